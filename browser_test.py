@@ -0,0 +1,82 @@
+"""
+To Run - python browser_test.py [tracks] from a terminal window on the Pi's desktop, uzbl must be installed
+Plays web tracks one after the other through the warm browser pool as BrowserPlayer does (from_pool, play,
+show_window, stop) and prints the uzbl each track used. With a pool of one every track must use the same uzbl
+and no uzbl may be left running at the end.
+Default is 3 tracks.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import Tkinter
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_childwatcher import ChildWatcher
+from pp_uzbldriver import UZBLDriver
+
+TRACK='about:blank'
+SHOW_TIME=3000      # ms each track is on the screen
+
+
+def run(root,tracks):
+    names=[]
+    closed=[]
+    done=[False]
+
+    def play_next():
+        if len(names) == tracks:
+            UZBLDriver(root,'').empty_pool()
+            # give the spare time to exit
+            Scheduler().after(UZBLDriver.exit_deadline+500,finish)
+            return
+        driver=UZBLDriver(root,'').from_pool()
+        names.append(driver.name)
+        driver.events.when('loaded',lambda: loaded(driver))
+        driver.events.when('closed',lambda reason: track_closed(driver))
+        driver.play(TRACK,None)
+
+    def loaded(driver):
+        driver.show_window()
+        Scheduler().after(SHOW_TIME,driver.stop)
+
+    def track_closed(driver):
+        closed.append(driver.name)
+        play_next()
+
+    def finish():
+        done[0]=True
+
+    UZBLDriver.pool_size=1
+    UZBLDriver(root,'').fill_pool()
+    play_next()
+    while done[0] is False:
+        root.tk.dooneevent(0)
+    return names,closed
+
+
+if len(sys.argv)>1:
+    tracks=int(sys.argv[1])
+else:
+    tracks=3
+
+Monitor.log_path=tempfile.mkdtemp()
+os.makedirs(Monitor.log_path + os.sep + 'pp_logs')
+Monitor().init()
+root=Tkinter.Tk()
+root.withdraw()
+Scheduler().init(root)
+ChildWatcher().init()
+names,closed=run(root,tracks)
+for index,name in enumerate(names):
+    print 'track %d used %s' % (index+1,name)
+if len(set(names)) == 1 and len(closed) == tracks:
+    print 'OK, every track used the same browser'
+else:
+    print 'FAILED, %d browsers were used for %d tracks, %d tracks were closed' % (len(set(names)),tracks,len(closed))
+print 'uzbl still running: ' + str(len(ChildWatcher.children))
+ChildWatcher().terminate()
+Scheduler().terminate()
+Monitor().finish()
+shutil.rmtree(Monitor.log_path)
@@ -0,0 +1,115 @@
+"""
+To Run - python gpio_benchmark.py [presses] from a terminal window, no Pi or display is needed
+Presses a simulated button (pp_fakegpio.py) with switch bounce and measures the time from the press
+to GPIODriver sending its input event, first with the inputs polled every 50 mS then with edge detection.
+Also measures the CPU time Pi Presents' Tk thread uses while the buttons are not pressed.
+Default is 50 presses.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import threading
+import Tkinter
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_gpiodriver import GPIODriver
+from pp_fakegpio import FakeGPIO
+
+BUTTON_PIN=11
+GPIO_CFG=\
+"""[P1-11]
+direction = in
+rising-name = pp-release
+falling-name = pp-press
+one-name =
+zero-name =
+repeat =
+threshold = 2
+pull-up-down = up
+
+[P1-12]
+direction = out
+name = led
+"""
+
+
+def make_profile():
+    pp_home=tempfile.mkdtemp()
+    os.makedirs(pp_home + os.sep + 'pp_logs')
+    os.makedirs(pp_home + os.sep + 'pp_io_config')
+    cfg=open(pp_home + os.sep + 'pp_io_config' + os.sep + 'gpio.cfg','w')
+    cfg.write(GPIO_CFG)
+    cfg.close()
+    return pp_home
+
+
+# Tcl without Tk has no windows to keep mainloop() going
+def event_loop(root,done):
+    done[0]=False
+    while done[0] is False:
+        root.tk.dooneevent(0)
+
+
+def run(mode,pp_home,presses):
+    latencies=[]
+    press_time=[0]
+    done=[False]
+
+    def stop():
+        done[0]=True
+
+    def input_event(symbol,source):
+        if symbol == 'pp-press':
+            latencies.append(time.time()-press_time[0])
+
+    def presser():
+        gpio=FakeGPIO()
+        for i in range(presses):
+            time.sleep(random.uniform(0.1,0.2))
+            press_time[0]=time.time()
+            gpio.set_input(BUTTON_PIN,0,bounces=random.randint(0,6))
+            time.sleep(random.uniform(0.1,0.2))
+            gpio.set_input(BUTTON_PIN,1,bounces=random.randint(0,6))
+        Scheduler().post(stop)
+
+    root=Tkinter.Tcl()
+    Scheduler().init(root)
+    GPIODriver.mode=mode
+    GPIODriver.fake=True
+    driver=GPIODriver()
+    driver.init(pp_home,pp_home,pp_home,None,50,input_event)
+    driver.poll()
+
+    # the Tk thread with nothing to do but the gpio
+    cpu_start=time.clock()
+    Scheduler().after(2000,stop)
+    event_loop(root,done)
+    idle_cpu=time.clock()-cpu_start
+
+    thread=threading.Thread(target=presser)
+    thread.daemon=True
+    thread.start()
+    event_loop(root,done)
+    driver.terminate()
+    Scheduler().terminate()
+    return latencies,idle_cpu
+
+
+if len(sys.argv)>1:
+    presses=int(sys.argv[1])
+else:
+    presses=50
+
+Monitor.log_path=make_profile()
+Monitor().init()
+for mode in ('poll','edge'):
+    latencies,idle_cpu=run(mode,Monitor.log_path,presses)
+    latencies.sort()
+    print "%s: %d presses of %d seen, press to event min %.1f mS, median %.1f mS, max %.1f mS, idle CPU %.1f mS a second"\
+          % (mode,len(latencies),presses,1000*latencies[0],1000*latencies[len(latencies)/2],1000*latencies[-1],1000*idle_cpu/2)
+Monitor().finish()
+shutil.rmtree(Monitor.log_path)
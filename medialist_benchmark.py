@@ -0,0 +1,110 @@
+"""
+To Run - python medialist_benchmark.py [tracks] [calls] from a terminal window
+Times calls of MediaList.next() stepping through an ordered medialist of anonymous tracks
+with every tenth track labelled, and MediaList.index_of_track() for the labelled tracks.
+Each is timed for MediaList and for ScanMediaList, a copy of how MediaList did them before
+the tracks were indexed, so the numbers before and after can be compared on the same machine.
+The scans make the before numbers take a few minutes at the defaults.
+Defaults are 10000 tracks and 100000 calls.
+"""
+
+import sys
+import time
+from pp_medialist import MediaList
+
+
+class ScanMediaList(MediaList):
+    """
+    next() and index_of_track() as they were before MediaList indexed its tracks,
+    every call counts the anonymous tracks and searches the list for the track wanted.
+    """
+
+    def anon_length(self):
+        # number of anonymous tracks
+        count=0
+        index=0
+        while index<self._num_tracks:
+            if self._tracks[index] ['track-ref'] =="":
+                count+=1
+            index +=1
+        return count
+
+
+    # only the ordered sequence is benchmarked
+    def next(self,sequence):
+        if self.anon_length()==0:
+            return False
+        if self._selected_track_index== self._num_tracks-1:
+            index=0
+        else:
+            index= self._selected_track_index+1
+        end=self._selected_track_index
+        # search for next anonymous track
+        while index != end:
+            if self._tracks[index] ['track-ref'] =="":
+                self.select(index)
+                return True
+            if index== self._num_tracks-1:
+                index=0
+            else:
+                index= index+1
+        return False
+
+
+    def index_of_track(self,wanted_track):
+        index = 0
+        for track in self._tracks:
+            if track['track-ref']==wanted_track:
+                return index
+            index +=1
+        return -1
+
+
+
+def make_list(medialist_class,num_tracks):
+    medialist=medialist_class('ordered')
+    for index in range(num_tracks):
+        if index % 10 == 9:
+            ref='track'+str(index)
+        else:
+            ref=''
+        medialist.append({'track-ref':ref,'title':'Track '+str(index),'type':'image','location':''})
+    return medialist
+
+
+def time_next(medialist,calls):
+    medialist.first()
+    start=time.time()
+    for i in range(calls):
+        medialist.next('ordered')
+    return time.time()-start
+
+
+def time_index_of_track(medialist,num_tracks,calls):
+    refs=['track'+str(index) for index in range(9,num_tracks,10)]
+    start=time.time()
+    for i in range(calls):
+        medialist.index_of_track(refs[i % len(refs)])
+    return time.time()-start
+
+
+if len(sys.argv)>1:
+    num_tracks=int(sys.argv[1])
+else:
+    num_tracks=10000
+if len(sys.argv)>2:
+    calls=int(sys.argv[2])
+else:
+    calls=100000
+
+for name,medialist_class in (('before (scan)',ScanMediaList),('after (indexed)',MediaList)):
+    print name
+    start=time.time()
+    medialist=make_list(medialist_class,num_tracks)
+    print "    Built medialist of",num_tracks,"tracks in %.3f secs" % (time.time()-start)
+
+    elapsed=time_next(medialist,calls)
+    print "   ",calls,"calls of next() took %.3f secs, %.2f us per call" % (elapsed,1000000*elapsed/calls)
+
+    elapsed=time_index_of_track(medialist,num_tracks,calls)
+    print "   ",calls,"calls of index_of_track() took %.3f secs, %.2f us per call" % (elapsed,1000000*elapsed/calls)
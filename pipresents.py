@@ -40,6 +40,20 @@ from pp_validate import Validator
 from pp_showmanager import ShowManager
 from pp_screendriver import ScreenDriver
 from pp_timeofday import TimeOfDay
+from pp_scheduler import Scheduler
+from pp_clock import Clock
+from pp_shufflebag import ShuffleBag
+from pp_livewatcher import LiveWatcher
+from pp_imagecache import ImageCache
+from pp_decodepool import DecodePool
+from pp_prescale import PreScale
+from pp_framestore import FrameStore
+from pp_loadtimes import LoadTimes
+from pp_mediainfo import MediaInfo
+from pp_mplayerslave import MplayerSlave
+from pp_soundcues import SoundCues
+from pp_mediabackend import MediaBackend
+from pp_childwatcher import ChildWatcher
 from pp_kbddriver import KbdDriver
 from pp_utils import Monitor
 from pp_utils import StopWatch
@@ -109,11 +123,12 @@ class PiPresents(object):
                             'HyperlinkShow','RadioButtonShow','ArtLiveShow','ArtMediaShow','MediaShow','LiveShow','MenuShow',
                             'GapShow','Show','ArtShow',
                             'AudioPlayer','BrowserPlayer','ImagePlayer','MenuPlayer','MessagePlayer','VideoPlayer','Player',
-                            'MediaList','LiveList','ShowList',
+                            'MediaList','LiveList','LiveWatcher','ShowList','ImageCache','DecodePool','FrameStore','LoadTimes','MediaInfo',
                             'PathManager','ControlsManager','ShowManager','PluginManager',
-                            'MplayerDriver','OMXDriver','UZBLDriver',
+                            'MplayerDriver','MplayerSlave','SoundCues','OMXDriver','OMXBus','UZBLDriver','ChildWatcher','MediaBackend',
+                            'FakeBackend','FakeVideoDriver','FakeAudioDriver','FakeWebDriver',
                             'KbdDriver','GPIODriver','TimeOfDay','ScreenDriver','Animate','OSCDriver',
-                            'Network','Mailer'
+                            'Network','Mailer','Scheduler','Clock'
                             ]
         
 
@@ -123,6 +138,29 @@ class PiPresents(object):
         Monitor.log_level = int(self.options['debug'])
         Monitor.manager = self.options['manager']
         # print self.options['manager']
+
+        # number of tracks that cannot be repeated across the end of a shuffled cycle
+        ShuffleBag.no_repeat = int(self.options['norepeat'])
+
+        # memory for images that have been decoded and resized
+        ImageCache.budget = int(self.options['imagecache'])*1024*1024
+        ImageCache.exif = self.options['exif']
+
+        # decoding images off the Tk thread and how many images shows decode ahead
+        DecodePool.mode = self.options['decode']
+        DecodePool.lookahead = int(self.options['lookahead'])
+
+        # audio tracks are played by one mplayer kept in slave mode, or by the fake one when there is no audio hardware
+        MplayerSlave.enabled = self.options['audio'] != 'spawn'
+        if self.options['audio'] == 'fake':
+            MplayerSlave.command = ['python',self.pp_dir + os.sep + 'pp_fakemplayer.py']
+
+        # gpio inputs are read when they change or polled, on a simulated gpio if there is no Pi
+        GPIODriver.mode = self.options['gpio']
+        GPIODriver.fake = self.options['fakegpio']
+
+        # fake players and the virtual clock would teach the real load times nonsense
+        LoadTimes.learning = self.options['backend'] != 'fake' and self.options['clock'] != 'virtual'
         self.mon.newline(3)
         self.mon.sched (self, "Pi Presents is starting, Version:"+self.pipresents_minorissue + ' at '+time.strftime("%Y-%m-%d %H:%M.%S"))
         self.mon.log (self, "Pi Presents is starting, Version:"+self.pipresents_minorissue+ ' at '+time.strftime("%Y-%m-%d %H:%M.%S"))
@@ -146,6 +184,7 @@ class PiPresents(object):
         
         # optional other classes used
         self.root=None
+        self.scheduler=None
         self.ppio=None
         self.tod=None
         self.animate=None
@@ -275,6 +314,21 @@ class PiPresents(object):
             call(["xset","s", "-dpms"])
 
         self.root=Tk()   
+
+        # the real clock, or a virtual one for running shows faster than real time
+        Clock().init(self.options)
+        if self.options['clock'] == 'virtual' and self.options['backend'] != 'fake':
+            self.mon.warn(self,'Virtual clock used with real media players, use --backend fake')
+
+        # one deadline scheduler for all the timers in Pi Presents
+        self.scheduler=Scheduler()
+        self.scheduler.init(self.root)
+
+        # reaps the players' processes as soon as they exit, uses the scheduler's wake up pipe
+        ChildWatcher().init()
+
+        # workers that decode images, they post the results back through the scheduler
+        DecodePool().init()
        
         self.title='Pi Presents - '+ self.pp_profile
         self.icon_text= 'Pi Presents'
@@ -293,6 +347,24 @@ class PiPresents(object):
                 self.end('error',message)
 
         self.mon.log(self, 'forced screen dimensions (--screensize) are ' + str(self.screen_width) + ' x ' + str(self.screen_height) + ' pixels')
+
+        # use the images pre-scaled by pp_prescale.py for this screen size if there are any
+        if PreScale().use(self.pp_profile,self.screen_width,self.screen_height) != '':
+            self.mon.log(self,'Using pre-scaled images in ' + PreScale.directory)
+            # and the raw frames if pp_prescale.py --raw made them
+            FrameStore().open(PreScale.directory)
+
+        # load and show times learned by artshows on previous runs
+        LoadTimes().open(self.pp_profile)
+
+        # durations, sizes and codecs of the media files found by pp_mediainfo.py or the validator
+        MediaInfo().open(self.pp_profile)
+
+        # decode the button and click sounds in pp_sounds and open the sound output ready for them
+        SoundCues().open(self.pp_profile,self.options['sounddevice'])
+
+        # the programs that play video, audio and web tracks, or fake ones for testing
+        MediaBackend().init(self.options,self.pp_profile,self.root)
        
         # set window dimensions and decorations
         if self.options['fullscreen'] is False:
@@ -392,13 +464,12 @@ class PiPresents(object):
                 self.end('error',message)
             else:
                 self.gpio_enabled=True
-                # and start polling gpio
+                # and start detecting or polling the gpio inputs
                 self.gpiodriver.poll()
             
-        # kick off animation sequencer
+        # start the animation sequencer, it sets a timer for each event when it is added
         self.animate = Animate()
-        self.animate.init(pp_dir,self.pp_home,self.pp_profile,self.canvas,200,self.handle_output_event)
-        self.animate.poll()
+        self.animate.init(pp_dir,self.pp_home,self.pp_profile,self.canvas,self.handle_output_event)
 
         #create a showmanager ready for time of day scheduler and osc server
         show_id=-1
@@ -572,7 +643,9 @@ class PiPresents(object):
 
                
     def handle_output_event(self,symbol,param_type,param_values,req_time):
-        if self.gpio_enabled is True:
+        if param_type == 'sound':
+            SoundCues().play(symbol)
+        elif self.gpio_enabled is True:
             reason,message=self.gpiodriver.handle_output_event(symbol,param_type,param_values,req_time)
             if reason =='error':
                 self.mon.err(self,message)
@@ -833,6 +906,34 @@ class PiPresents(object):
         if self.tod_enabled is True:
             self.tod.terminate()
 
+        # stop watching live tracks directories
+        LiveWatcher().terminate()
+
+        # log how well the image cache did
+        ImageCache().report()
+
+        # keep the learned load times for the next run
+        LoadTimes().report()
+        LoadTimes().save()
+
+        # stop the image decoding workers
+        DecodePool().terminate()
+
+        # and the mplayer kept for audio tracks
+        MplayerSlave(None,self.pp_dir).quit()
+        SoundCues().terminate()
+
+        # and the spare browsers
+        MediaBackend().terminate()
+        FrameStore().close()
+
+        # kill any player processes that are left, logs how many children had to be killed
+        ChildWatcher().terminate()
+
+        # and finally stop the timers, logs the timer statistics
+        if self.scheduler is not None:
+            self.scheduler.terminate()
+
          
 if __name__ == '__main__':
 
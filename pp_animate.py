@@ -1,6 +1,8 @@
-import time
-import copy
+import re
+import heapq
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_clock import Clock
 
 
 
@@ -8,46 +10,54 @@ class Animate(object):
     """
      allows players to put events, which request the change of state of pins, into a queue. Events are executed at the required time.
      using the interface to an output driver.
+
+     The events are kept in a heap ordered by the time they are due and one Scheduler timer is set for the earliest,
+     so an event is sent within a few milliseconds of its time rather than at the next poll.
+     Each tag (usually a track) has an index of its events so they can be removed without searching the heap,
+     removed events are marked and thrown away when they reach the top of the heap.
+     Delays are in seconds and may have up to 3 decimal places e.g. 0.25
    """
 
-# constants for sequencer events list          
-    
-    name = 0         # GPIO pin number, the xx in P1-xx
-    param_type = 1
-    param_values = 2    # off , on
-    time = 3        # time since the epoch in seconds
-    tag = 4   # tag used to delete all matching events, usually a track reference.
-    event_template=['','','',0,None]
-    
+# constants for sequencer events, the event is a list as the removed mark is changed in place
+    time = 0        # time since the epoch in seconds that the event is due
+    seq = 1         # order the events were added, events due at the same time are sent in this order
+    name = 2        # GPIO pin number, the xx in P1-xx
+    param_type = 3
+    param_values = 4    # off , on
+    tag = 5   # tag used to delete all matching events, usually a track reference.
+    removed = 6
+
+    delay_pattern=re.compile(r'^[0-9]+(\.[0-9]{1,3})?$')
+
 # CLASS VARIABLES (Animate.)
-    events=[]
-    last_poll_time=0
+    events=[]       # heap of events
+    tags={}         # tag -> {seq: event}
+    last_seq=0
+    num_removed=0   # removed events still in the heap
+    timer=None
+    timer_due=None
+    event_callback=None
 
 # executed by main program and by each object using animate
     def __init__(self):
         self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.clock=Clock()
 
     # executed once from main program   
-    def init(self,pp_dir,pp_home,pp_profile,widget,sequencer_tick,event_callback):
+    def init(self,pp_dir,pp_home,pp_profile,widget,event_callback):
         
         # instantiate arguments
         self.widget=widget    #something to hang 'after' on
         self.pp_dir=pp_dir
         self.pp_profile=pp_profile
         self.pp_home=pp_home
-        self.sequencer_tick=sequencer_tick
-        self.event_callback=event_callback
-
-        # Initialise time used by sequencer
-        Animate.sequencer_time=long(time.time())
-        
-        # init timer
-        self.sequencer_tick_timer=None
+        # the timer may be set by any instance so the callback is kept by the class
+        Animate.event_callback=staticmethod(event_callback)
+        self.clear_events_list(None)
 
     # called by main program only                
     def terminate(self):
-        if self.sequencer_tick_timer is not None:
-            self.widget.after_cancel(self.sequencer_tick_timer)
         self.clear_events_list(None)
 
 
@@ -55,39 +65,53 @@ class Animate(object):
 # output sequencer
 # ************************************************
 
-    # called by main program only         
-    def poll(self):
-        poll_time=long(time.time())
-        # is current time greater than last time the scheduler was run (previous second or more)
-        # run in a loop to catch up because root.after can get behind when images are being rendered etc.
-        while Animate.sequencer_time<=poll_time:
-            # kick off output pin sequencer
-            self.do_sequencer()
-            Animate.sequencer_time +=1
-        
-        # and loop the polling
-        self.sequencer_tick_timer=self.widget.after(self.sequencer_tick,self.poll)
-
-
-    # execute events at the appropriate time and remove from list (runs from main program only)
-    # runs through list a number of times because of problems with pop messing up list
+    # send the events that are due, in order, and set the timer for the next one.
+    # runs late if the Tk thread was busy but the events are still sent in order
     def do_sequencer(self):
-        # print 'sequencer run for: ' + str(sequencer_time) + ' at ' + str(long(time.time()))
-        while True:
-            event_found=False
-            for index, item in enumerate(Animate.events):
-                if item[Animate.time]<=Animate.sequencer_time:
-                    event=Animate.events.pop(index)
-                    event_found=True
-                    self.send_event(event[Animate.name],event[Animate.param_type],event[Animate.param_values],item[Animate.time])
-                    break
-            if event_found is False: break
+        Animate.timer=None
+        Animate.timer_due=None
+        # timers are armed to the nearest mS
+        now=self.clock.time()+0.0005
+        while len(Animate.events) > 0 and Animate.events[0][Animate.time] <= now:
+            event=heapq.heappop(Animate.events)
+            if event[Animate.removed] is True:
+                Animate.num_removed-=1
+                continue
+            self._unindex(event)
+            self.send_event(event[Animate.name],event[Animate.param_type],event[Animate.param_values],event[Animate.time])
+        self._set_timer()
 
     def send_event(self,name,param_type,param_values,req_time):
-        self.event_callback(name,param_type,param_values,req_time)
+        Animate.event_callback(name,param_type,param_values,req_time)
         self.mon.log(self, 'send event '+ name)
 
 
+    # the timer is for the earliest event that has not been removed
+    def _set_timer(self):
+        while len(Animate.events) > 0 and Animate.events[0][Animate.removed] is True:
+            heapq.heappop(Animate.events)
+            Animate.num_removed-=1
+        if len(Animate.events) == 0:
+            due=None
+        else:
+            due=Animate.events[0][Animate.time]
+        if due == Animate.timer_due:
+            return
+        self.scheduler.cancel(Animate.timer)
+        Animate.timer=None
+        Animate.timer_due=due
+        if due is not None:
+            Animate.timer=self.scheduler.after(max(0,int(round((due-self.clock.time())*1000))),self.do_sequencer)
+
+
+    def _unindex(self,event):
+        tag_events=Animate.tags.get(event[Animate.tag])
+        if tag_events is not None:
+            tag_events.pop(event[Animate.seq],None)
+            if len(tag_events) == 0:
+                del Animate.tags[event[Animate.tag]]
+
+
 # ************************************************
 # output sequencer interface methods
 # these can be called from many classes so need to operate on class variables
@@ -104,63 +128,36 @@ class Animate(object):
         return 'normal','events processed'
 
 
+    # delay is in seconds, events due at the same time are sent in the order they were added
     def add_event(self,name,param_type,param_values,delay,tag):
-        poll_time=long(time.time())
-        # prepare the event
-        event=Animate.event_template
-        event[Animate.name]=name
-        event[Animate.param_type]=param_type
-        event[Animate.param_values]=param_values
-        event[Animate.time]=delay+poll_time   #+1?
-        event[Animate.tag]=tag
-        # print 'add event ',event
-        # find the place in the events list and insert
-        # first item in the list is earliest, if two have the same time then last to be added is fired last.
-        # events are fired from top of list
-        abs_time=poll_time+delay
-        # print 'new event',abs_time
-        copy_event= copy.deepcopy(event)
-        length=len(Animate.events)
-        if length ==0:
-                Animate.events.append(copy_event)
-                # print 'append to empty ist',abs_time
-                return copy_event
-        else:
-            index=length-1
-            if abs_time>Animate.events[index][Animate.time]:
-                Animate.events.append(copy_event)
-                # print 'append to end of list if greater than last item',abs_time
-                return copy_event
-            while index!=-1:
-                if abs_time==Animate.events[index][Animate.time]:                
-                    Animate.events.insert(index+1,copy_event)
-                    # print 'insert after if equal',abs_time
-                    return copy_event
-                if abs_time>Animate.events[index][Animate.time]:                
-                    Animate.events.insert(index+1,copy_event)
-                    # print 'insert after if later',abs_time
-                    return copy_event
-                if index==0:                
-                    Animate.events.insert(index,copy_event)
-                    # print 'insert before if at start of list',abs_time
-                    return copy_event
-                index -=1
-            # print 'error at start of list',abs_time
+        Animate.last_seq+=1
+        event=[self.clock.time()+delay,Animate.last_seq,name,param_type,list(param_values),tag,False]
+        heapq.heappush(Animate.events,event)
+        Animate.tags.setdefault(tag,{})[event[Animate.seq]]=event
+        if Animate.timer_due is None or event[Animate.time] < Animate.timer_due:
+            self._set_timer()
+        return event
 
 
     def print_events(self):
         print '\nevents list'
-        for event in Animate.events:
-            print event
+        for event in sorted(Animate.events):
+            if event[Animate.removed] is False:
+                print event
     
 
     # remove all the events with the same tag, usually a track reference
     def remove_events(self,tag):
-        left=[]
-        for item in Animate.events:
-            if tag != item[Animate.tag]:
-                left.append(item)
-        Animate.events= left
+        tag_events=Animate.tags.pop(tag,{})
+        for event in tag_events.itervalues():
+            event[Animate.removed]=True
+        Animate.num_removed+=len(tag_events)
+        if Animate.num_removed > 64 and Animate.num_removed > len(Animate.events)/2:
+            # mostly removed events, make the heap again without them
+            Animate.events=[event for event in Animate.events if event[Animate.removed] is False]
+            heapq.heapify(Animate.events)
+            Animate.num_removed=0
+        self._set_timer()
         # self.print_events()
 
 
@@ -169,6 +166,9 @@ class Animate(object):
         self.mon.log(self,'clear events list ')
         # empty event list
         Animate.events=[]
+        Animate.tags={}
+        Animate.num_removed=0
+        self._set_timer()
 
 
     # [delay],symbol,type,state
@@ -186,17 +186,20 @@ class Animate(object):
         start_params = 3
        
         # check each field
-        if  not delay_text.isdigit():
-            return 'error','Delay is not an integer in : '+ line,'','',[],0
+        if Animate.delay_pattern.match(delay_text) is None:
+            return 'error','Delay is not a number of seconds with up to 3 decimal places in : '+ line,'','',[],0
         else:
-            delay=int(delay_text)
+            delay=float(delay_text)
 
-        #only one param type at the moment.
-        if param_type != 'state':
-            return 'error','uknown parameter type in : '+ line,'','',[],0
-        else:
+        if param_type == 'state':
             params_length = 1
             params_check = ('on','off')
+        elif param_type == 'sound':
+            # name is a sound in pp_sounds, played by PiPresents not the gpio driver
+            params_length = 1
+            params_check = ('play',)
+        else:
+            return 'error','uknown parameter type in : '+ line,'','',[],0
 
 
         params=[]
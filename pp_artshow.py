@@ -1,5 +1,8 @@
 from pp_show import Show
 from pp_controlsmanager import ControlsManager
+from pp_soundcues import SoundCues
+from pp_loadtimes import LoadTimes
+from pp_clock import Clock
 
 class ArtShow(Show):
     
@@ -36,10 +39,21 @@ class ArtShow(Show):
                           pp_profile,
                           command_callback)
 
-        # delay in mS before next track is loaded after showing a track.
+        # least delay in mS before next track is loaded after a track has started showing.
         # can be inceeased if animation is required
         self.load_delay = 5
 
+        # the load of the next track is started this many secs, plus one and a half times its learned load time,
+        # before the current track is expected to end. The times are learned by LoadTimes,
+        # a video or audio track that has not been shown yet is expected to show for its duration from MediaInfo
+        self.load_margin = 0.5
+        self.load_timer=None
+        self.load_pending=False
+        self.load_start=0
+        self.next_key=('','')       # type and location of the next track, for LoadTimes
+        self.current_key=('','')
+        self.show_start=None
+
         # Init variables for this show
         self.end_medialist_signal=False
         self.end_medialist_warning=False
@@ -133,6 +147,9 @@ class ArtShow(Show):
         elif operation  in ('no-command','null'):
             return
         
+        elif operation[0:6] == 'sound-':
+            SoundCues().play(operation[6:])
+
         elif operation[0:4] == 'omx-' or operation[0:6] == 'mplay-':
             if self.current_player is not None:
                 self.current_player.input_pressed(operation)
@@ -164,7 +181,7 @@ class ArtShow(Show):
             print 'FIRST EMPTY'
             # list is empty - display a message for 5 secs and then retry
             Show.display_admin_message(self,self.show_params['empty-text'])
-            self.canvas.after(5000,self.remove_list_empty_message)
+            self.scheduler.after(5000,self.remove_list_empty_message)
         else:
             # otherwise load the first track
             print "!!!!! artshow init first"
@@ -181,9 +198,11 @@ class ArtShow(Show):
                 else:
                     track_file=Show.base_complete_path(self,self.medialist.selected_track()['location'])
                 print "!!!!! artshow load first ",track_file
+                self.start_load_timing(self.medialist.selected_track())
                 self.next_player.load(track_file,
                                       self.loaded_callback,
                                       enable_menu=False)
+                Show.base_prefetch(self)
                 self.wait_for_load() 
             
 
@@ -199,17 +218,27 @@ class ArtShow(Show):
         # and is a good place to test for ending.
         # self.mon.trace(self,'')
         if self.next_player is not None:
-            if self.next_player.get_play_state() == 'load-failed':
-                self.req_next='error'
-                self.what_next()
-            else:
-                if self.previous_player is  None  and self.next_player.get_play_state() == 'loaded':
-                    self.mon.trace(self,' - next is loaded and previous closed')
-                    self.canvas.after(10,self.what_next)
-                else:
-                    self.canvas.after(50,self.wait_for_load)
+            self.next_player.when('loaded',self.next_loaded)
+        else:
+            self.scheduler.after(200,self.wait_for_load)           
+
+
+    def next_loaded(self,play_state):
+        if play_state == 'load-failed':
+            self.req_next='error'
+            self.what_next()
+        elif self.previous_player is None:
+            self.mon.trace(self,' - next is loaded and previous closed')
+            self.what_next()
         else:
-            self.canvas.after(200,self.wait_for_load)           
+            self.previous_player.when('closed',self.previous_closed)
+
+
+    def previous_closed(self,play_state):
+        # closed_callback has normally done this already
+        self.previous_player=None
+        self.mon.trace(self,' - next is loaded and previous closed')
+        self.what_next()
 
           
     def what_next(self):
@@ -278,21 +307,76 @@ class ArtShow(Show):
         self.mon.trace(self, 'showing track')
         if self.end_medialist_warning is True:
             self.end_medialist_signal = True
+        self.current_key=self.next_key
+        self.show_start=None
+        self.next_track_signal=False
+        self.load_pending=True
         self.current_player.show(self.track_ready_callback,self.finished_showing,self.closed_after_showing)
-        # load the next after a wait to allow animation etc to be timely.
-        self.canvas.after(self.load_delay,self.what_to_load_next)
+        # load the next once this one has started, so they do not compete while this one starts
+        self.current_player.when('first-frame',self.current_started)
+
+
+    # schedule the load of the next track so it finishes just before this one ends,
+    # or after load_delay if it is not known how long this one shows for or the next one takes to load
+    def current_started(self,play_state):
+        self.show_start=Clock().time()
+        if self.load_pending is False:
+            return
+        delay=self.load_delay
+        show_time=LoadTimes().expected('show',*self.current_key)
+        if show_time is None:
+            # not shown before, a video or audio track in the media info index shows for its duration
+            info=Show.base_media_info(self,{'type':self.current_key[0],'location':self.current_key[1]})
+            if info is not None:
+                show_time=info['duration']
+        upcoming=self.medialist.upcoming(1,self.show_params['sequence'])
+        if show_time is not None and len(upcoming) > 0:
+            track=upcoming[0]
+            load_time=LoadTimes().expected('load',track['type'],track.get('location',''))
+            if load_time is not None:
+                delay=max(self.load_delay,int((show_time-load_time*1.5-self.load_margin)*1000))
+                self.mon.log(self,'Loading next %s track in %.3f secs, expected to load in %.3f secs, this track shows for %.3f secs'
+                             % (track['type'],delay/1000.0,load_time,show_time))
+        self.load_timer=self.scheduler.after(delay,self.what_to_load_next)
+
+
+    # the current track has ended before the next has started loading
+    def load_next_now(self):
+        if self.load_pending is True:
+            if self.load_timer is not None:
+                self.scheduler.cancel(self.load_timer)
+            self.what_to_load_next()
+
+
+    def start_load_timing(self,track):
+        self.next_key=(track['type'],track.get('location',''))
+        self.load_start=Clock().time()
+        self.next_player.when('loaded',self.next_load_timed)
+
+
+    def next_load_timed(self,play_state):
+        if play_state == 'loaded':
+            LoadTimes().record('load',self.next_key[0],self.next_key[1],Clock().time()-self.load_start)
+
+
+    # how long the track showed for, unless it was cut short by the user
+    def record_show_time(self):
+        if self.show_start is not None and self.next_track_signal is False and self.current_player.play_state != 'show-failed':
+            LoadTimes().record('show',self.current_key[0],self.current_key[1],Clock().time()-self.show_start)
+        self.show_start=None
 
 
     def finished_showing(self,reason,message):
         # showing has finished with 'pause at end', showing the next track will close it after next has started showing
         self.mon.trace(self,' - pause at end')
         self.mon.log(self,"finished_showing - pause at end of showing with reason: "+reason+ ' and message: '+ message)
-    
+        self.record_show_time()
         if self.current_player.play_state == 'show-failed':
             self.req_next = 'error'
             self.what_next()
         else:
             self.req_next='finished-player'
+            self.load_next_now()
             self.wait_for_load()
 
 
@@ -300,17 +384,21 @@ class ArtShow(Show):
         # showing has finished with closing of player but track instance is alive for hiding the x_content
         self.mon.trace(self,' - closed after showing')
         self.mon.log(self,"closed_after_showing - Closed after showing with reason: "+reason+ ' and message: '+ message)
+        self.record_show_time()
         if self.current_player.play_state == 'show-failed':
             self.req_next = 'error'
             self.what_next()
         else:
             self.req_next='finished-player'
+            self.load_next_now()
             self.wait_for_load()        
 
         
     # pre-load the next track. Runs concurrently to show. Control goes nowhere after completion, success is detected from the states.    
     def what_to_load_next(self):
         self.mon.trace(self,self.pretty_state ())
+        self.load_pending=False
+        self.load_timer=None
 
         # closing down so don't load anything
         if self.ending_reason in ('killed','error'):
@@ -350,9 +438,11 @@ class ArtShow(Show):
                     track_file=Show.base_complete_path(self,self.medialist.selected_track()['location'])
                 print "!!!!! artshow load next ",track_file
                 self.mon.trace(self, track_file)
+                self.start_load_timing(self.medialist.selected_track())
                 self.next_player.load(track_file,
                                       self.loaded_callback,
                                       enable_menu=False)
+                Show.base_prefetch(self)
 
     def loaded_callback(self,reason,message):
         self.mon.trace(self,' - load complete with reason: ' + reason + '  message: ' + message)  
@@ -367,6 +457,10 @@ class ArtShow(Show):
     
     def close_current_and_next(self):
         # end of show so close current, next and previous before ending
+        if self.load_timer is not None:
+            self.scheduler.cancel(self.load_timer)
+            self.load_timer=None
+        self.load_pending=False
         if self.current_player is not None and self.current_player.get_play_state() == 'showing':
             self.mon.trace(self,' - closing_current from ' + self.ending_reason)
             self.current_player.close(self.end_close_current)
@@ -387,39 +481,43 @@ class ArtShow(Show):
     # previous=None at this point,just wait for loading and closing to complete then end
     def wait_for_end(self):
         self.mon.trace(self, self.pretty_state())
-        ok_to_end=0
-        if self.current_player is None or self.current_player.get_play_state() == 'closed':
-            self.current_player=None
-            ok_to_end+=1
-        if self.next_player is None or self.next_player.get_play_state() in ('initialised','unloaded','load-failed'):
-            self.next_player=None
-            ok_to_end+=1
-        if ok_to_end != 2:
-            self.canvas.after(50,self.wait_for_end)
-        else:
-            self.mon.trace(self,' - next and current closed ' + self.ending_reason)
+        # wait for the closed event of whichever player is still busy then look again
+        if self.current_player is not None and self.current_player.get_play_state() not in ('closed','unloaded','load-failed'):
+            self.current_player.when('closed',self.player_ended)
+            return
+        self.current_player=None
+        if self.next_player is not None and self.next_player.get_play_state() not in ('initialised','unloaded','closed','load-failed'):
+            self.next_player.when('closed',self.player_ended)
+            return
+        self.next_player=None
+        self.mon.trace(self,' - next and current closed ' + self.ending_reason)
 
-            if self.ending_reason == 'killed':
-                self.base_close_previous()
+        if self.ending_reason == 'killed':
+            self.base_close_previous()
 
-            elif self.ending_reason=='error':
-                self.base_close_previous()
-                
-            elif self.ending_reason == 'exit':
-                self.base_close_previous()
+        elif self.ending_reason=='error':
+            self.base_close_previous()
+            
+        elif self.ending_reason == 'exit':
+            self.base_close_previous()
 
-            elif self.ending_reason == 'end-trigger':
-                self.state='waiting'
-                self.wait_for_trigger()
+        elif self.ending_reason == 'end-trigger':
+            self.state='waiting'
+            self.wait_for_trigger()
 
-            elif self.ending_reason in ('user-stop','end-of-medialist'):
-                self.end('normal',"show quit by user or natural end")                
+        elif self.ending_reason in ('user-stop','end-of-medialist'):
+            self.end('normal',"show quit by user or natural end")                
+
+        elif self.ending_reason == 'change-medialist':
+                self.load_first_track()
+        else:
+            self.mon.err(self,"Unhandled ending_reason: "+ self.ending_reason)
+            self.end('error',"Unhandled ending_reason: "+ self.ending_reason)                
+
+
+    def player_ended(self,play_state):
+        self.wait_for_end()
 
-            elif self.ending_reason == 'change-medialist':
-                    self.load_first_track()
-            else:
-                self.mon.err(self,"Unhandled ending_reason: "+ self.ending_reason)
-                self.end('error',"Unhandled ending_reason: "+ self.ending_reason)                
 
     def track_ready_callback(self,enable_show_background):
         self.mon.trace(self, '')
@@ -515,7 +613,7 @@ class ArtShow(Show):
     def stop_timers(self):
         pass
         #if self.duration_timer is not None:
-            #self.canvas.after_cancel(self.duration_timer)
+            #self.scheduler.cancel(self.duration_timer)
             #self.duration_timer=None
         # clear outstanding time of day events for this show
         # self.tod.clear_times_list(id(self))     
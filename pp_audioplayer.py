@@ -1,5 +1,6 @@
 import os
-from pp_mplayerdriver import MplayerDriver
+from pp_mplayerslave import MplayerSlave
+from pp_mediabackend import MediaBackend
 from pp_player import Player
 
 """
@@ -57,7 +58,7 @@ class AudioPlayer(Player):
         else:
             duration_text= self.track_params['duration']
         if duration_text != '':
-            self.duration_limit= 20 * int(duration_text)
+            self.duration_limit= 1000 * int(duration_text)   # milliseconds
         else:
             self.duration_limit=-1
         # print self.duration_limit                   
@@ -72,8 +73,8 @@ class AudioPlayer(Player):
             mplayer_volume= self.track_params['mplayer-volume'].strip()
         else:
             mplayer_volume= self.show_params['mplayer-volume'].strip()
-        mplayer_volume_int=int(mplayer_volume)+60
-        self.volume_option= '-volume ' + str(mplayer_volume_int)
+        self.mplayer_volume_int=int(mplayer_volume)+60
+        self.volume_option= '-volume ' + str(self.mplayer_volume_int)
 
         # get speaker from profile
         if  self.track_params['audio-speaker'] != "":
@@ -96,7 +97,7 @@ class AudioPlayer(Player):
         # initialise the state and signals      
         self.tick_timer=None
         self.quit_signal=False
-        self.play_state='initialised'
+        self.set_play_state('initialised')
         self.waiting=False
 
         
@@ -116,7 +117,7 @@ class AudioPlayer(Player):
             status,message=self.load_plugin()
             if status == 'error':
                 self.mon.err(self,message)
-                self.play_state='load-failed'
+                self.set_play_state('load-failed')
                 if self.loaded_callback is not  None:
                     self.loaded_callback('error',message)
                     return
@@ -125,21 +126,26 @@ class AudioPlayer(Player):
         status,message=self.load_x_content(enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
 
         if track !='' and self.duration_limit!=0 and not os.path.exists(track):
             self.mon.err(self,"Track file not found: "+ track)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error','track file not found: ' + track)
                 return
 
         # just create instance of mplayer don't bother with any pre-load
-        self.mplayer=MplayerDriver(self.canvas,self.pp_dir)
-        self.play_state='loaded'
+        # the mplayer kept in slave mode is used unless the track needs mplayer to be started with other options
+        if MplayerSlave.enabled is True and self.mplayer_other_options.strip() == '':
+            self.driver_kind='audio-slave'
+        else:
+            self.driver_kind='audio'
+        self.mplayer=MediaBackend().driver(self.driver_kind,self.canvas,self.pp_dir)
+        self.set_play_state('loaded')
         self.mon.log(self,"<Track loaded from show Id: "+ str(self.show_id))
         if self.loaded_callback is not None:
             self.loaded_callback('loaded','audio track loaded')
@@ -148,7 +154,7 @@ class AudioPlayer(Player):
     def unload(self):
         self.mon.trace(self,'')
         self.mplayer=None
-        self.play_state='unloaded'
+        self.set_play_state('unloaded')
 
 
     
@@ -170,6 +176,7 @@ class AudioPlayer(Player):
             self.start_play_state_machine_show()
         else:
             self.mplayer=None
+            self.set_play_state('closed')
             if self.closed_callback is not None:
                 self.closed_callback('normal','end with zero duration')
 
@@ -260,6 +267,8 @@ class AudioPlayer(Player):
         self.mon.log(self,">stop received")
         if self.play_state in ('starting','showing'):
             self.quit_signal=True
+            if self.play_state == 'showing':
+                self.end_track('user quit')
 
          
       
@@ -283,9 +292,6 @@ class AudioPlayer(Player):
 
                 
         if self.play_state == 'loaded':
-            # initialise all the state machine variables
-            self.duration_count = 0
-
             # select the sound device
             if self.mplayer_audio != "":
                 if self.mplayer_audio == 'hdmi':
@@ -295,114 +301,98 @@ class AudioPlayer(Player):
             # play the track               
             options = ' '+ self.mplayer_other_options + ' '+  self.volume_option + ' -af '+ self.speaker_option + ' '
             if self.track != '':
-                self.mplayer.play(self.track,options)
+                # mplayer's events drive the sequence
+                self.mplayer.events.when('first-frame',self.mplayer_started)
+                self.mplayer.events.when('finished',self.mplayer_finished)
+                self.mplayer.events.when('closed',self.mplayer_closed)
+                if self.driver_kind == 'audio-slave':
+                    self.mplayer.play(self.track,self.mplayer_volume_int,self.speaker_option)
+                else:
+                    self.mplayer.play(self.track,options)
                 self.mon.log (self,'Playing audio track from show Id: '+ str(self.show_id))
-                self.play_state='starting'
+                self.set_play_state('starting')
             else:
                 # no track to play so cannot rely on mplayer starting signal
-                self.play_state='showing'
-            # and start polling for state changes and count duration
-            self.tick_timer=self.canvas.after(50, self.play_state_machine)
+                self.set_play_state('showing')
+            # and time the duration
+            if self.duration_limit>0:
+                self.tick_timer=self.scheduler.after(self.duration_limit, self.duration_ended)
         else:
             self.mon.fatal(self,'illegal state in show method ' + self.play_state)
-            self.play_state='show-failed'
-            if self.finished_callback is not None:
-                self.finished_callback('error','illegal state in show method ' + self.play_state)
+            self.set_play_state('show-failed')
+            self.track_finished('error','illegal state in show method ' + self.play_state)
 
 
     def start_play_state_machine_close(self):
         self.quit_signal=True
         # print 'start close state machine close',self.play_state
-        self.tick_timer=self.canvas.after(1, self.play_state_machine)
+        if self.play_state == 'showing':
+            self.end_track('close')
+        # if starting, mplayer_started will quit. if closing the closed_callback is called when mplayer has gone
 
 
 
-    def play_state_machine(self):
-        self.duration_count+=1
-        # self.mon.log(self,"      State machine: " + self.play_state)           
-        if self.play_state == 'closed':
-            # self.mon.log(self,"   State machine: " + self.play_state)
-            pass
-
-
-        elif self.play_state == 'starting':
-            # self.mon.log(self,"      State machine: " + self.play_state)
-            
-            # if mplayer has started and can accept runtime commands change to showing state
-            if self.mplayer.start_play_signal is True:
-                self.mon.log(self,"            <start play signal received from mplayer")
-                self.mplayer.start_play_signal=False
-                self.play_state='showing'
-                self.mon.log(self,"      State machine: go to showing")
-            self.tick_timer=self.canvas.after(50, self.play_state_machine)
-
-        elif self.play_state == 'showing':
-
-            if self.waiting is True:
-                # self.mon.log(self,"      State machine: " + self.play_state + ' ' + self.waiting)
-                if self.quit_signal is True or (self.duration_limit>0 and self.duration_count>self.duration_limit):
-                    self.mon.log(self,"      Service stop required signal or timeout from wait")
-                    self.quit_signal=False
-                    self.waiting=False
-                    self.play_state = 'closed'
-                    if self.closed_callback is not None:
-                        self.closed_callback('normal','wait is finished')
-                else:
-                    self.tick_timer=self.canvas.after(50, self.play_state_machine)
-
-
-            # self.mon.log(self,"      State machine: " + self.play_state)
-            # service any queued stop signals
-            elif self.quit_signal is True or (self.duration_limit>0 and self.duration_count>self.duration_limit):
-                self.mon.log(self,"      Service stop required signal or timeout")
-                # self.quit_signal=False
-                if self.track != '':
-                    self.mplayer.stop()
-                    self.play_state = 'closing'
-                    self.mon.log(self,"      State machine: closing due to quit or duration with track to play")
-                    self.tick_timer=self.canvas.after(50, self.play_state_machine)
-                else:
-                    self.mon.log(self,"      State machine: closed due to quit or duration with NO track to play")
-                    self.play_state='closed'
-                    if self.closed_callback is not None:
-                        self.closed_callback('normal','user quit or duration NO track to play')
-
-            # mplayer reports it is finishing at end of track so change to ending state
-            elif self.track != '' and self.mplayer.end_play_signal:                    
-                self.mon.log(self,"            <end play signal received")
-                self.mon.log(self,"            <end detected at: " + str(self.mplayer.audio_position))
-                self.play_state = 'closing'
-                self.tick_timer=self.canvas.after(50, self.play_state_machine)
-            else:
-                self.tick_timer=self.canvas.after(50, self.play_state_machine)
-
-
-        elif self.play_state == 'closing':
-            # self.mon.log(self,"      State machine: " + self.play_state)
-            # if spawned process has closed can change to closed state
-            if self.mplayer.is_running()  is False:
-                self.mon.log(self,"            <mplayer process is dead")
-                # if still need to wait for duration change to waiting state
-                if self.duration_limit>0 and self.duration_count<self.duration_limit:
-                    self.play_state= 'showing'
-                    self.waiting=True
-                    self.tick_timer=self.canvas.after(50, self.play_state_machine)
-                else:
-                    self.play_state = 'closed'
-                    if self.closed_callback is not None:
-                        self.closed_callback('normal','mplayer dead')
-
-            else:
-                self.tick_timer=self.canvas.after(50, self.play_state_machine)
-                
-
-
-
-
-                                            
+    # mplayer has started and can accept runtime commands so change to showing state
+    def mplayer_started(self):
+        if self.play_state != 'starting':
+            return
+        self.mon.log(self,"            <start play signal received from mplayer")
+        self.mplayer.start_play_signal=False
+        self.set_play_state('showing')
+        self.mon.log(self,"      State machine: go to showing")
+        # service a stop that arrived while starting
+        if self.quit_signal is True:
+            self.end_track('user quit while starting')
 
 
+    def duration_ended(self):
+        self.tick_timer=None
+        if self.play_state in ('starting','showing'):
+            self.end_track('duration exceeded')
+
+
+    # stop required or duration exceeded
+    def end_track(self,reason):
+        self.mon.log(self,"      Service stop required signal or timeout: " + reason)
+        if self.waiting is True:
+            # track has finished, only waiting for the duration
+            self.waiting=False
+            self.close_track('wait is finished')
+        elif self.track != '':
+            self.mplayer.stop()
+            self.set_play_state('closing')
+            self.mon.log(self,"      State machine: closing due to quit or duration with track to play")
+        else:
+            self.mon.log(self,"      State machine: closed due to quit or duration with NO track to play")
+            self.close_track('user quit or duration NO track to play')
+
+
+    # mplayer reports it is finishing at end of track so change to closing state
+    def mplayer_finished(self,reason):
+        if self.play_state not in ('starting','showing'):
+            return
+        self.mon.log(self,"            <end play signal received")
+        self.mon.log(self,"            <end detected at: " + str(self.mplayer.audio_position))
+        self.set_play_state('closing')
+
+
+    def mplayer_closed(self,reason):
+        if self.play_state not in ('starting','showing','closing'):
+            return
+        self.mon.log(self,"            <mplayer process is dead")
+        # if still need to wait for duration change to waiting state
+        if self.quit_signal is False and self.duration_limit>0 and self.tick_timer is not None:
+            self.set_play_state('showing')
+            self.waiting=True
+        else:
+            self.close_track('mplayer dead')
 
 
-   
+    def close_track(self,message):
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.quit_signal=False
+        self.set_play_state('closed')
+        if self.closed_callback is not None:
+            self.closed_callback('normal',message)
 
@@ -1,6 +1,6 @@
 import os
 import copy
-from pp_uzbldriver import UZBLDriver
+from pp_mediabackend import MediaBackend
 from pp_player import Player
 from pp_utils import parse_rectangle
 
@@ -47,7 +47,7 @@ class BrowserPlayer(Player):
             self.duration= int(self.track_params['duration'])
         else:
             self.duration= int(self.show_params['duration'])
-        self.duration_limit=20*self.duration
+        self.duration_limit=1000*self.duration   # milliseconds
 
         # process web window                  
         if self.track_params['web-window'] != '':
@@ -56,7 +56,7 @@ class BrowserPlayer(Player):
             self.web_window= self.show_params['web-window']
 
         # create an instance of uzbl driver
-        self.bplayer=UZBLDriver(self.canvas)
+        self.bplayer=MediaBackend().driver('web',self.canvas,self.pp_dir)
 
         # Initialize variables
         self.command_timer=None
@@ -64,7 +64,7 @@ class BrowserPlayer(Player):
         self.quit_signal=False     # signal that user has pressed stop
         
         # initialise the play state
-        self.play_state='initialised'
+        self.set_play_state('initialised')
         self.show_state=''
         self.load_state=''
 
@@ -83,7 +83,7 @@ class BrowserPlayer(Player):
         reason,message,command,has_window,x1,y1,x2,y2=self.parse_window(self.web_window)
         if reason == 'error':
             self.mon.err(self,'web window error: '+'  ' + message + ' in ' + self.web_window)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
@@ -91,17 +91,15 @@ class BrowserPlayer(Player):
 
         # compute web_window size
         if has_window is False:
-            self.geometry = ' --geometry=maximized '
+            self.window = None
         else:
-            width=x2-x1
-            height=y2-y1
-            self.geometry = "--geometry=%dx%d%+d%+d "  % (width,height,x1,y1)
+            self.window = (x1,y1,x2-x1,y2-y1)
             
         # parse browser commands to self.command_list
         reason,message=self.parse_commands(self.track_params['browser-commands'])
         if reason == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
@@ -112,21 +110,22 @@ class BrowserPlayer(Player):
             status,message=self.load_plugin()
             if status == 'error':
                 self.mon.err(self,message)
-                self.play_state='load-failed'
+                self.set_play_state('load-failed')
                 if self.loaded_callback is not  None:
                     self.loaded_callback('error',message)
                     return
 
-        # start loading the browser
-        self.play_state='loading'
-        self.bplayer.play(self.track,self.geometry)
+        # start loading the browser, use a warm one if there is a pool
+        self.set_play_state('loading')
+        self.bplayer=self.bplayer.from_pool()
+        self.bplayer.play(self.track,self.window)
         self.mon.log (self,'Loading browser from show Id: '+ str(self.show_id))
 
         # load the images and text
         status,message=self.load_x_content(enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
@@ -214,6 +213,7 @@ class BrowserPlayer(Player):
         # send signal to stop the track to the state machine
         self.mon.log(self,">stop received")
         self.quit_signal=True
+        self.close_browser()
 
 
 
@@ -233,47 +233,37 @@ class BrowserPlayer(Player):
     def start_load_state_machine(self):
         # initialise all the state machine variables
         self.load_state='starting'
-        # and start polling for state changes and count duration
-        self.tick_timer=self.canvas.after(50, self.load_state_machine)
+        # and wait for uzbl's fifo to be available
+        self.bplayer.events.when('loaded',self.browser_started)
 
 
-    def load_state_machine(self):
-        # print self.load_state,self.play_state
-        if self.load_state  in ('initialised','loaded','unloaded'):
-            self.mon.log(self,"      Load state machine: " + self.load_state)
-            return 
-                
-        elif self.load_state ==  'starting':
-            # self.mon.log(self,"      Load state machine: " + self.load_state)
-            
-            # if uzbl fifo is available can send commands to uzbl but change to wait state to wait for it to appear on screen
-            if self.bplayer.start_play_signal is True:
-                self.mon.log(self,"            <fifo available signal received from uzbl" + self.bplayer.fifo)
-                self.bplayer.start_play_signal=False
-                self.load_state='waiting'
-                # get rid of status bar
-                # self.bplayer.control('set show_status = 0')
-                # and get ready to wait for browser to appear
-                self.wait_count= 50   # 10 seconds at 200mS steps 
-                self.mon.log(self,"      State machine: uzbl process alive")
-                
-            self.tick_timer=self.canvas.after(200, self.load_state_machine)
-
-        elif self.load_state == 'waiting':
-            # self.mon.log(self,"      Load state machine: " + self.load_state)
-            if self.wait_count==0:
-                self.load_state='loaded'
-                self.play_state = 'loaded'
-                self.bplayer.control('set show_status = 0')
-               
-                # and start executing the browser commands
-                self.play_commands()
-                self.mon.log(self,"      State machine: uzbl loaded")
-                if self.loaded_callback is not None:
-                    self.loaded_callback('normal','browser loaded')
-            else:
-                self.wait_count -=1
-                self.tick_timer=self.canvas.after(200, self.load_state_machine)
+    # if uzbl fifo is available can send commands to uzbl but change to wait state to wait for it to appear on screen
+    def browser_started(self):
+        if self.load_state != 'starting':
+            return
+        self.mon.log(self,"            <fifo available signal received from uzbl" + self.bplayer.fifo)
+        self.bplayer.start_play_signal=False
+        self.load_state='waiting'
+        # get rid of status bar
+        # self.bplayer.control('set show_status = 0')
+        # and get ready to wait for browser to appear, 10 seconds for a new browser
+        self.mon.log(self,"      State machine: uzbl process alive")
+        self.tick_timer=self.scheduler.after(self.bplayer.appear_time, self.browser_loaded)
+
+
+    def browser_loaded(self):
+        self.tick_timer=None
+        if self.load_state != 'waiting':
+            return
+        self.load_state='loaded'
+        self.set_play_state('loaded')
+        self.bplayer.control('set show_status = 0')
+       
+        # and start executing the browser commands
+        self.play_commands()
+        self.mon.log(self,"      State machine: uzbl loaded")
+        if self.loaded_callback is not None:
+            self.loaded_callback('normal','browser loaded')
 
 
     def start_unload_state_machine(self):
@@ -282,90 +272,77 @@ class BrowserPlayer(Player):
             pass
         else:
             if self.play_state  ==  'loaded':
-                pass
                 # load already complete
                 self.unload_state_machine()
             elif self.play_state == 'loading':
                 # wait for load to complete before unloading - must do this because does not respond to exit when loading
-                self.tick_timer=self.canvas.after(10,self.start_unload_state_machine)
+                self.when('loaded',self.unload_after_load)
             else:
                 self.mon.err(self,'illegal state in unload method ' + self.play_state)
                 self.end('error','illegal state in unload method '  + self.play_state)           
 
 
+    def unload_after_load(self,state):
+        self.start_unload_state_machine()
+
+
     def unload_state_machine(self):
         # self.mon.log(self,"      Unload state machine: " + self.play_state)
-        if self.play_state == 'unloaded':
-            return 
-
-        elif self.play_state == 'loaded':
-            # service any queued stop signals and test duration count
+        if self.play_state == 'loaded':
             self.mon.log(self,"Exit browser")
+            self.scheduler.cancel(self.command_timer)
+            self.bplayer.events.when('closed',self.browser_unloaded)
             self.bplayer.stop()
-            self.play_state='unloading'
-            self.tick_timer=self.canvas.after(50, self.unload_state_machine)
-
-        elif self.play_state == 'unloading':
-            # self.mon.log(self,"      Unload state machine: " + self.load_state)
-            # if spawned process has closed can change to closed state
-            # self.mon.log (self,"      State machine : is uzbl process running? -  "  + str(self.bplayer.is_running()))
-            if self.bplayer.is_running() is False:
-                self.mon.log(self,"            <uzbl process is dead")
-                # clean up and fifos and sockets left by uzbl
-                os.system('rm -f  /tmp/uzbl_*')
-                self.play_state = 'unloaded'
-            else:
-                self.tick_timer=self.canvas.after(50, self.unload_state_machine)
-                
-                
+            self.set_play_state('unloading')
+
+
+    def browser_unloaded(self,reason):
+        if self.play_state != 'unloading':
+            return
+        self.mon.log(self,"            <uzbl process is dead or back in the pool")
+        self.set_play_state('unloaded')
 
 
     def start_show_state_machine_show(self):
-        self.play_state='showing'
+        # a warm browser has loaded the page off the screen
+        self.bplayer.show_window()
+        self.set_play_state('showing')
         self.show_state='showing'
-        self.duration_count=self.duration_limit
-        self.tick_timer=self.canvas.after(50, self.show_state_machine)
+        if self.duration_limit != 0:
+            self.tick_timer=self.scheduler.after(self.duration_limit, self.close_browser)
 
 
     def start_show_state_machine_close(self):
-        self.play_state='showing'
         self.quit_signal=True
-        self.duration_limit = 0
-        self.tick_timer=self.canvas.after(50, self.show_state_machine)
+        if self.play_state == 'closed':
+            # already closed, just say so
+            if self.closed_callback is not None:
+                self.closed_callback('normal','browser closed')
+        else:
+            self.close_browser()
 
 
-    def show_state_machine(self):
+    # stop required, exit command or duration exceeded
+    def close_browser(self):
+        if self.play_state != 'showing':
+            return
+        self.mon.log(self,"      Service stop required signal or timeout")
+        self.quit_signal=False
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.scheduler.cancel(self.command_timer)
+        self.bplayer.events.when('closed',self.browser_closed)
+        self.bplayer.stop()
+        self.set_play_state('closing')
 
-        if self.play_state == 'closed':
-            self.mon.log(self,"      Show state machine: " + self.show_state)
-            return 
 
-        elif self.play_state == 'showing':
-            self.duration_count -= 1
-            # self.mon.log(self,"      Show state machine: " + self.show_state)
-            
-            # service any queued stop signals and test duration count
-            if self.quit_signal is True or (self.duration_limit != 0 and self.duration_count == 0):
-                self.mon.log(self,"      Service stop required signal or timeout")
-                if self.quit_signal  is True:
-                    self.quit_signal=False
-                self.bplayer.stop()
-                self.play_state = 'closing'
-            self.tick_timer=self.canvas.after(50, self.show_state_machine)
-
-        elif self.play_state == 'closing':
-            # self.mon.log(self,"      Show state machine: " + self.show_state)
-            # if spawned process has closed can change to closed state
-            # self.mon.log (self,"      State machine : is uzbl process running? -  "  + str(self.bplayer.is_running()))
-            if self.bplayer.is_running() is False:
-                self.mon.log(self,"            <uzbl process is dead")
-                # clean up and fifos and sockets left by uzbl
-                os.system('rm -f  /tmp/uzbl_*')
-                self.play_state = 'closed'
-                if self.closed_callback is not None:
-                    self.closed_callback('normal','browser closed')
-            else:
-                self.tick_timer=self.canvas.after(50, self.show_state_machine)
+    def browser_closed(self,reason):
+        if self.play_state != 'closing':
+            return
+        self.mon.log(self,"            <uzbl process is dead or back in the pool")
+        self.set_play_state('closed')
+        if self.closed_callback is not None:
+            self.closed_callback('normal','browser closed')
                 
                 
 
@@ -425,7 +402,7 @@ class BrowserPlayer(Player):
             return
         self.loop=0
         self.command_index=0
-        self.canvas.after(100,self.execute_command)
+        self.command_timer=self.scheduler.after(100,self.execute_command)
 
         
     def execute_command(self):
@@ -443,20 +420,21 @@ class BrowserPlayer(Player):
             # self.root.lower()
             url=self.complete_path(arg)
             self.bplayer.control('uri '+ url)
-            self.command_timer=self.canvas.after(10,self.execute_command)
+            self.command_timer=self.scheduler.after(10,self.execute_command)
         elif command == 'refresh':
             self.bplayer.control('reload_ign_cache')
-            self.command_timer=self.canvas.after(10,self.execute_command)
+            self.command_timer=self.scheduler.after(10,self.execute_command)
         elif command == 'wait':
-            self.command_timer=self.canvas.after(1000*int(arg),self.execute_command)        
+            self.command_timer=self.scheduler.after(1000*int(arg),self.execute_command)        
         elif  command=='exit':
             self.quit_signal=True
+            self.close_browser()
         elif command=='loop':
             self.loop=self.command_index
-            self.command_timer=self.canvas.after(10,self.execute_command)
+            self.command_timer=self.scheduler.after(10,self.execute_command)
         elif command=='uzbl':
             self.bplayer.control(arg)
-            self.command_timer=self.canvas.after(10,self.execute_command)
+            self.command_timer=self.scheduler.after(10,self.execute_command)
 
         
 
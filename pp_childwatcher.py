@@ -0,0 +1,178 @@
+import os
+import signal
+import subprocess
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+
+
+class ChildWatcher(object):
+    """
+    the one place that finds out when the players' child processes (omxplayer, uzbl) exit.
+    The drivers register each process they start, SIGCHLD wakes the Tk thread through the scheduler's pipe
+    and the registered processes are reaped with waitpid there, so a driver is told its process has gone
+    straight away instead of finding out the next time it polls.
+
+    Stopping a process is given a deadline, SIGINT is sent to its process group and if anything in the group
+    is still there at the deadline it gets SIGKILL. When a process exits anything left in its group
+    (omxplayer.bin after the omxplayer script has gone) is an orphan, it is counted and killed.
+    A pexpect spawn read by a thread of its own (mplayer) must not be watched, the waitpid here and pexpect's in
+    the thread would race, the loser getting ECHILD. Its driver reaps it from that thread.
+
+    Only registered processes are waited for so subprocess and pexpect still see the exit status of the rest.
+    If SIGCHLD cannot be used (not on the main thread) the registered processes are polled every poll_interval.
+
+    Usage:
+        ChildWatcher().init()                                   # once by PiPresents after the scheduler
+        ChildWatcher().watch(process,'omxplayer',callback)      # process is a Popen or pexpect spawn,
+                                                                # callback(returncode) on the Tk thread or None
+        ChildWatcher().kill(process,deadline)                   # SIGINT now, SIGKILL after deadline ms
+    """
+
+# CLASS VARIABLES (ChildWatcher.)
+    children={}             # pid -> [process,name,callback,kill timer,killed with SIGKILL]
+    enabled=False           # SIGCHLD is being used
+    poll_timer=None
+    poll_interval=200       # ms
+
+    # statistics for report()
+    reaped=0
+    orphans=0               # processes left in the group when the child had gone
+    forced=0                # children that needed SIGKILL
+
+
+    def __init__(self):
+        self.mon=Monitor()
+        self.scheduler=Scheduler()
+
+
+    # called once by PiPresents, must be on the main thread
+    def init(self):
+        ChildWatcher.children={}
+        try:
+            # restart system calls in the other threads rather than interrupt them
+            signal.signal(signal.SIGCHLD,self._sigchld)
+            signal.siginterrupt(signal.SIGCHLD,False)
+            # the signal writes to the pipe so Tk wakes up and the handler runs at once
+            if Scheduler.wake_write is not None:
+                signal.set_wakeup_fd(Scheduler.wake_write)
+        except (ValueError,RuntimeError) as e:
+            self.mon.warn(self,'Cannot use SIGCHLD, polling child processes: ' + str(e))
+            ChildWatcher.enabled=False
+            return
+        ChildWatcher.enabled=True
+
+
+    def watch(self,process,name,callback):
+        ChildWatcher.children[process.pid]=[process,name,callback,None,False]
+        if ChildWatcher.enabled is False and ChildWatcher.poll_timer is None:
+            ChildWatcher.poll_timer=self.scheduler.after(ChildWatcher.poll_interval,self._poll)
+        # it may have gone already
+        self.scheduler.after(0,self._reap)
+
+
+    # stop a watched process, SIGINT so it can tidy up, then SIGKILL for the group at the deadline
+    def kill(self,process,deadline):
+        entry=ChildWatcher.children.get(process.pid)
+        if entry is None:
+            return
+        self._signal(process.pid,signal.SIGINT)
+        if entry[3] is None:
+            entry[3]=self.scheduler.after(deadline,self._deadline,process.pid)
+
+
+    # kill the processes left when Pi Presents exits
+    def terminate(self):
+        for pid in ChildWatcher.children.keys():
+            entry=ChildWatcher.children[pid]
+            self.mon.warn(self,entry[1] + ' ' + str(pid) + ' still running at exit, killing it')
+            entry[4]=True
+            self._signal(pid,signal.SIGKILL)
+        self._reap()
+        self.report()
+        if ChildWatcher.enabled is True:
+            signal.signal(signal.SIGCHLD,signal.SIG_DFL)
+            signal.set_wakeup_fd(-1)
+            ChildWatcher.enabled=False
+
+
+    def report(self):
+        self.mon.log(self,'Child processes reaped: %d, orphans killed: %d, needed SIGKILL: %d'
+                     % (ChildWatcher.reaped,ChildWatcher.orphans,ChildWatcher.forced))
+
+
+# ***********************************
+# INTERNAL FUNCTIONS
+# ************************************
+
+    # runs on the main thread at any point in the Tk thread's code so only posts
+    def _sigchld(self,signum,frame):
+        self.scheduler.post(self._reap)
+
+
+    def _poll(self):
+        ChildWatcher.poll_timer=None
+        self._reap()
+        if len(ChildWatcher.children) > 0:
+            ChildWatcher.poll_timer=self.scheduler.after(ChildWatcher.poll_interval,self._poll)
+
+
+    def _reap(self):
+        for pid in ChildWatcher.children.keys():
+            process,name,callback,kill_timer,killed=ChildWatcher.children[pid]
+            returncode=self._exit_status(process)
+            if returncode is None:
+                continue
+            del ChildWatcher.children[pid]
+            self.scheduler.cancel(kill_timer)
+            ChildWatcher.reaped+=1
+            self.mon.log(self,name + ' ' + str(pid) + ' has exited with ' + str(returncode))
+            if killed is False and self._signal(pid,0) is True:
+                # the group still has processes in it
+                ChildWatcher.orphans+=1
+                self.mon.warn(self,'processes of ' + name + ' ' + str(pid) + ' left running, killing them')
+                self._signal(pid,signal.SIGKILL)
+            if callback is not None:
+                callback(returncode)
+
+
+    # waitpid on the process through its own object so it knows it has gone, None if running
+    def _exit_status(self,process):
+        if isinstance(process,subprocess.Popen):
+            return process.poll()
+        try:
+            if process.isalive() is True:
+                return None
+        except Exception as e:
+            # pexpect's ExceptionPexpect, something else has waited for it so it has gone and its status is lost
+            self.mon.warn(self,'exit status of ' + str(process.pid) + ' lost: ' + str(e))
+            return 0
+        if process.exitstatus is not None:
+            return process.exitstatus
+        return -process.signalstatus
+
+
+    def _deadline(self,pid):
+        entry=ChildWatcher.children.get(pid)
+        if entry is None:
+            return
+        entry[3]=None
+        entry[4]=True
+        ChildWatcher.forced+=1
+        self.mon.warn(self,entry[1] + ' ' + str(pid) + ' did not exit, killing it')
+        self._signal(pid,signal.SIGKILL)
+
+
+    # signal the process group if the process leads one, otherwise the process, False if there is nothing to signal
+    def _signal(self,pid,sig):
+        try:
+            if os.getpgid(pid) == pid:
+                os.killpg(pid,sig)
+            else:
+                os.kill(pid,sig)
+        except OSError:
+            # the leader has gone but the group may still have processes in it
+            try:
+                os.killpg(pid,sig)
+            except OSError:
+                return False
+        return True
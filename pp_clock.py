@@ -0,0 +1,75 @@
+import time
+from datetime import datetime
+from pp_utils import Monitor
+
+
+class Clock(object):
+    """
+    the time of Pi Presents, everything that times the show (Scheduler and so the shows, players and drivers,
+    Animate and TimeOfDay) reads the time from here rather than from time.time() or datetime.now().
+
+    The clock is real (--clock real) or virtual (--clock virtual). The virtual clock moves only when the Scheduler
+    runs a timer, it jumps to the time the timer is due and stands still while the callbacks run, and the Scheduler waits
+    only 1/speed of the real time between timers (--speed, default 100).
+    So every timer runs at exactly its due time and a show played with --backend fake does the same things at the same times
+    however busy the machine is, at up to speed times real time. Real media players do not play faster so use it only with
+    the fake backend.
+
+    Usage:
+        Clock().init(options)                   # once by PiPresents, before the Scheduler is used
+        secs=Clock().time()                     # as time.time()
+        today=Clock().now()                     # as datetime.now()
+    """
+
+# CLASS VARIABLES (Clock.)
+    virtual=False
+    speed=1.0
+    virtual_time=0.0        # secs since the epoch, the time of the virtual clock
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # called once by PiPresents
+    def init(self,options):
+        if options['clock'] == 'virtual':
+            self.set_virtual(float(options['speed']),time.time())
+        else:
+            self.set_real()
+
+
+    # the virtual clock starts at start (secs since the epoch)
+    def set_virtual(self,speed,start):
+        if speed <= 0:
+            speed=1.0
+        Clock.virtual=True
+        Clock.speed=speed
+        Clock.virtual_time=start
+        self.mon.log(self,'Virtual clock at %g times real time starts at %s' % (speed,time.ctime(start)))
+
+
+    def set_real(self):
+        Clock.virtual=False
+        Clock.speed=1.0
+
+
+    def time(self):
+        if Clock.virtual is True:
+            return Clock.virtual_time
+        return time.time()
+
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+
+    # called by the Scheduler when it runs a timer, the virtual clock never goes back
+    def advance_to(self,when):
+        if Clock.virtual is True and when > Clock.virtual_time:
+            Clock.virtual_time=when
+
+
+    # the real secs to wait for secs of the clock to pass
+    def real_delay(self,secs):
+        return secs/Clock.speed
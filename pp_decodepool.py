@@ -0,0 +1,332 @@
+import time
+import threading
+import Queue
+import multiprocessing
+from PIL import Image
+from pp_imagecache import ImageCache, open_image, exif_transpose, decode_report
+from pp_scheduler import Scheduler
+from pp_utils import Monitor, parse_rectangle
+
+
+# the spec used by DecodePool and ImageCache for an image track, also used by shows to prefetch tracks
+# and by PreScale to name the pre-scaled copies
+# returns None if the image window is not valid
+def image_spec(track_file,image_window,image_rotate,canvas_width,canvas_height):
+    status,message,command,has_coords,x1,y1,x2,y2,image_filter=parse_image_window(image_window)
+    if status == 'error':
+        return None
+    if command == 'original':
+        return (track_file,command,0,0,image_filter,image_rotate)
+    if has_coords is True:
+        return (track_file,command,int(x2-x1),int(y2-y1),image_filter,image_rotate)
+    else:
+        return (track_file,command,int(canvas_width),int(canvas_height),image_filter,image_rotate)
+
+
+def parse_image_window(line):
+    
+    fields = line.split()
+    # check there is a command field
+    if len(fields) < 1:
+        return 'error','No command field','',False,0,0,0,0,''
+
+        
+    # deal with original whch has 0 or 2 arguments
+    image_filter=''
+    if fields[0] == 'original':
+        if len(fields) not in (1,3):
+            return 'error','Original has wrong number of arguments','',False,0,0,0,0,''       
+        # deal with window coordinates    
+        if len(fields)  ==  3:
+            # window is specified
+            if not (fields[1].isdigit() and fields[2].isdigit()):
+                return 'error','coordinates are not numbers','',False,0,0,0,0,''
+            has_window=True
+            return 'normal','',fields[0],has_window,float(fields[1]),float(fields[2]),0,0,image_filter
+        else:
+            # no window
+            has_window=False 
+            return 'normal','',fields[0],has_window,0,0,0,0,image_filter
+
+
+
+    # deal with remainder which has 1, 2, 5 or  6arguments
+    # check basic syntax
+    if  fields[0] not in ('shrink','fit','warp'):
+        return 'error','illegal command'+fields[0],'',False,0,0,0,0,'' 
+    if len(fields) not in (1,2,3,5,6):
+        return 'error','wrong number of fields' + str(len(fields)),'',False,0,0,0,0,''
+    if len(fields) == 6 and fields[5] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS'):
+        return 'error','wrong filter or params'+ fields[5],'',False,0,0,0,0,''
+    if len(fields) == 2 and (fields[1] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS') and '*' not in fields[1]):
+        return 'error','wrong filter or params'+ fields[1],'',False,0,0,0,0,''
+    if len(fields) == 3 and fields[2] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS'):
+        return 'error','wrong filter or params'+ fields[2],'',False,0,0,0,0,''
+
+
+    # deal with no window coordinates and no
+    if len(fields) == 1:
+        has_window=False           
+        return 'normal','',fields[0],has_window,0,0,0,0,'Image.NEAREST'
+   
+    # deal with window coordinates in +* format with optional filter
+    if len(fields) in (2,3) and '*' in fields[1]:
+        status,message,x1,y1,x2,y2 = parse_rectangle(fields[1])
+        if status=='error':
+            return 'error',message,'',False,0,0,0,0,''
+        else:
+            has_window=True
+            if len(fields) == 3:
+                image_filter='Image.'+fields[2]
+            else:
+                image_filter='Image.NEAREST'                
+            return 'normal','',fields[0],has_window,x1,y1,x2,y2,image_filter
+        
+    if len(fields) in (5,6):
+        # window is specified in x1 y1 x2 y2
+        if not (fields[1].isdigit() and fields[2].isdigit() and fields[3].isdigit() and fields[4].isdigit()):
+            return 'error','coords are not numbers','',False,0,0,0,0,''
+        has_window=True
+        if len(fields) == 6:
+            image_filter='Image.'+fields[5]
+        else:
+            image_filter='Image.NEAREST'
+        return 'normal','',fields[0],has_window,float(fields[1]),float(fields[2]),float(fields[3]),float(fields[4]),image_filter
+
+    else:
+        # no window
+        has_window=False
+        if len(fields) == 2:
+            image_filter='Image.'+fields[1]
+        else:
+            image_filter='Image.NEAREST'
+        return 'normal','',fields[0],has_window,0,0,0,0,image_filter
+
+
+# open, rotate and resize an image for display. Runs in the workers so must not touch Tk.
+# spec is (path,command,width,height,image_filter,rotate), width and height are not used for original
+# returns the image and a report of the decode for the log
+def prepare_image(path,command,width,height,image_filter,rotate):
+    start=time.time()
+    if command == 'original':
+        pil_image,full_size,orientation=open_image(path,0,0,rotate)
+    else:
+        pil_image,full_size,orientation=open_image(path,width,height,rotate)
+    # with --exif camera images are turned the right way up before the image-rotate of the track
+    pil_image=exif_transpose(pil_image,orientation)
+    if rotate!=0:
+        pil_image=pil_image.rotate(rotate,expand=True)
+    image_width,image_height=pil_image.size
+    if image_filter.startswith('Image.'):
+        resample=getattr(Image,image_filter[6:])
+    else:
+        resample=Image.NEAREST
+
+    if command in ('fit','shrink'):
+        # shrink fit the window or screen preserving aspect
+        if (image_width > width or image_height > height and command == 'fit') or (command == 'shrink') :
+            # original image is larger or , shrink it to fit the screen preserving aspect
+            pil_image.thumbnail((int(width),int(height)),resample)
+        else:
+            # fitting and original image is smaller, expand it to fit the screen preserving aspect
+            prop_x = float(width) / image_width
+            prop_y = float(height) / image_height
+            if prop_x > prop_y:
+                prop=prop_y
+            else:
+                prop=prop_x
+            pil_image=pil_image.resize((int(image_width * prop), int(image_height * prop)),resample)
+
+    elif command == 'warp':
+        # resize to window or screen without preserving aspect
+        pil_image=pil_image.resize((int(width), int(height)),resample)
+
+    else:
+        # original size, decode it now so the image does not need the file
+        pil_image.load()
+    return pil_image,decode_report(path,full_size,pil_image,start)
+
+
+# runs in a worker process, the image goes back to PiPresents as bytes.
+# the bytes of a palette image (gif, 8 bit png) are indexes so its palette and transparency go back with them
+def prepare_image_in_process(spec):
+    try:
+        pil_image,report=prepare_image(*spec)
+    except Exception as e:
+        return spec,None,None,None,None,None,str(e)
+    palette=None
+    if pil_image.mode in ('P','PA'):
+        palette=pil_image.getpalette()
+    transparency=pil_image.info.get('transparency')
+    return spec,pil_image.mode,pil_image.size,pil_image.tobytes(),palette,transparency,report
+
+
+
+class DecodePool(object):
+    """
+    decodes and resizes images in worker threads or processes so the Tk thread only has to make the PhotoImage.
+    Finished images are put in the ImageCache on the Tk thread and the callbacks waiting for them are called.
+    Shows ask for the next few tracks of their sequence to be prepared ahead of time with prefetch().
+
+    With mode 'off', or before init, decode() does the work straight away on the calling thread.
+
+    Usage:
+        self.decode_pool=DecodePool()
+        self.decode_pool.decode(spec,self.image_decoded)    # image_decoded(pil_image,message), pil_image None if failed
+        self.decode_pool.prefetch([spec,spec])
+    """
+
+# CLASS VARIABLES (DecodePool.)
+    mode='threads'          # threads, processes or off. Set from the command line by PiPresents
+    workers=2
+    lookahead=3             # number of tracks prefetched by shows, set from the command line
+    running=False
+    jobs=None               # queue of specs for the threads
+    threads=[]
+    process_pool=None
+    pending={}              # spec -> callbacks waiting for it, only used on the Tk thread
+
+
+    def __init__(self):
+        self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.image_cache=ImageCache()
+
+
+    # called once by PiPresents after the scheduler has started
+    def init(self):
+        DecodePool.pending={}
+        if DecodePool.mode == 'off':
+            return
+        if DecodePool.mode == 'processes':
+            DecodePool.process_pool=multiprocessing.Pool(DecodePool.workers)
+        else:
+            DecodePool.jobs=Queue.Queue()
+            DecodePool.threads=[]
+            for i in range(DecodePool.workers):
+                thread=threading.Thread(target=self._worker)
+                thread.daemon=True
+                thread.start()
+                DecodePool.threads.append(thread)
+        DecodePool.running=True
+        self.mon.log(self,'Decoding images in ' + str(DecodePool.workers) + ' ' + DecodePool.mode + ', lookahead ' + str(DecodePool.lookahead))
+
+
+    # called by PiPresents on exit
+    def terminate(self):
+        if DecodePool.running is False:
+            return
+        DecodePool.running=False
+        if DecodePool.process_pool is not None:
+            DecodePool.process_pool.terminate()
+            DecodePool.process_pool=None
+        if DecodePool.jobs is not None:
+            for thread in DecodePool.threads:
+                DecodePool.jobs.put(None)
+            DecodePool.jobs=None
+        DecodePool.pending={}
+
+
+# ***************************
+# Requests from the Tk thread
+# ***************************
+
+    # get the image for spec into the cache, callback(pil_image,message) is called when it is ready
+    def decode(self,spec,callback):
+        pil_image=self.image_cache.get(self.image_cache.make_key(*spec))
+        if pil_image is not None:
+            callback(pil_image,'')
+        elif DecodePool.running is False:
+            # no workers so do it now
+            try:
+                pil_image,message=prepare_image(*spec)
+            except Exception as e:
+                pil_image=None
+                message=str(e)
+            self._done(spec,pil_image,message,[callback])
+        elif spec in DecodePool.pending:
+            DecodePool.pending[spec].append(callback)
+        else:
+            DecodePool.pending[spec]=[callback]
+            self._submit(spec)
+
+
+    # get all the images into the cache then call callback()
+    def decode_all(self,specs,callback):
+        waiting=[len(specs)]
+        def one_done(pil_image,message):
+            waiting[0]-=1
+            if waiting[0]==0:
+                callback()
+        if len(specs)==0:
+            callback()
+            return
+        for spec in specs:
+            self.decode(spec,one_done)
+
+
+    # prepare images that will be wanted soon, nothing is done without workers
+    def prefetch(self,specs):
+        if DecodePool.running is False:
+            return
+        for spec in specs:
+            # do not let the queue build up if the show is skipping through tracks
+            if len(DecodePool.pending) >= DecodePool.lookahead+DecodePool.workers:
+                return
+            if spec in DecodePool.pending or self.image_cache.contains(self.image_cache.make_key(*spec)):
+                continue
+            DecodePool.pending[spec]=[]
+            self._submit(spec)
+
+
+    def _submit(self,spec):
+        if DecodePool.process_pool is not None:
+            DecodePool.process_pool.apply_async(prepare_image_in_process,(spec,),callback=self._process_done)
+        else:
+            DecodePool.jobs.put(spec)
+
+
+# ***************************
+# Workers
+# ***************************
+
+    def _worker(self):
+        jobs=DecodePool.jobs
+        while True:
+            spec=jobs.get()
+            if spec is None:
+                return
+            try:
+                pil_image,message=prepare_image(*spec)
+            except Exception as e:
+                pil_image=None
+                message=str(e)
+            self.scheduler.post(self._done,spec,pil_image,message,None)
+
+
+    # runs in the process pool's result thread
+    def _process_done(self,result):
+        spec,mode,size,data,palette,transparency,message=result
+        if mode is None:
+            pil_image=None
+        else:
+            pil_image=Image.frombytes(mode,size,data)
+            if palette is not None:
+                pil_image.putpalette(palette)
+            if transparency is not None:
+                pil_image.info['transparency']=transparency
+        self.scheduler.post(self._done,spec,pil_image,message,None)
+
+
+    # on the Tk thread, message is the decode report if it worked or the error if not
+    def _done(self,spec,pil_image,message,callbacks):
+        if callbacks is None:
+            callbacks=DecodePool.pending.pop(spec,[])
+        if pil_image is not None:
+            self.mon.log(self,'Decoded ' + message)
+            self.image_cache.put(self.image_cache.make_key(*spec),pil_image)
+            message=''
+        else:
+            self.mon.log(self,'Cannot prepare image ' + spec[0] + ': ' + message)
+        for callback in callbacks:
+            callback(pil_image,message)
@@ -60,7 +60,8 @@ class PPdefinitions(object):
             'tab-show','sep',  
                      'type','title','show-ref', 'medialist','show-timeout','sep',
             'trigger-start-type','trigger-start-param','trigger-next-type','trigger-next-param','sequence','track-count-limit','repeat','interval','trigger-end-type','trigger-end-param',
-            'empty-track-ref','sep','show-canvas',
+            'empty-track-ref','sep','show-canvas','sep',
+            'preload-depth','preload-memory','preload-players',
             'tab-child','sep',  
                 'child-track-ref', 'hint-text', 'hint-x','hint-y','hint-justify','hint-font','hint-colour',
             'tab-eggtimer','sep',  
@@ -105,7 +106,8 @@ class PPdefinitions(object):
             'tab-show','sep',  
                 'type','title','show-ref', 'medialist','live-tracks-dir1','live-tracks-dir2','show-timeout','sep',
             'trigger-start-type','trigger-start-param','trigger-next-type','trigger-next-param','sequence','track-count-limit','repeat','interval','trigger-end-type','trigger-end-param',
-            'empty-track-ref','sep','show-canvas',
+            'empty-track-ref','sep','show-canvas','sep',
+            'preload-depth','preload-memory','preload-players',
             'tab-child','sep',  
                     'child-track-ref', 'hint-text', 'hint-x','hint-y','hint-justify','hint-font','hint-colour',
             'tab-eggtimer','sep',  
@@ -216,6 +218,7 @@ class PPdefinitions(object):
                                    },
     
                 'mediashow':{'title': 'New Mediashow','show-ref':'', 'show-canvas':'', 'type': 'mediashow','medialist': '','show-timeout': '0','interval':'0','track-count-limit':'0',
+                            'preload-depth':'0','preload-memory':'64','preload-players':'1',
                           'disable-controls':'no','trigger-start-type': 'start','trigger-start-param':'','trigger-next-type': 'continue','trigger-next-param':'','sequence': 'ordered','repeat': 'repeat','trigger-end-type':'none', 'trigger-end-param':'',
                             'child-track-ref': '', 'hint-text': '', 'hint-x':'200','hint-y': '750','hint-justify':'left','hint-font': 'Helvetica 30 bold','hint-colour': 'white',
                              'eggtimer-text':'Loading....','eggtimer-x':'100','eggtimer-y':'100','eggtimer-justify':'left','eggtimer-font':'Helvetica 10 bold','eggtimer-colour':'white',
@@ -226,6 +229,7 @@ class PPdefinitions(object):
                              'controls':'pp-down down\npp-up up\npp-play play\npp-stop stop\npp-pause pause\n','show-control-begin':'','show-control-end':''},
                                      
                 'liveshow':{'title': 'New Liveshow','show-ref':'','show-canvas':'', 'type': 'liveshow','show-timeout': '0','interval':'0','track-count-limit':'0',
+                            'preload-depth':'0','preload-memory':'64','preload-players':'1',
                             'disable-controls':'no','trigger-start-type':'start','trigger-start-param':'','trigger-next-type': 'continue','trigger-next-param':'','sequence': 'ordered','repeat': 'repeat','trigger-end-type':            'none', 'trigger-end-param':'','medialist': '',
                         'child-track-ref': '', 'hint-text': '','hint-x':'200', 'hint-y': '750','hint-justify':'left','hint-font': 'Helvetica 30 bold','hint-colour': 'white',
                         'trigger-wait-text':'Waiting for Trigger....','empty-track-ref':'','admin-font':'Helvetica 10 bold','admin-colour':'white','admin-x':'100','admin-y':'200','admin-justify':'left',
@@ -313,6 +317,9 @@ class PPdefinitions(object):
                     'freeze-at-end':{'shape':'option-menu','text':'Freeze at End','must':'no','read-only':'no',
                                        'values':['yes','no']},
 
+                    'preload-depth':{'shape':'entry','text':'Preload Tracks','must':'no','read-only':'no'},
+                    'preload-memory':{'shape':'entry','text':'Preload Memory (MB)','must':'no','read-only':'no'},
+                    'preload-players':{'shape':'entry','text':'Preload Player Processes','must':'no','read-only':'no'},
                     'repeat':{'shape':'option-menu','text':'Repeat/Single','must':'no','read-only':'no',
                                         'values':['repeat','single-run']},
                     'sequence':{'shape':'option-menu','text':'Sequence','must':'no','read-only':'no',
@@ -747,6 +747,8 @@ class PPEditor(object):
             d=EditItem(self.root,"Edit Track",self.current_medialist.selected_track(),track_types,field_specs,
                        self.show_refs(),self.initial_media_dir,self.pp_profile_dir,self.pp_home_dir,'track')
             if d.result  is  True:
+                # track-ref may have been edited
+                self.current_medialist.reindex()
                 self.save_medialist()
             self.refresh_tracks_display()
 
@@ -0,0 +1,416 @@
+import os
+import random
+import ConfigParser
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_clock import Clock
+from pp_lifecycle import LifecycleEvents
+
+
+class FakeBackend(object):
+    """
+    how the fake drivers behave, use pipresents.py --backend fake. Nothing is played, drawn or started,
+    each driver fires the events its real driver would at the times they would happen.
+
+    The behaviour is read from pp_fake_backend.cfg in the profile, each value is looked for in a section
+    named after the track's file (e.g. [intro.mp4]), then [video], [audio] or [web], then [default].
+        load-time = 0.3     secs from load (play for audio and web) to the first frame
+        duration = 5        secs the track plays for
+        exit-time = 0.05    secs for the player to exit after stop
+        fail = 0            chance 0-1 of the track failing to load
+        hang = 0            chance 0-1 of the player not exiting after stop, it has to be killed
+    and in [default]
+        seed =              seed for fail and hang so a soak test can be repeated, blank for a random seed
+    """
+
+    defaults={'load-time':'0.3','duration':'5','exit-time':'0.05','fail':'0','hang':'0','seed':''}
+
+# CLASS VARIABLES (FakeBackend.)
+    config=None
+    rng=random.Random()
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # read the behaviour for the profile, called by MediaBackend
+    def open(self,pp_profile):
+        FakeBackend.config=ConfigParser.ConfigParser()
+        filename=pp_profile + os.sep + 'pp_fake_backend.cfg'
+        if os.path.exists(filename):
+            try:
+                FakeBackend.config.read(filename)
+            except ConfigParser.Error as e:
+                self.mon.err(self,'Cannot read ' + filename + ': ' + str(e))
+            self.mon.log(self,'Fake media backend uses ' + filename)
+        seed=self._get('seed','default','default')
+        if seed != '':
+            FakeBackend.rng=random.Random(seed)
+        else:
+            FakeBackend.rng=random.Random()
+
+
+    # the behaviour of one track, kind is video, audio or web
+    def behaviour(self,kind,track):
+        if FakeBackend.config is None:
+            FakeBackend.config=ConfigParser.ConfigParser()
+        result={}
+        for option in ('load-time','duration','exit-time','fail','hang'):
+            result[option]=float(self._get(option,kind,os.path.basename(track)))
+        # decide the chances now so the track behaves the same all the way through
+        result['fail']=FakeBackend.rng.random() < result['fail']
+        result['hang']=FakeBackend.rng.random() < result['hang']
+        return result
+
+
+    def _get(self,option,kind,name):
+        for section in (name,kind,'default'):
+            # not the parser's own defaults, they would be found in every section
+            if FakeBackend.config.has_section(section) and FakeBackend.config.has_option(section,option):
+                return FakeBackend.config.get(section,option)
+        return FakeBackend.defaults[option]
+
+
+
+class FakeDriver(object):
+    """
+    what the fake drivers have in common, a fake process that loads, plays for the track's duration,
+    can be paused and exits when stopped unless it hangs.
+    """
+
+    def __init__(self,widget,pp_dir):
+        self.widget=widget
+        self.pp_dir=pp_dir
+        self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.clock=Clock()
+        self.events=LifecycleEvents()
+
+        self.kind=''
+        self.track=''
+        self.behaviour=None
+        self.running=False
+        self.playing=False      # the play clock is running
+        self.played=0.0         # secs played before the play clock was last started
+        self.started_at=0.0
+        self.timer=None
+        self.start_play_signal=False
+        self.end_play_signal=False
+        self.terminate_reason=''
+
+
+    def is_running(self):
+        return self.running
+
+    def get_terminate_reason(self):
+        return self.terminate_reason
+
+
+    # secs played
+    def position(self):
+        if self.playing is True:
+            return self.played + self.clock.time() - self.started_at
+        return self.played
+
+
+    # start the fake process, loaded() is called after the load time
+    def _start(self,kind,track):
+        self.kind=kind
+        self.track=track
+        self.behaviour=FakeBackend().behaviour(kind,track)
+        self.running=True
+        self.mon.log(self,'Fake %s %s load %.2f secs, duration %.2f secs%s%s'
+                     % (kind,os.path.basename(track),self.behaviour['load-time'],self.behaviour['duration'],
+                        ' FAILS' if self.behaviour['fail'] else '',' HANGS' if self.behaviour['hang'] else ''))
+        self.timer=self.scheduler.after(int(self.behaviour['load-time']*1000),self._load_done)
+
+
+    def _load_done(self):
+        self.timer=None
+        if self.behaviour['fail'] is True:
+            self.mon.log(self,'Fake ' + self.kind + ' failed to load ' + self.track)
+            self._load_failed()
+            return
+        self._loaded()
+
+
+    def _play(self):
+        if self.playing is True or self.running is False:
+            return
+        self.playing=True
+        self.started_at=self.clock.time()
+        remaining=max(0,self.behaviour['duration']-self.played)
+        self.timer=self.scheduler.after(int(remaining*1000),self._come_to_end)
+
+
+    def _hold(self):
+        if self.playing is False:
+            return
+        self.played=self.position()
+        self.playing=False
+        self.scheduler.cancel(self.timer)
+        self.timer=None
+
+
+    def _come_to_end(self):
+        self.timer=None
+        self.played=self.behaviour['duration']
+        self.playing=False
+        self._ended()
+
+
+    # the fake process is told to go
+    def _quit(self):
+        self._hold()
+        # a load that has not finished never will
+        self.scheduler.cancel(self.timer)
+        self.timer=None
+        if self.running is False:
+            return
+        if self.behaviour['hang'] is True:
+            self.mon.log(self,'Fake ' + self.kind + ' is hanging and will not exit ' + self.track)
+            return
+        self.timer=self.scheduler.after(int(self.behaviour['exit-time']*1000),self._exit)
+
+
+    def _exit(self):
+        self.scheduler.cancel(self.timer)
+        self.timer=None
+        self.playing=False
+        if self.running is False:
+            return
+        self.running=False
+        self.events.fire('closed','nice_day')
+
+
+    # overridden to fire the driver's events
+    def _loaded(self):
+        pass
+
+    def _load_failed(self):
+        self._exit()
+
+    def _ended(self):
+        self._exit()
+
+
+
+class FakeVideoDriver(FakeDriver):
+    """
+    stands in for OMXDriver
+    """
+
+    def __init__(self,widget,pp_dir):
+        FakeDriver.__init__(self,widget,pp_dir)
+        self.duration=0
+        self.video_position=0
+        self.end_play_reason='nothing'
+        self.paused_at_start='False'
+        self.paused_at_end=False
+        self.paused=False
+        self.pause_before_play_required='no'
+        self.pause_at_end_required=False
+
+
+    def load(self,track,freeze_at_start,options,caller):
+        self.pause_before_play_required=freeze_at_start
+        self._start('video',track)
+        self.duration=int(self.behaviour['duration']*1000000)
+
+
+    def show(self,freeze_at_end_required,initial_volume):
+        self.pause_at_end_required=freeze_at_end_required
+        if self.pause_before_play_required == 'no':
+            self.go()
+
+    def go(self):
+        if self.paused_at_start == 'True':
+            self.paused_at_start='done'
+            self.paused=False
+            self._play()
+
+    def pause(self,reason):
+        self.paused=True
+        self._hold()
+
+    def toggle_pause(self,reason):
+        if self.paused is True:
+            self.pause_off()
+        else:
+            self.pause_on()
+
+    def pause_on(self):
+        self.pause('user')
+
+    def pause_off(self):
+        if self.paused is True and self.paused_at_end is False:
+            self.paused=False
+            self._play()
+
+    def mute(self):
+        pass
+
+    def unmute(self):
+        pass
+
+    def control(self,char):
+        self.mon.log(self,'>control received by fake omxplayer ' + char)
+
+    def stop(self):
+        if self.paused_at_end is True:
+            self._finished('nice_day')
+        self._quit()
+
+    def terminate(self,reason):
+        self.terminate_reason=reason
+        self.stop()
+
+    def kill(self):
+        self._exit()
+
+
+    def _loaded(self):
+        self.events.fire('loaded')
+        self.paused_at_start='True'
+        self.paused=True
+        self.start_play_signal=True
+        self.events.fire('first-frame')
+
+    def _load_failed(self):
+        # omxplayer ends before the first frame
+        self._finished('nice_day')
+        self._exit()
+
+    def _ended(self):
+        if self.pause_at_end_required is True:
+            self.paused_at_end=True
+            self.paused=True
+            self._finished('pause_at_end')
+        else:
+            self._finished('nice_day')
+            self._exit()
+
+    def _finished(self,reason):
+        self.video_position=int(self.position()*1000000)
+        self.end_play_signal=True
+        self.end_play_reason=reason
+        self.events.fire('finished',reason)
+
+
+
+class FakeAudioDriver(FakeDriver):
+    """
+    stands in for MplayerDriver and MplayerSlave
+    """
+
+    def __init__(self,widget,pp_dir):
+        FakeDriver.__init__(self,widget,pp_dir)
+        self.audio_position=0.0
+        self.paused=False
+
+
+    # options for MplayerDriver, volume and audio filter for MplayerSlave
+    def play(self,track,*args):
+        self._start('audio',track)
+
+    def pause(self):
+        if self.paused is True:
+            self.pause_off()
+        else:
+            self.pause_on()
+
+    def pause_on(self):
+        self.paused=True
+        self._hold()
+
+    def pause_off(self):
+        if self.paused is True:
+            self.paused=False
+            self._play()
+
+    def mute(self):
+        pass
+
+    def unmute(self):
+        pass
+
+    def control(self,char):
+        self.mon.log(self,'>control received by fake mplayer ' + char)
+
+    def stop(self):
+        if self.running is True and self.behaviour['hang'] is False:
+            self._finished()
+        self._quit()
+
+    def terminate(self,reason):
+        self.terminate_reason=reason
+        self.stop()
+
+
+    def _loaded(self):
+        self.start_play_signal=True
+        self.events.fire('first-frame')
+        self._play()
+
+    def _load_failed(self):
+        # mplayer cannot open the file and ends the track
+        self._finished()
+        self._exit()
+
+    def _ended(self):
+        self._finished()
+        self._exit()
+
+    def _finished(self):
+        if self.end_play_signal is True:
+            return
+        self.audio_position=self.position()
+        self.end_play_signal=True
+        self.events.fire('finished','nice_day')
+
+
+
+class FakeWebDriver(FakeDriver):
+    """
+    stands in for UZBLDriver, a browser that fails to load never becomes ready as uzbl does
+    """
+
+    def __init__(self,widget,pp_dir=''):
+        FakeDriver.__init__(self,widget,pp_dir)
+        self.fifo='fake'
+        self.appear_time=0
+
+
+    def from_pool(self):
+        return self
+
+    def spare_available(self):
+        return True
+
+    def play(self,track,window):
+        self._start('web',track)
+
+    def show_window(self):
+        pass
+
+    def control(self,data):
+        self.mon.log(self,'send command to fake uzbl:' + data)
+
+    def stop(self):
+        self._quit()
+        if self.running is True and self.behaviour['hang'] is True:
+            # uzbl that does not exit is killed at its exit deadline
+            self.timer=self.scheduler.after(2000,self._exit)
+
+    def terminate(self,reason):
+        self.terminate_reason=reason
+        self.stop()
+
+
+    def _loaded(self):
+        self.start_play_signal=True
+        self.events.fire('loaded')
+
+    def _load_failed(self):
+        pass
@@ -0,0 +1,153 @@
+"""
+Stands in for RPi.GPIO so the GPIO of a profile can be used without a Pi, use pipresents.py --fakegpio.
+Inputs are changed by writing lines to the fifo /tmp/pp_fake_gpio
+        <pin> <0|1>       set the level of an input pin, a button with a pull up is pressed by 0
+        press <pin>       the same as <pin> 0
+        release <pin>     the same as <pin> 1
+e.g.  echo press 11 > /tmp/pp_fake_gpio
+Edge callbacks are called from the thread that changes the level, as RPi.GPIO calls them from its own thread.
+Outputs only remember their level.
+"""
+
+import os
+import time
+import threading
+
+
+class FakeGPIO(object):
+    """
+    the part of the RPi.GPIO interface that GPIODriver uses, plus set_input() to simulate the inputs.
+    The time each input last changed is kept so the time from a press to its input event can be measured.
+    """
+
+    BOARD=10
+    BCM=11
+    OUT=0
+    IN=1
+    LOW=0
+    HIGH=1
+    PUD_OFF=20
+    PUD_DOWN=21
+    PUD_UP=22
+    RISING=31
+    FALLING=32
+    BOTH=33
+
+    fifo='/tmp/pp_fake_gpio'
+
+# CLASS VARIABLES (FakeGPIO.)
+    levels={}           # pin -> 0 or 1
+    directions={}       # pin -> IN or OUT
+    detects={}          # pin -> [edge,callback]
+    changed_at={}       # pin -> time the input last changed
+    lock=threading.Lock()
+    reader=None
+
+
+    def setwarnings(self,flag):
+        pass
+
+    def setmode(self,mode):
+        FakeGPIO.levels={}
+        FakeGPIO.directions={}
+        FakeGPIO.detects={}
+        FakeGPIO.changed_at={}
+
+
+    def setup(self,pin,direction,pull_up_down=PUD_OFF,initial=LOW):
+        FakeGPIO.directions[pin]=direction
+        if direction == FakeGPIO.IN:
+            # floating inputs read as 0
+            if pull_up_down == FakeGPIO.PUD_UP:
+                FakeGPIO.levels[pin]=1
+            else:
+                FakeGPIO.levels[pin]=0
+        else:
+            FakeGPIO.levels[pin]=int(initial)
+
+
+    def input(self,pin):
+        return FakeGPIO.levels.get(pin,0)
+
+
+    def output(self,pin,state):
+        FakeGPIO.levels[pin]=int(bool(state))
+
+
+    def add_event_detect(self,pin,edge,callback=None,bouncetime=None):
+        if FakeGPIO.directions.get(pin) != FakeGPIO.IN:
+            raise RuntimeError('You must setup() the GPIO channel as an input first')
+        FakeGPIO.detects[pin]=[edge,callback]
+        self._start_reader()
+
+
+    def remove_event_detect(self,pin):
+        FakeGPIO.detects.pop(pin,None)
+
+
+    def cleanup(self):
+        FakeGPIO.detects={}
+
+
+# ************************************************
+# simulating the inputs
+# ************************************************
+
+    # change the level of an input, bounces is the number of extra changes bounce_time secs apart
+    # before the level settles, as a mechanical switch makes
+    def set_input(self,pin,level,bounces=0,bounce_time=0.0005):
+        for bounce in range(bounces):
+            self._change(pin,(1-level) if bounce % 2 == 0 else level)
+            time.sleep(bounce_time)
+        self._change(pin,level)
+
+
+    def _change(self,pin,level):
+        FakeGPIO.lock.acquire()
+        old=FakeGPIO.levels.get(pin,0)
+        FakeGPIO.levels[pin]=level
+        if old != level:
+            FakeGPIO.changed_at[pin]=time.time()
+        detect=FakeGPIO.detects.get(pin)
+        FakeGPIO.lock.release()
+        if old == level or detect is None:
+            return
+        edge,callback=detect
+        if callback is None:
+            return
+        if edge == FakeGPIO.BOTH or (edge == FakeGPIO.RISING and level == 1) or (edge == FakeGPIO.FALLING and level == 0):
+            callback(pin)
+
+
+    def _start_reader(self):
+        if FakeGPIO.reader is not None:
+            return
+        if not os.path.exists(FakeGPIO.fifo):
+            try:
+                os.mkfifo(FakeGPIO.fifo)
+            except OSError:
+                return
+        FakeGPIO.reader=threading.Thread(target=self._read_fifo)
+        FakeGPIO.reader.daemon=True
+        FakeGPIO.reader.start()
+
+
+    # the reader thread, the fifo is opened again each time a writer closes it
+    def _read_fifo(self):
+        while True:
+            try:
+                fifo=open(FakeGPIO.fifo,'r')
+            except IOError:
+                return
+            for line in fifo:
+                fields=line.split()
+                try:
+                    if len(fields) == 2 and fields[0] == 'press':
+                        self.set_input(int(fields[1]),0)
+                    elif len(fields) == 2 and fields[0] == 'release':
+                        self.set_input(int(fields[1]),1)
+                    elif len(fields) == 2 and fields[1] in ('0','1'):
+                        self.set_input(int(fields[0]),int(fields[1]))
+                except ValueError:
+                    pass
+            fifo.close()
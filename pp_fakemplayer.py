@@ -0,0 +1,138 @@
+"""
+To Run - python pp_fakemplayer.py [--length secs]
+Stands in for mplayer -slave -idle so the audio tracks of a profile can be played without audio hardware,
+use pipresents.py --audio fake. It takes slave mode commands on stdin and writes the lines
+MplayerSlave reads on stdout, nothing is decoded or played.
+
+A .wav file plays for its real length, anything else for --length secs (default 5).
+loadfile, pause, stop and quit are acted on, other commands are accepted and ignored.
+"""
+
+import os
+import sys
+import time
+import wave
+import select
+import argparse
+
+
+class FakeMplayer(object):
+
+    def __init__(self,length):
+        self.length=length
+        self.track=None
+        self.ends_at=0
+        self.paused_at=None
+
+
+    def run(self):
+        # stdin is read with os.read as a buffered file would hold lines that select does not know about
+        pending=''
+        while True:
+            while '\n' in pending:
+                line,pending=pending.split('\n',1)
+                if self.command(line.strip()) is False:
+                    return
+            if self.track is not None and self.paused_at is None:
+                timeout=max(0,self.ends_at-time.time())
+            else:
+                timeout=None
+            ready,w,x=select.select([sys.stdin],[],[],timeout)
+            if len(ready) == 0:
+                self.end(1)
+                continue
+            data=os.read(sys.stdin.fileno(),4096)
+            if data == '':
+                # mplayer quits when stdin is closed
+                return
+            pending+=data
+
+
+    # returns False to quit
+    def command(self,line):
+        words=line.split(None,1)
+        if len(words) == 0:
+            return True
+        if words[0] in ('pausing','pausing_keep','pausing_toggle','pausing_keep_force') and len(words) > 1:
+            words=words[1].split(None,1)
+        name=words[0]
+        if name == 'loadfile' and len(words) > 1:
+            self.load(self.unquote(words[1]))
+        elif name == 'pause' and self.track is not None:
+            if self.paused_at is None:
+                self.paused_at=time.time()
+            else:
+                self.ends_at+=time.time()-self.paused_at
+                self.paused_at=None
+        elif name == 'stop' and self.track is not None:
+            self.end(4)
+        elif name == 'quit':
+            if self.track is not None:
+                self.end(3)
+            self.say('\nExiting... (Quit)')
+            return False
+        return True
+
+
+    def load(self,path):
+        if self.track is not None:
+            # loadfile ends the track that is playing
+            self.end(2)
+        self.say('\nPlaying ' + path + '.')
+        if not os.path.exists(path):
+            self.say('File not found: \'' + path + '\'')
+            self.say('Failed to open ' + path + '.')
+            return
+        self.track=path
+        self.ends_at=time.time()+self.track_length(path)
+        self.paused_at=None
+        self.say('AO: [fake] 44100Hz 2ch s16le (2 bytes per sample)')
+        self.say('Starting playback...')
+
+
+    def end(self,code):
+        self.track=None
+        self.paused_at=None
+        self.say('EOF code: ' + str(code))
+
+
+    def track_length(self,path):
+        if os.path.splitext(path)[1].lower() == '.wav':
+            try:
+                wav=wave.open(path,'rb')
+                length=float(wav.getnframes())/wav.getframerate()
+                wav.close()
+                return length
+            except (wave.Error,EOFError,IOError,ZeroDivisionError):
+                pass
+        return self.length
+
+
+    # slave commands take a file name that may be in double quotes with \ escapes
+    def unquote(self,text):
+        text=text.strip()
+        if len(text) >= 2 and text[0] == '"':
+            result=''
+            index=1
+            while index < len(text) and text[index] != '"':
+                if text[index] == '\\' and index+1 < len(text):
+                    index+=1
+                result+=text[index]
+                index+=1
+            return result
+        # a file name without quotes ends at the first space, anything after is the append flag
+        return text.split()[0]
+
+
+    def say(self,text):
+        sys.stdout.write(text + '\n')
+        sys.stdout.flush()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Fake mplayer in slave mode')
+    parser.add_argument('--length', nargs='?', default=5, const=5,help='Secs that a track other than a .wav plays for')
+    # ignore the mplayer options it is started with
+    args,others=parser.parse_known_args()
+    FakeMplayer(float(args.length)).run()
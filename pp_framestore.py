@@ -0,0 +1,124 @@
+import os
+import json
+import mmap
+from PIL import Image
+from pp_utils import Monitor
+
+
+class FrameStore(object):
+    """
+    screen ready frames for the pre-scaled images of a profile, made by pp_prescale.py --raw.
+    frames.raw holds the frames as raw RGBA pixels one after another, each starting on a page boundary.
+    frames.json is the index, name of the pre-scaled copy (see PreScale.cache_name) -> [offset,width,height,source mtime].
+
+    PiPresents maps frames.raw into memory and ImagePlayer makes its image straight from the mapped pages,
+    so there is no decoding and no copy until Tk takes the pixels. The pages are shared with the kernel's file cache.
+    RGBA is used as PIL can only wrap a buffer without copying it for 4 byte pixels, and Tk takes RGBA as it is.
+
+    Usage:
+        FrameStore().open(directory)                    # once by PiPresents
+        pil_image=FrameStore().frame(name,source_path)  # None if the frame is not in the store or out of date
+    """
+
+# CLASS VARIABLES (FrameStore.)
+    frames=None         # the mapped frames.raw
+    index={}
+    frames_file=None
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # map the frame store in directory if there is one
+    def open(self,directory):
+        self.close()
+        index_path=directory + os.sep + 'frames.json'
+        frames_path=directory + os.sep + 'frames.raw'
+        if not (os.path.exists(index_path) and os.path.exists(frames_path)):
+            return False
+        try:
+            index_file=open(index_path,'rb')
+            FrameStore.index=json.load(index_file)
+            index_file.close()
+            FrameStore.frames_file=open(frames_path,'rb')
+            FrameStore.frames=mmap.mmap(FrameStore.frames_file.fileno(),0,access=mmap.ACCESS_READ)
+        except (IOError,ValueError,mmap.error) as e:
+            self.mon.warn(self,'Cannot open frame store ' + directory + ': ' + str(e))
+            self.close()
+            return False
+        self.mon.log(self,'Mapped ' + str(len(FrameStore.index)) + ' frames, ' + str(len(FrameStore.frames)/1048576) + ' MB from ' + frames_path)
+        return True
+
+
+    # called by PiPresents on exit
+    def close(self):
+        if FrameStore.frames is not None:
+            FrameStore.frames.close()
+            FrameStore.frames=None
+        if FrameStore.frames_file is not None:
+            FrameStore.frames_file.close()
+            FrameStore.frames_file=None
+        FrameStore.index={}
+
+
+    # is there an up to date frame
+    def contains(self,name,source_path):
+        return self._entry(name,source_path) is not None
+
+
+    # returns an RGBA image that uses the mapped pages, None if there is no up to date frame
+    def frame(self,name,source_path):
+        entry=self._entry(name,source_path)
+        if entry is None:
+            return None
+        offset,width,height,source_mtime=entry
+        return Image.frombuffer('RGBA',(width,height),buffer(FrameStore.frames,offset,width*height*4),'raw','RGBA',0,1)
+
+
+    def _entry(self,name,source_path):
+        if FrameStore.frames is None:
+            return None
+        entry=FrameStore.index.get(name)
+        if entry is None:
+            return None
+        try:
+            if abs(os.path.getmtime(source_path)-entry[3]) >= 0.001:
+                return None
+        except OSError:
+            return None
+        return entry
+
+
+    # write a new frame store in directory from the pre-scaled copies, copies is a list of (name,copy path,source path)
+    # The files are replaced by renaming so a PiPresents that has the old ones mapped is not disturbed
+    def write(self,directory,copies,log):
+        index={}
+        frames_temp=directory + os.sep + 'frames.raw.tmp'
+        frames_file=open(frames_temp,'wb')
+        offset=0
+        for name,copy_path,source_path in copies:
+            try:
+                pil_image=Image.open(copy_path)
+                if pil_image.mode != 'RGBA':
+                    pil_image=pil_image.convert('RGBA')
+                data=pil_image.tobytes()
+                source_mtime=os.path.getmtime(source_path)
+            except (IOError,OSError) as e:
+                log('Cannot add ' + copy_path + ' to frame store: ' + str(e))
+                continue
+            frames_file.write(data)
+            index[name]=[offset,pil_image.size[0],pil_image.size[1],source_mtime]
+            offset+=len(data)
+            # start the next frame on a page boundary
+            padding=-offset % mmap.PAGESIZE
+            frames_file.write('\0'*padding)
+            offset+=padding
+        frames_file.close()
+        index_temp=directory + os.sep + 'frames.json.tmp'
+        index_file=open(index_temp,'wb')
+        json.dump(index,index_file)
+        index_file.close()
+        os.rename(frames_temp,directory + os.sep + 'frames.raw')
+        os.rename(index_temp,directory + os.sep + 'frames.json')
+        return len(index),offset
@@ -3,6 +3,7 @@
 
 from pp_show import Show
 from pp_controlsmanager import ControlsManager
+from pp_soundcues import SoundCues
 from pp_screendriver import ScreenDriver
 
 class GapShow(Show):
@@ -83,6 +84,12 @@ class GapShow(Show):
             self.end('error','ShowTimeout has bad time: '+self.show_params['show-timeout'])
             
         self.track_count_limit = int(self.show_params['track-count-limit'])
+
+        # how many tracks to load ahead of the one showing and the limits on what they can take
+        # profiles made before preloading was added do not have the fields
+        self.preload_depth = int(self.show_params.get('preload-depth','0'))
+        self.preload_memory = int(self.show_params.get('preload-memory','64'))*1024*1024
+        self.preload_players = int(self.show_params.get('preload-players','1'))
             
         reason,message,self.interval = Show.calculate_duration (self, self.show_params['interval'])
         if reason=='error':
@@ -190,6 +197,10 @@ class GapShow(Show):
         elif operation in ('no-command','null'):
             return
                 
+        # sounds play over the top of the track
+        elif operation[0:6] == 'sound-':
+            SoundCues().play(operation[6:])
+
         # if the operation is omxplayer mplayer or uzbl runtime control then pass it to player if running
         elif operation[0:4] == 'omx-' or operation[0:6] == 'mplay-'or operation[0:5] == 'uzbl-':
             if self.current_player is not None:
@@ -228,7 +239,7 @@ class GapShow(Show):
         # start duration timer
         if self.show_timeout  != 0:
             # print 'set alarm ', self.show_timeout
-            self.duration_timer = self.canvas.after(self.show_timeout*1000,self.show_timeout_stop)
+            self.duration_timer = self.scheduler.after(self.show_timeout*1000,self.show_timeout_stop)
 
         self.first_list=True
 
@@ -293,7 +304,7 @@ class GapShow(Show):
         # start interval timer
         self.interval_timer_signal = False
         if self.interval != 0:
-            self.interval_timer=self.canvas.after(self.interval*1000,self.end_interval_timer)
+            self.interval_timer=self.scheduler.after(self.interval*1000,self.end_interval_timer)
 
         # print '\nSTART LIST', self.first_list
         if  self.first_list is True:
@@ -332,12 +343,26 @@ class GapShow(Show):
 
     
 
-        # load the track or show
+        # load the track or show, unless it has been preloaded
         # params - track,enable_menu
         enable=self.enable_child & self.enable_hint
-        Show.base_load_track_or_show(self,selected_track,self.what_next_after_load,self.end_shower,enable)
+        preloaded_player=Show.base_take_preloaded(self,selected_track,enable)
+        if preloaded_player is not None:
+            self.current_player=preloaded_player
+            self.mon.trace(self,' - current_player is preloaded: '+ self.mon.pretty_inst(self.current_player))
+            self.current_player.when('loaded',self.preloaded_player_loaded)
+        else:
+            Show.base_load_track_or_show(self,selected_track,self.what_next_after_load,self.end_shower,enable)
+
+        # get the following images ready while this track loads and shows
+        Show.base_prefetch(self)
         
 
+    # the preloaded player may still be loading
+    def preloaded_player_loaded(self,play_state):
+        self.what_next_after_load(play_state,'preloaded')
+
+
     # track has loaded so show it.
     def what_next_after_load(self,status,message):
         self.mon.log(self,'Show Id ' + str(self.show_id)+' load complete with status: ' + status +'  message: ' +message)
@@ -349,6 +374,8 @@ class GapShow(Show):
             if self.terminate_signal is True or self.exit_signal is True or self.user_stop_signal is True:
                 self.what_next_after_showing()
             else:
+                # load the tracks that follow while this one shows
+                Show.base_preload(self,self.enable_child)
                 self.mon.trace(self, ' - showing track')
                 self.current_player.show(self.track_ready_callback,self.finished_showing,self.closed_after_showing)
 
@@ -462,7 +489,7 @@ class GapShow(Show):
                     self.ending_reason='user-stop'
                     Show.base_close_or_unload(self)
             else:
-                self.poll_for_interval_timer=self.canvas.after(1000,self.what_next_after_showing)
+                self.poll_for_interval_timer=self.scheduler.after(1000,self.what_next_after_showing)
 
         else:
             self.medialist.create_new_livelist()
@@ -503,7 +530,7 @@ class GapShow(Show):
                         Show.base_track_ready_callback(self,False)
                         # use new empty livelist so if changed works OK
                         self.medialist.use_new_livelist()
-                        self.canvas.after(1000,self.what_next_after_showing)
+                        self.scheduler.after(1000,self.what_next_after_showing)
 
 
                 elif self.medialist.new_length()==0 and self.show_params['repeat']=='single-run':
@@ -653,7 +680,7 @@ class GapShow(Show):
                         # print 'WAITING FOR INTERVAL'
                         Show.base_shuffle(self)
                         Show.base_track_ready_callback(self,False)
-                        self.poll_for_interval_timer=self.canvas.after(200,self.what_next_after_showing) 
+                        self.poll_for_interval_timer=self.scheduler.after(200,self.what_next_after_showing) 
 
                     # interval=0   
                     #elif self.show_params['sequence'] == "ordered" and self.show_params['repeat'] == 'repeat' and self.show_params['trigger-end-type']== 'interval' and int(self.show_params['trigger-end-param']) == 0:
@@ -742,6 +769,7 @@ class GapShow(Show):
 # End the show
 # *********************
     def end(self,reason,message):
+        Show.base_discard_preloaded(self)
         Show.base_end(self,reason,message)
 
 
@@ -751,15 +779,15 @@ class GapShow(Show):
         # self.tod.clear_times_list(id(self))
 
         if self.poll_for_interval_timer is not None:
-            self.canvas.after_cancel(self.poll_for_interval_timer)
+            self.scheduler.cancel(self.poll_for_interval_timer)
             self.poll_for_interval_timer=None
             
         if self.interval_timer is not None:
-            self.canvas.after_cancel(self.interval_timer)
+            self.scheduler.cancel(self.interval_timer)
             self.interval_timer=None
             
         if self.duration_timer is not None:
-            self.canvas.after_cancel(self.duration_timer)
+            self.scheduler.cancel(self.duration_timer)
             self.duration_timer=None
 
 
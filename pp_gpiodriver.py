@@ -5,6 +5,8 @@ import copy
 import os
 import ConfigParser
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_clock import Clock
 
 
 class GPIODriver(object):
@@ -13,6 +15,17 @@ class GPIODriver(object):
      - configures and binds GPIO pins from data in gpio.cfg
      - reads and debounces inputs pins, provides callbacks on state changes which generate input events
     - changes the stae of output pins as required by calling programs
+
+    In 'edge' mode (the default) the GPIO library calls back from its own thread when an input changes,
+    the change is passed to the Tk thread with Scheduler.post() and the input event is sent a few mS after the press.
+    The first change of a settled input is taken at once, changes in the debounce time after it are bounces,
+    the input is read again at the end of the debounce time in case it has not settled where it was expected.
+    The debounce time is 'debounce' in mS in gpio.cfg, otherwise threshold times the button tick as it is for polling.
+    Nothing is done while the inputs are still, except for pins with repeated state callbacks.
+    In 'poll' mode, or if edge detection cannot be used, every input is read every button tick and debounced
+    by counting the ticks it has been in its new state.
+
+    --fakegpio uses FakeGPIO (pp_fakegpio.py) instead of RPi.GPIO so it all works without a Pi.
     """
  
  
@@ -38,6 +51,9 @@ class GPIODriver(object):
     PRESSED = 13     # variable - debounced state 
     LAST = 14      # varible - last state - used to detect edge
     REPEAT_COUNT = 15
+    DEBOUNCE = 16       # debounce time in mS for edge mode
+    SETTLE_TIMER = 17   # variable - edge mode, the input is in its debounce time
+    REPEAT_TIMER = 18   # variable - edge mode, timer for the state callbacks
 
     
     TEMPLATE = ['',   # pin
@@ -49,7 +65,8 @@ class GPIODriver(object):
                 '',             #pull
                 -1,             #linked pin
                 False,          # linked invert
-                0,False,False,0]   #dynamics
+                0,False,False,0,   #dynamics
+                0,None,None]
     
 # for A and B
 #    PINLIST = ('P1-03','P1-05','P1-07','P1-08',
@@ -68,11 +85,21 @@ class GPIODriver(object):
     pins=[]
     options=None
     gpio_enabled=False
+    outputs={}              # symbolic name -> pin number of the output pins
+    inputs={}               # pin number -> entry in pins of the input pins
+    mode='edge'             # set from the command line by PiPresents, 'edge' or 'poll'
+    fake=False              # use FakeGPIO not RPi.GPIO
+
+    # time from an input changing to its event being sent, edge mode only
+    latency_count=0
+    latency_total=0.0
+    latency_max=0.0
 
 
     # executed by main program and by each object using gpio
     def __init__(self):
         self.mon=Monitor()
+        self.scheduler=Scheduler()
 
 
 
@@ -94,8 +121,15 @@ class GPIODriver(object):
         if reason =='error':
             return 'error',message
 
-        import RPi.GPIO as GPIO
+        if GPIODriver.fake is True:
+            from pp_fakegpio import FakeGPIO
+            GPIO=FakeGPIO()
+            self.mon.log(self,'Using fake GPIO, change inputs with: echo press <pin> > ' + FakeGPIO.fifo)
+        else:
+            import RPi.GPIO as GPIO
         self.GPIO = GPIO
+        GPIODriver.pins=[]
+        GPIODriver.outputs={}
         
         # construct the GPIO control list from the configuration
         for index, pin_def in enumerate(GPIODriver.PINLIST):
@@ -137,6 +171,10 @@ class GPIODriver(object):
                         else:
                             pin[GPIODriver.REPEAT]=-1
                         pin[GPIODriver.THRESHOLD]=int(self.config.get(pin_def,'threshold'))
+                        if self.config.has_option(pin_def,'debounce') and self.config.get(pin_def,'debounce') != '':
+                            pin[GPIODriver.DEBOUNCE]=int(self.config.get(pin_def,'debounce'))
+                        else:
+                            pin[GPIODriver.DEBOUNCE]=pin[GPIODriver.THRESHOLD]*self.button_tick
                         
                         if self.config.get(pin_def,'pull-up-down') == 'up':
                             pin[GPIODriver.PULL]=GPIO.PUD_UP
@@ -147,9 +185,11 @@ class GPIODriver(object):
                     else:
                         # output pin
                         pin[GPIODriver.NAME]=self.config.get(pin_def,'name')
+                        GPIODriver.outputs[pin[GPIODriver.NAME]]=pin[GPIODriver.PIN]
  
             # print pin            
             GPIODriver.pins.append(copy.deepcopy(pin))
+        GPIODriver.inputs=dict((pin[GPIODriver.PIN],pin) for pin in GPIODriver.pins if pin[GPIODriver.DIRECTION] == 'in')
 
         # setup GPIO
         self.GPIO.setwarnings(True)        
@@ -174,20 +214,34 @@ class GPIODriver(object):
 
     # called by main program only         
     def poll(self):
-        # loop to look at the buttons
-        self.do_buttons()
-        self.button_tick_timer=self.widget.after(self.button_tick,self.poll)
+        if GPIODriver.mode == 'edge' and self.detect_edges() is True:
+            return
+        # look at the buttons every button_tick, fixed rate so the debounce and repeat counts stay in step
+        self.button_tick_timer=self.scheduler.every(self.button_tick,self.do_buttons)
 
 
     # called by main program only                
     def terminate(self):
         if GPIODriver.gpio_enabled is True:
             if self.button_tick_timer is not None:
-                self.widget.after_cancel(self.button_tick_timer)
+                self.scheduler.cancel(self.button_tick_timer)
+            for pin in GPIODriver.pins:
+                if pin[GPIODriver.DIRECTION] == 'in' and GPIODriver.mode == 'edge':
+                    self.GPIO.remove_event_detect(pin[GPIODriver.PIN])
+                    self.scheduler.cancel(pin[GPIODriver.SETTLE_TIMER])
+                    self.scheduler.cancel(pin[GPIODriver.REPEAT_TIMER])
+            self.report()
             self.reset_outputs()
             self.GPIO.cleanup()
 
 
+    def report(self):
+        if GPIODriver.latency_count > 0:
+            self.mon.log(self,'GPIO inputs: %d events, press to event average %.1f mS, max %.1f mS'
+                         % (GPIODriver.latency_count,1000*GPIODriver.latency_total/GPIODriver.latency_count,
+                            1000*GPIODriver.latency_max))
+
+
 # ************************************************
 # gpio input functions
 # called by main program only
@@ -199,6 +253,9 @@ class GPIODriver(object):
             pin[GPIODriver.PRESSED]=False
             pin[GPIODriver.LAST]=False
             pin[GPIODriver.REPEAT_COUNT]=pin[GPIODriver.REPEAT]
+        GPIODriver.latency_count=0
+        GPIODriver.latency_total=0.0
+        GPIODriver.latency_max=0.0
 
     # index is of the pins array, provided by the callback ***** needs to be name
     def shutdown_pressed(self):
@@ -212,10 +269,7 @@ class GPIODriver(object):
             if pin[GPIODriver.DIRECTION] == 'in':
 
                 # linked pin
-                if pin[GPIODriver.LINKED_NAME] != '':
-                    link_pin=self.output_pin_of(pin[GPIODriver.LINKED_NAME])
-                    if link_pin!=-1:
-                        self.GPIO.output(link_pin,self.GPIO.input(pin[GPIODriver.PIN]) ^ pin[GPIODriver.LINKED_INVERT])
+                self._follow_link(pin)
                     
                 # debounce
                 if self.GPIO.input(pin[GPIODriver.PIN]) == 0:
@@ -255,6 +309,105 @@ class GPIODriver(object):
                         pin[GPIODriver.REPEAT_COUNT]-=1
          
 
+# ************************************************
+# edge mode
+# ************************************************
+
+    # ask the GPIO library to call back when the inputs change, False if it cannot and the inputs must be polled
+    def detect_edges(self):
+        for index, pin in enumerate(GPIODriver.pins):
+            if pin[GPIODriver.DIRECTION] != 'in':
+                continue
+            try:
+                self.GPIO.add_event_detect(pin[GPIODriver.PIN],self.GPIO.BOTH,callback=self._edge_detected)
+            except RuntimeError as e:
+                self.mon.warn(self,'Cannot detect edges of pin P1-' + str(pin[GPIODriver.PIN]) + ', polling the inputs: ' + str(e))
+                for other in GPIODriver.pins[:index]:
+                    if other[GPIODriver.DIRECTION] == 'in':
+                        self.GPIO.remove_event_detect(other[GPIODriver.PIN])
+                GPIODriver.mode='poll'
+                return False
+            # the state it is in now, without events
+            self._follow_link(pin)
+            pin[GPIODriver.PRESSED]=self.GPIO.input(pin[GPIODriver.PIN]) == 0
+            pin[GPIODriver.LAST]=pin[GPIODriver.PRESSED]
+            self._start_repeat(pin)
+        self.mon.log(self,'GPIO inputs are edge detected')
+        return True
+
+
+    # runs in the GPIO library's thread so only posts
+    def _edge_detected(self,num):
+        self.scheduler.post(self._edge,num,time.time())
+
+
+    def _edge(self,num,edge_time):
+        pin=GPIODriver.inputs.get(num)
+        if pin is None or GPIODriver.gpio_enabled is False:
+            return
+        self._follow_link(pin)
+        if pin[GPIODriver.SETTLE_TIMER] is not None:
+            # bouncing, it is read when the debounce time is up
+            return
+        # a settled input has changed so it is the other state now, reading it could catch a bounce
+        self._change(pin,not pin[GPIODriver.PRESSED],edge_time)
+        pin[GPIODriver.SETTLE_TIMER]=self.scheduler.after(pin[GPIODriver.DEBOUNCE],self._settled,pin)
+
+
+    def _settled(self,pin):
+        pin[GPIODriver.SETTLE_TIMER]=None
+        self._follow_link(pin)
+        pressed=self.GPIO.input(pin[GPIODriver.PIN]) == 0
+        if pressed != pin[GPIODriver.PRESSED]:
+            # it was a glitch, or it changed again after the bounces
+            self._change(pin,pressed,None)
+            pin[GPIODriver.SETTLE_TIMER]=self.scheduler.after(pin[GPIODriver.DEBOUNCE],self._settled,pin)
+
+
+    # the debounced state has changed, send the edge event and start the state callbacks again
+    def _change(self,pin,pressed,edge_time):
+        pin[GPIODriver.PRESSED]=pressed
+        pin[GPIODriver.LAST]=pressed
+        if pressed is True:
+            name=pin[GPIODriver.FALLING_NAME]
+        else:
+            name=pin[GPIODriver.RISING_NAME]
+        if name != '' and self.button_callback is not None:
+            if edge_time is not None:
+                latency=time.time()-edge_time
+                GPIODriver.latency_count+=1
+                GPIODriver.latency_total+=latency
+                GPIODriver.latency_max=max(GPIODriver.latency_max,latency)
+            self.button_callback(name,"GPIO")
+        self._start_repeat(pin)
+
+
+    # state callbacks every repeat ticks, as they are when polling
+    def _start_repeat(self,pin):
+        self.scheduler.cancel(pin[GPIODriver.REPEAT_TIMER])
+        pin[GPIODriver.REPEAT_TIMER]=None
+        if pin[GPIODriver.REPEAT] == -1 or (pin[GPIODriver.ONE_NAME] == '' and pin[GPIODriver.ZERO_NAME] == ''):
+            return
+        interval=max(1,pin[GPIODriver.REPEAT])*self.button_tick
+        pin[GPIODriver.REPEAT_TIMER]=self.scheduler.every(interval,self._repeat,pin)
+
+
+    def _repeat(self,pin):
+        if self.button_callback is None:
+            return
+        if pin[GPIODriver.ZERO_NAME] != '' and pin[GPIODriver.PRESSED] is True:
+            self.button_callback(pin[GPIODriver.ZERO_NAME],"GPIO")
+        if pin[GPIODriver.ONE_NAME] != '' and pin[GPIODriver.PRESSED] is False:
+            self.button_callback(pin[GPIODriver.ONE_NAME],"GPIO")
+
+
+    def _follow_link(self,pin):
+        if pin[GPIODriver.LINKED_NAME] != '':
+            link_pin=self.output_pin_of(pin[GPIODriver.LINKED_NAME])
+            if link_pin!=-1:
+                self.GPIO.output(link_pin,self.GPIO.input(pin[GPIODriver.PIN]) ^ pin[GPIODriver.LINKED_INVERT])
+
+
     # execute an output event
     def handle_output_event(self,name,param_type,param_values,req_time):
         if GPIODriver.gpio_enabled is False:
@@ -273,7 +426,7 @@ class GPIODriver(object):
         if pin  == -1:
             return 'error','Not an output for gpio: ' + name
         
-        self.mon.log (self,'pin P1-'+ str(pin)+ ' set  '+ str(state) + ' required at: ' + str(req_time)+ ' sent at: ' + str(long(time.time())))
+        self.mon.log (self,'pin P1-%s set %s required at: %.3f sent at: %.3f' % (pin,state,req_time,Clock().time()))
         # print 'pin P1-'+ str(pin)+ ' set  '+ str(state) + ' required: ' + str(req_time)+ ' actual: ' + str(long(time.time()))
         self.GPIO.output(pin,state)
         return 'normal','gpio handled OK'
@@ -301,12 +454,7 @@ class GPIODriver(object):
 
 
     def output_pin_of(self,name):
-        for pin in GPIODriver.pins:
-            # print " in list" + pin[GPIODriver.NAME] + str(pin[GPIODriver.PIN] )
-            if pin[GPIODriver.NAME] == name and pin[GPIODriver.DIRECTION] == 'out':
-                # print " linked pin " + pin[GPIODriver.NAME] + ' ' + str(pin[GPIODriver.PIN] )
-                return pin[GPIODriver.PIN]
-        return -1
+        return GPIODriver.outputs.get(name,-1)
 
 
 
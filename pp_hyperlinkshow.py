@@ -3,6 +3,7 @@
 from pp_medialist import MediaList
 from pp_pathmanager import PathManager
 from pp_screendriver import ScreenDriver
+from pp_soundcues import SoundCues
 from pp_show import Show
 
 
@@ -191,7 +192,7 @@ class HyperlinkShow(Show):
         if found is True:
             # cancel the show timeout when playing another track
             if self.show_timeout_timer is not None:
-                self.canvas.after_cancel(self.show_timeout_timer)
+                self.scheduler.cancel(self.show_timeout_timer)
                 self.show_timeout_timer=None
                 
             if link_op == 'home':
@@ -232,6 +233,9 @@ class HyperlinkShow(Show):
                 if self.current_player is not  None:
                     self.current_player.input_pressed(link_op)
                     
+            elif link_op[0:6] == 'sound-':
+                SoundCues().play(link_op[6:])
+
             elif link_op[0:4] == 'omx-' or link_op[0:6] == 'mplay-'or link_op[0:5] == 'uzbl-':
                 if self.current_player is not None:
                     self.current_player.input_pressed(link_op)
@@ -355,19 +359,19 @@ class HyperlinkShow(Show):
         # start the show timer when displaying the first track
         if self.current_track_ref == self.first_track_ref:
             if self.show_timeout_timer is not None:
-                self.canvas.after_cancel(self.show_timeout_timer)
+                self.scheduler.cancel(self.show_timeout_timer)
                 self.show_timeout_timer=None
             if self.show_timeout != 0:
-                self.show_timeout_timer=self.canvas.after(self.show_timeout*1000 ,self.show_timeout_stop)
+                self.show_timeout_timer=self.scheduler.after(self.show_timeout*1000 ,self.show_timeout_stop)
 
         
        # start timeout for the track if required   ???? differnet to radiobuttonshow
         if self.continue_timeout is False:
             if self.track_timeout_timer is not None:
-                self.canvas.after_cancel(self.track_timeout_timer)
+                self.scheduler.cancel(self.track_timeout_timer)
                 self.track_timeout_timer=None
             if self.current_track_ref != self.first_track_ref and self.track_timeout != 0:
-                self.track_timeout_timer=self.canvas.after(self.track_timeout*1000,self.track_timeout_callback)
+                self.track_timeout_timer=self.scheduler.after(self.track_timeout*1000,self.track_timeout_callback)
 
 
         # get control bindings for this show
@@ -0,0 +1,192 @@
+import os
+import time
+import resource
+from collections import OrderedDict
+from PIL import Image
+from pp_utils import Monitor
+
+
+# EXIF orientation tag and the transposes that put the image the right way up for each value
+EXIF_ORIENTATION=274
+exif_transposes={2:[Image.FLIP_LEFT_RIGHT],
+                 3:[Image.ROTATE_180],
+                 4:[Image.FLIP_TOP_BOTTOM],
+                 5:[Image.FLIP_LEFT_RIGHT,Image.ROTATE_90],
+                 6:[Image.ROTATE_270],
+                 7:[Image.FLIP_LEFT_RIGHT,Image.ROTATE_270],
+                 8:[Image.ROTATE_90]}
+
+
+# returns the EXIF orientation of a camera image, 1 (the right way up) if it has none or --exif is not used
+def exif_orientation(pil_image):
+    if ImageCache.exif is False:
+        return 1
+    try:
+        exif=pil_image._getexif()
+    except Exception:
+        return 1
+    if exif is None:
+        return 1
+    return exif.get(EXIF_ORIENTATION,1)
+
+
+def exif_transpose(pil_image,orientation):
+    for transpose in exif_transposes.get(orientation,[]):
+        pil_image=pil_image.transpose(transpose)
+    return pil_image
+
+
+# open an image that is going to be shown at width x height after rotating by rotate degrees.
+# A JPEG that is at least twice as big as that is decoded at 1/2, 1/4 or 1/8 scale by the decoder (draft mode)
+# which is much quicker and needs a fraction of the memory of decoding it at full size then shrinking it.
+# The scaled image is never smaller than width x height so the resize afterwards still does the final filtering.
+# Returns the image, not yet decoded or turned by exif_transpose, the size of the file's image and its EXIF orientation
+def open_image(path,width,height,rotate):
+    pil_image=Image.open(path)
+    full_size=pil_image.size
+    orientation=exif_orientation(pil_image)
+    if orientation >= 5:
+        # the camera was on its side
+        rotate+=90
+    if pil_image.format == 'JPEG' and width > 0 and height > 0:
+        # the size wanted in the orientation of the file
+        if rotate % 180 == 0:
+            wanted=(int(width),int(height))
+        elif rotate % 90 == 0:
+            wanted=(int(height),int(width))
+        else:
+            wanted=(int(max(width,height)),int(max(width,height)))
+        if full_size[0] >= 2*wanted[0] and full_size[1] >= 2*wanted[1]:
+            pil_image.draft(pil_image.mode,wanted)
+    return pil_image,full_size,orientation
+
+
+# returns the text for the log of how an image was decoded, start is the time.time() before open_image
+def decode_report(path,full_size,pil_image,start):
+    decoded_size=pil_image.size
+    bytes_per_pixel=ImageCache.pixel_bytes.get(pil_image.mode,4)
+    # ru_maxrss is in KB on Linux
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+    return ('%s %dx%d shown at %dx%d in %.3f secs, %.1f MB decoded (%.1f MB at full size), peak memory %.1f MB'
+            % (os.path.basename(path),full_size[0],full_size[1],decoded_size[0],decoded_size[1],time.time()-start,
+               decoded_size[0]*decoded_size[1]*bytes_per_pixel/1048576.0,
+               full_size[0]*full_size[1]*bytes_per_pixel/1048576.0,peak))
+
+
+class ImageCache(object):
+    """
+    process wide cache of PIL images that are ready to display, i.e. rotated and resized for the window they go in.
+    A repeating show then decodes and resizes each image once rather than once per cycle.
+
+    The key is the file's path and modification time and everything that changes the displayed image,
+    so an edited file or a different window gives a new entry.
+    Least recently used images are thrown away when the images take more than budget bytes.
+    Images in the cache are shared so must not be altered, make a copy first.
+
+    Usage:
+        self.image_cache=ImageCache()
+        key=self.image_cache.make_key(path,'fit',width,height,'Image.NEAREST',0)
+        pil_image=self.image_cache.get(key)
+        if pil_image is None:
+            pil_image= ... open and resize
+            self.image_cache.put(key,pil_image)
+    """
+
+# CLASS VARIABLES (ImageCache.)
+    images=OrderedDict()        # key -> (PIL image, bytes), least recently used first
+    total_bytes=0
+    budget=64*1024*1024         # set from the command line by PiPresents, 0 disables the cache
+    exif=False                  # turn camera images the right way up by their EXIF orientation, set from the command line
+    hits=0
+    misses=0
+    evictions=0
+
+    # bytes per pixel of PIL's internal storage for each mode, 4 for anything not listed
+    pixel_bytes={'1':1,'L':1,'P':1,'LA':4,'RGB':4,'RGBA':4,'RGBX':4,'CMYK':4,'YCbCr':4,'I':4,'F':4}
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # returns the key for the displayed image, None if the file cannot be read
+    def make_key(self,path,command,width,height,image_filter,rotate):
+        try:
+            mtime=os.path.getmtime(path)
+        except OSError:
+            return None
+        return (path,mtime,command,int(width),int(height),image_filter,rotate)
+
+
+    # returns the image for the key or None
+    def get(self,key):
+        if key is None or ImageCache.budget == 0:
+            return None
+        entry=ImageCache.images.pop(key,None)
+        if entry is None:
+            ImageCache.misses+=1
+            return None
+        # put it back as the most recently used
+        ImageCache.images[key]=entry
+        ImageCache.hits+=1
+        return entry[0]
+
+
+    # is the image in the cache, does not count as a hit or miss
+    def contains(self,key):
+        return key in ImageCache.images
+
+
+    def put(self,key,image):
+        if key is None or ImageCache.budget == 0:
+            return
+        size=image.size[0]*image.size[1]*ImageCache.pixel_bytes.get(image.mode,4)
+        if size > ImageCache.budget:
+            self.mon.log(self,'Image too big to cache: ' + key[0])
+            return
+        old=ImageCache.images.pop(key,None)
+        if old is not None:
+            ImageCache.total_bytes-=old[1]
+        ImageCache.images[key]=(image,size)
+        ImageCache.total_bytes+=size
+        while ImageCache.total_bytes > ImageCache.budget:
+            old_key,old=ImageCache.images.popitem(last=False)
+            ImageCache.total_bytes-=old[1]
+            ImageCache.evictions+=1
+        self.mon.log(self,'Cached ' + os.path.basename(key[0]) + ' ' + self.statistics())
+
+
+    # returns a show or track background image resized to the show canvas
+    def background(self,path,width,height):
+        key=self.make_key(path,'warp',width,height,'Image.NEAREST',0)
+        pil_background_img=self.get(key)
+        if pil_background_img is None:
+            start=time.time()
+            pil_background_img,full_size,orientation=open_image(path,width,height,0)
+            pil_background_img=exif_transpose(pil_background_img,orientation)
+            # print 'pil_background_img ',pil_background_img
+            image_width,image_height=pil_background_img.size
+            if image_width != width or image_height != height:
+                pil_background_img=pil_background_img.resize((width, height))
+            else:
+                pil_background_img.load()
+            self.mon.log(self,'Background ' + decode_report(path,full_size,pil_background_img,start))
+            self.put(key,pil_background_img)
+        return pil_background_img
+
+
+    # throw away all images
+    def clear(self):
+        ImageCache.images=OrderedDict()
+        ImageCache.total_bytes=0
+
+
+    def statistics(self):
+        return ('hits %d, misses %d, evictions %d, %d images, %.1f of %.1f MB'
+                % (ImageCache.hits,ImageCache.misses,ImageCache.evictions,len(ImageCache.images),
+                   ImageCache.total_bytes/1048576.0,ImageCache.budget/1048576.0))
+
+
+    # log the statistics, called by PiPresents on exit
+    def report(self):
+        self.mon.log(self,'Image cache ' + self.statistics())
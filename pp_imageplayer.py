@@ -3,10 +3,14 @@
 
 import os
 from Tkinter import CENTER,NW
-from PIL import Image
 from PIL import ImageTk
-from pp_utils import StopWatch, parse_rectangle,calculate_text_position
+from pp_utils import StopWatch,calculate_text_position
 from pp_player import Player
+from pp_imagecache import ImageCache
+from pp_decodepool import DecodePool, prepare_image, image_spec, parse_image_window
+from pp_prescale import PreScale
+from pp_framestore import FrameStore
+
 
 class ImagePlayer(Player):
 
@@ -75,12 +79,16 @@ class ImagePlayer(Player):
 
         self.track_image_obj=None
         self.tk_img=None
+        self.image_cache=ImageCache()
+        self.decode_pool=DecodePool()
+        self.decoded_image=None
+        self.frame=None
         # krt 28/1/2016
         self.paused=False
         self.pause_text_obj=None
 
         # initialise the state machine
-        self.play_state='initialised'    
+        self.set_play_state('initialised')    
             
             
     # LOAD - loads the images and text
@@ -98,7 +106,7 @@ class ImagePlayer(Player):
         status,message,self.command,self.has_coords,self.window_x1,self.window_y1,self.window_x2,self.window_y2,self.image_filter=self.parse_window(self.image_window)
         if status  == 'error':
             self.mon.err(self,'image window error, '+message+ ': '+self.image_window)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             self.loaded_callback('error','image window error, '+message+ ': '+self.image_window)
             return
  
@@ -107,20 +115,51 @@ class ImagePlayer(Player):
             status,message=self.load_plugin()
             if status == 'error':
                 self.mon.err(self,message)
-                self.play_state='load-failed'
+                self.set_play_state('load-failed')
                 self.loaded_callback('error',message)
                 return
 
 
+        # decode and resize the image in the decode pool, then load
+        self.enable_menu=enable_menu
+        spec=image_spec(self.track,self.image_window,self.image_rotate,self.show_canvas_width,self.show_canvas_height)
+        # a frame in the frame store made by pp_prescale.py --raw needs no decoding
+        self.frame=FrameStore().frame(PreScale().cache_name(spec),self.track)
+        if self.frame is not None:
+            self.spec=spec
+            self.load_content()
+            self.frame=None
+            return
+        # otherwise use the pre-scaled copy made by pp_prescale.py if it is up to date
+        self.spec=PreScale().prefer(spec)
+        if os.path.exists(self.track) is True:
+            self.set_play_state('loading')
+            self.decode_pool.decode(self.spec,self.image_decoded)
+        else:
+            # load_track_content reports the error
+            self.load_content()
+
+
+    def image_decoded(self,pil_image,message):
+        # ignore it if unloaded while decoding
+        if self.play_state != 'loading':
+            return
+        # keep the image in case it is too big for the cache
+        self.decoded_image=pil_image
+        self.load_content()
+        self.decoded_image=None
+
+
+    def load_content(self):
         # load the images and text
-        status,message=Player.load_x_content(self,enable_menu)
+        status,message=Player.load_x_content(self,self.enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             self.loaded_callback('error',message)
             return
         else:
-            self.play_state='loaded'
+            self.set_play_state('loaded')
             if self.loaded_callback is not None:
                 self.loaded_callback('loaded','image track loaded')
 
@@ -130,7 +169,7 @@ class ImagePlayer(Player):
         self.mon.trace(self,'')        
         # nothing to do for imageplayer
         self.mon.log(self,">unload received from show Id: "+ str(self.show_id))
-        self.play_state='unloaded'
+        self.set_play_state('unloaded')
      
             
 
@@ -145,9 +184,7 @@ class ImagePlayer(Player):
         self.mon.trace(self,'')
         
         # init state and signals  
-        self.tick = 100 # tick time for image display (milliseconds)
-        self.dwell = 10*self.duration
-        self.dwell_counter=0
+        self.dwell = 1000*self.duration   # milliseconds, 0 is for ever
         self.quit_signal=False
         self.paused=False
         self.pause_text_obj=None
@@ -165,8 +202,9 @@ class ImagePlayer(Player):
         self.closed_callback=closed_callback
         self.mon.log(self,">close received from show Id: "+ str(self.show_id))
         if self.tick_timer!= None:
-            self.canvas.after_cancel(self.tick_timer)
-        self.play_state='closed'
+            self.scheduler.cancel(self.tick_timer)
+            self.tick_timer=None
+        self.set_play_state('closed')
         if self.closed_callback is not None:
             self.closed_callback('normal','imageplayer closed')
 
@@ -185,18 +223,44 @@ class ImagePlayer(Player):
       
     def pause(self):
         if not self.paused:
-            self.paused = True
+            self.pause_on()
         else:
-            self.paused=False
+            self.pause_off()
 
+    # pausing stops the dwell timer and remembers how much of the dwell is left
     def pause_on(self):
+        if self.paused is True:
+            return
         self.paused = True
+        if self.play_state != 'showing' or self.quit_signal is True:
+            return
+        if self.tick_timer is not None:
+            self.dwell=self.scheduler.remaining(self.tick_timer)
+            self.scheduler.cancel(self.tick_timer)
+            self.tick_timer=None
+        self.show_pause_text()
 
     def pause_off(self):
+        if self.paused is False:
+            return
         self.paused = False
+        if self.play_state != 'showing' or self.quit_signal is True:
+            return
+        self.hide_pause_text()
+        # there is only ever one dwell timer
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        if self.dwell != 0:
+            self.tick_timer=self.scheduler.after(self.dwell, self.end_dwell)
 
     def stop(self):
+        if self.play_state != 'showing' or self.quit_signal is True:
+            return
+        self.mon.log(self,"quit received")
+        # quitting, so pause_off and a second stop leave the timer alone
         self.quit_signal=True
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=self.scheduler.after(0, self.end_dwell)
         
 
 
@@ -205,45 +269,37 @@ class ImagePlayer(Player):
 # Sequencing
 # ********************************************
 
+    # the dwell is a single deadline, paused by cancelling it and resumed with the time that was left
     def start_dwell(self):
-        self.play_state='showing'
-        self.tick_timer=self.canvas.after(self.tick, self.do_dwell)
+        self.set_play_state('showing')
+        if self.dwell != 0:
+            self.tick_timer=self.scheduler.after(self.dwell, self.end_dwell)
 
         
-    def do_dwell(self):
-        if self.quit_signal is  True:
-            self.mon.log(self,"quit received")
-            if self.finished_callback is not None:
-                self.finished_callback('pause_at_end','user quit or duration exceeded')
-                # use finish so that the show will call close
-        else:
-            if self.paused is False:
-                self.dwell_counter=self.dwell_counter+1
-
-            # one time flipping of pause text
-            pause_text= self.track_params['pause-text']
-            if self.paused is True and self.pause_text_obj is None:
-                x,y,anchor,justify=calculate_text_position(self.track_params['pause-text-x'],self.track_params['pause-text-y'],
-                                             self.show_canvas_x1,self.show_canvas_y1,
-                                             self.show_canvas_centre_x,self.show_canvas_centre_y,
-                                             self.show_canvas_x2,self.show_canvas_y2,self.track_params['pause-text-justify'])                
-                self.pause_text_obj=self.canvas.create_text(x,y, anchor=anchor,justify=justify,
-                                                        text=pause_text,
-                                                        fill=self.track_params['pause-text-colour'],
-                                                        font=self.track_params['pause-text-font'])
-                self.canvas.update_idletasks( )
-                
-            if self.paused is False and self.pause_text_obj is not None:
-                self.canvas.delete(self.pause_text_obj)
-                self.pause_text_obj=None
-                self.canvas.update_idletasks( )
-
-            if self.dwell != 0 and self.dwell_counter == self.dwell:
-                if self.finished_callback is not None:
-                    self.finished_callback('pause_at_end','user quit or duration exceeded')
-                    # use finish so that the show will call close
-            else:
-                self.tick_timer=self.canvas.after(self.tick, self.do_dwell)
+    def end_dwell(self):
+        self.tick_timer=None
+        self.quit_signal=True
+        self.track_finished('pause_at_end','user quit or duration exceeded')
+            # use finish so that the show will call close
+
+
+    def show_pause_text(self):
+        if self.pause_text_obj is None:
+            x,y,anchor,justify=calculate_text_position(self.track_params['pause-text-x'],self.track_params['pause-text-y'],
+                                         self.show_canvas_x1,self.show_canvas_y1,
+                                         self.show_canvas_centre_x,self.show_canvas_centre_y,
+                                         self.show_canvas_x2,self.show_canvas_y2,self.track_params['pause-text-justify'])                
+            self.pause_text_obj=self.canvas.create_text(x,y, anchor=anchor,justify=justify,
+                                                    text=self.track_params['pause-text'],
+                                                    fill=self.track_params['pause-text-colour'],
+                                                    font=self.track_params['pause-text-font'])
+            self.canvas.update_idletasks( )
+
+    def hide_pause_text(self):
+        if self.pause_text_obj is not None:
+            self.canvas.delete(self.pause_text_obj)
+            self.pause_text_obj=None
+            self.canvas.update_idletasks( )
 
 
 
@@ -254,117 +310,60 @@ class ImagePlayer(Player):
     # called from Player, load_x_content      
             
     def load_track_content(self):
-        ppil_image=None  # Keep landscape happy
-        
         # get the track to be displayed
-        if os.path.exists(self.track) is True:
+        if os.path.exists(self.track) is False:
+            self.tk_img=None
+            self.track_image_obj=None
+            return 'error','Track file not found '+ self.track
+
+        # work out the window the image is displayed in
+        if self.command == 'original':
+            if self.has_coords is False:
+                # display image at its original size in centre
+                x=self.show_canvas_centre_x+self.show_canvas_x1
+                y=self.show_canvas_centre_y+self.show_canvas_y1
+                anchor=CENTER
+            else:
+                # display image at its original size at x1,y1
+                x=self.window_x1+self.show_canvas_x1
+                y=self.window_y1+self.show_canvas_y1
+                anchor=NW
+        else:
+            # fit, shrink or warp to the window or screen
+            if self.has_coords is True:
+                window_centre_x=(self.window_x2+self.window_x1)/2
+                window_centre_y= (self.window_y2+self.window_y1)/2
+            else:
+                window_centre_x=self.show_canvas_centre_x
+                window_centre_y=self.show_canvas_centre_y
+            x=window_centre_x + self.show_canvas_x1
+            y=window_centre_y + self.show_canvas_y1
+            anchor=CENTER
+
+        # normally the decode pool has put the image in the cache already
+        if self.frame is not None:
+            ppil_image=self.frame
+        else:
+            ppil_image=self.image_cache.get(self.image_cache.make_key(*self.spec))
+        if ppil_image is None:
+            ppil_image=self.decoded_image
+        if ppil_image is None:
             try:
-                ppil_image=Image.open(self.track)
+                ppil_image,report=prepare_image(*self.spec)
             except:
                 ppil_image=None
                 self.tk_img=None
                 self.track_image_obj=None
-                return 'error','Not a recognised image format '+ self.track                
-        else:
-            ppil_image=None
-            self.tk_img=None
-            self.track_image_obj=None
-            return 'error','Track file not found '+ self.track
-
-        # display track image
-        if ppil_image is not None:
-            #rotate the image
-            # print self.image_width,self.image_height
-            if self.image_rotate!=0:
-                ppil_image=ppil_image.rotate(self.image_rotate,expand=True)      
-            self.image_width,self.image_height=ppil_image.size
-            # print self.image_width,self.image_height
+                return 'error','Not a recognised image format '+ self.track
+            self.mon.log(self,'Decoded ' + report)
+            self.image_cache.put(self.image_cache.make_key(*self.spec),ppil_image)
 
-            
-            if self.command == 'original':
-                # display image at its original size
-                if self.has_coords is False:
-                    
-                    # load and display the unmodified image in centre
-                    self.tk_img=ImageTk.PhotoImage(ppil_image)
-                    del ppil_image
-                    self.track_image_obj = self.canvas.create_image(self.show_canvas_centre_x+self.show_canvas_x1,
-                                                                    self.show_canvas_centre_y+self.show_canvas_y1,
-                                                                    image=self.tk_img, anchor=CENTER)
-                else:
-                    # load and display the unmodified image at x1,y1
-                    self.tk_img=ImageTk.PhotoImage(ppil_image)
-                    del ppil_image
-                    self.track_image_obj = self.canvas.create_image(self.window_x1+self.show_canvas_x1,
-                                                                    self.window_y1+self.show_canvas_y1,
-                                                                    image=self.tk_img, anchor=NW)
-
-
-            elif self.command in ('fit','shrink'):
-                # shrink fit the window or screen preserving aspect
-                if self.has_coords is True:
-                    window_width=self.window_x2 - self.window_x1
-                    window_height=self.window_y2 - self.window_y1
-                    window_centre_x=(self.window_x2+self.window_x1)/2
-                    window_centre_y= (self.window_y2+self.window_y1)/2
-                else:
-                    window_width=self.show_canvas_width
-                    window_height=self.show_canvas_height
-                    window_centre_x=self.show_canvas_centre_x
-                    window_centre_y=self.show_canvas_centre_y
-                if (self.image_width > window_width or self.image_height > window_height and self.command == 'fit') or (self.command == 'shrink') :
-                    # print 'show canvas',self.show_canvas_x1,self.show_canvas_y1,self.show_canvas_x2,self.show_canvas_y2
-                    # print 'canvas width/height/centre',self.show_canvas_width,self.show_canvas_height,self.show_canvas_centre_x,self.show_canvas_centre_y
-                    # print 'window dimensions/centre',window_width,window_height,window_centre_x,window_centre_y
-                    # print
-                    # original image is larger or , shrink it to fit the screen preserving aspect
-                    ppil_image.thumbnail((int(window_width),int(window_height)),eval(self.image_filter))                 
-                    self.tk_img=ImageTk.PhotoImage(ppil_image)
-                    del ppil_image
-                    self.track_image_obj = self.canvas.create_image(window_centre_x + self.show_canvas_x1,
-                                                                    window_centre_y + self.show_canvas_y1,
-                                                                    image=self.tk_img, anchor=CENTER)
-                else:
-                    # fitting and original image is smaller, expand it to fit the screen preserving aspect
-                    prop_x = float(window_width) / self.image_width
-                    prop_y = float(window_height) / self.image_height
-                    if prop_x > prop_y:
-                        prop=prop_y
-                    else:
-                        prop=prop_x
-                        
-                    increased_width=int(self.image_width * prop)
-                    increased_height=int(self.image_height * prop)
-                    # print 'result',prop, increased_width,increased_height
-                    ppil_image=ppil_image.resize((int(increased_width), int(increased_height)),eval(self.image_filter))
-                    self.tk_img=ImageTk.PhotoImage(ppil_image)
-                    del ppil_image
-                    self.track_image_obj = self.canvas.create_image(window_centre_x + self.show_canvas_x1,
-                                                                    window_centre_y + self.show_canvas_y1,
-                                                                    image=self.tk_img, anchor=CENTER)                                                 
-
-            elif self.command in ('warp'):
-                # resize to window or screen without preserving aspect
-                if self.has_coords is True:
-                    window_width=self.window_x2 - self.window_x1
-                    window_height=self.window_y2 - self.window_y1
-                    window_centre_x=(self.window_x2+self.window_x1)/2
-                    window_centre_y= (self.window_y2+self.window_y1)/2
-                else:
-                    window_width=self.show_canvas_width
-                    window_height=self.show_canvas_height
-                    window_centre_x=self.show_canvas_centre_x
-                    window_centre_y=self.show_canvas_centre_y
-
-                # print 'window',window_width,window_height,window_centre_x,window_centre_y,self.show_canvas_x1,self.show_canvas_y1,'\n'
-                ppil_image=ppil_image.resize((int(window_width), int(window_height)),eval(self.image_filter))
-                self.tk_img=ImageTk.PhotoImage(ppil_image)
-                del ppil_image
-                self.track_image_obj = self.canvas.create_image(window_centre_x+ self.show_canvas_x1,
-                                                                window_centre_y+ self.show_canvas_y1,
-                                                               image=self.tk_img, anchor=CENTER)
+        self.tk_img=ImageTk.PhotoImage(ppil_image)
+        del ppil_image
+        self.track_image_obj = self.canvas.create_image(x,y,image=self.tk_img, anchor=anchor)
         self.canvas.itemconfig(self.track_image_obj,state='hidden')
-        return 'normal','track content loaded';
+        return 'normal','track content loaded'
+
 
     def show_track_content(self):
         self.canvas.itemconfig(self.track_image_obj,state='normal')
@@ -381,82 +380,4 @@ class ImagePlayer(Player):
         
 
     def parse_window(self,line):
-        
-        fields = line.split()
-        # check there is a command field
-        if len(fields) < 1:
-            return 'error','No command field','',False,0,0,0,0,''
-
-            
-        # deal with original whch has 0 or 2 arguments
-        image_filter=''
-        if fields[0] == 'original':
-            if len(fields) not in (1,3):
-                return 'error','Original has wrong number of arguments','',False,0,0,0,0,''       
-            # deal with window coordinates    
-            if len(fields)  ==  3:
-                # window is specified
-                if not (fields[1].isdigit() and fields[2].isdigit()):
-                    return 'error','coordinates are not numbers','',False,0,0,0,0,''
-                has_window=True
-                return 'normal','',fields[0],has_window,float(fields[1]),float(fields[2]),0,0,image_filter
-            else:
-                # no window
-                has_window=False 
-                return 'normal','',fields[0],has_window,0,0,0,0,image_filter
-
-
-
-        # deal with remainder which has 1, 2, 5 or  6arguments
-        # check basic syntax
-        if  fields[0] not in ('shrink','fit','warp'):
-            return 'error','illegal command'+fields[0],'',False,0,0,0,0,'' 
-        if len(fields) not in (1,2,3,5,6):
-            return 'error','wrong number of fields' + str(len(fields)),'',False,0,0,0,0,''
-        if len(fields) == 6 and fields[5] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS'):
-            return 'error','wrong filter or params'+ fields[5],'',False,0,0,0,0,''
-        if len(fields) == 2 and (fields[1] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS') and '*' not in fields[1]):
-            return 'error','wrong filter or params'+ fields[1],'',False,0,0,0,0,''
-        if len(fields) == 3 and fields[2] not in ('NEAREST','BILINEAR','BICUBIC','ANTIALIAS'):
-            return 'error','wrong filter or params'+ fields[2],'',False,0,0,0,0,''
-
-
-        # deal with no window coordinates and no
-        if len(fields) == 1:
-            has_window=False           
-            return 'normal','',fields[0],has_window,0,0,0,0,'Image.NEAREST'
-   
-        # deal with window coordinates in +* format with optional filter
-        if len(fields) in (2,3) and '*' in fields[1]:
-            status,message,x1,y1,x2,y2 = parse_rectangle(fields[1])
-            if status=='error':
-                return 'error',message,'',False,0,0,0,0,''
-            else:
-                has_window=True
-                if len(fields) == 3:
-                    image_filter='Image.'+fields[2]
-                else:
-                    image_filter='Image.NEAREST'                
-                return 'normal','',fields[0],has_window,x1,y1,x2,y2,image_filter
-            
-        if len(fields) in (5,6):
-            # window is specified in x1 y1 x2 y2
-            if not (fields[1].isdigit() and fields[2].isdigit() and fields[3].isdigit() and fields[4].isdigit()):
-                return 'error','coords are not numbers','',False,0,0,0,0,''
-            has_window=True
-            if len(fields) == 6:
-                image_filter='Image.'+fields[5]
-            else:
-                image_filter='Image.NEAREST'
-            return 'normal','',fields[0],has_window,float(fields[1]),float(fields[2]),float(fields[3]),float(fields[4]),image_filter
-
-        else:
-            # no window
-            has_window=False
-            if len(fields) == 2:
-                image_filter='Image.'+fields[1]
-            else:
-                image_filter='Image.NEAREST'
-            return 'normal','',fields[0],has_window,0,0,0,0,image_filter
-
-    
+        return parse_image_window(line)
@@ -0,0 +1,60 @@
+from pp_scheduler import Scheduler
+
+
+class LifecycleEvents(object):
+    """
+    completion events for the lifecycle of a player or a media driver.
+    Instead of polling play_state or the driver's signal flags a caller registers a callback
+    for an event and is called back on the Tk thread as soon as the event happens.
+
+    Events used by the players and drivers:
+        loaded - track is loaded (or has failed to load), arg is the play_state
+        first-frame - first frame is ready or on the screen
+        finished - track has come to its end, arg is the reason
+        closed - player or driver has released everything, arg is the play_state or reason
+
+    An event that has already happened calls a newly registered callback straight away,
+    like a completed future, so there is no race between starting something and waiting for it.
+    An event can happen more than once (e.g. finished with pause_at_end then nice_day),
+    waiting callbacks are one shot and get the args of the first occurrence after they registered.
+
+    fire() may be called from any thread, callbacks always run on the Tk thread.
+    """
+
+    def __init__(self):
+        self.scheduler=Scheduler()
+        self.happened={}    # event -> args of the last time it happened
+        self.waiting={}     # event -> list of callbacks waiting for it
+
+
+    # call callback(*args) once event has happened
+    def when(self,event,callback):
+        if event in self.happened:
+            self.scheduler.after(0,callback,*self.happened[event])
+        else:
+            self.waiting.setdefault(event,[]).append(callback)
+
+
+    # forget callbacks waiting for an event, all callbacks if event is None
+    def cancel(self,event=None):
+        if event is None:
+            self.waiting={}
+        elif event in self.waiting:
+            del self.waiting[event]
+
+
+    # has the event happened
+    def has_happened(self,event):
+        return event in self.happened
+
+
+    # thread safe, the event is recorded and the callbacks run on the Tk thread
+    def fire(self,event,*args):
+        self.scheduler.post(self._do_fire,event,args)
+
+
+    def _do_fire(self,event,args):
+        self.happened[event]=args
+        callbacks=self.waiting.pop(event,[])
+        for callback in callbacks:
+            callback(*args)
@@ -1,12 +1,10 @@
 import os
 import json
 import copy
-import random
-import ConfigParser
-import time
 
-from pp_definitions import PPdefinitions
 from pp_utils import Monitor
+from pp_livewatcher import LiveWatcher
+from pp_shufflebag import ShuffleBag
 
 class LiveList(object):
 
@@ -17,6 +15,14 @@ class LiveList(object):
         self._tracks=[]
         self._num_tracks=0
         self.last_num_tracks=-1
+        # shuffle bag of track locations, keeps its permutation when the livelist changes
+        self._bag=ShuffleBag()
+        self._index_of_location={}
+        # generation of the live tracks directories that _tracks and new_livelist were made from
+        self.generation=-1
+        self.new_generation=-1
+        self.new_livelist=[]
+        self.watcher=None
         
 
 # ***************************
@@ -79,6 +85,12 @@ class LiveList(object):
     def live_tracks(self,dir1,dir2):
         self.pp_live_dir1=dir1
         self.pp_live_dir2=dir2
+        # one watcher for the directories, carries on between runs of the show
+        if (dir1,dir2) not in LiveWatcher.watchers:
+            watcher=LiveWatcher()
+            watcher.start([dir1,dir2])
+            LiveWatcher.watchers[(dir1,dir2)]=watcher
+        self.watcher=LiveWatcher.watchers[(dir1,dir2)]
 
     def length(self):
         return self._num_tracks
@@ -104,38 +116,7 @@ class LiveList(object):
             self.select(self._selected_track_index)
             return True
         else:
-            cand=random.randint(0,self._num_tracks-1)
-            # print '\nnext - initial cand',cand
-            if len(self.played_tracks)==self._num_tracks:
-                # all played so start again
-                # stop same track being played twice
-                if self.played_tracks[-1]==cand:
-                    cand+=1
-                    if cand == self._num_tracks:
-                        cand=0
-                self.played_tracks=[cand]
-                self._selected_track_index = cand
-                # print 'all played',self._selected_track_index
-                # print self.played_tracks
-                self.select(self._selected_track_index)
-                return True
-            else:
-                while True:
-                    # print 'trying',cand
-                    if cand not in self.played_tracks:
-                        self.played_tracks.append(cand)
-                        self._selected_track_index = cand
-                        # print 'add to played',self._selected_track_index
-                        # print self.played_tracks
-                        self.select(self._selected_track_index)
-                        return True
-                    else:
-                        cand+=1
-                        if cand == self._num_tracks:
-                            cand=0
-                        # print 'increment candidate to ',cand
-
-
+            return self._shuffled(self._bag.next())
 
 
     def previous(self,sequence):
@@ -147,36 +128,23 @@ class LiveList(object):
             self.select(self._selected_track_index)
             return True            
         else:
-            cand=random.randint(0,self._num_tracks-1)
-            # print '\nprevious - initial cand',cand
-            if len(self.played_tracks)==self._num_tracks:
-                # all played so start again
-                # stop same track being played twice
-                if self.played_tracks[-1]==cand:
-                    cand+=1
-                    if cand == self._num_tracks:
-                        cand=0
-                self.played_tracks=[cand]
-                self._selected_track_index = cand
-                # print 'all played',self._selected_track_index
-                # print self.played_tracks
-                self.select(self._selected_track_index)
-                return True
-            else:
-                while True:
-                    # print 'trying',cand
-                    if cand not in self.played_tracks:
-                        self.played_tracks.append(cand)
-                        self._selected_track_index = cand
-                        # print 'add to played',self._selected_track_index
-                        # print self.played_tracks
-                        self.select(self._selected_track_index)
-                        return True
-                    else:
-                        cand+=1
-                        if cand == self._num_tracks:
-                            cand=0
-                        # print 'increment candidate to ',cand
+            return self._shuffled(self._bag.previous())
+
+
+    # the next count tracks that next() will select, the selection is not changed
+    def upcoming(self,count,sequence):
+        if self._num_tracks==0:
+            return []
+        if sequence!='ordered':
+            return [self._tracks[self._index_of_location[location]] for location in self._bag.peek(count)]
+        return [self._tracks[(self._selected_track_index+1+i) % self._num_tracks] for i in range(min(count,self._num_tracks))]
+
+
+    def _shuffled(self,location):
+        if location is None:
+            return False
+        self.select(self._index_of_location[location])
+        return True
 
         
     def start(self):
@@ -184,7 +152,6 @@ class LiveList(object):
             return False
         else:
             self._selected_track_index=-1
-            self.played_tracks=[]
             self.next(self.sequence)
             return True
 
@@ -193,7 +160,6 @@ class LiveList(object):
             return False
         else:
             self._selected_track_index=self._num_tracks-1
-            self.played_tracks=[]
             self.next(self.sequence)
             return True
 
@@ -230,7 +196,7 @@ class LiveList(object):
 # ***************************       
 
     def livelist_changed(self):
-        if  self.new_livelist != self._tracks:
+        if  self.new_generation != self.generation:
             return True
         else:
             return False
@@ -244,38 +210,18 @@ class LiveList(object):
         # will have only anonymous tracks
         self._tracks=copy.deepcopy(self.new_livelist)
         self._num_tracks=len(self._tracks)
+        self.generation=self.new_generation
         self._selected_track_index=-1
+        self._index_of_location={}
+        for index,track in enumerate(self._tracks):
+            self._index_of_location[track['location']]=index
+        self._bag.set_members([track['location'] for track in self._tracks])
         return True
 
 
+    # the live tracks directories are followed by the watcher so this costs nothing unless they have changed
     def create_new_livelist(self):
-        self.new_livelist=[]
-        if os.path.exists(self.pp_live_dir1):
-            for track_file in os.listdir(self.pp_live_dir1):
-                track_file = self.pp_live_dir1 + os.sep + track_file
-                (root_name,leaf)=os.path.split(track_file)
-                if leaf[0] == '.':
-                    continue
-                else:
-                    (root_file,ext_file)= os.path.splitext(track_file)
-                    if (ext_file.lower() in PPdefinitions.IMAGE_FILES+PPdefinitions.VIDEO_FILES+PPdefinitions.AUDIO_FILES+PPdefinitions.WEB_FILES) or (ext_file.lower()=='.cfg'):
-                        self.livelist_add_track(track_file)
-                        
-        if os.path.exists(self.pp_live_dir2):
-            for track_file in os.listdir(self.pp_live_dir2):
-                track_file = self.pp_live_dir2 + os.sep + track_file
-                (root_name,leaf)=os.path.split(track_file)
-                if leaf[0] == '.':
-                    continue
-                else:
-                    (root_file,ext_file)= os.path.splitext(track_file)
-                    if (ext_file.lower() in PPdefinitions.IMAGE_FILES+PPdefinitions.VIDEO_FILES+PPdefinitions.AUDIO_FILES+PPdefinitions.WEB_FILES) or (ext_file.lower()=='.cfg'):
-                        self.livelist_add_track(track_file)
-                        
-        self.new_livelist= sorted(self.new_livelist, key= lambda track: os.path.basename(track['location']).lower())
-        # self.print_livelist()
-
-
+        self.new_generation,self.new_livelist=self.watcher.snapshot()
 
 
     def print_livelist(self):
@@ -283,48 +229,3 @@ class LiveList(object):
         for it in self.new_livelist:
             print 'type: ', it['type'], 'loc: ',it['location'],'\nplugin cfg: ', it['plugin']
         print ''
-
-
-        
-    def livelist_add_track(self,afile):
-        (root,title)=os.path.split(afile)
-        (root_plus,ext)= os.path.splitext(afile)
-        if ext.lower() in PPdefinitions.IMAGE_FILES:
-            self.livelist_new_track(PPdefinitions.new_tracks['image'],{'title':title,'track-ref':'','location':afile})
-        if ext.lower() in PPdefinitions.VIDEO_FILES:
-            self.livelist_new_track(PPdefinitions.new_tracks['video'],{'title':title,'track-ref':'','location':afile})
-        if ext.lower() in PPdefinitions.AUDIO_FILES:
-            self.livelist_new_track(PPdefinitions.new_tracks['audio'],{'title':title,'track-ref':'','location':afile})
-        if ext.lower() in PPdefinitions.WEB_FILES:
-            self.livelist_new_track(PPdefinitions.new_tracks['web'],{'title':title,'track-ref':'','location':afile})
-        if ext.lower()=='.cfg':
-            self.livelist_new_plugin(afile,title)
-           
-
-    def livelist_new_plugin(self,plugin_cfg,title):
-        # read the file which is a plugin cfg file into a dictionary
-        self.plugin_config = ConfigParser.ConfigParser()
-        self.plugin_config.read(plugin_cfg)
-        self.plugin_params =  dict(self.plugin_config.items('plugin'))
-        # create a new livelist entry of a type specified in the config file with plugin
-        # miss entry if type is not  config file
-        if 'type' in self.plugin_params:
-            self.livelist_new_track(PPdefinitions.new_tracks[self.plugin_params['type']],{'title':title,'track-ref':'','plugin':plugin_cfg,'location':plugin_cfg})        
-
-        
-    def livelist_new_track(self,fields,values):
-        new_track=fields
-        self.new_livelist.append(copy.deepcopy(new_track))
-        last = len(self.new_livelist)-1
-        self.new_livelist[last].update(values)        
-    
-
-
-
-   
-   
-
-
-
-
-
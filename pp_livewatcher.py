@@ -0,0 +1,333 @@
+import os
+import sys
+import time
+import copy
+import struct
+import select
+import threading
+import ConfigParser
+import ctypes
+import ctypes.util
+
+from pp_definitions import PPdefinitions
+from pp_utils import Monitor
+
+
+class LiveWatcher(object):
+    """
+    keeps the tracks in the live tracks directories up to date for LiveList so the directories
+    are not rescanned for every cycle of a liveshow.
+    The directories are scanned once when the watcher starts, after that a thread follows the changes with inotify.
+    If inotify is not available the thread scans the directories every poll_interval seconds instead.
+
+    A file is admitted to the list only when it has been completely written:
+        inotify - when it is closed after writing or renamed into the directory
+        polling - when its size and modification time are the same in two scans running
+
+    Every change to the list increments generation so LiveList can tell the list has changed with an integer compare.
+    A directory that disappears (e.g. USB stick removed) loses its tracks and is watched again when it comes back.
+
+    Usage:
+        watcher=LiveWatcher()
+        watcher.start([dir1,dir2])
+        generation,tracks=watcher.snapshot()
+    """
+
+# inotify constants from <sys/inotify.h>
+    IN_CLOSE_WRITE=0x00000008
+    IN_MOVED_FROM=0x00000040
+    IN_MOVED_TO=0x00000080
+    IN_DELETE=0x00000200
+    IN_DELETE_SELF=0x00000400
+    IN_MOVE_SELF=0x00000800
+    IN_UNMOUNT=0x00002000
+    IN_Q_OVERFLOW=0x00004000
+    IN_IGNORED=0x00008000
+    IN_ONLYDIR=0x01000000
+    IN_ISDIR=0x40000000
+    WATCH_MASK=IN_CLOSE_WRITE|IN_MOVED_FROM|IN_MOVED_TO|IN_DELETE|IN_DELETE_SELF|IN_MOVE_SELF|IN_ONLYDIR
+    EVENT_HEADER='iIII'     # wd, mask, cookie, length of name
+    EVENT_HEADER_SIZE=struct.calcsize(EVENT_HEADER)
+
+# CLASS VARIABLES (LiveWatcher.)
+    watchers={}             # (dir1,dir2) -> watcher, shared by every show that uses the same directories
+    poll_interval=2.0       # seconds between scans when polling, also how often a missing directory is looked for
+    use_inotify=True
+
+
+    def __init__(self):
+        self.mon=Monitor()
+        self.lock=threading.Lock()
+        self.live_dirs=[]
+        self.generation=0
+        self.tracks={}              # path -> track dictionary of the admitted files
+        self.dir_of={}              # path -> live directory it is in
+        self.signatures={}          # path -> (size,mtime) when it was admitted
+        self.pending={}             # polling - path -> (size,mtime) of a file seen once but not yet admitted
+        self.sorted_tracks=[]
+        self.sorted_generation=-1
+        self.running=False
+        self.thread=None
+        self.libc=None
+        self.inotify_fd=None
+        self.wd_dirs={}             # inotify watch descriptor -> live directory
+        self.watched=set()          # live directories with a watch
+
+
+    # scans the directories and starts following them
+    def start(self,live_dirs):
+        self.live_dirs=[live_dir for live_dir in live_dirs if live_dir != '']
+        if LiveWatcher.use_inotify is True:
+            self._open_inotify()
+        # watches are added before the first scan so nothing written during it is missed
+        for live_dir in self.live_dirs:
+            if self.inotify_fd is not None:
+                self._add_watch(live_dir)
+            self._scan_dir(live_dir,False)
+        self.running=True
+        self.thread=threading.Thread(target=self._run)
+        self.thread.daemon=True
+        self.thread.start()
+        if self.inotify_fd is not None:
+            self.mon.log(self,'Watching live tracks directories with inotify: ' + ', '.join(self.live_dirs))
+        else:
+            self.mon.log(self,'Polling live tracks directories every ' + str(LiveWatcher.poll_interval) + ' secs: ' + ', '.join(self.live_dirs))
+
+
+    # stop this watcher, the thread closes inotify as it exits
+    def stop(self):
+        self.running=False
+
+
+    # called by PiPresents on exit, stops all the watchers
+    def terminate(self):
+        for watcher in LiveWatcher.watchers.values():
+            watcher.stop()
+        LiveWatcher.watchers={}
+
+
+    # returns the generation and the tracks sorted by file name, the list must not be altered
+    def snapshot(self):
+        self.lock.acquire()
+        try:
+            if self.sorted_generation != self.generation:
+                self.sorted_tracks= sorted(self.tracks.values(), key= lambda track: os.path.basename(track['location']).lower())
+                self.sorted_generation=self.generation
+            return self.generation,self.sorted_tracks
+        finally:
+            self.lock.release()
+
+
+# ***************************
+# Following the directories
+# ***************************
+
+    def _run(self):
+        while self.running is True:
+            if self.inotify_fd is not None:
+                # look for directories that have appeared since the last time round
+                for live_dir in self.live_dirs:
+                    if live_dir not in self.watched and self._add_watch(live_dir) is True:
+                        self.mon.log(self,'Live tracks directory is back: ' + live_dir)
+                        self._scan_dir(live_dir,False)
+                try:
+                    readable,writable,errors=select.select([self.inotify_fd],[],[],LiveWatcher.poll_interval)
+                except select.error:
+                    continue
+                if len(readable)>0:
+                    self._read_events()
+            else:
+                for live_dir in self.live_dirs:
+                    self._scan_dir(live_dir,True)
+                time.sleep(LiveWatcher.poll_interval)
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd=None
+
+
+    # compare the directory with the list, wait_for_stable is used when polling to admit only files that are not changing
+    def _scan_dir(self,live_dir,wait_for_stable):
+        found=set()
+        try:
+            names=os.listdir(live_dir)
+        except OSError:
+            names=[]
+        for name in names:
+            if self._wanted(name) is False:
+                continue
+            path=live_dir + os.sep + name
+            signature=self._signature(path)
+            if signature is None:
+                continue
+            found.add(path)
+            if self.signatures.get(path) == signature:
+                continue
+            if wait_for_stable is True and self.pending.get(path) != signature:
+                # new or still being written, admit it if it is the same next time
+                self.pending[path]=signature
+                continue
+            self.pending.pop(path,None)
+            self._admit(path,live_dir,signature)
+        for path in self.pending.keys():
+            if path not in found and path.startswith(live_dir + os.sep):
+                del self.pending[path]
+        for path in [path for path in self.tracks if self.dir_of[path] == live_dir and path not in found]:
+            self._remove(path)
+
+
+    def _wanted(self,name):
+        if name[0] == '.':
+            return False
+        ext=os.path.splitext(name)[1].lower()
+        return ext in PPdefinitions.IMAGE_FILES+PPdefinitions.VIDEO_FILES+PPdefinitions.AUDIO_FILES+PPdefinitions.WEB_FILES or ext == '.cfg'
+
+
+    def _signature(self,path):
+        try:
+            stat=os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size,stat.st_mtime)
+
+
+    def _admit(self,path,live_dir,signature):
+        track=self._make_track(path)
+        if track is None:
+            self._remove(path)
+            return
+        self.lock.acquire()
+        self.tracks[path]=track
+        self.dir_of[path]=live_dir
+        self.signatures[path]=signature
+        self.generation+=1
+        self.lock.release()
+
+
+    def _remove(self,path):
+        if path not in self.tracks:
+            return
+        self.lock.acquire()
+        del self.tracks[path]
+        del self.dir_of[path]
+        del self.signatures[path]
+        self.generation+=1
+        self.lock.release()
+
+
+# ***************************
+# inotify
+# ***************************
+
+    def _open_inotify(self):
+        try:
+            libc=ctypes.CDLL(ctypes.util.find_library('c'),use_errno=True)
+            fd=libc.inotify_init()
+        except (OSError,AttributeError):
+            fd=-1
+        if fd < 0:
+            self.mon.warn(self,'inotify is not available, polling live tracks directories')
+            return
+        self.libc=libc
+        self.inotify_fd=fd
+
+
+    def _add_watch(self,live_dir):
+        if isinstance(live_dir,unicode):
+            path=live_dir.encode(sys.getfilesystemencoding() or 'utf-8')
+        else:
+            path=live_dir
+        wd=self.libc.inotify_add_watch(self.inotify_fd,path,LiveWatcher.WATCH_MASK)
+        if wd < 0:
+            return False
+        self.wd_dirs[wd]=live_dir
+        self.watched.add(live_dir)
+        return True
+
+
+    def _read_events(self):
+        try:
+            data=os.read(self.inotify_fd,65536)
+        except OSError:
+            return
+        offset=0
+        while offset + LiveWatcher.EVENT_HEADER_SIZE <= len(data):
+            wd,mask,cookie,length=struct.unpack_from(LiveWatcher.EVENT_HEADER,data,offset)
+            offset+=LiveWatcher.EVENT_HEADER_SIZE
+            name=data[offset:offset+length].rstrip('\0')
+            offset+=length
+            if mask & LiveWatcher.IN_Q_OVERFLOW:
+                # events have been lost so compare everything
+                self.mon.warn(self,'inotify queue overflow, rescanning live tracks directories')
+                for live_dir in self.watched:
+                    self._scan_dir(live_dir,False)
+                continue
+            live_dir=self.wd_dirs.get(wd)
+            if live_dir is None:
+                continue
+            if mask & (LiveWatcher.IN_DELETE_SELF|LiveWatcher.IN_MOVE_SELF|LiveWatcher.IN_UNMOUNT|LiveWatcher.IN_IGNORED):
+                self._lost_dir(wd,live_dir)
+                continue
+            if mask & LiveWatcher.IN_ISDIR or name == '' or self._wanted(name) is False:
+                continue
+            if isinstance(live_dir,unicode):
+                name=name.decode(sys.getfilesystemencoding() or 'utf-8','replace')
+            path=live_dir + os.sep + name
+            if mask & (LiveWatcher.IN_CLOSE_WRITE|LiveWatcher.IN_MOVED_TO):
+                signature=self._signature(path)
+                if signature is not None and self.signatures.get(path) != signature:
+                    self._admit(path,live_dir,signature)
+            elif mask & (LiveWatcher.IN_DELETE|LiveWatcher.IN_MOVED_FROM):
+                self._remove(path)
+
+
+    def _lost_dir(self,wd,live_dir):
+        if wd in self.wd_dirs:
+            del self.wd_dirs[wd]
+            self.libc.inotify_rm_watch(self.inotify_fd,wd)
+        if live_dir in self.watched:
+            self.mon.log(self,'Live tracks directory has gone: ' + live_dir)
+            self.watched.discard(live_dir)
+            for path in [path for path in self.tracks if self.dir_of[path] == live_dir]:
+                self._remove(path)
+
+
+# ***************************
+# Making tracks
+# ***************************
+
+    def _make_track(self,afile):
+        (root,title)=os.path.split(afile)
+        (root_plus,ext)= os.path.splitext(afile)
+        if ext.lower() in PPdefinitions.IMAGE_FILES:
+            return self._new_track(PPdefinitions.new_tracks['image'],{'title':title,'track-ref':'','location':afile})
+        if ext.lower() in PPdefinitions.VIDEO_FILES:
+            return self._new_track(PPdefinitions.new_tracks['video'],{'title':title,'track-ref':'','location':afile})
+        if ext.lower() in PPdefinitions.AUDIO_FILES:
+            return self._new_track(PPdefinitions.new_tracks['audio'],{'title':title,'track-ref':'','location':afile})
+        if ext.lower() in PPdefinitions.WEB_FILES:
+            return self._new_track(PPdefinitions.new_tracks['web'],{'title':title,'track-ref':'','location':afile})
+        if ext.lower()=='.cfg':
+            return self._new_plugin(afile,title)
+        return None
+
+
+    def _new_plugin(self,plugin_cfg,title):
+        # read the file which is a plugin cfg file into a dictionary
+        plugin_config = ConfigParser.ConfigParser()
+        try:
+            plugin_config.read(plugin_cfg)
+            plugin_params =  dict(plugin_config.items('plugin'))
+        except ConfigParser.Error:
+            self.mon.warn(self,'Cannot read plugin configuration file: ' + plugin_cfg)
+            return None
+        # create a new livelist entry of a type specified in the config file with plugin
+        # miss entry if type is not  config file
+        if 'type' in plugin_params and plugin_params['type'] in PPdefinitions.new_tracks:
+            return self._new_track(PPdefinitions.new_tracks[plugin_params['type']],{'title':title,'track-ref':'','plugin':plugin_cfg,'location':plugin_cfg})
+        return None
+
+
+    def _new_track(self,fields,values):
+        new_track=copy.deepcopy(fields)
+        new_track.update(values)
+        return new_track
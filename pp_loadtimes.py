@@ -0,0 +1,127 @@
+import os
+import json
+import time
+from collections import OrderedDict
+from pp_utils import Monitor
+
+
+class LoadTimes(object):
+    """
+    how long tracks take to load (omxplayer starting, image decoding etc.) and how long they show for,
+    measured by ArtShow so it can start loading the next track just in time.
+    Each time is an average weighted towards the latest measurements, kept for each file
+    and for each type of track for files that have not been measured yet.
+    The times are kept in pp_load_times.json in the profile so they are not lost when Pi Presents restarts.
+    Nothing is learned, or saved, when tracks are played by the fake backend or timed by the virtual clock,
+    their times are not those of real players.
+
+    Usage:
+        LoadTimes().open(pp_profile)                            # once by PiPresents
+        LoadTimes().record('load',track_type,location,secs)
+        secs=LoadTimes().expected('load',track_type,location)   # None if not known
+    """
+
+# CLASS VARIABLES (LoadTimes.)
+    types={}                # track type -> {'load':secs,'show':secs}
+    files=OrderedDict()     # track location -> {'load':secs,'show':secs}, least recently measured first
+    filename=''
+    last_save=0
+    learning=True           # set by PiPresents
+
+    weight=0.3              # weight of the latest measurement in the average
+    max_files=1000
+    save_interval=60        # secs, the times are saved at most this often and at exit
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # read the times for the profile, called by PiPresents
+    def open(self,pp_profile):
+        LoadTimes.filename=pp_profile + os.sep + 'pp_load_times.json'
+        LoadTimes.types={}
+        LoadTimes.files=OrderedDict()
+        if not os.path.exists(LoadTimes.filename):
+            return
+        try:
+            times_file=open(LoadTimes.filename,'rb')
+            times=json.load(times_file,object_pairs_hook=OrderedDict)
+            times_file.close()
+            LoadTimes.types=dict(times['types'])
+            LoadTimes.files=times['files']
+        except (IOError,ValueError,KeyError,TypeError) as e:
+            self.mon.warn(self,'Cannot read load times ' + LoadTimes.filename + ': ' + str(e))
+            return
+        self.mon.log(self,'Read load times of ' + str(len(LoadTimes.files)) + ' files from ' + LoadTimes.filename)
+        self.report()
+
+
+    # write the times, called by PiPresents on exit
+    def save(self):
+        if LoadTimes.filename == '' or LoadTimes.learning is False:
+            return
+        LoadTimes.last_save=time.time()
+        try:
+            temp=LoadTimes.filename + '.tmp'
+            times_file=open(temp,'wb')
+            json.dump({'types':LoadTimes.types,'files':LoadTimes.files},times_file)
+            times_file.close()
+            os.rename(temp,LoadTimes.filename)
+        except (IOError,OSError) as e:
+            self.mon.warn(self,'Cannot save load times ' + LoadTimes.filename + ': ' + str(e))
+
+
+    # add a measurement, what is 'load' or 'show'
+    def record(self,what,track_type,location,secs):
+        if LoadTimes.learning is False:
+            return
+        type_times=LoadTimes.types.setdefault(track_type,{})
+        type_times[what]=self._average(type_times.get(what),secs)
+        location=self._key(location)
+        if location != '':
+            # move it to the end as the most recently measured
+            file_times=LoadTimes.files.pop(location,{})
+            file_times[what]=self._average(file_times.get(what),secs)
+            LoadTimes.files[location]=file_times
+            while len(LoadTimes.files) > LoadTimes.max_files:
+                LoadTimes.files.popitem(last=False)
+            learned=file_times[what]
+        else:
+            learned=type_times[what]
+        self.mon.log(self,'%s %s %s took %.3f secs, learned %.3f for the file, %.3f for %s tracks'
+                     % (what.capitalize(),track_type,os.path.basename(location),secs,learned,type_times[what],track_type))
+        if time.time()-LoadTimes.last_save > LoadTimes.save_interval:
+            self.save()
+
+
+    # the learned time for the file, or for the type if the file has not been measured, None if neither has
+    def expected(self,what,track_type,location):
+        file_times=LoadTimes.files.get(self._key(location))
+        if file_times is not None and what in file_times:
+            return file_times[what]
+        if what == 'show':
+            # how long a file shows for says nothing about another
+            return None
+        return LoadTimes.types.get(track_type,{}).get(what)
+
+
+    # locations read back from the file are unicode, the same location from a medialist may be a str
+    def _key(self,location):
+        if isinstance(location,str):
+            return location.decode('utf-8')
+        return location
+
+
+    def _average(self,old,secs):
+        if old is None:
+            return secs
+        return old+LoadTimes.weight*(secs-old)
+
+
+    # log the learned times for each type of track
+    def report(self):
+        for track_type in sorted(LoadTimes.types.keys()):
+            load=LoadTimes.types[track_type].get('load')
+            if load is not None:
+                self.mon.log(self,'Learned load time of %s tracks is %.3f secs' % (track_type,load))
@@ -99,6 +99,8 @@ class PPManager(App):
         #init variables
         self.profile_objects=[]
         self.current_profile=''
+        self.prescale_timer=None
+        self.prescaler=None
 
         # Initialise an instance of the Pi Presents and Web Editor driver classes
         self.pp=PiPresents()
@@ -363,6 +365,7 @@ class PPManager(App):
     def do_import_media_item(self,result):
         if result is True:
             shutil.copy2(self.current_item, self.import_to)
+            self.prescale_media()
         return
             
 
@@ -426,6 +429,7 @@ class PPManager(App):
                 os.remove(self.to_path)
             shutil.move(self.upload_dir+os.sep+self.current_item, self.upload_to)
             self.media_upload_status.set_text('File upload successful')
+            self.prescale_media()
         else:
             os.remove(self.upload_dir+os.sep+self.current_item)
 
@@ -494,6 +498,7 @@ class PPManager(App):
     def do_import_livetracks_item(self,result):
         if result is True:
             shutil.copy2(self.current_item, self.import_to)
+            self.prescale_media()
         return
  
 
@@ -556,6 +561,7 @@ class PPManager(App):
                 os.remove(self.to_path)
             shutil.move(self.upload_dir+os.sep+self.current_item, self.upload_to)
             self.livetracks_upload_status.set_text('File upload successful')
+            self.prescale_media()
         else:
             os.remove(self.upload_dir+os.sep+self.current_item)
 
@@ -578,6 +584,34 @@ class PPManager(App):
         pass
 
 
+    # ******************
+    # PRE-SCALED IMAGES
+    # ******************
+
+    # media has changed so bring the pre-scaled images of the selected profile up to date.
+    # Waits a few seconds so a batch of imports is done in one run
+    def prescale_media(self):
+        if self.current_profile == '':
+            return
+        if self.prescale_timer is not None:
+            self.prescale_timer.cancel()
+        self.prescale_timer=Timer(5.0,self.run_prescale)
+        self.prescale_timer.start()
+
+    def run_prescale(self):
+        self.prescale_timer=None
+        if self.prescaler is not None and self.prescaler.poll() is None:
+            # still running, try again later
+            self.prescale_media()
+            return
+        # same options as Pi Presents so the screen size and home directory match
+        options_list= self.pp_options.split(' ')
+        command = ['python',self.manager_dir+'/pp_prescale.py','-p',self.current_profile]
+        if options_list[0] != '':
+            command = command + options_list
+        self.prescaler=subprocess.Popen(command)
+
+
     # ******************        
     #PROFILES
     # ******************
@@ -0,0 +1,108 @@
+import os
+import json
+from pp_utils import Monitor
+
+
+class MediaBackend(object):
+    """
+    the drivers that VideoPlayer, AudioPlayer and BrowserPlayer use to play media, chosen by --backend.
+    The players only get their drivers from here so another media program can be added by writing a driver
+    with the same commands and events and registering it, the players and shows are not changed.
+
+    'real' is omxplayer, mplayer and uzbl. 'fake' (pp_fakebackend.py) plays nothing and needs no programs
+    or dbus and pexpect, it simulates load time, duration, failures and hangs so the sequencing of whole
+    shows can be soak tested and benchmarked on an ordinary Linux machine.
+
+    A driver is created with (widget,pp_dir) and has self.events, a LifecycleEvents that fires
+        loaded, first-frame, finished(reason), closed(reason)
+    and the commands and attributes its player uses
+        video - load(track,freeze_at_start,options,caller) show(freeze_at_end,volume) go()
+                pause(reason) toggle_pause(reason) pause_on() pause_off() mute() unmute() control(char)
+                stop() kill() terminate(reason)
+                duration video_position (microsecs) paused_at_start end_play_reason
+        audio - play(track,options) pause() pause_on() pause_off() mute() unmute() control(char)
+                stop() terminate(reason) audio_position start_play_signal
+        audio-slave - as audio but play(track,volume,audio_filter)
+        web   - from_pool() spare_available() play(track,window) show_window() control(command) stop() terminate(reason)
+                appear_time (ms from loaded to the page being drawn) fifo start_play_signal
+
+    Usage:
+        MediaBackend().init(options,pp_profile,root)                    # once by PiPresents
+        self.omx=MediaBackend().driver('video',self.canvas,self.pp_dir)
+        MediaBackend().register('real','video','pp_vlcdriver','VLCDriver')
+    """
+
+# CLASS VARIABLES (MediaBackend.)
+    backend='real'
+    # backend -> kind -> (module,class), the modules are imported when first used
+    drivers={'real':{'video':('pp_omxdriver','OMXDriver'),
+                     'audio':('pp_mplayerdriver','MplayerDriver'),
+                     'audio-slave':('pp_mplayerslave','MplayerSlave'),
+                     'web':('pp_uzbldriver','UZBLDriver')},
+             'fake':{'video':('pp_fakebackend','FakeVideoDriver'),
+                     'audio':('pp_fakebackend','FakeAudioDriver'),
+                     'audio-slave':('pp_fakebackend','FakeAudioDriver'),
+                     'web':('pp_fakebackend','FakeWebDriver')}}
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # called once by PiPresents
+    def init(self,options,pp_profile,root):
+        MediaBackend.backend=options['backend']
+        self.mon.log(self,'Media backend is ' + MediaBackend.backend)
+        if MediaBackend.backend == 'fake':
+            from pp_fakebackend import FakeBackend
+            FakeBackend().open(pp_profile)
+        else:
+            # web tracks use browsers started now, before they are needed, so shows can preload them.
+            # A profile without web tracks in its medialists starts none, live web tracks start them when first played
+            self.driver_class('web').pool_size=int(options['browsers'])
+            if self.has_web_tracks(pp_profile) is True:
+                self.driver_class('web')(root,'').fill_pool()
+
+
+    # called by PiPresents on exit
+    def terminate(self):
+        if MediaBackend.backend == 'real':
+            # exit the spare browsers
+            self.driver_class('web')(None,'').empty_pool()
+
+
+    # a medialist of the profile has a web track
+    def has_web_tracks(self,pp_profile):
+        for name in os.listdir(pp_profile):
+            if os.path.splitext(name)[1] != '.json':
+                continue
+            try:
+                with open(pp_profile + os.sep + name) as f:
+                    medialist=json.load(f)
+            except (IOError,ValueError):
+                continue
+            if not isinstance(medialist,dict) or not isinstance(medialist.get('tracks'),list):
+                continue
+            for track in medialist['tracks']:
+                if isinstance(track,dict) and track.get('type') == 'web':
+                    return True
+        return False
+
+
+    def register(self,backend,kind,module_name,class_name):
+        MediaBackend.drivers.setdefault(backend,{})[kind]=(module_name,class_name)
+
+
+    def driver_class(self,kind):
+        module_name,class_name=MediaBackend.drivers[MediaBackend.backend][kind]
+        module=__import__(module_name)
+        return getattr(module,class_name)
+
+
+    def driver(self,kind,widget,pp_dir):
+        return self.driver_class(kind)(widget,pp_dir)
+
+
+    # a show can preload a web track only into a spare browser
+    def spare_browser(self):
+        return self.driver_class('web')(None,'').spare_available()
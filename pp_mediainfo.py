@@ -0,0 +1,324 @@
+"""
+To Run - python pp_mediainfo.py -p <profile> [-o <home>] [-l <live tracks dir>] [--workers n] [--prober <module>]
+Probes every video and audio file of a profile and keeps its duration, resolution and codecs in
+pp_media_info.json in the profile, so Pi Presents knows them before the track is loaded.
+Only files that have changed since the last run are probed again.
+The files are probed with ffprobe unless --prober names a module in the Pi Presents directory
+with a function probe(path), it returns the same dictionary as ffprobe_probe or raises ProbeError,
+ProberUnavailable if it cannot be run.
+"""
+
+import os
+import sys
+import json
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from pp_utils import Monitor
+from pp_options import mediainfo_options
+
+
+class ProbeError(Exception):
+    pass
+
+
+# the prober cannot be run at all, nothing is learned about the file
+class ProberUnavailable(ProbeError):
+    pass
+
+
+# the default prober, runs ffprobe and returns the duration in secs (None if not known),
+# width and height of the first video stream (0 if there is none) and the codec of the first video and audio streams
+def ffprobe_probe(path):
+    command=['ffprobe','-v','error','-print_format','json','-show_format','-show_streams',path]
+    try:
+        prober=subprocess.Popen(command,stdout=subprocess.PIPE,stderr=subprocess.PIPE,close_fds=True)
+    except OSError as e:
+        raise ProberUnavailable('cannot run ffprobe: ' + str(e))
+    output,errors=prober.communicate()
+    if prober.returncode != 0:
+        raise ProbeError(errors.strip() or 'ffprobe failed with code ' + str(prober.returncode))
+    try:
+        result=json.loads(output)
+    except ValueError as e:
+        raise ProbeError('cannot read ffprobe output: ' + str(e))
+    info={'duration':None,'width':0,'height':0,'video-codec':'','audio-codec':''}
+    try:
+        info['duration']=float(result.get('format',{})['duration'])
+    except (KeyError,ValueError,TypeError):
+        pass
+    for stream in result.get('streams',[]):
+        if stream.get('codec_type') == 'video' and info['video-codec'] == '':
+            # the cover picture of an mp3 is a video stream
+            if stream.get('disposition',{}).get('attached_pic',0) == 1:
+                continue
+            info['video-codec']=stream.get('codec_name','')
+            info['width']=int(stream.get('width',0))
+            info['height']=int(stream.get('height',0))
+        elif stream.get('codec_type') == 'audio' and info['audio-codec'] == '':
+            info['audio-codec']=stream.get('codec_name','')
+    return info
+
+
+# runs in the thread pool, job is (prober,path,mtime,size), returns False for known if the file was not probed
+def probe_job(job):
+    prober,path,mtime,size=job
+    try:
+        info=prober(path)
+    except ProberUnavailable as e:
+        return path,mtime,size,None,str(e),False
+    except ProbeError as e:
+        return path,mtime,size,None,str(e),True
+    except Exception as e:
+        # a plugged in prober is not trusted to raise only ProbeError
+        return path,mtime,size,None,'prober failed: ' + str(e),True
+    return path,mtime,size,info,'',True
+
+
+
+class MediaInfo(object):
+    """
+    the index of the duration, resolution and codecs of the video and audio files of a profile, made by
+    pp_mediainfo.py (or by validating the profile in the editor) and kept in pp_media_info.json in the profile.
+    A file's entry is only used if its modification time and size are the same as when it was probed.
+
+    OMXDriver takes the duration from here rather than asking omxplayer over dbus, shows use the duration
+    to plan loading the next track and the validator rejects files that cannot be played.
+    A file that could not be probed, or has neither a video nor an audio stream, is not playable.
+
+    Usage:
+        MediaInfo().open(pp_profile)                        # once by PiPresents
+        info=MediaInfo().lookup(path)                       # None if the file is not in the index or has changed
+        secs=MediaInfo().duration(path)                     # None if not known
+    """
+
+    fields=('mtime','size','duration','width','height','video-codec','audio-codec','error')
+
+# CLASS VARIABLES (MediaInfo.)
+    files={}                # path -> list of the values of fields
+    filename=''
+    prober=staticmethod(ffprobe_probe)
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    def index_file(self,pp_profile):
+        return pp_profile + os.sep + 'pp_media_info.json'
+
+
+    # read the index of the profile, called by PiPresents
+    def open(self,pp_profile):
+        MediaInfo.filename=self.index_file(pp_profile)
+        MediaInfo.files,error=self.read(MediaInfo.filename)
+        if error != '':
+            self.mon.warn(self,'Cannot read media info ' + MediaInfo.filename + ': ' + error)
+        elif len(MediaInfo.files) > 0:
+            self.mon.log(self,'Read media info of ' + str(len(MediaInfo.files)) + ' files from ' + MediaInfo.filename)
+
+
+    # returns the index in filename and '', or an empty index and why it could not be read
+    def read(self,filename):
+        if not os.path.exists(filename):
+            return {},''
+        try:
+            index_file=open(filename,'rb')
+            index=json.load(index_file)
+            index_file.close()
+            if tuple(index['fields']) != MediaInfo.fields:
+                # made by a different version, probe everything again
+                return {},''
+            return index['files'],''
+        except (IOError,ValueError,KeyError,TypeError) as e:
+            return {},str(e)
+
+
+    # the entry of the file as a dictionary if it is up to date, None if it is not
+    def lookup(self,path,files=None):
+        if files is None:
+            files=MediaInfo.files
+        entry=files.get(self._key(path))
+        if entry is None:
+            return None
+        try:
+            stat=os.stat(path)
+        except OSError:
+            return None
+        if abs(stat.st_mtime-entry[0]) >= 0.001 or stat.st_size != entry[1]:
+            return None
+        info=dict(zip(MediaInfo.fields,entry))
+        info['playable']=info['error'] == ''
+        return info
+
+
+    def duration(self,path):
+        info=self.lookup(path)
+        if info is None:
+            return None
+        return info['duration']
+
+
+    def set_prober(self,prober):
+        MediaInfo.prober=staticmethod(prober)
+
+
+# ***************************
+# Building the index
+# ***************************
+
+    # probe the files that are not in the index or have changed and, if drop is True, drop the files no longer wanted.
+    # returns the index and the numbers probed, kept and failed. A file that could not be probed is left out
+    def build(self,pp_profile,paths,workers=0,log=None,drop=True):
+        if log is None:
+            log=self._print
+        filename=self.index_file(pp_profile)
+        old,error=self.read(filename)
+        if error != '':
+            log('Cannot read media info ' + filename + ', making it again: ' + error)
+        files=OrderedDict()
+        jobs=[]
+        for path in sorted(set(paths)):
+            key=self._key(path)
+            if key in files:
+                continue
+            try:
+                stat=os.stat(path)
+            except OSError:
+                continue
+            if self.lookup(path,old) is not None:
+                files[key]=old[key]
+            else:
+                files[key]=None
+                jobs.append((MediaInfo.prober,path,stat.st_mtime,stat.st_size))
+        kept=len(files)-len(jobs)
+
+        failed=0
+        unprobed=0
+        if len(jobs) > 0:
+            if workers <= 0:
+                workers=multiprocessing.cpu_count()
+            log('Probing ' + str(len(jobs)) + ' media files with ' + str(workers) + ' threads')
+            # the probing is done by other processes so threads are enough
+            pool=ThreadPool(workers)
+            try:
+                for path,mtime,size,info,error,known in pool.imap_unordered(probe_job,jobs):
+                    if known is False:
+                        del files[self._key(path)]
+                        unprobed+=1
+                        if unprobed == 1:
+                            log('Cannot probe media files: ' + error)
+                        continue
+                    if info is None:
+                        info={'duration':None,'width':0,'height':0,'video-codec':'','audio-codec':''}
+                    elif info['video-codec'] == '' and info['audio-codec'] == '':
+                        error='no video or audio stream'
+                    if error != '':
+                        failed+=1
+                        log('Cannot play ' + path + ': ' + error)
+                    else:
+                        log('%s %s %dx%d %s %s' % (path,self._pretty_duration(info['duration']),info['width'],info['height'],
+                                                   info['video-codec'],info['audio-codec']))
+                    files[self._key(path)]=[mtime,size,info['duration'],info['width'],info['height'],
+                                            info['video-codec'],info['audio-codec'],error]
+            finally:
+                pool.close()
+                pool.join()
+
+        dropped=0
+        for key in old:
+            if key not in files:
+                if drop is True:
+                    dropped+=1
+                else:
+                    files[key]=old[key]
+
+        try:
+            temp=filename + '.tmp'
+            index_file=open(temp,'wb')
+            json.dump({'fields':MediaInfo.fields,'files':files},index_file,separators=(',',':'))
+            index_file.close()
+            os.rename(temp,filename)
+        except (IOError,OSError) as e:
+            log('Cannot save media info ' + filename + ': ' + str(e))
+        log('Media info ' + filename + ': probed %d, kept %d, cannot play %d, not probed %d, dropped %d'
+            % (len(jobs)-unprobed,kept,failed,unprobed,dropped))
+        return files,len(jobs)-unprobed,kept,failed
+
+
+    # the video and audio files of the profile's shows
+    def profile_paths(self,pp_home,pp_profile,live_dir2,log):
+        # the tracks are found as they are for pre-scaling images
+        from pp_prescale import PreScale
+        from pp_showlist import ShowList
+        showlist=ShowList()
+        if showlist.open_json(pp_profile + os.sep + 'pp_showlist.json') is False:
+            log('Cannot read showlist of ' + pp_profile)
+            return []
+        paths=[]
+        for show in showlist.shows():
+            for track in PreScale().show_tracks(show,pp_home,pp_profile,showlist.profile_version(),live_dir2,log,
+                                                ('video','audio')):
+                path=self.track_path(track,pp_home,pp_profile)
+                if path is not None:
+                    paths.append(path)
+        return paths
+
+
+    # the file of a video or audio track, None if it is another type or has no file
+    def track_path(self,track,pp_home,pp_profile):
+        if track.get('type') not in ('video','audio') or track.get('plugin','') != '':
+            return None
+        track_file=track.get('location','')
+        if track_file != '' and track_file[0]=="+":
+            track_file=pp_home+track_file[1:]
+        elif track_file != '' and track_file[0] == "@":
+            track_file=pp_profile+track_file[1:]
+        if not os.path.isfile(track_file):
+            return None
+        return track_file
+
+
+    # locations read back from the file are unicode, the same location from a medialist may be a str
+    def _key(self,path):
+        if isinstance(path,str):
+            return path.decode('utf-8')
+        return path
+
+
+    def _pretty_duration(self,secs):
+        if secs is None:
+            return 'duration unknown'
+        return '%d:%02d' % (int(secs)/60,int(secs)%60)
+
+
+    def _print(self,text):
+        print text
+
+
+
+if __name__ == '__main__':
+    options=mediainfo_options()
+    if options['profile'] == '':
+        print >> sys.stderr, 'Profile not specified with the -p option'
+        exit(102)
+    if options['home'] == '':
+        pp_home=os.path.expanduser('~') + os.sep + 'pp_home'
+    else:
+        pp_home=options['home'] + os.sep + 'pp_home'
+    pp_profile=pp_home + os.sep + 'pp_profiles' + os.sep + options['profile']
+    if not os.path.exists(pp_profile):
+        print >> sys.stderr, 'Failed to find requested profile: ' + pp_profile
+        exit(102)
+
+    if options['prober'] != '':
+        try:
+            MediaInfo().set_prober(__import__(options['prober']).probe)
+        except (ImportError,AttributeError) as e:
+            print >> sys.stderr, 'Cannot use prober ' + options['prober'] + ': ' + str(e)
+            exit(102)
+
+    media_info=MediaInfo()
+    paths=media_info.profile_paths(pp_home,pp_profile,options['liveshow'],media_info._print)
+    media_info.build(pp_profile,paths,int(options['workers']))
@@ -1,8 +1,8 @@
 import json
 import copy
 import string
-import random
 from pp_utils import Monitor
+from pp_shufflebag import ShuffleBag
 
 """
 31/12/2016 - fixed crash if mediashow id shffled and there is one track - taks Drew Keller
@@ -30,6 +30,11 @@ class MediaList(object):
         self._tracks = []  #MediaList, stored as a list of dicts
         self._num_tracks=0
         self._selected_track_index=-1 # index of currently selected track
+        self._anon_indexes=[]
+        self._anon_before=[0]
+        self._ref_index={}
+        self._bag=ShuffleBag()
+        self._bag_changed=True  # members of the shuffle bag need updating from _anon_indexes
 
     def print_list(self):
         print '\n'
@@ -47,29 +52,36 @@ class MediaList(object):
         """appends a track dictionary to the end of the medialist store"""
         self._tracks.append(copy.deepcopy(track_dict))
         self._num_tracks+=1
+        self._index_track(self._num_tracks-1)
 
     def update(self,index,values):
         self._tracks[index].update(values)
+        if 'track-ref' in values:
+            self._reindex_from(index)
 
 
     def remove(self,index):
         self._tracks.pop(index)
         self._num_tracks-=1
+        self._reindex_from(index)
         # deselect any track, saves worrying about whether index needs changing
         self._selected_track_index=-1
 
     def move_up(self):
         if self._selected_track_index != 0:
             self._tracks.insert(self._selected_track_index-1, self._tracks.pop(self._selected_track_index))
+            self._reindex_from(self._selected_track_index-1)
             self.select(self._selected_track_index-1)
 
     def move_down(self):
         if self._selected_track_index != self._num_tracks-1:
             self._tracks.insert(self._selected_track_index+1, self._tracks.pop(self._selected_track_index))
+            self._reindex_from(self._selected_track_index)
             self.select(self._selected_track_index+1)
 
     def replace(self,index,replacement):
         self._tracks[index]= replacement     
+        self._reindex_from(index)
         
         
 # Common functions work for anything
@@ -102,199 +114,175 @@ class MediaList(object):
 
 # Dealing with anonymous tracks for use and display
 
-  
+# The positions of the anonymous tracks are indexed so that navigation does not scan the list:
+#    _anon_indexes - track indexes of the anonymous tracks in list order
+#    _anon_before  - _anon_before[i] is the number of anonymous tracks before track i, length is _num_tracks+1
+#    _ref_index    - track-ref of each labelled track -> index of the first track with that ref
+# append() updates the index in constant time, the other editing functions re-index from the first track they change.
+# Anything that changes a track's track-ref in place (e.g. an edit dialog) must call reindex()
+# Random sequencing uses a shuffle bag of the anonymous track indexes, it is brought up to date when it is next used.
+
+    def reindex(self):
+        self._reindex_from(0)
+
+    def _reindex_from(self,start):
+        if start<0:
+            start=0
+        self._bag_changed=True
+        del self._anon_before[start+1:]
+        # keep the anonymous tracks before start, they have not moved
+        del self._anon_indexes[self._anon_before[start]:]
+        for ref in self._ref_index.keys():
+            if self._ref_index[ref]>=start:
+                del self._ref_index[ref]
+        for index in range(start,self._num_tracks):
+            self._index_track(index)
+
+    def _index_track(self,index):
+        # add the track at index to the end of the index
+        self._bag_changed=True
+        ref=self._tracks[index]['track-ref']
+        if ref == "":
+            self._anon_indexes.append(index)
+            self._anon_before.append(self._anon_before[-1]+1)
+        else:
+            self._anon_before.append(self._anon_before[-1])
+            if ref not in self._ref_index:
+                self._ref_index[ref]=index
+
+    def _shuffled(self,backwards=False):
+        # select the next or previous track from the shuffle bag
+        if self._bag_changed is True:
+            self._bag.set_members(self._anon_indexes)
+            self._bag_changed=False
+        if backwards is True:
+            self.select(self._bag.previous())
+        else:
+            self.select(self._bag.next())
+        return True
      
     def at_end(self):
         # true is selected track is last anon
-        index=self._num_tracks-1
-        while index>=0:
-            if self._tracks[index] ['track-ref'] =="":
-                end=index
-                if self._selected_track_index==end:
-                    return True
-                else:
-                    return False
-            index -=1
-        return False
+        if len(self._anon_indexes)==0:
+            return False
+        return self._selected_track_index==self._anon_indexes[-1]
         
         
     def index_of_end(self):
-        if self.anon_length()==0:
+        if len(self._anon_indexes)==0:
             return False
-        index=self._num_tracks-1
-        while index >= 0:
-            if self._tracks[index] ['track-ref'] =="":
-                return index
-            index -=1
-        return -1
+        return self._anon_indexes[-1]
    
    
     def at_start(self):
-        if self.anon_length()==0:
+        if len(self._anon_indexes)==0:
             return False
-        index=0
-        while index<self._num_tracks:
-            if self._tracks[index] ['track-ref'] =="":
-                start =  index
-                if self._selected_track_index==start:
-                    return True
-                else:
-                    return False
-            index +=1
-        return False
+        return self._selected_track_index==self._anon_indexes[0]
    
             
     def index_of_start(self):
-        if self.anon_length()==0:
+        if len(self._anon_indexes)==0:
             return False
-        index=0
-        while index<self._num_tracks:
-            if self._tracks[index] ['track-ref'] =="":
-                return index
-            index +=1
-        return False
+        return self._anon_indexes[0]
 
 
     def anon_length(self):
         # number of anonymous tracks
-        count=0
-        index=0
-        while index<self._num_tracks:
-            if self._tracks[index] ['track-ref'] =="":
-                count+=1
-            index +=1
-        return count
+        return len(self._anon_indexes)
 
     def start(self):
-        if self.anon_length()==0:
+        if len(self._anon_indexes)==0:
             return False
         # select first anonymous track in the list
         if self.sequence == 'ordered':
-            index=0
-            while index<self._num_tracks:
-                if self._tracks[index] ['track-ref'] =="":
-                    self.select(index)
-                    return True
-                index +=1
-            return False
+            self.select(self._anon_indexes[0])
+            return True
         else:
-            match=random.randint(0,self.anon_length()-1)
-            # print 'match',match
-            index=0
-            while index<self._num_tracks:
-                if self._tracks[index] ['track-ref'] =="" and index==match:
-                    self.select(index)
-                    # print index
-                    return index
-                index +=1
+            return self._shuffled()
 
     def finish(self):
-        if self.anon_length()==0:
+        if len(self._anon_indexes)==0:
             return False
         if self.sequence == 'ordered':
             # select last anymous track in the list
-            index=self._num_tracks-1
-            while index>=0:
-                if self._tracks[index] ['track-ref'] =="":
-                    self.select(index)
-                    return True
-                index -=1
-            return False
+            self.select(self._anon_indexes[-1])
+            return True
         else:
-            match=random.randint(0,self.anon_length()-1)
-            # print 'match',match
-            index=0
-            while index<self._num_tracks:
-                if self._tracks[index] ['track-ref'] =="" and index==match:
-                    self.select(index)
-                    # print index
-                    return index
-                index +=1
+            return self._shuffled()
         
 
+    # all the anonymous tracks in list order
+    def anon_tracks(self):
+        return [self._tracks[index] for index in self._anon_indexes]
+
+
+    # the next count anonymous tracks that next() will select, the selection is not changed
+    def upcoming(self,count,sequence):
+        num_anon=len(self._anon_indexes)
+        if num_anon==0:
+            return []
+        if sequence!='ordered':
+            if self._bag_changed is True:
+                self._bag.set_members(self._anon_indexes)
+                self._bag_changed=False
+            return [self._tracks[index] for index in self._bag.peek(count)]
+        rank=self._anon_before[self._selected_track_index+1]
+        return [self._tracks[self._anon_indexes[(rank+i) % num_anon]] for i in range(min(count,num_anon))]
+
+
     def select_anon_by_index(self,wanted):
-        if self.anon_length()==0:
+        if wanted<0 or wanted>=len(self._anon_indexes):
             return False
-        index=0
-        anon_index=0
-        while index != self._num_tracks:
-            # print index,self._tracks[index] ['track-ref'],wanted
-            if self._tracks[index] ['track-ref'] =="":
-                if anon_index==wanted:
-                    # print 'match\n'
-                    self.select(index)
-                    return True
-                anon_index+=1
-            index= index+1
-        return False
+        self.select(self._anon_indexes[wanted])
+        return True
 
 
     def next(self,sequence):
-        if self.anon_length()==0:
+        num_anon=len(self._anon_indexes)
+        if num_anon==0:
             return False
-        if sequence=='ordered':
-            if self._selected_track_index== self._num_tracks-1:
-                index=0
-            else:
-                index= self._selected_track_index+1
-                
-            end=self._selected_track_index
-        else:
-            index=random.randint(0,self.anon_length()-1)
-            if index==0:
-                end=self._num_tracks-1
-            else:
-                end=index-1
-        # search for next anonymous track
-        # print 'index', index, 'end',end
-        while index != end:
-            if self._tracks[index] ['track-ref'] =="":
-                self.select(index)
-                return True
-            if index== self._num_tracks-1:
-                index=0
-            else:
-                index= index+1
-        return False
+        if sequence!='ordered':
+            return self._shuffled()
+        # first anonymous track after the selected track, wrapping round to the start
+        rank=self._anon_before[self._selected_track_index+1]
+        if rank==num_anon:
+            rank=0
+        index=self._anon_indexes[rank]
+        if index==self._selected_track_index:
+            # the selected track is the only anonymous track
+            return False
+        self.select(index)
+        return True
 
     def previous(self,sequence):
-        if self.anon_length()==0:
+        num_anon=len(self._anon_indexes)
+        if num_anon==0:
             return False
-        if sequence=='ordered':
-            if self._selected_track_index == 0:
-                index=self._num_tracks-1
-            else:
-                index= self._selected_track_index-1
-            end = self._selected_track_index
+        if sequence!='ordered':
+            return self._shuffled(backwards=True)
+        # last anonymous track before the selected track, wrapping round to the end
+        if self._selected_track_index<0:
+            rank=0
         else:
-            index=random.randint(0,self.anon_length()-1)
-            if index==self._num_tracks-1:
-                end=0
-            else:
-                end=index+1
-        # print 'index', index, 'end',end                
-        # search for previous anonymous track            
-        while index != end :
-            if self._tracks[index] ['track-ref'] =="":
-                self.select(index)
-                return True                
-            if index == 0:
-                index=self._num_tracks-1
-            else:
-                index= index-1
-        return False
+            rank=self._anon_before[self._selected_track_index]
+        if rank==0:
+            rank=num_anon
+        index=self._anon_indexes[rank-1]
+        if index==self._selected_track_index:
+            return False
+        self.select(index)
+        return True
     
     
 # Lookup for labelled tracks
     
     
     def index_of_track(self,wanted_track):
-        index = 0
-        for track in self._tracks:
-            if track['track-ref']==wanted_track:
-                return index
-            index +=1
-        return -1
+        if wanted_track=="":
+            if len(self._anon_indexes)==0:
+                return -1
+            return self._anon_indexes[0]
+        return self._ref_index.get(wanted_track,-1)
 
 
 
@@ -318,6 +306,7 @@ class MediaList(object):
             
         if self.medialist_version()==profile_version:
             self._num_tracks=len(self._tracks)
+            self.reindex()
             self.last_num_tracks=self._num_tracks
             self._selected_track_index=-1
             return True
@@ -1,8 +1,9 @@
 import os
 from Tkinter import N, CENTER, LEFT, NW, W
-from PIL import Image
 from PIL import ImageTk
 from pp_player import Player
+from pp_imagecache import ImageCache
+from pp_decodepool import DecodePool, prepare_image
 from pp_utils import parse_rectangle, calculate_text_position
 
 class MenuPlayer(Player):
@@ -49,10 +50,12 @@ class MenuPlayer(Player):
         
         # and initialise things for this player
         self.display_guidelines=track_params['menu-guidelines']
-        self.play_state='initialised'
+        self.set_play_state('initialised')
         self.menu_entry_id=[]
         self.menu_text_obj = None
         self.hint_text_obj = None
+        self.image_cache=ImageCache()
+        self.decode_pool=DecodePool()
 
 
 
@@ -72,21 +75,31 @@ class MenuPlayer(Player):
             self.medialist=self.show_params['medialist_obj']
         else:
             self.mon.err(self,'A Menu Track must be run from a Menu Show')
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error','A Menu Track must be run from a Menu Show')
                 return
         
+        # decode and resize the icons in the decode pool then load
+        self.enable_menu=enable_menu
+        self.set_play_state('loading')
+        self.decode_pool.decode_all(self.icon_specs(),self.icons_decoded)
+
+
+    def icons_decoded(self):
+        # ignore it if unloaded while decoding
+        if self.play_state != 'loading':
+            return
         # load the images and text
-        status,message=Player.load_x_content(self,enable_menu)
+        status,message=Player.load_x_content(self,self.enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
         else:
-            self.play_state='loaded'
+            self.set_play_state('loaded')
             if self.loaded_callback is not None:
                 self.loaded_callback('loaded','menu track loaded')
 
@@ -97,7 +110,7 @@ class MenuPlayer(Player):
         self.mon.trace(self, '')
         # nothing to do for Menuplayer
         self.mon.log(self,">unload received from show Id: "+ str(self.show_id))
-        self.play_state='unloaded'
+        self.set_play_state('unloaded')
 
 
      # SHOW - show the menu from its loaded state 
@@ -124,7 +137,7 @@ class MenuPlayer(Player):
 
         self.closed_callback=closed_callback
         self.mon.log(self,">close received from show Id: "+ str(self.show_id))
-        self.play_state='closed'
+        self.set_play_state('closed')
         if self.closed_callback is not None:
             self.closed_callback('normal','menuplayer closed')
 
@@ -137,7 +150,10 @@ class MenuPlayer(Player):
 
 
     def stop(self):
+        if self.play_state != 'showing' or self.quit_signal is True:
+            return
         self.quit_signal=True
+        self.tick_timer=self.scheduler.after(0, self.do_dwell)
 
 
 
@@ -145,21 +161,17 @@ class MenuPlayer(Player):
 # Sequencing
 # ********************************************
 
+    # menu stays until stopped so there is nothing to time, stop() schedules the finish
     def start_dwell(self):
-        self.play_state='showing'
-        self.tick_timer=self.canvas.after(100, self.do_dwell)
+        self.set_play_state('showing')
 
 
         
     def do_dwell(self):
-        if self.quit_signal is True:
-            self.quit_signal=False
-            self.mon.log(self,"quit received")
-            if self.finished_callback is not  None:
-                self.finished_callback('pause_at_end','user quit')
-                # use finish so that the show will call close 
-        else:
-            self.tick_timer=self.canvas.after(100, self.do_dwell)
+        self.tick_timer=None
+        self.mon.log(self,"quit received")
+        self.track_finished('pause_at_end','user quit')
+            # use finish so that the show will call close 
 
 
 
@@ -642,67 +654,90 @@ class MenuPlayer(Player):
         return icon_id
     
 
-    # display the image in a menu entry
-    def  display_icon_image(self):
-        image_id=None
-        photo_image_id=None
+    # the file used for the icon of a menu entry, None if there is not one
+    def icon_path(self,track):
         if self.track_params['menu-icon-mode'] == 'thumbnail':
             # try for the thumbnail
-            if self.medialist.selected_track()['thumbnail'] != '' and os.path.exists(self.complete_path(self.medialist.selected_track()['thumbnail'])):
-                self.pil_image=Image.open(self.complete_path(self.medialist.selected_track()['thumbnail']))
-            else:
-                # cannot find thumbnail get the image if its an image track
-                if self.medialist.selected_track()['type']  == 'image':
-                    self.track=self.complete_path(self.medialist.selected_track()['location'])
-                else:
-                    self.track=''
-                    
-                if self.medialist.selected_track()['type'] == 'image' and os.path.exists(self.track) is True: 
-                    self.pil_image=Image.open(self.track)
-                else:
-                    # use a standard thumbnail
-                    icon_type=self.medialist.selected_track()['type']
-                    standard=self.pp_dir+os.sep+'pp_resources'+os.sep+icon_type+'.png'
-                    if os.path.exists(standard) is True:
-                        self.pil_image=Image.open(standard)
-                        self.mon.warn(self,'Default thumbnail used for '+self.medialist.selected_track()['title'])
-                    else:
-                        self.pil_image=None
-
-            # display the image                
-            if self.pil_image  is not  None:
-                self.pil_image=self.pil_image.resize((self.icon_width-2,self.icon_height-2))                 
-                photo_image_id=ImageTk.PhotoImage(self.pil_image)
-                image_id=self.canvas.create_image(self.icon_x_left+1 + self.show_canvas_x1,
-                                         self.icon_y_top+1 + self.show_canvas_y1,
-                                         image=photo_image_id,
-                                         anchor=NW)
-                del self.pil_image
-            else:
-                image_id=None
-                    
+            if track['thumbnail'] != '' and os.path.exists(self.complete_path(track['thumbnail'])):
+                return self.complete_path(track['thumbnail'])
+            # cannot find thumbnail get the image if its an image track
+            if track['type']  == 'image':
+                image_file=self.complete_path(track['location'])
+                if os.path.exists(image_file) is True:
+                    return image_file
+            # use a standard thumbnail
+            standard=self.pp_dir+os.sep+'pp_resources'+os.sep+track['type']+'.png'
+            if os.path.exists(standard) is True:
+                return standard
+            return None
+
         elif self.track_params['menu-icon-mode']  == 'bullet':
             bullet=self.complete_path(self.track_params['menu-bullet'])                  
             if os.path.exists(bullet) is True:
-                self.pil_image=Image.open(bullet)
-            else:
-                bullet=self.pp_dir+os.sep+'pp_resources'+os.sep+'bullet.png'
-                if os.path.exists(bullet) is True:
-                    self.mon.warn(self,'Default bullet used for '+self.medialist.selected_track()['title'])
-                    self.pil_image=Image.open(bullet)
-                else:
-                    self.pil_image=None
-                    
-            if self.pil_image is not None:
-                self.pil_image=self.pil_image.resize((self.icon_width-2,self.icon_height-2))                 
-                photo_image_id=ImageTk.PhotoImage(self.pil_image)
-                image_id=self.canvas.create_image(self.icon_x_left+1 + self.show_canvas_x1,
-                                         self.icon_y_top+1 + self.show_canvas_y1,
-                                         image=photo_image_id,
-                                         anchor=NW)
-                del self.pil_image
+                return bullet
+            bullet=self.pp_dir+os.sep+'pp_resources'+os.sep+'bullet.png'
+            if os.path.exists(bullet) is True:
+                return bullet
+            return None
         else:
-            image_id=None
+            return None
+
+
+    def icon_spec(self,path):
+        return (path,'warp',int(self.track_params['menu-icon-width'])-2,int(self.track_params['menu-icon-height'])-2,'Image.NEAREST',0)
+
+
+    # specs of the icons of all the entries for the decode pool
+    def icon_specs(self):
+        specs=[]
+        if self.track_params['menu-icon-mode'] not in ('thumbnail','bullet'):
+            return specs
+        try:
+            self.icon_spec('')
+        except ValueError:
+            # calculate_geometry reports the error
+            return specs
+        for track in self.medialist.anon_tracks():
+            path=self.icon_path(track)
+            if path is not None and self.icon_spec(path) not in specs:
+                specs.append(self.icon_spec(path))
+        return specs
+
+
+    # display the image in a menu entry
+    def  display_icon_image(self):
+        image_id=None
+        photo_image_id=None
+        if self.track_params['menu-icon-mode'] not in ('thumbnail','bullet'):
+            return image_id,photo_image_id
+        path=self.icon_path(self.medialist.selected_track())
+        if path is None:
+            return image_id,photo_image_id
+        if self.track_params['menu-icon-mode'] == 'thumbnail':
+            if path.startswith(self.pp_dir+os.sep+'pp_resources'+os.sep):
+                self.mon.warn(self,'Default thumbnail used for '+self.medialist.selected_track()['title'])
+        elif path == self.pp_dir+os.sep+'pp_resources'+os.sep+'bullet.png':
+            self.mon.warn(self,'Default bullet used for '+self.medialist.selected_track()['title'])
+
+        # the decode pool has normally put the resized icon in the cache
+        spec=self.icon_spec(path)
+        self.pil_image=self.image_cache.get(self.image_cache.make_key(*spec))
+        if self.pil_image is None:
+            try:
+                self.pil_image,report=prepare_image(*spec)
+                self.mon.log(self,'Decoded ' + report)
+                self.image_cache.put(self.image_cache.make_key(*spec),self.pil_image)
+            except IOError:
+                self.pil_image=None
+
+        # display the image                
+        if self.pil_image  is not  None:
+            photo_image_id=ImageTk.PhotoImage(self.pil_image)
+            image_id=self.canvas.create_image(self.icon_x_left+1 + self.show_canvas_x1,
+                                     self.icon_y_top+1 + self.show_canvas_y1,
+                                     image=photo_image_id,
+                                     anchor=NW)
+            del self.pil_image
         return image_id,photo_image_id
 
             
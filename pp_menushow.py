@@ -3,6 +3,7 @@
 from pp_medialist import MediaList
 from pp_show import Show
 from pp_controlsmanager import ControlsManager
+from pp_soundcues import SoundCues
 from pp_screendriver import ScreenDriver
 
 class MenuShow(Show):
@@ -140,10 +141,10 @@ class MenuShow(Show):
         elif operation in ('up','down'):
             # stop show timeout
             if self.show_timeout_timer is not None:
-                self.canvas.after_cancel(self.show_timeout_timer)
+                self.scheduler.cancel(self.show_timeout_timer)
                 # and start it again
                 if self.show_timeout != 0:
-                    self.show_timeout_timer=self.canvas.after(self.show_timeout*1000,self.show_timeout_stop)
+                    self.show_timeout_timer=self.scheduler.after(self.show_timeout*1000,self.show_timeout_stop)
             if operation=='up':
                 self.previous()
             else:
@@ -158,7 +159,7 @@ class MenuShow(Show):
 
             # cancel show timeout
             if self.show_timeout_timer is not None:
-                self.canvas.after_cancel(self.show_timeout_timer)
+                self.scheduler.cancel(self.show_timeout_timer)
                 self.show_timeout_timer=None
 
             # stop current track (the menuplayer) if running or just start the next track
@@ -174,6 +175,9 @@ class MenuShow(Show):
             if self.current_player is not None:
                 self.current_player.input_pressed(operation)
                 
+        elif operation[0:6]=='sound-':
+            SoundCues().play(operation[6:])
+
         elif operation[0:4]=='omx-' or operation[0:6]=='mplay-'or operation[0:5]=='uzbl-':
             if self.current_player is not None:
                 self.current_player.input_pressed(operation)
@@ -217,7 +221,7 @@ class MenuShow(Show):
         self.mon.trace(self,'')
         # start show timeout alarm if required
         if self.show_timeout != 0:
-            self.show_timeout_timer=self.canvas.after(self.show_timeout *1000,self.show_timeout_stop)
+            self.show_timeout_timer=self.scheduler.after(self.show_timeout *1000,self.show_timeout_stop)
 
         index = self.medialist.index_of_track(self.show_params['menu-track-ref'])
         if index == -1:
@@ -330,7 +334,7 @@ class MenuShow(Show):
         self.mon.trace(self,'')
         # cancel track timeout timer
         if self.track_timeout_timer is not None:
-            self.canvas.after_cancel(self.track_timeout_timer)
+            self.scheduler.cancel(self.track_timeout_timer)
             self.track_timeout_timer=None
             
         # need to terminate?
@@ -370,7 +374,7 @@ class MenuShow(Show):
             self.menu_showing=False
             # start timeout for the track if required           
             if self.track_timeout != 0:
-                self.track_timeout_timer=self.canvas.after(self.track_timeout*1000,self.track_timeout_callback)
+                self.track_timeout_timer=self.scheduler.after(self.track_timeout*1000,self.track_timeout_callback)
             self.last_menu_index=self.menu_index
             Show.write_stats(self,'play',self.show_params,self.next_track)
             self.start_load_show_loop(self.next_track)
@@ -420,9 +424,9 @@ class MenuShow(Show):
 
     def stop_timers(self):
         if self.track_timeout_timer is not None:
-            self.canvas.after_cancel(self.track_timeout_timer)
+            self.scheduler.cancel(self.track_timeout_timer)
             self.track_timeout_timer=None
         if self.show_timeout_timer is not None:
-            self.canvas.after_cancel(self.show_timeout_timer)
+            self.scheduler.cancel(self.show_timeout_timer)
             self.show_timeout_timer=None    
 
@@ -55,7 +55,7 @@ class MessagePlayer(Player):
             self.duration= int(self.show_params['duration'])       
         
         # initialise the state machine
-        self.play_state='initialised'    
+        self.set_play_state('initialised')    
             
             
     # LOAD - loads the images and text
@@ -73,7 +73,7 @@ class MessagePlayer(Player):
             status,message=self.load_plugin()
             if status == 'error':
                 self.mon.err(self,message)
-                self.play_state='load-failed'
+                self.set_play_state('load-failed')
                 if self.loaded_callback is not  None:
                     self.loaded_callback('error',message)
                     return
@@ -83,12 +83,12 @@ class MessagePlayer(Player):
         status,message=self.load_x_content(enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
         else:
-            self.play_state='loaded'
+            self.set_play_state('loaded')
             if self.loaded_callback is not None:
                 self.loaded_callback('loaded','message track loaded')
 
@@ -98,7 +98,7 @@ class MessagePlayer(Player):
         self.mon.trace(self,'')
         # nothing to do for Messageplayer
         self.mon.log(self,">unload received from show Id: "+ str(self.show_id))
-        self.play_state='unloaded'
+        self.set_play_state('unloaded')
      
             
 
@@ -112,9 +112,7 @@ class MessagePlayer(Player):
 
         self.mon.trace(self,'')
         # init state and signals  
-        self.tick = 100 # tick time for image display (milliseconds)
-        self.dwell = 10*self.duration
-        self.dwell_counter=0
+        self.dwell = 1000*self.duration   # milliseconds, 0 is for ever
         self.quit_signal=False
 
         # do common bits
@@ -129,8 +127,9 @@ class MessagePlayer(Player):
         self.closed_callback=closed_callback
         self.mon.log(self,">close received from show Id: "+ str(self.show_id))
         if self.tick_timer!= None:
-            self.canvas.after_cancel(self.tick_timer)
-        self.play_state='closed'
+            self.scheduler.cancel(self.tick_timer)
+            self.tick_timer=None
+        self.set_play_state('closed')
         if self.closed_callback is not None:
             self.closed_callback('normal','Messageplayer closed')
 
@@ -141,7 +140,11 @@ class MessagePlayer(Player):
 
 
     def stop(self):
-        self.quit_signal=True
+        if self.play_state != 'showing' or self.quit_signal is True:
+            return
+        self.mon.log(self,"quit received")
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=self.scheduler.after(0, self.end_dwell)
         
 
 
@@ -150,26 +153,18 @@ class MessagePlayer(Player):
 # Sequencing
 # ********************************************
 
+    # the dwell is a single deadline rather than counting ticks
     def start_dwell(self):
-        self.play_state='showing'
-        self.tick_timer=self.canvas.after(self.tick, self.do_dwell)
+        self.set_play_state('showing')
+        if self.dwell != 0:
+            self.tick_timer=self.scheduler.after(self.dwell, self.end_dwell)
 
         
-    def do_dwell(self):
-        if self.quit_signal  is   True:
-            self.mon.log(self,"quit received")
-            if self.finished_callback is not None:
-                self.finished_callback('pause_at_end','user quit or duration exceeded')
-                # use finish so that the show will call close
-        else:
-            self.dwell_counter=self.dwell_counter+1
-
-            if self.dwell != 0 and self.dwell_counter ==  self.dwell:
-                if self.finished_callback is not None:
-                    self.finished_callback('pause_at_end','user quit or duration exceeded')
-                    # use finish and pause_at_end so that the show will call close
-            else:
-                self.tick_timer=self.canvas.after(self.tick, self.do_dwell)
+    def end_dwell(self):
+        self.tick_timer=None
+        self.quit_signal=True
+        self.track_finished('pause_at_end','user quit or duration exceeded')
+            # use finish and pause_at_end so that the show will call close
 
 # *****************
 # x content
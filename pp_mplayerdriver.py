@@ -5,6 +5,7 @@ import os
 from threading import Thread
 from time import sleep
 from pp_utils import Monitor
+from pp_lifecycle import LifecycleEvents
 
 """
  pyomxplayer from https://github.com/jbaiter/pyomxplayer
@@ -36,6 +37,15 @@ Signals
          self.start_play_signal = True when a track is ready to be shown
          self.end_play_signal= True when a track has finished due to stop or because it has come to an end
  Also is_running() tests whether the sub-process running mplayer is alive.
+ The reader thread reaps mplayer when its output closes, nothing else may waitpid it (isalive())
+ or pexpect in the reader thread finds the child has gone and fails.
+
+Events
+----------
+ The same transitions are fired as lifecycle events from the reader thread, callbacks run on the Tk thread
+         self.events.when('first-frame',callback) - mplayer is running and can take controls
+         self.events.when('finished',callback) - callback(reason) mplayer has said it is exiting
+         self.events.when('closed',callback) - mplayer has closed its output, the process has gone
 
 """
 
@@ -52,6 +62,7 @@ class MplayerDriver(object):
         self.pp_dir=pp_dir
         
         self.mon=Monitor()
+        self.events=LifecycleEvents()
         
         self._process=None
         self.paused=False
@@ -125,9 +136,9 @@ class MplayerDriver(object):
     def get_terminate_reason(self):
         return self.terminate_reason
     
-   # test of whether _process is running
+   # test of whether _process is running, terminated is set when the reader thread has reaped it
     def is_running(self):
-        return self._process.isalive()     
+        return self._process.terminated is False
 
 # ***********************************
 # INTERNAL FUNCTIONS
@@ -162,6 +173,7 @@ class MplayerDriver(object):
         # while True:
                 # pass
         self.start_play_signal = True  
+        self.events.fire('first-frame')
 
         self.audio_position=0.0
         
@@ -175,7 +187,15 @@ class MplayerDriver(object):
             if index == 0:   # nice day
                 # print 'nice day'
                 self.end_play_signal=True
-                break        
+                self.events.fire('finished','nice_day')
+            elif index == 2:
+                # output closed so mplayer has gone, may not have said exiting if it crashed
+                self._reap()
+                if self.end_play_signal is False:
+                    self.end_play_signal=True
+                    self.events.fire('finished','nice_day')
+                self.events.fire('closed','nice_day')
+                break
             else:
                 # matches _STATUS_REXP so audio position
                 self.audio_position = 0.0
@@ -183,3 +203,11 @@ class MplayerDriver(object):
                 sleep(0.05)
 
 
+
+
+    # on the reader thread, the only place mplayer is waited for so it does not become a zombie
+    def _reap(self):
+        try:
+            self._process.close()
+        except (pexpect.ExceptionPexpect,OSError) as e:
+            self.mon.warn(self,'cannot reap mplayer: ' + str(e))
@@ -0,0 +1,231 @@
+import os
+import subprocess
+import threading
+from collections import deque
+from pp_utils import Monitor
+from pp_lifecycle import LifecycleEvents
+from pp_scheduler import Scheduler
+
+"""
+ MplayerSlave plays audio tracks in one mplayer that is started once in slave mode and kept idle between tracks.
+ Each track is a loadfile command so there is no process to start and the next track plays as soon as it is asked for.
+
+ It is used by AudioPlayer in place of MplayerDriver for tracks that have no mplayer-other-options,
+ options can only be given to mplayer when it starts.
+
+ One reader thread for the life of the process reads mplayer's output, the lines that matter are
+         Playing <file>.        mplayer has taken the next loadfile
+         Starting playback...   the track is playing and can take controls
+         EOF code: <n>          the track has ended, come to its end or been stopped (needs -msglevel global=6)
+         Failed to open <file>. the track could not be played, there is no EOF code
+ As mplayer does the loadfiles in order the driver that each line belongs to is known without asking mplayer.
+
+ External commands and events are the same as MplayerDriver except play takes the volume and audio filter,
+ 'closed' is fired when the track has ended as the process carries on.
+ Keyboard controls (mplay-<char>) are translated to slave commands where there is one.
+
+ pp_fakemplayer.py can be used instead of mplayer, see --audio in pp_options.py
+"""
+
+class MplayerSlave(object):
+
+    _LAUNCH_CMD = ['mplayer','-slave','-idle','-quiet','-msglevel','global=6','-nolirc']
+
+    # mplayer keyboard controls that have a slave command
+    _KEY_COMMANDS = {'p':'pause','m':'mute','9':'volume -1','0':'volume 1','/':'volume -1','*':'volume 1',
+                     '[':'speed_mult 0.9091',']':'speed_mult 1.1','{':'speed_mult 0.5','}':'speed_mult 2.0',
+                     '\x08':'speed_set 1.0'}
+
+# CLASS VARIABLES (MplayerSlave.)
+    enabled=True            # set from the command line by PiPresents, False to start an mplayer for each track
+    command=_LAUNCH_CMD     # set to run pp_fakemplayer.py by PiPresents
+    process=None
+    reader=None
+    lock=threading.Lock()
+    loading=deque()         # drivers whose loadfile mplayer has not taken yet, in the order sent
+    playing=None            # driver whose track mplayer is playing
+    log_file=None
+
+
+    def __init__(self,widget,pp_dir):
+        self.widget=widget
+        self.pp_dir=pp_dir
+        self.mon=Monitor()
+        self.events=LifecycleEvents()
+
+        self.paused=False
+        self.muted=False
+        self.start_play_signal=False
+        self.end_play_signal=False
+        self.terminate_reason=''
+        self.audio_position=0.0
+        self.volume=0
+        self.audio_filter=''
+
+
+    def play(self,track,volume,audio_filter):
+        self.paused=False
+        self.start_play_signal = False
+        self.end_play_signal=False
+        self.terminate_reason=''
+        self.volume=volume
+        self.audio_filter=audio_filter
+        if MplayerSlave.process is None or MplayerSlave.process.poll() is not None:
+            if self._start() is False:
+                self.end_play_signal=True
+                self.events.fire('finished','error')
+                self.events.fire('closed','error')
+                return
+        # slave commands take the file name in double quotes
+        track='"' + track.replace('\\','\\\\').replace('"','\\"') + '"'
+        self.mon.log(self,'Send command to mplayer: loadfile ' + track)
+        MplayerSlave.lock.acquire()
+        MplayerSlave.loading.append(self)
+        MplayerSlave.lock.release()
+        self._send('loadfile ' + track)
+
+
+    def control(self,char):
+        command=MplayerSlave._KEY_COMMANDS.get(char)
+        if command is None:
+            self.mon.log(self,'No mplayer slave command for control: ' + char)
+        elif self._is_playing():
+            self._send(command)
+
+    def mute(self):
+        if self.muted is False and self._is_playing():
+            self._send('pausing_keep mute 1')
+            self.muted=True
+
+    def unmute(self):
+        if self.muted is True and self._is_playing():
+            self._send('pausing_keep mute 0')
+            self.muted=False
+
+    def pause(self):
+        if self._is_playing():
+            self._send('pause')
+            self.paused = not self.paused
+
+    def pause_on(self):
+        if self.paused is False:
+            self.pause()
+
+    def pause_off(self):
+        if self.paused is True:
+            self.pause()
+
+    def stop(self):
+        if self._is_playing() or self in MplayerSlave.loading:
+            self._send('stop')
+
+    # stop the track, the process is left for the next track
+    def terminate(self,reason):
+        self.terminate_reason=reason
+        if self._is_playing() or self in MplayerSlave.loading:
+            self._send('stop')
+        else:
+            self.end_play_signal=True
+
+    def get_terminate_reason(self):
+        return self.terminate_reason
+
+    def is_running(self):
+        return MplayerSlave.process is not None and MplayerSlave.process.poll() is None
+
+
+    # quit mplayer, called by PiPresents on exit
+    def quit(self):
+        if MplayerSlave.process is not None and MplayerSlave.process.poll() is None:
+            self._send('quit')
+
+
+# ***********************************
+# INTERNAL FUNCTIONS
+# ************************************
+
+    def _is_playing(self):
+        return MplayerSlave.playing is self
+
+
+    def _start(self):
+        self.mon.log(self,'Starting mplayer in slave mode: ' + ' '.join(MplayerSlave.command))
+        try:
+            MplayerSlave.process=subprocess.Popen(MplayerSlave.command,stdin=subprocess.PIPE,
+                                                  stdout=subprocess.PIPE,stderr=subprocess.STDOUT,close_fds=True)
+        except OSError as e:
+            self.mon.err(self,'Cannot start mplayer: ' + str(e))
+            MplayerSlave.process=None
+            return False
+        MplayerSlave.loading.clear()
+        MplayerSlave.playing=None
+        # opened once for the life of the process, not for each track
+        MplayerSlave.log_file=open(self.pp_dir + os.sep + 'pp_logs' + os.sep + 'mplayerlogfile.txt','w')
+        MplayerSlave.reader=threading.Thread(target=self._read,args=(MplayerSlave.process,))
+        MplayerSlave.reader.daemon=True
+        MplayerSlave.reader.start()
+        return True
+
+
+    def _send(self,command):
+        MplayerSlave.lock.acquire()
+        try:
+            MplayerSlave.process.stdin.write(command + '\n')
+            MplayerSlave.process.stdin.flush()
+        except (IOError,AttributeError) as e:
+            # mplayer has gone, the reader thread ends the track
+            self.mon.warn(self,'Cannot send to mplayer: ' + command + ' ' + str(e))
+        finally:
+            MplayerSlave.lock.release()
+
+
+    # the reader thread, the drivers are only changed under the lock as the Tk thread adds to loading
+    def _read(self,process):
+        for line in iter(process.stdout.readline,''):
+            if MplayerSlave.log_file is not None:
+                MplayerSlave.log_file.write(line)
+                MplayerSlave.log_file.flush()
+            line=line.strip()
+            if line.startswith('Playing '):
+                MplayerSlave.lock.acquire()
+                if len(MplayerSlave.loading) > 0:
+                    MplayerSlave.playing=MplayerSlave.loading.popleft()
+                MplayerSlave.lock.release()
+            elif line.startswith('Starting playback') and MplayerSlave.playing is not None:
+                driver=MplayerSlave.playing
+                # the settings of the last track are kept by mplayer, the volume is absolute
+                if driver.audio_filter != '':
+                    driver._send('af_switch ' + driver.audio_filter)
+                driver._send('volume ' + str(driver.volume) + ' 1')
+                driver._send('pausing_keep mute 0')
+                driver.start_play_signal=True
+                driver.events.fire('first-frame')
+            elif (line.startswith('EOF code:') or line.startswith('Failed to open')) and MplayerSlave.playing is not None:
+                self._ended(MplayerSlave.playing,'nice_day')
+                MplayerSlave.playing=None
+        # output closed so mplayer has gone, end the track playing and any waiting to be taken
+        process.wait()
+        Scheduler().post(self.mon.log,self,'mplayer has exited with code ' + str(process.returncode))
+        MplayerSlave.lock.acquire()
+        if MplayerSlave.process is not process:
+            # a new mplayer has been started already
+            MplayerSlave.lock.release()
+            return
+        drivers=list(MplayerSlave.loading)
+        if MplayerSlave.playing is not None:
+            drivers.insert(0,MplayerSlave.playing)
+        MplayerSlave.loading.clear()
+        MplayerSlave.playing=None
+        MplayerSlave.process=None
+        if MplayerSlave.log_file is not None:
+            MplayerSlave.log_file.close()
+            MplayerSlave.log_file=None
+        MplayerSlave.lock.release()
+        for driver in drivers:
+            self._ended(driver,'nice_day')
+
+
+    def _ended(self,driver,reason):
+        driver.end_play_signal=True
+        driver.events.fire('finished',reason)
+        driver.events.fire('closed',reason)
@@ -0,0 +1,157 @@
+import os
+import threading
+import dbus
+import dbus.bus
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+
+
+class OMXBus(object):
+    """
+    the one connection to the dbus session bus that omxplayer starts, shared by all the OMXDrivers.
+    The first omxplayer starts a dbus-daemon and writes its address to /tmp/omxplayerdbus.<user>,
+    the address is read once when the file appears and the connection is kept for the life of Pi Presents.
+
+    A driver asks to be told when its omxplayer has registered its dbus name. The bus's NameOwnerChanged
+    signal is delivered by a glib main loop in its own thread so the driver attaches the moment the name appears.
+    Without glib the names are polled with NameHasOwner every poll_interval, which does not read any files.
+
+    Usage:
+        OMXBus().attach(dbus_name,self.attached)    # attached() is called on the Tk thread
+        omx_object=OMXBus().get_object(dbus_name)
+    """
+
+# CLASS VARIABLES (OMXBus.)
+    connection=None
+    glib=None               # glib module if there is one
+    dbus_mainloop=None      # glib main loop for dbus, None if polling
+    waiting={}              # dbus name -> callback waiting for omxplayer to register the name
+    poll_timer=None
+    poll_interval=20        # ms
+
+
+    def __init__(self):
+        self.mon=Monitor()
+        self.scheduler=Scheduler()
+
+
+    # call callback() on the Tk thread as soon as omxplayer has registered dbus_name
+    def attach(self,dbus_name,callback):
+        OMXBus.waiting[dbus_name]=callback
+        if OMXBus.connection is None and self._connect() is False:
+            # first omxplayer has not started the bus yet
+            self._start_polling()
+            return
+        # the name may have been registered before the driver asked
+        self._check(dbus_name)
+
+
+    # stop waiting for dbus_name, e.g. omxplayer killed before it started
+    def cancel(self,dbus_name):
+        OMXBus.waiting.pop(dbus_name,None)
+
+
+    def get_object(self,dbus_name):
+        return OMXBus.connection.get_object(dbus_name,"/org/mpris/MediaPlayer2",introspect=False)
+
+
+    def _check(self,dbus_name):
+        try:
+            owned=OMXBus.connection.name_has_owner(dbus_name)
+        except dbus.exceptions.DBusException as ex:
+            # bus has gone away, connect again when the next omxplayer starts one
+            self.mon.warn(self,'Lost omxplayer dbus - dbus exception: {}'.format(ex.get_dbus_message()))
+            OMXBus.connection=None
+            self._start_polling()
+            return
+        if owned is True:
+            self._attached(dbus_name)
+        elif OMXBus.dbus_mainloop is None:
+            self._start_polling()
+
+
+    def _attached(self,dbus_name):
+        callback=OMXBus.waiting.pop(dbus_name,None)
+        if callback is not None:
+            callback()
+
+
+    def _start_polling(self):
+        if OMXBus.poll_timer is None:
+            OMXBus.poll_timer=self.scheduler.after(OMXBus.poll_interval,self._poll)
+
+
+    def _poll(self):
+        OMXBus.poll_timer=None
+        if len(OMXBus.waiting) == 0:
+            return
+        if OMXBus.connection is None and self._connect() is False:
+            self._start_polling()
+            return
+        for dbus_name in OMXBus.waiting.keys():
+            if OMXBus.connection is not None:
+                self._check(dbus_name)
+
+
+    # in the glib thread
+    def _name_owner_changed(self,name,old_owner,new_owner):
+        if new_owner != '' and name in OMXBus.waiting:
+            self.scheduler.post(self._attached,name)
+
+
+# ***************************
+# Connecting
+# ***************************
+
+    def _connect(self):
+        address_filename = "/tmp/omxplayerdbus.{}".format(os.environ.get('USER','root'))
+        try:
+            address_file=open(address_filename,'r')
+            bus_address=address_file.read().strip()
+            address_file.close()
+        except IOError:
+            return False
+        if bus_address == '':
+            # omxplayer is writing it
+            return False
+        if OMXBus.glib is None:
+            self._start_glib()
+        try:
+            if OMXBus.dbus_mainloop is not None:
+                connection=dbus.bus.BusConnection(bus_address,mainloop=OMXBus.dbus_mainloop)
+                connection.add_signal_receiver(self._name_owner_changed,
+                                               signal_name='NameOwnerChanged',
+                                               dbus_interface='org.freedesktop.DBus',
+                                               bus_name='org.freedesktop.DBus',
+                                               path='/org/freedesktop/DBus')
+            else:
+                connection=dbus.bus.BusConnection(bus_address)
+        except dbus.exceptions.DBusException as ex:
+            # address left over from a bus that has gone, omxplayer will start a new one
+            self.mon.log(self,'Cannot connect to omxplayer dbus yet - dbus exception: {}'.format(ex.get_dbus_message()))
+            return False
+        OMXBus.connection=connection
+        self.mon.log(self,'Connected to omxplayer dbus at ' + bus_address)
+        return True
+
+
+    # start a glib main loop thread to receive dbus signals, glib is not needed by anything else so it is optional
+    def _start_glib(self):
+        try:
+            import gobject as glib
+        except ImportError:
+            try:
+                from gi.repository import GLib as glib
+            except ImportError:
+                OMXBus.glib=False
+                self.mon.log(self,'glib is not installed, polling for omxplayer dbus names')
+                return
+        from dbus.mainloop.glib import DBusGMainLoop, threads_init
+        if hasattr(glib,'threads_init'):
+            glib.threads_init()
+        threads_init()
+        OMXBus.glib=glib
+        OMXBus.dbus_mainloop=DBusGMainLoop()
+        thread=threading.Thread(target=glib.MainLoop().run)
+        thread.daemon=True
+        thread.start()
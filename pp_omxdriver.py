@@ -1,21 +1,31 @@
-import signal
 import os
 import sys
 import dbus
+import shlex
 import subprocess
-from time import time,strftime
+import threading
+import Queue
+from time import time,strftime,sleep
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_lifecycle import LifecycleEvents
+from pp_omxbus import OMXBus
+from pp_childwatcher import ChildWatcher
+from pp_mediainfo import MediaInfo
 
 
 """
 12/6/2016 - rewrite to use dbus
 2/11/2016 - connection needs to wait for dbus filemane to be populated
 2/11/2016 - remove busy wait for conection
+          - (now one shared dbus connection, drivers attach when omxplayer registers its name, see pp_omxbus.py)
 24/11/2016 - move pause after load to after first get_position to ensure omxplayer has loaded track before pause
 24/11/2016 - report dbus exception messages in log
 30/11/2016 - pause at start waits until position is not 0 as video has not started until it becomes -ve
 2/12/2016 - make pause glitch tolerant, try again if fails
 3/12/2016 - remove threading to stop pause and unpause for showing happening in wrong order
+          - (dbus traffic is now in one monitor thread with a command queue so the order is kept)
+          - (the duration is taken from the media info index when the track is in it, see pp_mediainfo.py)
 5/12/2016 - deal with situation where pause at end happened so late that video finished first
 5/12/2016 - need to send nice-day when stop is received and paused for end as now do not intercept one from omxplayer
 
@@ -29,12 +39,14 @@ from pp_utils import Monitor
   load  - processes the track up to where it is ready to display, at this time it pauses.
  show  - plays the video from where 'prepare' left off by resuming from the pause.
  play -  plays a track (not used by gapless)
- pause/unpause   -  pause on/off
+ pause_on/pause_off   -  pause on/off
  toggle_pause  - toggles pause
  control  - sends controls to omxplayer.bin  while track is playing (use stop and pause instead of q and p)
  stop - stops a video that is playing.
+ The commands are queued for the monitor thread which does all the dbus traffic, they return straight away.
  terminate - Stops a video playing. Used when aborting an application.
- kill - kill of omxplayer when it hasn't terminated at the end of a track.
+ kill - kill of omxplayer when it hasn't terminated at the end of a track, SIGKILL if it is still there at kill_deadline.
+ The omxplayer process is watched by ChildWatcher (pp_childwatcher.py) which fires closed as soon as it exits.
  
 Signals
 ----------
@@ -44,12 +56,29 @@ Signals
          self.end_play_reason reports the reason for the end
  Also is_running() tests whether the sub-process running omxplayer is present.
 
+Events
+----------
+ The same transitions are also fired as lifecycle events so a player can wait for them rather than poll the signals
+         self.events.when('loaded',callback) - connected to omxplayer's dbus
+         self.events.when('first-frame',callback) - paused ready to show, same time as start_play_signal
+         self.events.when('finished',callback) - callback(reason) same time as end_play_signal
+         self.events.when('closed',callback) - omxplayer process has exited
+
 """
 
 class OMXDriver(object):
 
     # adjust this to determine freeze after the first frame
     after_first_frame_position =-50000 # microseconds
+
+    # how far before the end a track that freezes at the end is paused
+    pause_at_end_leeway=350000 # microseconds
+
+    # how often the monitor thread reads the position of the video
+    status_interval=0.02 # seconds
+
+    # how long omxplayer has to exit after SIGINT before it is killed
+    kill_deadline=2000 # milliseconds
    
     _LAUNCH_CMD = '/usr/bin/omxplayer --no-keys '  # needs changing if user has installed his own version of omxplayer elsewhere
     KEY_MAP =   { '-': 17, '+': 18, '=': 18} # add more keys here, see popcornmix/omxplayer github file KeyConfig.h
@@ -61,11 +90,14 @@ class OMXDriver(object):
         self.pp_dir=pp_dir
         
         self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.events=LifecycleEvents()
 
         self.start_play_signal=False
         self.end_play_signal=False
         self.end_play_reason='nothing'
         self.duration=0
+        self.known_duration=None    # secs from the media info index
         self.video_position=0
         
         self.pause_at_end_required=False
@@ -80,6 +112,10 @@ class OMXDriver(object):
 
         self.terminate_reason=''
 
+        # monitor thread and the commands queued for it
+        self.monitor_thread=None
+        self.commands=Queue.Queue()
+
         #  dbus and subprocess
         self._process=None
         self.__iface_root=None
@@ -90,9 +126,9 @@ class OMXDriver(object):
     def load(self, track, freeze_at_start,options,caller):
         self.pause_before_play_required=freeze_at_start
         self.caller=caller
-        track= "'"+ track.replace("'","'\\''") + "'"
+        # looked up now so the monitor thread does not need to ask omxplayer
+        self.known_duration=MediaInfo().duration(track)
         # self.mon.log(self,'TIME OF DAY: '+ strftime("%Y-%m-%d %H:%M"))
-        self.dbus_user = os.environ["USER"]
 
         self.id=str(int(time()*10))
 
@@ -100,43 +136,34 @@ class OMXDriver(object):
 
         self.dbus_name = "org.mpris.MediaPlayer2.omxplayer"+self.id
         
-        self.omxplayer_cmd = OMXDriver._LAUNCH_CMD + options + " --dbus_name '"+ self.dbus_name + "' " + track
-        # self.mon.log(self, 'dbus user ' + self.dbus_user)
+        # no shell so the track does not need quoting
+        self.omxplayer_cmd = shlex.split(OMXDriver._LAUNCH_CMD + options) + ['--dbus_name',self.dbus_name,track]
         # self.mon.log(self, 'dbus name ' + self.dbus_name)
 
         # print self.omxplayer_cmd
-        self.mon.log(self, "Send command to omxplayer: "+ self.omxplayer_cmd)
-        # self._process=subprocess.Popen(self.omxplayer_cmd,shell=True,stdout=file('/home/pi/pipresents/pp_logs/stdout.txt','a'),stderr=file('/home/pi/pipresents/pp_logs/stderr.txt','a'))
-        self._process=subprocess.Popen(self.omxplayer_cmd,shell=True,stdout=file('/dev/null','a'),stderr=file('/dev/null','a'))
+        self.mon.log(self, "Send command to omxplayer: "+ ' '.join(self.omxplayer_cmd))
+        self.launch_time=time()
+        # in its own process group so omxplayer.bin can be signalled with the omxplayer script
+        self._process=subprocess.Popen(self.omxplayer_cmd,stdout=file('/dev/null','a'),stderr=file('/dev/null','a'),
+                                       preexec_fn=os.setpgrp)
         self.pid=self._process.pid
+        ChildWatcher().watch(self._process,'omxplayer',self._exited)
 
-        # wait for omxplayer to start then start monitoring thread
-        self.dbus_tries = 0
-        self.omx_loaded = False
-        self._wait_for_dbus()
+        # wait for omxplayer to register its dbus name then start monitoring thread
+        OMXBus().attach(self.dbus_name,self._attached)
         return
     
-    def _wait_for_dbus(self):
-        connect_success=self.__dbus_connect()
-        if connect_success is True:
-            # print 'SUCCESS'
-            self.mon.log(self,'connected to omxplayer dbus after ' + str(self.dbus_tries) + ' centisecs')
-                
-            # get duration of the track in microsecs if fails return a very large duration
-            # posibly faile because omxplayer is running but not omxplayer.bin
-            duration_success,duration=self.get_duration()
-            if duration_success is False:
-                self.mon.warn(self,'get duration failed for n attempts using '+ str(duration/60000000)+ ' minutes')
-            # calculate time to pause before last frame
-            self.duration = duration
-            self.pause_at_end_time = duration - 350000
-            # start the thread that is going to monitor output from omxplayer.
-            self._monitor_status()
-        else:
-            self.dbus_tries+=1
-            self.widget.after(100,self._wait_for_dbus)
 
-    
+    def _attached(self):
+        self.mon.log(self,'attached to omxplayer dbus %.0f ms after launch' % ((time()-self.launch_time)*1000))
+        omx_object = OMXBus().get_object(self.dbus_name)
+        self.__iface_root = dbus.Interface(omx_object, "org.mpris.MediaPlayer2")
+        self.__iface_props = dbus.Interface(omx_object, "org.freedesktop.DBus.Properties")
+        self.__iface_player = dbus.Interface(omx_object, "org.mpris.MediaPlayer2.Player")
+        # start the thread that is going to monitor omxplayer.
+        self._monitor_status()
+
+
 
     def _monitor_status(self):
         # print '\n',self.id, '** STARTING ',self.duration
@@ -145,104 +172,219 @@ class OMXDriver(object):
         self.end_play_reason='nothing'
         self.paused_at_end=False
         self.paused_at_start='False'
-        self.delay = 50
-        self.widget.after(0,self._status_loop)
+        self.monitor_thread=threading.Thread(target=self._monitor)
+        self.monitor_thread.daemon=True
+        self.monitor_thread.start()
 
 
+# ***************************
+# Monitor thread
+# ***************************
 
     """
+    All the dbus traffic with omxplayer after connecting is done by the monitor thread so the Tk thread
+    never waits for omxplayer. Commands from the Tk thread are queued in self.commands and done
+    at the next tick, results go back to the Tk thread with Scheduler.post().
+    The thread reads the position every status_interval seconds on a fixed deadline so pausing after load
+    and at the end happen at regular times whatever the Tk thread is doing.
+
     freeze at start
     'no' - unpause in show - test !=0
     'before_first_frame' - don't unpause in show, test !=0
     'after_first_frame' - don't unpause in show, test > -100000
     """
-        
-    def _status_loop(self):
-            if self.is_running() is False:
-                # process is not running because quit or natural end - seems not to happen
-                self.end_play_signal=True
-                self.end_play_reason='nice_day'
-                # print ' send nice day - process not running'
+
+    def _monitor(self):
+        # get duration of the track in microsecs, from the media info index if it is there otherwise from omxplayer
+        # if that fails return a very large duration
+        # posibly faile because omxplayer is running but not omxplayer.bin
+        if self.known_duration is not None:
+            duration=int(self.known_duration*1000000)
+        else:
+            duration_success,duration=self.get_duration()
+            if duration_success is False:
+                self._post_warn('get duration failed for n attempts using '+ str(duration/60000000)+ ' minutes')
+        # calculate time to pause before last frame
+        self.duration = duration
+        self.pause_at_end_time = duration - OMXDriver.pause_at_end_leeway
+        self.events.fire('loaded')
+
+        monitoring=True
+        next_tick=time()
+        while True:
+            # sleep to the deadline rather than for the interval so the ticks do not drift
+            delay=next_tick-time()
+            if delay>0:
+                sleep(delay)
+            next_tick+=OMXDriver.status_interval
+            if next_tick<time():
+                # fell behind, do not try to catch up with a burst of ticks
+                next_tick=time()+OMXDriver.status_interval
+            while True:
+                try:
+                    command=self.commands.get_nowait()
+                except Queue.Empty:
+                    break
+                self._do_command(command)
+            if monitoring is True:
+                monitoring=self._status_tick()
+            elif self.is_running() is False:
                 return
+
+
+    # returns False when the end of the track has been reported
+    def _status_tick(self):
+        if self.is_running() is False:
+            # process is not running because quit or natural end - seems not to happen
+            # print ' send nice day - process not running'
+            self.scheduler.post(self._status_event,'finished','nice_day')
+            return False
+        success, video_position = self.get_position()
+        # if video_position <= 0: print 'read position',video_position
+        if success is False:
+            # print 'send nice day - exception when reading video position'
+            self.scheduler.post(self._status_event,'finished','nice_day')
+            return False
+        self.video_position=video_position
+        # if timestamp is near the end then pause
+        if self.pause_at_end_required is True and self.video_position>self.pause_at_end_time:    #microseconds
+            # print 'pausing at end, leeway ',self.duration - self.video_position
+            pause_end_success = self._pause(' at end of track')
+            if pause_end_success is True:
+                # print self.id,' pause for end success', self.video_position
+                self.paused_at_end=True
+                self.scheduler.post(self._status_event,'finished','pause_at_end')
+                return False
             else:
-                success, video_position = self.get_position()
-                # if video_position <= 0: print 'read position',video_position
-                if success is False:
-                    # print 'send nice day - exception when reading video position'
-                    self.end_play_signal=True
-                    self.end_play_reason='nice_day'
-                    return
-                else:
-                    self.video_position=video_position
-                    # if timestamp is near the end then pause
-                    if self.pause_at_end_required is True and self.video_position>self.pause_at_end_time:    #microseconds
-                        # print 'pausing at end, leeway ',self.duration - self.video_position
-                        pause_end_success = self.pause(' at end of track')
-                        if pause_end_success is True:
-                            # print self.id,' pause for end success', self.video_position
-                            self.paused_at_end=True
-                            self.end_play_signal=True
-                            self.end_play_reason='pause_at_end'
-                            return
-                        else:
-                            print 'pause at end failed, probably because of delay after detection, just run on'
-                            self.widget.after(self.delay,self._status_loop)
+                self._post_log('pause at end failed, probably because of delay after detection, just run on')
+                return True
+
+        # need to do the pausing for preload after first timestamp is received 0 is default value before start
+        # print self.pause_before_play_required,self.paused_at_start,self.video_position,OMXDriver.after_first_frame_position
+        if (self.pause_before_play_required == 'after-first-frame' and self.paused_at_start == 'False' and self.video_position >OMXDriver.after_first_frame_position)\
+        or(self.pause_before_play_required != 'after-first-frame' and self.paused_at_start == 'False' and self.video_position !=0):
+            pause_after_load_success=self._pause('after load')
+            if pause_after_load_success is True:
+                # print self.id,' pause after load success',self.video_position
+                self.paused_at_start='True'
+                self.scheduler.post(self._status_event,'first-frame',None)
+            else:
+                # should never fail, just warn at the moment
+                # print 'pause after load failed '+ + str(self.video_position)
+                self._post_warn(str(self.id)+ ' pause after load fail ' + str(self.video_position))
+        return True
+
+
+    # on the Tk thread, the signals are only changed here so the player sees them change in order
+    def _status_event(self,event,reason):
+        if event == 'first-frame':
+            self.start_play_signal = True
+            self.events.fire('first-frame')
+        else:
+            self.end_play_signal=True
+            self.end_play_reason=reason
+            self.events.fire('finished',reason)
+
+
+    def _do_command(self,command):
+        name=command[0]
+        if name == 'unpause':
+            unpause_success=self._unpause(command[1])
+            if unpause_success is False and command[2] is True:
+                # should never fail, just warn at the moment
+                self._post_warn(str(self.id)+ ' unpause' + command[1] + ' fail ' + str(self.video_position))
+        elif name == 'pause':
+            self._pause(command[1])
+        elif name == 'pause-on':
+            self._pause_on()
+        elif name == 'pause-off':
+            self._pause_off()
+        elif name == 'toggle-pause':
+            self._toggle_pause()
+        elif name == 'control':
+            self._control(command[1])
+        elif name == 'quit':
+            self._quit()
+        else:
+            # mute, unmute
+            if self.is_running():
+                try:
+                    if name == 'mute':
+                        self.__iface_player.Mute()
                     else:
-                        # need to do the pausing for preload after first timestamp is received 0 is default value before start
-                        # print self.pause_before_play_required,self.paused_at_start,self.video_position,OMXDriver.after_first_frame_position
-                        if (self.pause_before_play_required == 'after-first-frame' and self.paused_at_start == 'False' and self.video_position >OMXDriver.after_first_frame_position)\
-                        or(self.pause_before_play_required != 'after-first-frame' and self.paused_at_start == 'False' and self.video_position !=0):
-                            pause_after_load_success=self.pause('after load')
-                            if pause_after_load_success is True:
-                                # print self.id,' pause after load success',self.video_position
-                                self.start_play_signal = True
-                                self.paused_at_start='True'
-                            else:
-                                # should never fail, just warn at the moment
-                                # print 'pause after load failed '+ + str(self.video_position)
-                                self.mon.warn(self, str(self.id)+ ' pause after load fail ' + str(self.video_position))                                   
-                            self.widget.after(self.delay,self._status_loop)
-                        else:
-                            self.widget.after(self.delay,self._status_loop)
+                        self.__iface_player.Unmute()
+                except dbus.exceptions.DBusException as ex:
+                    self._post_warn('Failed to ' + name + ' - dbus exception: {}'.format(ex.get_dbus_message()))
 
 
-    
+    # Monitor writes to the log file and the terminal so is only used from the Tk thread
+    def _post_warn(self,text):
+        self.scheduler.post(self.mon.warn,self,text)
+
+    def _post_log(self,text):
+        self.scheduler.post(self.mon.log,self,text)
+
+
+# ***************************
+# Commands from the player
+# ***************************
+
     def show(self,freeze_at_end_required,initial_volume):
         self.initial_volume=initial_volume
         self.pause_at_end_required=freeze_at_end_required
         # unpause to start playing
         if self.pause_before_play_required =='no':
-            unpause_show_success=self.unpause(' to start showing')
-            # print 'unpause for show',self.paused
-            if unpause_show_success is True:
-                pass
-                # print self.id,' unpause for show success', self.video_position
-            else:
-                # should never fail, just warn at the moment
-                self.mon.warn(self, str(self.id)+ ' unpause for show fail ' + str(self.video_position))                                   
+            self.commands.put(('unpause',' to start showing',True))
 
         
     def control(self,char):
-
         val = OMXDriver.KEY_MAP[char]
         self.mon.log(self,'>control received and sent to omxplayer ' + str(self.pid))
-        if self.is_running():
-            try:
-                self.__iface_player.Action(dbus.Int32(val))
-            except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to send control - dbus exception: {}'.format(ex.get_dbus_message()))
-                return
-        else:
-            self.mon.warn(self,'Failed to send control - process not running')
-            return
+        self.commands.put(('control',val))
+
 
-        
     # USE ONLY at end and after load
-    # return succces of the operation, several tries if pause did not work and no error reported.
     def pause(self,reason):
         self.mon.log(self,'pause received '+reason)
+        self.commands.put(('pause',reason))
+
+
+    def pause_on(self):
+        self.mon.log(self,'pause on received ')
+        self.commands.put(('pause-on',))
+
+
+    def pause_off(self):
+        self.mon.log(self,'pause off received ')
+        self.commands.put(('pause-off',))
+
+
+    def go(self):
+        self.mon.log(self,'go received ')
+        self.commands.put(('unpause','for go',False))
+
+
+    def mute(self):
+        self.commands.put(('mute',))
+
+            
+    def unmute(self):
+        self.commands.put(('unmute',))
+        
+
+    def toggle_pause(self,reason):
+        self.mon.log(self,'toggle pause received '+ reason)
+        self.commands.put(('toggle-pause',))
+
+
+# ***************************
+# dbus commands, monitor thread only
+# ***************************
+
+    # return succces of the operation, several tries if pause did not work and no error reported.
+    def _pause(self,reason):
         if self.paused is False:
-            self.mon.log(self,'not paused so send pause '+reason)
+            self._post_log('not paused so send pause '+reason)
             tries=1
             while True:
                 if self.send_pause() is False:
@@ -257,22 +399,20 @@ class OMXDriver(object):
                     return False
                 else:
                     # failed for no good reason
-                    self.mon.warn(self, '!!!!! repeat pause ' + str(tries))
+                    self._post_warn('!!!!! repeat pause ' + str(tries))
                     # print self.id,' !!!!! repeat pause ',self.video_position, tries
                     tries +=1
                     if tries >5:
                         # print self.id, ' pause failed for n attempts'
-                        self.mon.warn(self,'pause failed for n attempts')
+                        self._post_warn('pause failed for n attempts')
                         return False
             # repeat
+        return False
 
             
-    # USE ONLY for show
-
-    def unpause(self,reason):
-        self.mon.log(self,'Unpause received '+ reason)
+    def _unpause(self,reason):
         if self.paused is True:
-            self.mon.log(self,'Is paused so Track will be unpaused '+ reason)
+            self._post_log('Is paused so Track will be unpaused '+ reason)
             tries=1
             while True:
                 if self.send_unpause() is False:
@@ -288,13 +428,14 @@ class OMXDriver(object):
                     # failed for good reason because of exception or process not running caused by end of track
                     return False
                 else:
-                    self.mon.warn(self, '!!!!! repeat unpause ' + str(tries))
+                    self._post_warn('!!!!! repeat unpause ' + str(tries))
                     # print self.id,' !!!! repeat unpause ',self.video_position, tries
                     tries +=1
                     if tries >5:
                         # print self.id, ' unpause failed for n attempts'                       
-                        self.mon.warn(self,'unpause failed for n attempts')
+                        self._post_warn('unpause failed for n attempts')
                         return False
+        return False
                     
 
     def omxplayer_is_paused(self):
@@ -302,11 +443,11 @@ class OMXDriver(object):
             try:
                 result=self.__iface_props.PlaybackStatus()
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to test paused - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to test paused - dbus exception: {}'.format(ex.get_dbus_message()))
                 return 'Failed'
             return result
         else:
-            self.mon.warn(self,'Failed to test paused - process not running')
+            self._post_warn('Failed to test paused - process not running')
             # print self.id,' test paused not successful - process'
             return 'Failed'
 
@@ -316,11 +457,11 @@ class OMXDriver(object):
             try:
                 self.__iface_player.Pause()
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to send pause - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to send pause - dbus exception: {}'.format(ex.get_dbus_message()))
                 return False
             return True
         else:
-            self.mon.warn(self,'Failed to send pause - process not running')
+            self._post_warn('Failed to send pause - process not running')
             # print self.id,' send pause not successful - process'
             return False
 
@@ -330,16 +471,16 @@ class OMXDriver(object):
             try:
                 self.__iface_player.Action(16)
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to send unpause - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to send unpause - dbus exception: {}'.format(ex.get_dbus_message()))
                 return False
             return True
         else:
-            self.mon.warn(self,'Failed to send unpause - process not running')
+            self._post_warn('Failed to send unpause - process not running')
             # print self.id,' send unpause not successful - process'
             return False
 
-    def pause_on(self):
-        self.mon.log(self,'pause on received ')
+
+    def _pause_on(self):
         # print 'pause on',self.paused
         if self.paused is True:
             return
@@ -351,15 +492,14 @@ class OMXDriver(object):
                 # print 'paused OK'
                 return
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to do pause on - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to do pause on - dbus exception: {}'.format(ex.get_dbus_message()))
                 return
         else:
-            self.mon.warn(self,'Failed to do pause on - process not running')
+            self._post_warn('Failed to do pause on - process not running')
             return
                     
 
-    def pause_off(self):
-        self.mon.log(self,'pause off received ')
+    def _pause_off(self):
         # print 'pause off',self.paused
         if self.paused is False:
             return
@@ -370,30 +510,14 @@ class OMXDriver(object):
                 # print 'not paused OK'
                 return
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to do pause off - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to do pause off - dbus exception: {}'.format(ex.get_dbus_message()))
                 return
         else:
-            self.mon.warn(self,'Failed to do pause off - process not running')
+            self._post_warn('Failed to do pause off - process not running')
             return
 
-    def go(self):
-        self.mon.log(self,'go received ')
-        self.unpause('for go')
 
-
-    def mute(self):
-            self.__iface_player.Mute()
-            
-    def unmute(self):
-            self.__iface_player.Unmute()
-
-    def set_volume(self,millibels):
-        volume = pow(10, millibels / 2000.0);
-        self.__iface_props.Volume(volume)
-        
-
-    def toggle_pause(self,reason):
-        self.mon.log(self,'toggle pause received '+ reason)
+    def _toggle_pause(self):
         if not self.paused:
             self.paused = True
         else:
@@ -402,13 +526,42 @@ class OMXDriver(object):
             try:
                 self.__iface_player.Action(16)
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to toggle pause - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed to toggle pause - dbus exception: {}'.format(ex.get_dbus_message()))
+                return
+        else:
+            self._post_warn('Failed to toggle pause - process not running')
+            return
+
+
+    def _control(self,val):
+        if self.is_running():
+            try:
+                self.__iface_player.Action(dbus.Int32(val))
+            except dbus.exceptions.DBusException as ex:
+                self._post_warn('Failed to send control - dbus exception: {}'.format(ex.get_dbus_message()))
+                return
+        else:
+            self._post_warn('Failed to send control - process not running')
+            return
+
+
+    def _quit(self):
+        if self.is_running():
+            try:
+                self.__iface_root.Quit()
+            except dbus.exceptions.DBusException as ex:
+                self._post_warn('Failed to quit - dbus exception: {}'.format(ex.get_dbus_message()))
                 return
         else:
-            self.mon.warn(self,'Failed to toggle pause - process not running')
+            self._post_warn('Failed to quit - process not running')
             return
 
 
+    def set_volume(self,millibels):
+        volume = pow(10, millibels / 2000.0);
+        self.__iface_props.Volume(volume)
+
+
 
     def stop(self):
         self.mon.log(self,'>stop received and quit sent to omxplayer ' + str(self.pid))
@@ -416,16 +569,13 @@ class OMXDriver(object):
         if self.paused_at_end is True:
             self.end_play_signal=True
             self.end_play_reason='nice_day'
+            self.events.fire('finished','nice_day')
             # print 'send nice day for close track'
-        if self.is_running():
-            try:
-                self.__iface_root.Quit()
-            except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed to quit - dbus exception: {}'.format(ex.get_dbus_message()))
-                return
+        if self.monitor_thread is None:
+            # not attached to dbus yet so cannot ask omxplayer to quit
+            self.kill()
         else:
-            self.mon.warn(self,'Failed to quit - process not running')
-            return
+            self.commands.put(('quit',))
 
 
     # kill the subprocess (omxplayer and omxplayer.bin). Used for tidy up on exit.
@@ -449,10 +599,15 @@ class OMXDriver(object):
 
 
     # kill off omxplayer when it hasn't terminated at the end of a track.
-    # send SIGINT (CTRL C) so it has a chance to tidy up daemons and omxplayer.bin
+    # send SIGINT (CTRL C) so it has a chance to tidy up daemons and omxplayer.bin, SIGKILL if still there at the deadline
     def kill(self):
-        if self.is_running()is True:
-            self._process.send_signal(signal.SIGINT)
+        OMXBus().cancel(self.dbus_name)
+        ChildWatcher().kill(self._process,OMXDriver.kill_deadline)
+
+
+    # the child watcher has reaped omxplayer, it has ended or been told to quit
+    def _exited(self,returncode):
+        self.events.fire('closed','nice_day')
 
 
     def get_position(self):
@@ -472,7 +627,7 @@ class OMXDriver(object):
             if success is True:
                 return True,duration
             else:
-                self.mon.warn(self, 'repeat get duration ' + str(tries))
+                self._post_warn('repeat get duration ' + str(tries))
                 tries +=1
                 if tries >5:                      
                     return False,sys.maxint*100
@@ -485,61 +640,7 @@ class OMXDriver(object):
                 micros = self.__iface_props.Duration()
                 return True,micros
             except dbus.exceptions.DBusException as ex:
-                self.mon.warn(self,'Failed get duration - dbus exception: {}'.format(ex.get_dbus_message()))
+                self._post_warn('Failed get duration - dbus exception: {}'.format(ex.get_dbus_message()))
                 return False,-1
         else:
             return False,-1
-
-
-
-
-    # *********************
-    # connect to dbus
-    # *********************
-    def __dbus_connect(self):
-        if self.omx_loaded is False:
-            # read the omxplayer dbus data from files generated by omxplayer
-            bus_address_filename = "/tmp/omxplayerdbus.{}".format(self.dbus_user)
-            bus_pid_filename = "/tmp/omxplayerdbus.{}.pid".format(self.dbus_user)
-
-            if not os.path.exists(bus_address_filename):
-                self.mon.log(self, 'waiting for bus address file ' + bus_address_filename)
-                self.omx_loaded=False
-                return False
-            else:
-                f = open(bus_address_filename, "r")
-                bus_address = f.read().rstrip()
-                if bus_address == '':
-                    self.mon.log(self, 'waiting for bus address in file ' + bus_address_filename)
-                    self.omx_loaded=False
-                    return False
-                else:
-                    # self.mon.log(self, 'bus address found ' + bus_address)
-                    if not os.path.exists(bus_pid_filename):
-                        self.mon.warn(self, 'bus pid file does not exist ' + bus_pid_filename)
-                        self.omx_loaded=False
-                        return False
-                    else:
-                        f= open(bus_pid_filename, "r")
-                        bus_pid = f.read().rstrip()
-                        if bus_pid == '':
-                            self.omx_loaded=False
-                            return False
-                        else:
-                            # self.mon.log(self, 'bus pid found ' + bus_pid)
-                            os.environ["DBUS_SESSION_BUS_ADDRESS"] = bus_address
-                            os.environ["DBUS_SESSION_BUS_PID"] = bus_pid
-                            self.omx_loaded = True
-       
-        if self.omx_loaded is True:
-            session_bus = dbus.SessionBus()
-            try:
-                omx_object = session_bus.get_object(self.dbus_name, "/org/mpris/MediaPlayer2", introspect=False)
-                self.__iface_root = dbus.Interface(omx_object, "org.mpris.MediaPlayer2")
-                self.__iface_props = dbus.Interface(omx_object, "org.freedesktop.DBus.Properties")
-                self.__iface_player = dbus.Interface(omx_object, "org.mpris.MediaPlayer2.Player")
-            except dbus.exceptions.DBusException as ex:
-                # self.mon.log(self,"Waiting for dbus connection to omxplayer: {}".format(ex.get_dbus_message()))
-                return False
-        return True
-
@@ -20,11 +20,66 @@ def command_options():
     parser.add_argument( '-p','--profile', nargs='?', default='', const='',help='Profile')
     parser.add_argument( '--manager', action='store_true',help='Use With Manager for PiPresents')
     parser.add_argument( '-n','--nonetwork', nargs='?', default=wait_no_w, const=wait_w,help='Enable wait for network [and time in secs]')
+    parser.add_argument( '--imagecache', nargs='?', default=64, const=64,help='Memory for decoded images in MB, 0 to disable')
+    parser.add_argument( '--exif', action='store_true',help='Turn camera images the right way up by their EXIF orientation')
+    parser.add_argument( '--norepeat', nargs='?', default=1, const=1,help='Number of tracks not repeated between cycles of a shuffled show')
+    parser.add_argument( '--decode', nargs='?', default='threads', const='threads', choices=['threads','processes','off'],help='Decode images in worker threads, processes or off')
+    parser.add_argument( '--lookahead', nargs='?', default=3, const=3,help='Number of images a show decodes ahead')
+    parser.add_argument( '--audio', nargs='?', default='slave', const='slave', choices=['slave','spawn','fake'],help='Play audio tracks in one mplayer in slave mode, an mplayer for each track, or pp_fakemplayer.py')
+    parser.add_argument( '--sounddevice', nargs='?', default='', const='',help='ALSA device for the sounds in pp_sounds')
+    parser.add_argument( '--browsers', nargs='?', default=1, const=1,help='Number of browsers kept running for web tracks, started at start up if a medialist has web tracks, 0 to start one for each track')
+    parser.add_argument( '--gpio', nargs='?', default='edge', const='edge', choices=['edge','poll'],help='Detect GPIO input changes as they happen, or read the inputs every 50 mS')
+    parser.add_argument( '--fakegpio', action='store_true',help='Simulate the GPIO, see pp_fakegpio.py')
+    parser.add_argument( '--backend', nargs='?', default='real', const='real', choices=['real','fake'],help='Play media with omxplayer, mplayer and uzbl, or fake players that need no programs')
+    parser.add_argument( '--clock', nargs='?', default='real', const='real', choices=['real','virtual'],help='Time shows by the real clock, or a virtual clock that runs faster, see pp_clock.py')
+    parser.add_argument( '--speed', nargs='?', default='100', const='100',help='Times faster than real time the virtual clock runs')
 
     args=parser.parse_args()
     return  vars(args)
 
 
+def prescale_options():
+    """ reads the command line options and returns a dictionary of them"""
+    parser = argparse.ArgumentParser(description = 'Pi Presents pre-scaled image cache')
+    parser.add_argument( '-p','--profile', nargs='?', default='', const='',help='Profile')
+    parser.add_argument( '-o','--home', nargs='?', default='', const='',help='Path to pp_home')
+    parser.add_argument( '-s','--screensize', nargs='?',default='',const='',help='Size of target screen w*h')
+    parser.add_argument( '-l','--liveshow', nargs='?', default='', const='',help='Directory1 for live tracks')
+    parser.add_argument( '--workers', nargs='?', default=0, const=0,help='Number of processes, default one per core')
+    parser.add_argument( '--raw', action='store_true',help='Also make a frame store of raw pixels for instant display')
+    parser.add_argument( '--exif', action='store_true',help='Turn camera images the right way up by their EXIF orientation, as pipresents.py --exif')
+    # ignore the other options of pipresents.py so the same options can be given to both
+    args,others=parser.parse_known_args()
+    return  vars(args)
+
+
+def mediainfo_options():
+    """ reads the command line options and returns a dictionary of them"""
+    parser = argparse.ArgumentParser(description = 'Pi Presents media info index')
+    parser.add_argument( '-p','--profile', nargs='?', default='', const='',help='Profile')
+    parser.add_argument( '-o','--home', nargs='?', default='', const='',help='Path to pp_home')
+    parser.add_argument( '-l','--liveshow', nargs='?', default='', const='',help='Directory1 for live tracks')
+    parser.add_argument( '--workers', nargs='?', default=0, const=0,help='Number of files probed at once, default one per core')
+    parser.add_argument( '--prober', nargs='?', default='', const='',help='Module with probe(path) to use instead of ffprobe')
+    # ignore the other options of pipresents.py so the same options can be given to both
+    args,others=parser.parse_known_args()
+    return  vars(args)
+
+
+def schedulesim_options():
+    """ reads the command line options and returns a dictionary of them"""
+    parser = argparse.ArgumentParser(description = 'Pi Presents schedule simulator')
+    parser.add_argument( '-p','--profile', nargs='?', default='', const='',help='Profile')
+    parser.add_argument( '-o','--home', nargs='?', default='', const='',help='Path to pp_home')
+    parser.add_argument( '--from', nargs='?', default='', const='',help='First day simulated YYYY-MM-DD, default today')
+    parser.add_argument( '--to', nargs='?', default='', const='',help='Last day simulated YYYY-MM-DD, default a week after the first')
+    parser.add_argument( '--boot', nargs='*', default=[],help='Times Pi Presents is started, YYYY-MM-DD HH:MM[:SS], to show the catch up')
+    parser.add_argument( '--show', nargs='?', default='', const='',help='Report only this show-ref')
+    # ignore the other options of pipresents.py so the same options can be given to both
+    args,others=parser.parse_known_args()
+    return  vars(args)
+
+
 def web_ed_options():
     """ reads the command line options and returns a dictionary of them"""
     parser = argparse.ArgumentParser(description = 'Pi Presents Web Editor')
@@ -103,7 +103,7 @@ class PathManager(object):
             return "incorrect number of fields in link",['','','']
         symbol=fields[0]
         operation=fields[1]
-        if operation in allowed_list or operation[0:4] == 'omx-' or operation[0:6] == 'mplay-'or operation[0:5] == 'uzbl-':
+        if operation in allowed_list or operation[0:4] == 'omx-' or operation[0:6] == 'mplay-'or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             if len(fields) ==  3:
                 arg=fields[2]
             else:
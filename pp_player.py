@@ -1,10 +1,12 @@
 import os
 from Tkinter import NW
-from PIL import Image
 from PIL import ImageTk
 
 from pp_pluginmanager import PluginManager
 from pp_animate import Animate
+from pp_scheduler import Scheduler
+from pp_imagecache import ImageCache
+from pp_lifecycle import LifecycleEvents
 from pp_utils import Monitor,calculate_text_position
 
 class Player(object):
@@ -26,6 +28,12 @@ class Player(object):
         # create debugging log object
         self.mon=Monitor()
 
+        # timers for the players
+        self.scheduler=Scheduler()
+
+        # lifecycle events (loaded, first-frame, finished, closed) so shows can wait on them
+        self.events=LifecycleEvents()
+
         self.mon.trace(self,'')
 
         # instantiate arguments
@@ -113,9 +121,8 @@ class Player(object):
         reason,message=self.animate.animate(self.animate_begin_text,id(self))
         if reason  ==  'error':
             self.mon.err(self,message)
-            self.play_state='show-failed'
-            if self.finished_callback is not None:
-                self.finished_callback('error',message)
+            self.set_play_state('show-failed')
+            self.track_finished('error',message)
         else:
             # return to start playing the track.
             self.mon.log(self,">show track received from show Id: "+ str(self.show_id))
@@ -156,7 +163,7 @@ class Player(object):
         self.mon.trace(self,'')
         # abort the timer
         if self.tick_timer is not None:
-            self.canvas.after_cancel(self.tick_timer)
+            self.scheduler.cancel(self.tick_timer)
             self.tick_timer=None
         
         self.hide_x_content()
@@ -175,9 +182,8 @@ class Player(object):
         # create animation events for ending
         reason,message=self.animate.animate(self.animate_end_text,id(self))
         if reason == 'error':
-            self.play_state='show-failed'
-            if self.finished_callback is not None:
-                self.finished_callback('error',message)
+            self.set_play_state('show-failed')
+            self.track_finished('error',message)
         else:
             return
 
@@ -194,13 +200,37 @@ class Player(object):
     # must be overriden by derived class
     def stop(self):
         self.mon.fatal(self,'stop not overidden by derived class')
-        self.play_state='show-failed'
-        if self.finished_callback is not None:
-            self.finished_callback('error','stop not overidden by derived class')
+        self.set_play_state('show-failed')
+        self.track_finished('error','stop not overidden by derived class')
 
 
     def get_play_state(self):
         return self.play_state
+
+
+# *****************
+# lifecycle events
+# *****************
+
+    # call callback once the event (loaded, first-frame, finished, closed) has happened to this player
+    def when(self,event,callback):
+        self.events.when(event,callback)
+
+    # all changes of play_state go through here so the lifecycle events are fired
+    def set_play_state(self,state):
+        self.play_state=state
+        if state in ('loaded','load-failed'):
+            self.events.fire('loaded',state)
+        if state == 'showing':
+            self.events.fire('first-frame',state)
+        if state in ('closed','unloaded','load-failed'):
+            self.events.fire('closed',state)
+
+    # players call this rather than finished_callback so that the finished event is fired too
+    def track_finished(self,reason,message):
+        self.events.fire('finished',reason)
+        if self.finished_callback is not None:
+            self.finished_callback(reason,message)
   
 # *****************
 # ending the player
@@ -251,13 +281,7 @@ class Player(object):
             if not os.path.exists(background_img_file):
                 return 'error',"Track background file not found "+ background_img_file
             else:
-                pil_background_img=Image.open(background_img_file)
-                # print 'pil_background_img ',pil_background_img
-                image_width,image_height=pil_background_img.size
-                window_width=self.show_canvas_width
-                window_height=self.show_canvas_height
-                if image_width != window_width or image_height != window_height:
-                    pil_background_img=pil_background_img.resize((window_width, window_height))
+                pil_background_img=ImageCache().background(background_img_file,self.show_canvas_width,self.show_canvas_height)
                 self.background = ImageTk.PhotoImage(pil_background_img)
                 del pil_background_img
                 self.background_obj = self.canvas.create_image(self.show_canvas_x1,
@@ -2,6 +2,7 @@ import os
 import imp
 import ConfigParser
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
 
 class PluginManager(object):
 
@@ -17,6 +18,7 @@ class PluginManager(object):
         """
 
         self.mon=Monitor()
+        self.scheduler=Scheduler()
 
         self.show_id=show_id
         self.root=root
@@ -85,21 +87,21 @@ class PluginManager(object):
             self.canvas.update_idletasks()
             # and repeat if time>0
             if self.plugin_redraw_time>0:
-                self.plugin_timer=self.canvas.after(self.plugin_redraw_time,self._redraw_plugin)
+                self.plugin_timer=self.scheduler.after(self.plugin_redraw_time,self._redraw_plugin)
 
     def _redraw_plugin(self):
         # call the plugins repeat method
         if self.plugin is not None:
             self.plugin.redraw()
             self.canvas.update_idletasks()
-            self.plugin_timer=self.canvas.after(self.plugin_redraw_time,self._redraw_plugin)
+            self.plugin_timer=self.scheduler.after(self.plugin_redraw_time,self._redraw_plugin)
 
 
     # called by players at the end of a track
     def stop_plugin(self):
         # stop the timer as the stop_plugin may have been called while it is running
         if self.plugin_timer is not None:
-            self.canvas.after_cancel(self.plugin_timer)
+            self.scheduler.cancel(self.plugin_timer)
             self.plugin.hide()
             self.canvas.update_idletasks()
 
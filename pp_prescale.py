@@ -0,0 +1,310 @@
+"""
+To Run - python pp_prescale.py -p <profile> [-o <home>] [-s <width>*<height>] [-l <live tracks dir>] [--workers n] [--raw] [--exif]
+Makes a copy of every image of a profile already rotated and resized for the show it is in,
+so Pi Presents only has to decode a screen sized image instead of a full size photograph.
+The screen size defaults to the size of the current display.
+Only images whose source has changed since the last run are done again.
+--raw also makes a frame store of the copies as raw pixels that Pi Presents maps into memory so
+the images need no decoding at all. It takes 4 bytes a pixel, about 8MB for each full screen image at 1920x1080.
+--exif turns camera images the right way up, use it if Pi Presents is run with --exif.
+"""
+
+import os
+import sys
+import hashlib
+import multiprocessing
+from pp_showlist import ShowList
+from pp_medialist import MediaList
+from pp_definitions import PPdefinitions
+from pp_decodepool import image_spec, prepare_image
+from pp_framestore import FrameStore
+from pp_imagecache import ImageCache
+from pp_utils import parse_rectangle
+from pp_options import prescale_options
+
+
+# runs in the process pool, job is (spec,cache path without extension)
+def prescale_job(job):
+    spec,cache_base=job
+    try:
+        pil_image,report=prepare_image(*spec)
+        # JPEG decodes much quicker than PNG, PNG keeps transparency and palettes
+        if pil_image.mode in ('RGB','L','CMYK'):
+            ext='.jpg'
+            options={'quality':95}
+        else:
+            ext='.png'
+            options={}
+        temp_path=cache_base + '.tmp' + ext
+        pil_image.save(temp_path,**options)
+        # the copy takes the modification time of the source so it can be checked when it is used
+        source_mtime=os.path.getmtime(spec[0])
+        os.utime(temp_path,(source_mtime,source_mtime))
+        os.rename(temp_path,cache_base + ext)
+    except Exception as e:
+        return spec[0],'error',str(e)
+    return spec[0],'normal',report
+
+
+
+class PreScale(object):
+    """
+    the offline cache of pre-scaled images. The copies for a profile are in pp_prescaled/<width>x<height>
+    within the profile, one directory for each screen size it is used on.
+    A copy is named by a hash of its spec (see image_spec) and has the modification time of its source
+    so a copy is used only if the spec of the track and the source file are the same as when it was made.
+
+    Usage:
+        PreScale().use(pp_profile,screen_width,screen_height)     # once by PiPresents
+        spec=PreScale().prefer(spec)
+    """
+
+# CLASS VARIABLES (PreScale.)
+    directory=''        # cache for the running profile and screen, '' if there is none
+
+    extensions=('.jpg','.png')
+    live_extensions={'image':PPdefinitions.IMAGE_FILES,'video':PPdefinitions.VIDEO_FILES,'audio':PPdefinitions.AUDIO_FILES}
+    frame_files=('frames.raw','frames.json')
+
+
+    def __init__(self):
+        pass
+
+
+    def cache_dir(self,pp_profile,screen_width,screen_height):
+        return pp_profile + os.sep + 'pp_prescaled' + os.sep + str(screen_width) + 'x' + str(screen_height)
+
+
+    # called by PiPresents, the cache is only used if pp_prescale.py has been run for this screen size
+    def use(self,pp_profile,screen_width,screen_height):
+        directory=self.cache_dir(pp_profile,screen_width,screen_height)
+        if os.path.isdir(directory):
+            PreScale.directory=directory
+        else:
+            PreScale.directory=''
+        return PreScale.directory
+
+
+    # the same for str and unicode paths, which one a track has depends on where its location came from.
+    # --exif changes the copy so a copy made with a different --exif is not used
+    def cache_name(self,spec):
+        text=u'|'.join(item.decode('utf-8') if isinstance(item,str) else unicode(item) for item in spec)
+        text+=u'|exif=' + unicode(ImageCache.exif)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+    # returns the path of the up to date copy in directory, None if there is not one
+    def lookup(self,directory,spec):
+        try:
+            source_mtime=os.path.getmtime(spec[0])
+        except OSError:
+            return None
+        base=directory + os.sep + self.cache_name(spec)
+        for ext in PreScale.extensions:
+            try:
+                # utime may not keep the full precision of the source's time
+                if abs(os.path.getmtime(base + ext) - source_mtime) < 0.001:
+                    return base + ext
+            except OSError:
+                pass
+        return None
+
+
+    # returns the spec of the pre-scaled copy if there is one, otherwise spec
+    def prefer(self,spec):
+        if PreScale.directory == '' or spec is None:
+            return spec
+        path=self.lookup(PreScale.directory,spec)
+        if path is None:
+            return spec
+        # the copy is ready to show as it is
+        return (path,'original',0,0,'',0)
+
+
+# ***************************
+# Building the cache
+# ***************************
+
+    # make the copies that are missing or out of date and delete the ones no longer used
+    # returns the numbers made, kept, failed and deleted
+    def build(self,pp_home,pp_profile,screen_width,screen_height,live_dir2='',workers=0,raw=False,log=None):
+        if log is None:
+            log=self._print
+        directory=self.cache_dir(pp_profile,screen_width,screen_height)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        specs=self.profile_specs(pp_home,pp_profile,screen_width,screen_height,live_dir2,log)
+        wanted=set()
+        jobs=[]
+        for spec in specs:
+            name=self.cache_name(spec)
+            if name in wanted:
+                continue
+            wanted.add(name)
+            if self.lookup(directory,spec) is None:
+                jobs.append((spec,directory + os.sep + name))
+        kept=len(wanted)-len(jobs)
+
+        made=0
+        failed=0
+        if len(jobs)>0:
+            if workers <= 0:
+                workers=multiprocessing.cpu_count()
+            log('Pre-scaling ' + str(len(jobs)) + ' images with ' + str(workers) + ' processes')
+            pool=multiprocessing.Pool(workers)
+            try:
+                for path,status,message in pool.imap_unordered(prescale_job,jobs):
+                    if status == 'error':
+                        failed+=1
+                        log('Cannot pre-scale ' + path + ': ' + message)
+                    else:
+                        made+=1
+                        log(message)
+            finally:
+                pool.close()
+                pool.join()
+
+        # the frame store is made again from all the copies
+        if raw is True:
+            copies=[]
+            names=set()
+            for spec in specs:
+                name=self.cache_name(spec)
+                copy_path=self.lookup(directory,spec)
+                if copy_path is not None and name not in names:
+                    names.add(name)
+                    copies.append((name,copy_path,spec[0]))
+            frames,size=FrameStore().write(directory,copies,log)
+            log('Frame store has %d frames, %.1f MB' % (frames,size/1048576.0))
+            frame_files=PreScale.frame_files
+        else:
+            frame_files=()
+
+        # copies for specs that have gone, tracks whose window has changed, failed temporary files
+        # and the frame store if it is no longer wanted
+        deleted=0
+        for filename in os.listdir(directory):
+            if os.path.splitext(filename)[0] not in wanted and filename not in frame_files:
+                os.remove(directory + os.sep + filename)
+                deleted+=1
+        log('Pre-scaled cache ' + directory + ': made %d, kept %d, failed %d, deleted %d' % (made,kept,failed,deleted))
+        return made,kept,failed,deleted
+
+
+    # the specs of all the image tracks of the profile's shows
+    def profile_specs(self,pp_home,pp_profile,screen_width,screen_height,live_dir2,log):
+        showlist=ShowList()
+        if showlist.open_json(pp_profile + os.sep + 'pp_showlist.json') is False:
+            log('Cannot read showlist of ' + pp_profile)
+            return []
+        specs=[]
+        for show in showlist.shows():
+            status,message,x1,y1,x2,y2=self.parse_show_canvas(show.get('show-canvas',''),screen_width,screen_height)
+            if status == 'error':
+                log('Show ' + show['show-ref'] + ': ' + message)
+                continue
+            for track in self.show_tracks(show,pp_home,pp_profile,showlist.profile_version(),live_dir2,log):
+                spec=self.track_spec(track,show,pp_home,pp_profile,x2-x1,y2-y1)
+                if spec is not None:
+                    specs.append(spec)
+        return specs
+
+
+    # the tracks in the show's medialist and the files of live_types in its live tracks directories
+    def show_tracks(self,show,pp_home,pp_profile,profile_version,live_dir2,log,live_types=('image',)):
+        tracks=[]
+        if show.get('medialist','') != '':
+            medialist=MediaList('ordered')
+            medialist_file=pp_profile + os.sep + show['medialist']
+            if not os.path.exists(medialist_file) or medialist.open_list(medialist_file,profile_version) is False:
+                log('Cannot read medialist ' + medialist_file)
+            else:
+                tracks+=[medialist.track(index) for index in range(medialist.length())]
+        if show['type'] in ('liveshow','artliveshow'):
+            live_dirs=[show.get('live-tracks-dir1','') or pp_home + os.sep + 'pp_live_tracks',
+                       show.get('live-tracks-dir2','') or live_dir2]
+            for live_dir in live_dirs:
+                if live_dir == '' or not os.path.isdir(live_dir):
+                    continue
+                for name in sorted(os.listdir(live_dir)):
+                    ext=os.path.splitext(name)[1].lower()
+                    for track_type in live_types:
+                        if ext in PreScale.live_extensions[track_type]:
+                            tracks.append({'type':track_type,'plugin':'','location':live_dir + os.sep + name,
+                                           'image-window':'','image-rotate':''})
+                            break
+        return tracks
+
+
+    # the spec ImagePlayer will have for the track, None if it is not an image or the spec cannot be worked out
+    def track_spec(self,track,show,pp_home,pp_profile,canvas_width,canvas_height):
+        if track.get('type') != 'image' or track.get('plugin','') != '':
+            return None
+        track_file=track.get('location','')
+        if track_file != '' and track_file[0]=="+":
+            track_file=pp_home+track_file[1:]
+        elif track_file != '' and track_file[0] == "@":
+            track_file=pp_profile+track_file[1:]
+        if not os.path.isfile(track_file):
+            return None
+        image_window=track.get('image-window','').strip()
+        if image_window == '':
+            image_window=show.get('image-window','').strip()
+        image_rotate=track.get('image-rotate','').strip()
+        if image_rotate == '':
+            image_rotate=show.get('image-rotate','0').strip()
+        try:
+            image_rotate=int(image_rotate)
+        except ValueError:
+            return None
+        return image_spec(track_file,image_window,image_rotate,canvas_width,canvas_height)
+
+
+    # as ShowManager.parse_show_canvas
+    def parse_show_canvas(self,text,screen_width,screen_height):
+        fields = text.split()
+        if len(fields) < 1:
+            return 'normal','',0,0,screen_width,screen_height
+        elif len(fields) in (1,4):
+            return parse_rectangle(text)
+        else:
+            return 'error','Wrong number of fields in Show canvas: '+ text,0,0,0,0
+
+
+    def _print(self,text):
+        print text
+
+
+
+if __name__ == '__main__':
+    options=prescale_options()
+    if options['profile'] == '':
+        print >> sys.stderr, 'Profile not specified with the -p option'
+        exit(102)
+    if options['home'] == '':
+        pp_home=os.path.expanduser('~') + os.sep + 'pp_home'
+    else:
+        pp_home=options['home'] + os.sep + 'pp_home'
+    pp_profile=pp_home + os.sep + 'pp_profiles' + os.sep + options['profile']
+    if not os.path.exists(pp_profile):
+        print >> sys.stderr, 'Failed to find requested profile: ' + pp_profile
+        exit(102)
+
+    if options['screensize'] == '':
+        from Tkinter import Tk
+        root=Tk()
+        screen_width=root.winfo_screenwidth()
+        screen_height=root.winfo_screenheight()
+        root.destroy()
+    else:
+        fields=options['screensize'].split('*')
+        if len(fields) != 2 or not (fields[0].isdigit() and fields[1].isdigit()):
+            print >> sys.stderr, 'Do not understand --screensize: ' + options['screensize']
+            exit(102)
+        screen_width=int(fields[0])
+        screen_height=int(fields[1])
+
+    # the copies must be made as Pi Presents would show the images
+    ImageCache.exif=options['exif']
+    PreScale().build(pp_home,pp_profile,screen_width,screen_height,options['liveshow'],int(options['workers']),options['raw'])
@@ -7,6 +7,7 @@ from pp_medialist import MediaList
 from pp_show import Show
 from pp_pathmanager import PathManager
 from pp_screendriver import ScreenDriver
+from pp_soundcues import SoundCues
 
 
 class RadioButtonShow(Show):
@@ -174,6 +175,9 @@ class RadioButtonShow(Show):
             elif link_op in ('no-command','null'):
                 return
                     
+            elif link_op[0:6] == 'sound-':
+                SoundCues().play(link_op[6:])
+
             elif link_op[0:4] == 'omx-' or link_op[0:6] == 'mplay-'or link_op[0:5] == 'uzbl-':
                 if self.current_player is not None:
                     self.current_player.input_pressed(link_op)
@@ -201,7 +205,7 @@ class RadioButtonShow(Show):
         # if track_ref != self.current_track_ref:
         # cancel the show timeout when playing another track
         if self.show_timeout_timer is not None:
-            self.canvas.after_cancel(self.show_timeout_timer)
+            self.scheduler.cancel(self.show_timeout_timer)
             self.show_timeout_timer=None
         # print '\n NEED NEXT TRACK'
         self.next_track_signal=True
@@ -229,10 +233,10 @@ class RadioButtonShow(Show):
             self.current_track_ref=self.first_track_ref
             # start the show timer when displaying the first track
             if self.show_timeout_timer is not None:
-                self.canvas.after_cancel(self.show_timeout_timer)
+                self.scheduler.cancel(self.show_timeout_timer)
                 self.show_timeout_timer=None
             if self.show_timeout != 0:
-                self.show_timeout_timer=self.canvas.after(self.show_timeout*1000 ,self.show_timeout_stop)
+                self.show_timeout_timer=self.scheduler.after(self.show_timeout*1000 ,self.show_timeout_stop)
             # print 'do first track',self.current_track_ref
             # and load it
             self.start_load_show_loop(self.medialist.track(index))
@@ -254,12 +258,12 @@ class RadioButtonShow(Show):
         self.display_eggtimer()
 
         if self.track_timeout_timer is not None:
-            self.canvas.after_cancel(self.track_timeout_timer)
+            self.scheduler.cancel(self.track_timeout_timer)
             self.track_timeout_timer=None
 
         # start timeout for the track if required           
         if self.current_track_ref != self.first_track_ref and self.track_timeout != 0:
-            self.track_timeout_timer=self.canvas.after(self.track_timeout*1000,self.track_timeout_callback)
+            self.track_timeout_timer=self.scheduler.after(self.track_timeout*1000,self.track_timeout_callback)
 
         # read the show links. Track links will  be added by ready_callback
         # needs to be done in show loop as each track adds different links to the show links
@@ -429,10 +433,10 @@ class RadioButtonShow(Show):
 
     def stop_timers(self):
         if self.show_timeout_timer is not None:
-            self.canvas.after_cancel(self.show_timeout_timer)
+            self.scheduler.cancel(self.show_timeout_timer)
             self.show_timeout_timer=None   
         if self.track_timeout_timer is not None:
-            self.canvas.after_cancel(self.track_timeout_timer)
+            self.scheduler.cancel(self.track_timeout_timer)
             self.track_timeout_timer=None  
            
 
@@ -0,0 +1,325 @@
+import os
+import sys
+import time
+import heapq
+import fcntl
+from collections import deque
+import Tkinter
+from pp_utils import Monitor
+from pp_clock import Clock
+
+
+class Scheduler(object):
+    """
+    one deadline scheduler shared by everything in Pi Presents that needs a timer.
+    Timers are kept in a heap ordered by due time and a single Tkinter 'after' is armed for the earliest one,
+    so Tk wakes up only when something is actually due rather than every few milliseconds for each poll.
+    The scheduler also measures how late each timer fires (lag) and how much of the Tk thread
+    each subsystem uses, and logs a summary periodically.
+
+    Due times are read from Clock so a show can be run faster than real time with a virtual clock,
+    the time each subsystem uses of the Tk thread is always measured in real time.
+
+    Other threads (drivers' reader threads etc.) must not touch Tk, they use post() which is thread safe
+    and wakes Tk through a pipe so the callback runs on the Tk thread straight away.
+
+    Usage:
+        self.scheduler=Scheduler()
+        self.timer=self.scheduler.after(1000,self.do_something)
+        self.scheduler.cancel(self.timer)
+        self.scheduler.post(self.do_something_on_tk_thread)    # from any thread
+    """
+
+# constants for the timer entry, the entry is also the handle returned by after() and every()
+    DUE=0           # Clock time the timer is due in seconds since the epoch
+    SEQ=1           # sequence number, keeps heap ordering stable for equal due times
+    CALLBACK=2
+    ARGS=3
+    OWNER=4         # name of the subsystem, used for accounting
+    INTERVAL=5      # repeat interval in seconds for every(), 0 for one shot
+    CANCELLED=6
+
+# CLASS VARIABLES (Scheduler.)
+    root=None
+    timers=[]
+    seq=0
+    tk_timer=None
+    armed_due=None
+    running=False
+    in_run=False            # True while _run_due is running timers, it re-arms Tk itself at the end
+
+    # callbacks posted from other threads
+    posted=deque()
+    wake_read=None
+    wake_write=None
+    posted_poll_timer=None  # used only if Tk cannot watch the wake up pipe
+
+    # statistics since last report
+    report_interval=60      # seconds between statistics reports in the log
+    last_report_time=0
+    lag_count=0
+    lag_total=0.0
+    lag_max=0.0
+    late_count=0            # timers that were more than late_threshold late
+    late_threshold=0.1
+    owner_stats={}          # owner -> [calls, busy seconds, max seconds]
+
+
+    def __init__(self):
+        self.mon=Monitor()
+        self.clock=Clock()
+
+
+    # called once by PiPresents
+    def init(self,root):
+        Scheduler.root=root
+        Scheduler.timers=[]
+        Scheduler.seq=0
+        Scheduler.tk_timer=None
+        Scheduler.armed_due=None
+        Scheduler.owner_stats={}
+        Scheduler.last_report_time=time.time()
+        self._reset_lag()
+        Scheduler.running=True
+
+        # pipe used by other threads to wake up Tk
+        Scheduler.posted=deque()
+        Scheduler.posted_poll_timer=None
+        Scheduler.wake_read,Scheduler.wake_write=os.pipe()
+        for fd in (Scheduler.wake_read,Scheduler.wake_write):
+            flags=fcntl.fcntl(fd,fcntl.F_GETFL)
+            fcntl.fcntl(fd,fcntl.F_SETFL,flags|os.O_NONBLOCK)
+        try:
+            Scheduler.root.tk.createfilehandler(Scheduler.wake_read,Tkinter.READABLE,self._drain_posted)
+        except (AttributeError,Tkinter.TclError):
+            # no file handlers on this platform so look at the queue regularly instead
+            self.mon.warn(self,'cannot watch wake up pipe, polling for posted callbacks')
+            Scheduler.posted_poll_timer=self.every(20,self._drain_posted,None,None)
+
+
+    # called by PiPresents on exit
+    def terminate(self):
+        if Scheduler.running is False:
+            return
+        Scheduler.running=False
+        self.report()
+        if Scheduler.tk_timer is not None and Scheduler.root is not None:
+            try:
+                Scheduler.root.after_cancel(Scheduler.tk_timer)
+            except:
+                # root may already be destroyed
+                pass
+        Scheduler.tk_timer=None
+        Scheduler.armed_due=None
+        Scheduler.timers=[]
+        if Scheduler.wake_read is not None:
+            if Scheduler.posted_poll_timer is None:
+                try:
+                    Scheduler.root.tk.deletefilehandler(Scheduler.wake_read)
+                except:
+                    pass
+            os.close(Scheduler.wake_read)
+            os.close(Scheduler.wake_write)
+            Scheduler.wake_read=None
+            Scheduler.wake_write=None
+        Scheduler.posted=deque()
+
+
+# ************************************************
+# Timer interface
+# ************************************************
+
+    # run callback(*args) once after delay milliseconds, returns a handle for cancel()
+    def after(self,delay,callback,*args):
+        return self._add(delay,callback,args,0)
+
+
+    # run callback(*args) every interval milliseconds at a fixed rate until cancelled.
+    # if the Tk thread gets behind by more than an interval the missed calls are dropped, not bunched up.
+    def every(self,interval,callback,*args):
+        return self._add(interval,callback,args,interval)
+
+
+    # cancel a timer, handle may be None or a timer that has already run
+    def cancel(self,handle):
+        if handle is not None:
+            handle[Scheduler.CANCELLED]=True
+
+
+    # milliseconds until the timer is due, 0 if it is overdue or has been cancelled
+    def remaining(self,handle):
+        if handle is None or handle[Scheduler.CANCELLED] is True:
+            return 0
+        return max(0,int((handle[Scheduler.DUE]-self.clock.time())*1000))
+
+
+    # thread safe, run callback(*args) on the Tk thread as soon as possible
+    def post(self,callback,*args):
+        Scheduler.posted.append((callback,args))
+        if Scheduler.wake_write is not None:
+            try:
+                os.write(Scheduler.wake_write,'x')
+            except OSError:
+                # pipe is full so Tk has plenty of wake ups pending already
+                pass
+
+
+    def _add(self,delay,callback,args,interval):
+        due=self.clock.time()+delay/1000.0
+        Scheduler.seq+=1
+        entry=[due,Scheduler.seq,callback,args,self._owner_of(callback),interval/1000.0,False]
+        heapq.heappush(Scheduler.timers,entry)
+        # re-arm Tk only if this timer is earlier than the one Tk is already waiting for
+        if Scheduler.in_run is False and (Scheduler.armed_due is None or due < Scheduler.armed_due):
+            self._arm()
+        return entry
+
+
+    def _owner_of(self,callback):
+        obj=getattr(callback,'im_self',None)
+        if obj is None:
+            return getattr(callback,'__name__','unknown')
+        else:
+            return obj.__class__.__name__
+
+
+# ************************************************
+# Running the timers
+# ************************************************
+
+    def _arm(self):
+        if Scheduler.running is False:
+            return
+        if Scheduler.tk_timer is not None:
+            Scheduler.root.after_cancel(Scheduler.tk_timer)
+            Scheduler.tk_timer=None
+            Scheduler.armed_due=None
+        # throw away cancelled timers from the top of the heap
+        while len(Scheduler.timers)>0 and Scheduler.timers[0][Scheduler.CANCELLED] is True:
+            heapq.heappop(Scheduler.timers)
+        if len(Scheduler.timers)==0:
+            return
+        due=Scheduler.timers[0][Scheduler.DUE]
+        delay=int(self.clock.real_delay(due-self.clock.time())*1000)
+        if delay<0:
+            delay=0
+        Scheduler.armed_due=due
+        Scheduler.tk_timer=Scheduler.root.after(delay,self._run_due)
+
+
+    def _run_due(self):
+        # a virtual clock gets to the due time of the timer Tk was waiting for
+        if Scheduler.armed_due is not None:
+            self.clock.advance_to(Scheduler.armed_due)
+        Scheduler.tk_timer=None
+        Scheduler.armed_due=None
+        Scheduler.in_run=True
+        now=self.clock.time()
+        # only run timers that were added before this pass started, a callback that
+        # does after(0,...) will be run on the next pass so Tk gets to process its events
+        last_seq=Scheduler.seq
+        deferred=[]
+        while len(Scheduler.timers)>0 and Scheduler.timers[0][Scheduler.DUE]<=now:
+            entry=heapq.heappop(Scheduler.timers)
+            if entry[Scheduler.CANCELLED] is True:
+                continue
+            if entry[Scheduler.SEQ]>last_seq:
+                deferred.append(entry)
+                continue
+            self._record_lag(now-entry[Scheduler.DUE])
+            if entry[Scheduler.INTERVAL]>0:
+                # fixed rate, skip missed intervals rather than running them back to back
+                next_due=entry[Scheduler.DUE]+entry[Scheduler.INTERVAL]
+                if next_due<=now:
+                    next_due=now+entry[Scheduler.INTERVAL]
+                entry[Scheduler.DUE]=next_due
+                heapq.heappush(Scheduler.timers,entry)
+            else:
+                # one shot, mark as done so a late cancel() is harmless
+                entry[Scheduler.CANCELLED]=True
+            start=time.time()
+            try:
+                entry[Scheduler.CALLBACK](*entry[Scheduler.ARGS])
+            except Exception:
+                # report it the way Tk reports an exception in an after() callback and carry on with the other timers
+                Scheduler.root.report_callback_exception(*sys.exc_info())
+            self._record_busy(entry[Scheduler.OWNER],time.time()-start)
+            if Scheduler.running is False:
+                Scheduler.in_run=False
+                return
+        for entry in deferred:
+            heapq.heappush(Scheduler.timers,entry)
+        Scheduler.in_run=False
+        if time.time()-Scheduler.last_report_time>=Scheduler.report_interval:
+            self.report()
+        self._arm()
+
+
+    # Tk file handler for the wake up pipe, runs everything that has been posted
+    def _drain_posted(self,fd,mask):
+        if Scheduler.wake_read is not None:
+            try:
+                os.read(Scheduler.wake_read,4096)
+            except OSError:
+                pass
+        while len(Scheduler.posted)>0 and Scheduler.running is True:
+            callback,args=Scheduler.posted.popleft()
+            start=time.time()
+            try:
+                callback(*args)
+            except Exception:
+                Scheduler.root.report_callback_exception(*sys.exc_info())
+            self._record_busy(self._owner_of(callback),time.time()-start)
+
+
+# ************************************************
+# Statistics
+# ************************************************
+
+    def _reset_lag(self):
+        Scheduler.lag_count=0
+        Scheduler.lag_total=0.0
+        Scheduler.lag_max=0.0
+        Scheduler.late_count=0
+
+
+    def _record_lag(self,lag):
+        Scheduler.lag_count+=1
+        Scheduler.lag_total+=lag
+        if lag>Scheduler.lag_max:
+            Scheduler.lag_max=lag
+        if lag>Scheduler.late_threshold:
+            Scheduler.late_count+=1
+
+
+    def _record_busy(self,owner,busy):
+        if owner not in Scheduler.owner_stats:
+            Scheduler.owner_stats[owner]=[0,0.0,0.0]
+        stats=Scheduler.owner_stats[owner]
+        stats[0]+=1
+        stats[1]+=busy
+        if busy>stats[2]:
+            stats[2]=busy
+
+
+    # log the lag and Tk thread usage since the last report
+    def report(self):
+        now=time.time()
+        period=now-Scheduler.last_report_time
+        if Scheduler.lag_count>0:
+            average=Scheduler.lag_total/Scheduler.lag_count
+        else:
+            average=0.0
+        self.mon.log(self,'Timers run: %d in %.1f secs, lag average %.1f ms, max %.1f ms, late %d, pending %d'
+                     % (Scheduler.lag_count,period,average*1000,Scheduler.lag_max*1000,Scheduler.late_count,len(Scheduler.timers)))
+        for owner in sorted(Scheduler.owner_stats,key=lambda o: Scheduler.owner_stats[o][1],reverse=True):
+            calls,busy,longest=Scheduler.owner_stats[owner]
+            if period>0:
+                percent=100*busy/period
+            else:
+                percent=0.0
+            self.mon.log(self,'    %s: %d calls, %.1f ms busy (%.1f%% of Tk thread), longest %.1f ms'
+                         % (owner,calls,busy*1000,percent,longest*1000))
+        Scheduler.owner_stats={}
+        self._reset_lag()
+        Scheduler.last_report_time=now
@@ -0,0 +1,231 @@
+"""
+To Run - python pp_schedulesim.py -p <profile> [-o <home>] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+                                   [--boot 'YYYY-MM-DD HH:MM[:SS]' ...] [--show <show-ref>]
+Runs the time of day scheduler of a profile over a range of days as fast as it can and reports every
+open, close, exitpipresents and shutdownnow, which of everyday, weekday, monthday or specialday times each
+show has on each day (so holidays entered as special days can be checked) and commands that will do nothing,
+e.g. a close of a show that is not open.
+--boot reports the catch up Pi Presents does if it is started at that time.
+Nothing is shown or played and the simulate-time settings of schedule.json are not used.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from pp_timeofday import TimeOfDay
+from pp_options import schedulesim_options
+
+
+class SimulatedTimeOfDay(TimeOfDay):
+    """
+    the TimeOfDay of Pi Presents with its clock and timer replaced by a simulated clock that jumps from one timer to the next,
+    the same calendar, timer and catch up code decides what is done when.
+    """
+
+    def __init__(self,start):
+        TimeOfDay.__init__(self)
+        self.sim_time=start
+        self.wake=None
+        self.catching_up=False
+        # list of [clock,event,catch up]
+        self.done=[]
+        # the scheduler's timer is the simulated one
+        self.scheduler=self
+
+
+    def now(self):
+        return self.sim_time
+
+
+    def after(self,delay,callback,*args):
+        self.wake=self.sim_time+timedelta(milliseconds=delay)
+        return self.wake
+
+
+    def cancel(self,handle):
+        self.wake=None
+
+
+    # run the timers up to and including end
+    def run_until(self,end):
+        while self.wake is not None and self.wake <= end:
+            self.sim_time=self.wake
+            self.wake=None
+            self.poll()
+        self.sim_time=end
+
+
+    def do_catchup(self,missed,at_start):
+        self.catching_up=True
+        result=TimeOfDay.do_catchup(self,missed,at_start)
+        self.catching_up=False
+        return result
+
+
+    def do_event(self,event):
+        self.done.append([self.sim_time,event,self.catching_up])
+
+
+
+class ScheduleSimulator(object):
+    """
+    runs SimulatedTimeOfDay over days and makes the report.
+
+    Usage:
+        simulator=ScheduleSimulator(pp_profile)
+        lines=simulator.report(first_day,last_day,boot_times,show_ref)
+    """
+
+    def __init__(self,pp_profile):
+        self.pp_profile=pp_profile
+
+
+    # start the scheduler at start, returns it with the catch up done
+    def boot(self,start):
+        tod=SimulatedTimeOfDay(start)
+        tod.init('','',self.pp_profile,None,None)
+        # there is no clock to watch so the timer need only wake for the events
+        TimeOfDay.max_sleep=86400
+        tod.poll()
+        return tod
+
+
+    # the events done from the start of first_day to the end of last_day, list of [clock,event,catch up]
+    def run(self,first_day,last_day):
+        tod=self.boot(datetime.combine(first_day,datetime.min.time()))
+        tod.run_until(datetime.combine(last_day,datetime.max.time()))
+        tod.terminate()
+        return tod.done
+
+
+    # the catch up done if Pi Presents is started at start
+    def catchup_at(self,start):
+        tod=self.boot(start)
+        catchup=[done for done in tod.done if done[2] is True]
+        tod.terminate()
+        return catchup
+
+
+    def report(self,first_day,last_day,boot_times,show_ref):
+        done=self.run(first_day,last_day)
+        lines=['Schedule of ' + self.pp_profile + ' from ' + self.pretty_day(first_day) + ' to ' + self.pretty_day(last_day)]
+
+        # the events day by day with the kind of times each show has
+        day=first_day
+        index=0
+        tod=TimeOfDay()
+        while day <= last_day:
+            lines.append('')
+            kinds=[]
+            for ref,(kind,times) in tod.schedule_for_day(TimeOfDay.schedule,day).items():
+                if show_ref in ('',ref):
+                    kinds.append(ref + ' ' + kind)
+            lines.append(self.pretty_day(day) + '    ' + ', '.join(kinds))
+            while index < len(done) and done[index][0].date() == day:
+                event=done[index][1]
+                if show_ref in ('',event[TimeOfDay.SHOW_REF]):
+                    lines.append('    ' + event[TimeOfDay.WHEN].time().isoformat() + '  ' + event[TimeOfDay.COMMAND]
+                                 + ' ' + event[TimeOfDay.SHOW_REF])
+                index+=1
+            day+=timedelta(days=1)
+
+        for boot_time in boot_times:
+            lines.append('')
+            lines.append('Started at ' + boot_time.strftime('%a %Y-%m-%d %H:%M:%S'))
+            catchup=self.catchup_at(boot_time)
+            for clock,event,catching_up in catchup:
+                if show_ref in ('',event[TimeOfDay.SHOW_REF]):
+                    lines.append('    catch up  ' + event[TimeOfDay.COMMAND] + ' ' + event[TimeOfDay.SHOW_REF]
+                                 + ', the event at ' + event[TimeOfDay.WHEN].time().isoformat())
+            if len(catchup) == 0:
+                lines.append('    no catch up')
+
+        lines.append('')
+        lines.append('Summary')
+        counts={}
+        for clock,event,catching_up in done:
+            show_counts=counts.setdefault(event[TimeOfDay.SHOW_REF],{})
+            show_counts[event[TimeOfDay.COMMAND]]=show_counts.get(event[TimeOfDay.COMMAND],0)+1
+        for ref in sorted(counts):
+            if show_ref in ('',ref):
+                lines.append('    ' + ref + ': ' + ', '.join(['%s %d' % (command,counts[ref][command])
+                                                             for command in sorted(counts[ref])]))
+
+        problems=self.problems(done,show_ref)
+        if len(problems) > 0:
+            lines.append('')
+            lines.append('Commands that will do nothing')
+            lines.extend(problems)
+        return lines
+
+
+    # opens of a show that is already open and closes of a show that is not, shows are not open at the start
+    def problems(self,done,show_ref):
+        problems=[]
+        running={}
+        for clock,event,catching_up in done:
+            ref=event[TimeOfDay.SHOW_REF]
+            command=event[TimeOfDay.COMMAND]
+            if ref == 'pp_core' or show_ref not in ('',ref):
+                continue
+            if command == 'open' and running.get(ref,False) is True:
+                problems.append('    ' + clock.strftime('%Y-%m-%d %H:%M:%S') + '  open ' + ref + ', it is already open')
+            elif command == 'close' and running.get(ref,False) is False:
+                problems.append('    ' + clock.strftime('%Y-%m-%d %H:%M:%S') + '  close ' + ref + ', it is not open')
+            running[ref]=command == 'open'
+        return problems
+
+
+    def pretty_day(self,day):
+        return day.strftime('%a %Y-%m-%d')
+
+
+
+def parse_day(text):
+    return datetime.strptime(text,'%Y-%m-%d').date()
+
+
+def parse_boot_time(text):
+    for time_format in ('%Y-%m-%d %H:%M:%S','%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(text,time_format)
+        except ValueError:
+            pass
+    raise ValueError('time data ' + repr(text) + ' does not match format YYYY-MM-DD HH:MM[:SS]')
+
+
+
+if __name__ == '__main__':
+    options=schedulesim_options()
+    if options['profile'] == '':
+        print >> sys.stderr, 'Profile not specified with the -p option'
+        exit(102)
+    if options['home'] == '':
+        pp_home=os.path.expanduser('~') + os.sep + 'pp_home'
+    else:
+        pp_home=options['home'] + os.sep + 'pp_home'
+    pp_profile=pp_home + os.sep + 'pp_profiles' + os.sep + options['profile']
+    if not os.path.exists(pp_profile + os.sep + 'schedule.json'):
+        print >> sys.stderr, 'Failed to find schedule of requested profile: ' + pp_profile
+        exit(102)
+
+    try:
+        if options['from'] == '':
+            first_day=datetime.now().date()
+        else:
+            first_day=parse_day(options['from'])
+        if options['to'] == '':
+            last_day=first_day+timedelta(days=6)
+        else:
+            last_day=parse_day(options['to'])
+        boot_times=[parse_boot_time(text) for text in options['boot']]
+    except ValueError as e:
+        print >> sys.stderr, str(e)
+        exit(102)
+
+    try:
+        lines=ScheduleSimulator(pp_profile).report(first_day,last_day,boot_times,options['show'])
+    except (ValueError,KeyError,TypeError,IndexError) as e:
+        print >> sys.stderr, 'Error in schedule.json: ' + str(e)
+        exit(102)
+    print '\n'.join(lines)
@@ -2,12 +2,18 @@
 
 import os
 from Tkinter import NW
-from PIL import Image
 from PIL import ImageTk
 
 from pp_showmanager import ShowManager
 from pp_timeofday import TimeOfDay
+from pp_scheduler import Scheduler
+from pp_imagecache import ImageCache
 from pp_imageplayer import ImagePlayer
+from pp_decodepool import DecodePool, image_spec
+from pp_prescale import PreScale
+from pp_framestore import FrameStore
+from pp_mediainfo import MediaInfo
+from pp_mediabackend import MediaBackend
 from pp_videoplayer import VideoPlayer
 from pp_audioplayer import AudioPlayer
 from pp_browserplayer import BrowserPlayer
@@ -63,6 +69,12 @@ class Show(object):
 
         # create and instance of TimeOfDay scheduler so we can add events
         self.tod=TimeOfDay()
+
+        # timers for the show
+        self.scheduler=Scheduler()
+
+        # decodes the images the show will want next
+        self.decode_pool=DecodePool()
         
         # create an  instance of showmanager so we can init child/subshows
         self.show_manager=ShowManager(self.show_id,self.showlist,self.show_params,self.root,self.show_canvas,self.pp_dir,self.pp_profile,self.pp_home)
@@ -85,6 +97,12 @@ class Show(object):
         self.level=0
         self.subshow_kickback_signal=False
         self.kickback_for_next_track=False
+
+        # players loaded ahead of the playhead, see base_preload. The limits are set by the show
+        self.preloaded=[]
+        self.preload_depth=0
+        self.preload_memory=0
+        self.preload_players=0
         
         # get background image from profile.
         # print 'background', self.show_params['background-image']
@@ -189,22 +207,24 @@ class Show(object):
             self.mon.log(self,self.show_params['show-ref']+ ' '+ str(self.show_id)+ ": Track type is: "+ track_type)
             
             self.current_player=self.base_init_selected_player(selected_track)
-            #menu has no track file
-            if selected_track['type']=='menu':
-                track_file=''
-                
-            # messageplayer passes the text not a file name
-            elif selected_track['type'] == 'message':
-                track_file=selected_track['text']
-            else:
-                track_file=self.base_complete_path(selected_track['location'])
-                
+            track_file=self.base_track_file(selected_track)
             self.mon.trace(self,' - track is: ' + track_file)
             self.mon.trace(self,' - current_player is: '+ self.mon.pretty_inst(self.current_player))
             self.current_player.load(track_file,
                                      loaded_callback,
                                      enable_menu=enable_menu)
 
+    # what is passed to the player's load
+    def base_track_file(self,selected_track):
+        #menu has no track file
+        if selected_track['type']=='menu':
+            return ''
+        # messageplayer passes the text not a file name
+        elif selected_track['type'] == 'message':
+            return selected_track['text']
+        else:
+            return self.base_complete_path(selected_track['location'])
+
     # DUMMY, must be overidden by derived class
     def what_next_after_showing(self):
         self.mon.err(self,"what_next_after showing not overidden")
@@ -311,6 +331,7 @@ class Show(object):
     # close or unload the current player when ending the show
     def base_close_or_unload(self):
         self.mon.trace(self,self.mon.pretty_inst(self.current_player))
+        self.base_discard_preloaded()
         # need to test for None because player may be made None by subshow lower down the stack for terminate
         if self.current_player is not None:
             self.mon.trace(self,self.current_player.get_play_state())
@@ -355,53 +376,56 @@ class Show(object):
         self.mon.trace(self, self.mon.pretty_inst(self.current_player))
         if self.current_player is not None:
             self.mon.trace(self,' - play state is ' +self.current_player.get_play_state())
-            if self.current_player.play_state not in ('unloaded','closed','load-failed'):  ####
-                self.canvas.after(50,self._wait_for_end)
-            else:
-                self.mon.trace(self,' - current closed '+ self.mon.pretty_inst(self.current_player) + ' ' + self.ending_reason)
+            # closed event is fired by the player when it gets to unloaded, closed or load-failed
+            self.current_player.when('closed',self._current_ended)
+        else:
+            self.mon.trace(self,' - current is None ' +  self.mon.pretty_inst(self.current_player) + ' ' + self.ending_reason)
 
-                 #why is some of thsi different to close and unload????????????? perhaps because current_player isn't none, just closed
-                if self.ending_reason == 'killed':
-                    self.current_player.hide()
-                    self.current_player=None
-                    self.base_close_previous()
 
-                elif self.ending_reason == 'error':
-                    self.current_player.hide()
-                    self.current_player=None
-                    self.base_close_previous()
+    def _current_ended(self,play_state):
+        if self.current_player is not None:
+            self.mon.trace(self,' - current closed '+ self.mon.pretty_inst(self.current_player) + ' ' + self.ending_reason)
 
-                elif self.ending_reason == 'exit':
-                    self.current_player.hide()
-                    self.current_player=None
-                    self.base_close_previous()
+            #why is some of thsi different to close and unload????????????? perhaps because current_player isn't none, just closed
+            if self.ending_reason == 'killed':
+                self.current_player.hide()
+                self.current_player=None
+                self.base_close_previous()
 
-                elif self.ending_reason == 'change-medialist':
-                    self.current_player.hide()
-                    self.current_player=None
-                    # self.base_close_previous()
-                    # go to start of list via wait for trigger.
-                    self.wait_for_trigger()
-                    
-                elif self.ending_reason == 'show-timeout':
+            elif self.ending_reason == 'error':
+                self.current_player.hide()
+                self.current_player=None
+                self.base_close_previous()
+
+            elif self.ending_reason == 'exit':
+                self.current_player.hide()
+                self.current_player=None
+                self.base_close_previous()
+
+            elif self.ending_reason == 'change-medialist':
+                self.current_player.hide()
+                self.current_player=None
+                # self.base_close_previous()
+                # go to start of list via wait for trigger.
+                self.wait_for_trigger()
+                
+            elif self.ending_reason == 'show-timeout':
+                self.current_player.hide()
+                self.current_player=None
+                self.end('normal',"show timeout")
+                
+            elif self.ending_reason == 'user-stop':
+                if self.level !=0:
+                    self.end('normal',"show quit by stop operation")
+                else:
                     self.current_player.hide()
                     self.current_player=None
-                    self.end('normal',"show timeout")
-                    
-                elif self.ending_reason == 'user-stop':
-                    if self.level !=0:
-                        self.end('normal',"show quit by stop operation")
-                    else:
-                        self.current_player.hide()
-                        self.current_player=None
-                        self.base_close_previous()
-                        
+                    self.base_close_previous()
                     
-                else:
-                    self.mon.fatal(self,"Unhandled ending_reason: " + self.ending_reason)
-                    self.end('error',"Unhandled ending_reason: "+ self.ending_reason)
-        else:
-            self.mon.trace(self,' - current is None ' +  self.mon.pretty_inst(self.current_player) + ' ' + self.ending_reason)
+                
+            else:
+                self.mon.fatal(self,"Unhandled ending_reason: " + self.ending_reason)
+                self.end('error',"Unhandled ending_reason: "+ self.ending_reason)
 
 
 # ***************************
@@ -533,13 +557,7 @@ class Show(object):
             if not os.path.exists(background_img_file):
                 return 'error',"Show background file not found "+ background_img_file
             else:
-                pil_background_img=Image.open(background_img_file)
-                # print 'pil_background_img ',pil_background_img
-                image_width,image_height=pil_background_img.size
-                window_width=self.show_canvas_width
-                window_height=self.show_canvas_height
-                if image_width != window_width or image_height != window_height:
-                    pil_background_img=pil_background_img.resize((window_width, window_height))
+                pil_background_img=ImageCache().background(background_img_file,self.show_canvas_width,self.show_canvas_height)
                 self.background = ImageTk.PhotoImage(pil_background_img)
                 del pil_background_img
                 # print 'self.background ',self.background
@@ -706,6 +724,148 @@ class Show(object):
         return track_file     
   
 
+    # ask the decode pool to prepare the images of the next few tracks while the current one is showing
+    def base_prefetch(self):
+        if self.medialist is None:
+            return
+        specs=[]
+        for track in self.medialist.upcoming(DecodePool.lookahead,self.show_params['sequence']):
+            if track['type'] != 'image' or track.get('plugin','') != '':
+                continue
+            spec=self.base_image_spec(track)
+            # frames in the frame store are ready already
+            if spec is not None and FrameStore().contains(PreScale().cache_name(spec),spec[0]) is False:
+                specs.append(PreScale().prefer(spec))
+        self.decode_pool.prefetch(specs)
+
+
+    # the spec that ImagePlayer will use for the track, None if it cannot be worked out
+    def base_image_spec(self,track):
+        image_window=track.get('image-window','').strip()
+        if image_window == '':
+            image_window=self.show_params.get('image-window','').strip()
+        image_rotate=track.get('image-rotate','').strip()
+        if image_rotate == '':
+            image_rotate=self.show_params.get('image-rotate','0').strip()
+        try:
+            image_rotate=int(image_rotate)
+        except ValueError:
+            return None
+        # not base_complete_path as the track is not being loaded yet
+        track_file=track['location']
+        if track_file != '' and track_file[0]=="+":
+            track_file=self.pp_home+track_file[1:]
+        elif track_file != '' and track_file[0] == "@":
+            track_file=self.pp_profile+track_file[1:]
+        return image_spec(track_file,image_window,image_rotate,self.show_canvas_width,self.show_canvas_height)
+
+
+
+# ***************************
+# Preloading
+# ***************************
+
+    # load the players for the next preload_depth tracks of the medialist so each is loaded and frozen
+    # by the time it is wanted. Preloading stops at the first track that is not an image, video, audio, message or web track,
+    # at a web track if there is no spare browser to load it off the screen, or when the images would take more than preload_memory bytes or there would be more than preload_players
+    # player processes (video and audio).
+    # Players already loaded for tracks that are still to come are kept, the others are unloaded,
+    # so a jump to another track throws away only the players that are no longer wanted.
+    def base_preload(self,enable_menu):
+        if self.medialist is None or self.preload_depth == 0:
+            upcoming=[]
+        else:
+            upcoming=self.medialist.upcoming(self.preload_depth,self.show_params['sequence'])
+        old=self.preloaded
+        self.preloaded=[]
+        memory=0
+        players=0
+        for track in upcoming:
+            if track['type'] not in ('image','video','audio','message','web') or track.get('plugin','') != '':
+                break
+            if track['type'] == 'web' and self._base_find_preloaded(old,track,enable_menu) is None \
+               and MediaBackend().spare_browser() is False:
+                break
+            info=self.base_media_info(track)
+            if info is not None and info['playable'] is False:
+                # it would only fail to load, keep the player for the tracks after it
+                continue
+            track_memory,track_players=self.base_preload_cost(track)
+            if memory+track_memory > self.preload_memory or players+track_players > self.preload_players:
+                break
+            memory+=track_memory
+            players+=track_players
+            entry=self._base_find_preloaded(old,track,enable_menu)
+            if entry is not None:
+                old.remove(entry)
+            else:
+                self.mon.log(self,self.show_params['show-ref']+ ' '+ str(self.show_id)+ ": Preloading track type: "+ track['type'])
+                player=self.base_init_selected_player(track)
+                entry=(track,enable_menu,player)
+                player.load(self.base_track_file(track),
+                            self._base_preload_loaded,
+                            enable_menu=enable_menu)
+            self.preloaded.append(entry)
+        for track,enable,player in old:
+            self._base_unload_preloaded(player)
+
+
+    # memory in bytes and player processes a preloaded track takes
+    def base_preload_cost(self,track):
+        if track['type'] == 'image':
+            # images are decoded to about the size of the show canvas, 4 bytes a pixel
+            return self.show_canvas_width*self.show_canvas_height*4,0
+        elif track['type'] in ('video','audio'):
+            return 0,1
+        else:
+            return 0,0
+
+
+    # the entry of a video or audio track in the media info index made by pp_mediainfo.py, None if it is not there
+    def base_media_info(self,track):
+        path=MediaInfo().track_path(track,self.pp_home,self.pp_profile)
+        if path is None:
+            return None
+        return MediaInfo().lookup(path)
+
+
+    # returns the player preloaded for the track and stops preloading it, None if there is not one
+    def base_take_preloaded(self,selected_track,enable_menu):
+        entry=self._base_find_preloaded(self.preloaded,selected_track,enable_menu)
+        if entry is None:
+            return None
+        self.preloaded.remove(entry)
+        self.mon.log(self,self.show_params['show-ref']+ ' '+ str(self.show_id)+ ": Using preloaded track type: "+ selected_track['type'])
+        return entry[2]
+
+
+    # unload all the preloaded players, used when the show ends
+    def base_discard_preloaded(self):
+        for track,enable_menu,player in self.preloaded:
+            self._base_unload_preloaded(player)
+        self.preloaded=[]
+
+
+    def _base_find_preloaded(self,entries,track,enable_menu):
+        # the same entry in the list not just the same content, a medialist can have a track twice
+        for entry in entries:
+            if entry[0] is track and entry[1] == enable_menu:
+                return entry
+        return None
+
+
+    def _base_unload_preloaded(self,player):
+        self.mon.trace(self,' - unloading preloaded: ' + self.mon.pretty_inst(player))
+        if player.get_play_state() in ('loading','loaded'):
+            player.unload()
+        # delete the hidden content the player has drawn once it has finished with it
+        player.when('closed',lambda play_state: player.hide_x_content())
+
+
+    def _base_preload_loaded(self,status,message):
+        self.mon.log(self,self.show_params['show-ref']+ ' '+ str(self.show_id)+ ': Preload complete with status: ' + status +'  message: ' +message)
+
+
     def calculate_duration(self,line):
         fields=line.split(':')
         if len(fields)==1:
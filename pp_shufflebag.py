@@ -0,0 +1,127 @@
+import random
+
+
+class ShuffleBag(object):
+    """
+    shuffled sequencing for medialists and livelists.
+    Every track is played once per cycle in the order of a random permutation, each step is O(1),
+    the permutation is made once per cycle with a Fisher-Yates shuffle.
+
+    no_repeat is the number of tracks at the end of a cycle that may not be played
+    in the same number of places at the start of the next one, so there is no repeat across the boundary.
+
+    The members are keys chosen by the list (track index or track location). When the members change mid-cycle
+    the tracks that are left keep their place, tracks that have gone are dropped and new tracks
+    are put at random places in the part of the cycle that has not been played yet.
+    """
+
+# CLASS VARIABLES (ShuffleBag.)
+    no_repeat=1     # set from the command line by PiPresents
+
+
+    def __init__(self):
+        self.order=[]           # permutation for the current cycle
+        self.position=-1        # position in order of the last key returned
+        self.next_order=None    # permutation for the next cycle if peek() has needed it
+
+
+    def length(self):
+        return len(self.order)
+
+
+    # start a new cycle at the next call of next()
+    def reset(self):
+        self.position=len(self.order)-1
+
+
+    # change the members of the bag, keys is a list of hashable keys
+    def set_members(self,keys):
+        new=set(keys)
+        played=[]
+        to_play=[]
+        old=set()
+        for index,key in enumerate(self.order):
+            old.add(key)
+            if key in new:
+                if index<=self.position:
+                    played.append(key)
+                else:
+                    to_play.append(key)
+        added=[key for key in keys if key not in old]
+        if len(added)==0 and len(played)+len(to_play)==len(self.order):
+            return
+
+        # merge the new keys into random places in the unplayed part, keeping the order of the others
+        random.shuffle(added)
+        slots=sorted(random.randint(0,len(to_play)) for key in added)
+        merged=[]
+        next_added=0
+        for index,key in enumerate(to_play):
+            while next_added<len(added) and slots[next_added]==index:
+                merged.append(added[next_added])
+                next_added+=1
+            merged.append(key)
+        merged+=added[next_added:]
+
+        self.order=played+merged
+        self.position=len(played)-1
+        self.next_order=None
+
+
+    # return the next key, None if the bag is empty
+    def next(self):
+        if len(self.order)==0:
+            return None
+        self.position+=1
+        if self.position>=len(self.order):
+            self._new_cycle()
+            self.position=0
+        return self.order[self.position]
+
+
+    # return the next count keys without moving on, running into the next cycle if needed
+    def peek(self,count):
+        keys=self.order[self.position+1:self.position+1+count]
+        if len(keys) < count and len(self.order)>0:
+            if self.next_order is None:
+                self.next_order=self._make_cycle()
+            keys+=self.next_order[:count-len(keys)]
+        return keys
+
+
+    # return the key before the current one in this cycle, wrapping round to the end of the cycle
+    def previous(self):
+        if len(self.order)==0:
+            return None
+        self.position-=1
+        if self.position<0:
+            self.position=len(self.order)-1
+        return self.order[self.position]
+
+
+    def _new_cycle(self):
+        if self.next_order is not None:
+            self.order=self.next_order
+            self.next_order=None
+        else:
+            self.order=self._make_cycle()
+
+
+    def _make_cycle(self):
+        # window cannot be more than half the tracks or there is no way to satisfy it
+        window=min(ShuffleBag.no_repeat,len(self.order)/2)
+        if window>0:
+            recent=set(self.order[-window:])
+        order=list(self.order)
+        # random.shuffle is a Fisher-Yates shuffle
+        random.shuffle(order)
+        if window>0:
+            # swap recently played keys out of the start of the cycle, there are always enough others after the window
+            swap=window
+            for index in range(window):
+                if order[index] in recent:
+                    while order[swap] in recent:
+                        swap+=1
+                    order[index],order[swap]=order[swap],order[index]
+                    swap+=1
+        return order
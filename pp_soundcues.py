@@ -0,0 +1,230 @@
+import os
+import wave
+import audioop
+import threading
+import subprocess
+from pp_utils import Monitor
+from pp_scheduler import Scheduler
+
+
+class SoundCues(object):
+    """
+    short sounds for button and click feedback, played at once and over the top of whatever track is showing.
+    The .wav files in the profile's pp_sounds directory are decoded into memory when the profile is opened,
+    converted to one format so they can be mixed, and are known by their file name without .wav.
+
+    The sound output is opened once and kept open. A mixer thread adds up the sounds that are playing
+    and writes them to the output a chunk at a time, the output blocks when its buffer is full so the
+    thread is paced by the sound card and a new sound is heard within a chunk or two.
+    The output is pyalsaaudio if it is installed, otherwise aplay reading raw samples from a pipe.
+    Nothing is written while no sounds are playing so the sound card is free for mplayer and omxplayer
+    where ALSA mixes the streams (the default device on Raspbian does).
+
+    A sound is played by the operation sound-<name> in controls and links, or the animate line
+    <delay> <name> sound play
+
+    Usage:
+        SoundCues().open(pp_profile,device)     # once by PiPresents
+        SoundCues().play(name)
+    """
+
+    rate=44100
+    channels=2
+    width=2                 # bytes in a sample, S16_LE
+    chunk_frames=441        # 10 mS
+
+# CLASS VARIABLES (SoundCues.)
+    sounds={}               # name -> samples as a string
+    voices=[]               # [samples,offset] of each sound that is playing
+    lock=threading.Lock()
+    wake=threading.Event()
+    mixer=None
+    running=False
+    output=None             # alsaaudio.PCM or the aplay Popen
+    alsaaudio=None          # the module if output is alsaaudio
+    max_voices=8
+
+
+    def __init__(self):
+        self.mon=Monitor()
+
+
+    # read the sounds of the profile and open the output, called by PiPresents
+    def open(self,pp_profile,device):
+        SoundCues.sounds={}
+        directory=pp_profile + os.sep + 'pp_sounds'
+        if not os.path.isdir(directory):
+            return
+        for filename in sorted(os.listdir(directory)):
+            name,ext=os.path.splitext(filename)
+            if ext.lower() != '.wav':
+                continue
+            samples=self._read(directory + os.sep + filename)
+            if samples is not None:
+                SoundCues.sounds[name]=samples
+        if len(SoundCues.sounds) == 0:
+            return
+        size=sum(len(samples) for samples in SoundCues.sounds.values())
+        self.mon.log(self,'Read ' + str(len(SoundCues.sounds)) + ' sounds, ' + str(size/1024) + ' KB, from ' + directory)
+        if self._open_output(device) is False:
+            SoundCues.sounds={}
+            return
+        SoundCues.running=True
+        SoundCues.mixer=threading.Thread(target=self._mix)
+        SoundCues.mixer.daemon=True
+        SoundCues.mixer.start()
+
+
+    def play(self,name):
+        samples=SoundCues.sounds.get(name)
+        if samples is None:
+            self.mon.warn(self,'Sound not found in pp_sounds: ' + name)
+            return
+        SoundCues.lock.acquire()
+        SoundCues.voices.append([samples,0])
+        if len(SoundCues.voices) > SoundCues.max_voices:
+            # lose the oldest rather than clip everything
+            del SoundCues.voices[0]
+        SoundCues.lock.release()
+        SoundCues.wake.set()
+
+
+    # stop the mixer and close the output, called by PiPresents on exit
+    def terminate(self):
+        if SoundCues.running is False:
+            return
+        SoundCues.running=False
+        SoundCues.wake.set()
+        SoundCues.mixer.join(1.0)
+        if SoundCues.alsaaudio is not None:
+            SoundCues.output.close()
+        else:
+            try:
+                SoundCues.output.stdin.close()
+            except IOError:
+                pass
+            SoundCues.output.wait()
+        SoundCues.output=None
+
+
+# ***********************************
+# INTERNAL FUNCTIONS
+# ************************************
+
+    # decode a .wav file to the mixing format, None if it cannot be
+    def _read(self,path):
+        try:
+            wav=wave.open(path,'rb')
+            channels=wav.getnchannels()
+            width=wav.getsampwidth()
+            rate=wav.getframerate()
+            samples=wav.readframes(wav.getnframes())
+            wav.close()
+        except (wave.Error,EOFError,IOError) as e:
+            self.mon.warn(self,'Cannot read sound ' + path + ': ' + str(e))
+            return None
+        if channels not in (1,2):
+            self.mon.warn(self,'Sound must be mono or stereo: ' + path)
+            return None
+        # audioop cannot convert 24 bit samples
+        if width not in (1,2,4):
+            self.mon.warn(self,'Sound must be 8, 16 or 32 bit: ' + path)
+            return None
+        try:
+            if width == 1:
+                # 8 bit wav is unsigned
+                samples=audioop.bias(samples,1,-128)
+            if width != SoundCues.width:
+                samples=audioop.lin2lin(samples,width,SoundCues.width)
+            if rate != SoundCues.rate:
+                samples,state=audioop.ratecv(samples,SoundCues.width,channels,rate,SoundCues.rate,None)
+            if channels == 1:
+                samples=audioop.tostereo(samples,SoundCues.width,1,1)
+        except audioop.error as e:
+            self.mon.warn(self,'Cannot convert sound ' + path + ': ' + str(e))
+            return None
+        return samples
+
+
+    def _open_output(self,device):
+        try:
+            import alsaaudio
+        except ImportError:
+            alsaaudio=None
+        # pyalsaaudio is not needed by anything else so it is optional
+        if alsaaudio is not None:
+            try:
+                if device == '':
+                    device='default'
+                pcm=alsaaudio.PCM(alsaaudio.PCM_PLAYBACK,alsaaudio.PCM_NORMAL,device=device)
+                pcm.setchannels(SoundCues.channels)
+                pcm.setrate(SoundCues.rate)
+                pcm.setformat(alsaaudio.PCM_FORMAT_S16_LE)
+                pcm.setperiodsize(SoundCues.chunk_frames)
+            except alsaaudio.ALSAAudioError as e:
+                self.mon.err(self,'Cannot open sound device ' + device + ': ' + str(e))
+                return False
+            SoundCues.output=pcm
+            SoundCues.alsaaudio=alsaaudio
+            self.mon.log(self,'Sounds play through pyalsaaudio on ' + device)
+            return True
+
+        command=['aplay','-q','-t','raw','-f','S16_LE','-c',str(SoundCues.channels),'-r',str(SoundCues.rate),
+                 '--buffer-time=50000']
+        if device != '':
+            command+=['-D',device]
+        try:
+            devnull=open(os.devnull,'w')
+            SoundCues.output=subprocess.Popen(command,stdin=subprocess.PIPE,stderr=devnull,close_fds=True)
+            devnull.close()
+        except OSError as e:
+            self.mon.err(self,'Cannot start aplay for sounds: ' + str(e))
+            return False
+        SoundCues.alsaaudio=None
+        self.mon.log(self,'Sounds play through ' + ' '.join(command))
+        return True
+
+
+    # the mixer thread
+    def _mix(self):
+        chunk_bytes=SoundCues.chunk_frames*SoundCues.channels*SoundCues.width
+        silence='\0'*chunk_bytes
+        while SoundCues.running is True:
+            SoundCues.lock.acquire()
+            if len(SoundCues.voices) == 0:
+                SoundCues.wake.clear()
+                SoundCues.lock.release()
+                SoundCues.wake.wait()
+                continue
+            mixed=silence
+            for voice in SoundCues.voices:
+                samples,offset=voice
+                chunk=samples[offset:offset+chunk_bytes]
+                if len(chunk) < chunk_bytes:
+                    chunk+=silence[len(chunk):]
+                # add saturates rather than wrapping if the sounds together are too loud
+                mixed=audioop.add(mixed,chunk,SoundCues.width)
+                voice[1]=offset+chunk_bytes
+            SoundCues.voices=[voice for voice in SoundCues.voices if voice[1] < len(voice[0])]
+            SoundCues.lock.release()
+            if self._write(mixed) is False:
+                break
+
+
+    def _write(self,samples):
+        if SoundCues.alsaaudio is not None:
+            errors=(SoundCues.alsaaudio.ALSAAudioError,)
+        else:
+            errors=(IOError,ValueError)
+        try:
+            if SoundCues.alsaaudio is not None:
+                SoundCues.output.write(samples)
+            else:
+                SoundCues.output.stdin.write(samples)
+                SoundCues.output.stdin.flush()
+        except errors as e:
+            # the output has gone so there is no more to do
+            Scheduler().post(self.mon.warn,self,'Cannot write sounds: ' + str(e))
+            SoundCues.running=False
+            return False
+        return True
@@ -1,38 +1,69 @@
-import copy
-import time
-import string
 import os
-from datetime import datetime, timedelta,time
+import sys
+import math
+import string
 import json
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta,time
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_clock import Clock
 
 
 class TimeOfDay(object):
-
-    # CLASS VARIABLES
+    """
+    opens and closes shows, and exits or shuts down Pi Presents, at the times in schedule.json.
+
+    The schedule is compiled into a calendar, for each day one timeline of all the day's events merged and
+    sorted by time. Today and the next days_ahead days are compiled in advance.
+    A single timer is armed for the next event so nothing runs between events however many there are,
+    it is never armed for more than max_sleep secs so a change to the clock is noticed.
+
+    Events that are due when the timer runs are done in time order. If the timer ran more than stall_limit
+    secs late, because the clock jumped forward (e.g. set by ntp after booting with the wrong time) or Tk was held up,
+    the events missed are caught up as at start up: the last pp_core event is done, otherwise the last event of each show.
+    If the clock goes back events are done again when their times come round.
+
+    Usage:
+        self.tod=TimeOfDay()
+        self.tod.init(pp_dir,pp_home,pp_profile,root,callback)     # once by PiPresents
+        self.tod.poll()                                             # does the catch up and arms the timer
+        timeline=TimeOfDay().compile_day(schedule,date)             # for tools, needs only the schedule
+    """
 
     # change this for another language
     DAYS_OF_WEEK=['monday','tuesday','wednesday','thursday','friday','saturday','sunday']
 
-    """
-        TimeOfDay.events is a dictionary the keys being show-refs.
-        Each dictionary entry is a list of time_elements sorted by descending time
-        Each time element is a list with the fields:
-        0 - command
-        1 - time, seconds since midnight
-
-    """
-    events={}  # list of times of day used to generate callbacks, earliest first
+# constants for an event, an event is a tuple so a timeline can be searched with bisect
+    WHEN=0          # datetime
+    ORDER=1         # position in schedule.json, events at the same time are done in the order they are written
+    COMMAND=2
+    SHOW_REF=3
+
+# CLASS VARIABLES (TimeOfDay.)
+    schedule={}
+    calendar={}             # date -> timeline, the day's events sorted by time
+    days_ahead=2            # days compiled in advance of today
+    catchup_days=7          # days looked back over when the clock jumps forward
+    max_sleep=60            # secs, the longest the timer is armed for
+    stall_limit=60          # secs, a timer this late has its missed events caught up rather than done one by one
+    done_until=None         # datetime, every event up to and including this time has been done
+    armed_for=None          # datetime the timer is due
+    timer=None
+    sim_offset=None         # simulated time - real time when testing
 
 
     # executed by main program and by each object using tod
     def __init__(self):
         self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.clock=Clock()
 
 
-     # executed once from main program  only 
+     # executed once from main program  only
     def init(self,pp_dir,pp_home,pp_profile,root,callback):
-       
+
         # instantiate arguments
         TimeOfDay.root=root
         self.pp_dir=pp_dir
@@ -40,163 +71,119 @@ class TimeOfDay(object):
         self.pp_profile=pp_profile
         self.callback=callback
 
-        # init variables
-        self.testing=False
-        self.tod_tick=500
-        self.tick_timer=None
-        TimeOfDay.now = datetime.now().replace(microsecond=0)
         # read the schedule
-        self.schedule=self.open_schedule()
-
-        #create the initial events list
-        if 'simulate-time' in self.schedule and self.schedule['simulate-time']=='yes':
-            year= int(self.schedule['sim-year'])
-            month= int(self.schedule['sim-month'])
-            day = int(self.schedule['sim-day'])
-            hour= int(self.schedule['sim-hour'])
-            minute= int(self.schedule['sim-minute'])
-            second= int(self.schedule['sim-second'])
-            TimeOfDay.now = datetime(day = day, month =month, year=year,hour=hour, minute=minute, second=second)
-            self.testing=True
-            # print '\nInitial SIMULATED time',TimeOfDay.now.ctime()
-            self.mon.sched(self,'Testing is ON, Initial SIMULATED time ' + str(TimeOfDay.now.ctime()))
-        else:
-            #get the current date/time only this once
-            TimeOfDay.now = datetime.now().replace(microsecond=0)
-            # print '\nInitial REAL time',TimeOfDay.now.ctime()
-            self.testing=False
-        TimeOfDay.last_now = TimeOfDay.now - timedelta(seconds=1)           
-        self.build_schedule_for_today(self.schedule)
-        self.mon.sched(self,self.pretty_todays_schedule())
-        # if self.testing:
-            # self.print_todays_schedule()
-        self.build_events_lists()
-        # self.print_events_lists()
-        # and do exitpipresents or start any show that should be running at start up time
-        self.do_catchup()
-
-
-    def do_catchup(self):
-            TimeOfDay.scheduler_time=TimeOfDay.now.time()
-            # shutdown or exit if current time is later than time in event list
-            for show_ref in TimeOfDay.events:
-                if show_ref == 'pp_core':
-                    times = TimeOfDay.events[show_ref]
-                    for time_element in reversed(times):
-                        # print 'now', TimeOfDay.scheduler_time, 'time from events', time_element[1], time_element[0]
-                        # got past current time can give up and execute exitpipresents or closedown
-                        if   TimeOfDay.scheduler_time >= time_element[1]:
-                            self.do_event(show_ref,time_element)
-                            return 'exiting'
-
-                    
-            # do the catchup for each real show in turn
-            for show_ref in TimeOfDay.events:
-                 if show_ref != 'pp_core':
-                    # print '\n*****',show_ref
-                    times = TimeOfDay.events[show_ref]
-                    # go through the event list for a show rembering show state until the first future event is found.
-                    # then if last command was to start the show send it
-                    show_running=False
-                    last_start_element=[]
-                    for time_element in reversed(times):
-                        # print 'now', now_seconds, 'time from events', time_element[1], time_element[0]
-                        # got past current time can give up catch up
-                        if time_element[1]  >=  TimeOfDay.scheduler_time:
-                            # print ' gone past time - break'
-                            break
-                        if time_element[0] == 'open':
-                            last_start_element=time_element
-                            # print 'open - show-running= true' 
-                            show_running=True
-                        elif time_element[0]=='close':
-                            # print 'close - show-running= false' 
-                            show_running=False
-                    if show_running is True:
-                        #if self.testing:
-                            # print 'End of Catch Up Search', show_ref,last_start_element
-                        self.mon.sched(self,'Catch up for show: ' + show_ref +' requires '+ last_start_element[0] + ' ' +str(last_start_element[1]))
-                        self.do_event(show_ref,last_start_element)
-
-##                    # print 'catchup time match', show_ref
-##                    # now do the inital real time command if time now matches event time
-##                    for time_element in reversed(times):
-##                        if time_element[1]  ==  TimeOfDay.scheduler_time:
-##                            print ' do event  - catchup', TimeOfDay.scheduler_time, 'time from events', time_element[1], time_element[0]
-##                            self.do_event(show_ref,time_element)
-            return 'not exiting'        
-
-    # called by main program only         
+        TimeOfDay.schedule=self.open_schedule()
+        TimeOfDay.sim_offset=None
+        TimeOfDay.timer=None
+        if 'simulate-time' in TimeOfDay.schedule and TimeOfDay.schedule['simulate-time']=='yes':
+            year= int(TimeOfDay.schedule['sim-year'])
+            month= int(TimeOfDay.schedule['sim-month'])
+            day = int(TimeOfDay.schedule['sim-day'])
+            hour= int(TimeOfDay.schedule['sim-hour'])
+            minute= int(TimeOfDay.schedule['sim-minute'])
+            second= int(TimeOfDay.schedule['sim-second'])
+            # the simulated time then goes forward with the real time
+            TimeOfDay.sim_offset=datetime(day = day, month =month, year=year,hour=hour, minute=minute, second=second)\
+                                  - self.clock.now().replace(microsecond=0)
+            self.mon.sched(self,'Testing is ON, Initial SIMULATED time ' + str(self.now().ctime()))
+
+        now=self.now().replace(microsecond=0)
+        TimeOfDay.calendar={}
+        self.precompile(now.date())
+        self.mon.sched(self,self.pretty_schedule(now.date()))
+        # events at the start up time are done by the first poll, those before it are caught up
+        TimeOfDay.done_until=now-timedelta(microseconds=1)
+        midnight=datetime.combine(now.date(),time())
+        self.do_catchup(self.events_between(midnight-timedelta(microseconds=1),TimeOfDay.done_until),True)
+
+
+    # does exitpipresents or shutdownnow if pp_core has missed an event, otherwise the last missed event of each show.
+    # At start up only opens are done as no show is running. Returns 'exiting' if pp_core is
+    def do_catchup(self,missed,at_start):
+        actions=self.catchup_events(missed,at_start)
+        for event in actions:
+            self.mon.sched(self,'Catch up for show: ' + event[TimeOfDay.SHOW_REF] +' requires '+ event[TimeOfDay.COMMAND]
+                           + ' ' +str(event[TimeOfDay.WHEN].time()))
+            self.do_event(event)
+        if len(actions) > 0 and actions[-1][TimeOfDay.SHOW_REF] == 'pp_core':
+            return 'exiting'
+        return 'not exiting'
+
+
+    # the events that catch up with the missed events, missed is in time order
+    def catchup_events(self,missed,at_start):
+        last={}
+        for event in missed:
+            if event[TimeOfDay.SHOW_REF] == 'pp_core':
+                # got past an exit or shutdown, nothing else matters
+                return [event]
+            last[event[TimeOfDay.SHOW_REF]]=event
+        actions=[]
+        for event in last.values():
+            if at_start is False or event[TimeOfDay.COMMAND] == 'open':
+                actions.append(event)
+        return sorted(actions)
+
+
+    # called by main program only, then runs from the timer
     def poll(self):
-        if self.testing:
-            poll_time=TimeOfDay.now
-        else:
-            poll_time=datetime.now()
-        # print 'poll time: ',poll_time.time(),'scheduler time: ',TimeOfDay.now.time()
-        # if poll_time != TimeOfDay.now : print 'times different ',poll_time.time(),TimeOfDay.now.time()
-        # is current time greater than last time the scheduler was run
-        # run in a loop to catch up because root.after can get behind when images are being rendered etc.
-        # poll time can be the same twice as poll is run at half second intervals.
-        catchup_time=0
-        while TimeOfDay.now<=poll_time:
-            if  TimeOfDay.now-TimeOfDay.last_now != timedelta(seconds=1):
-                print 'POLL TIME FAILED', TimeOfDay.last_now, TimeOfDay.now
-            #if catchup_time != 0:
-               # print 'scheduler behind by: ',catchup_time, TimeOfDay.now.time(),poll_time.time()
-            self.do_scheduler()
-            TimeOfDay.last_now=TimeOfDay.now
-            catchup_time+=1
-            TimeOfDay.now = TimeOfDay.now + timedelta(seconds=1)
-        # and loop
-        if self.testing:
-            self.tick_timer=TimeOfDay.root.after(1000,self.poll)
-        else:
-            self.tick_timer=TimeOfDay.root.after(self.tod_tick,self.poll)
-
-
-     # called by main program only           
+        TimeOfDay.timer=None
+        now=self.now()
+        new_day=now.date() != TimeOfDay.done_until.date()
+        if now < TimeOfDay.done_until-timedelta(seconds=1):
+            self.mon.sched(self,'Clock has gone back from ' + str(TimeOfDay.done_until.ctime()) + ' to ' + str(now.ctime()))
+            TimeOfDay.done_until=now
+        elif TimeOfDay.armed_for is not None and now > TimeOfDay.armed_for+timedelta(seconds=TimeOfDay.stall_limit):
+            self.mon.sched(self,'Scheduler is ' + str(now-TimeOfDay.armed_for) + ' late, catching up from '
+                           + str(TimeOfDay.done_until.ctime()))
+            start=max(TimeOfDay.done_until,datetime.combine(now.date()-timedelta(days=TimeOfDay.catchup_days),time()))
+            missed=self.events_between(start,now)
+            TimeOfDay.done_until=now
+            self.do_catchup(missed,False)
+        elif now > TimeOfDay.done_until:
+            due=self.events_between(TimeOfDay.done_until,now)
+            TimeOfDay.done_until=now
+            for event in due:
+                self.do_event(event)
+
+        # a callback may have terminated Pi Presents
+        if TimeOfDay.done_until is None:
+            return
+        if new_day is True:
+            self.mon.sched(self,'Its midnight,  today is now ' + str(now.ctime()))
+            self.precompile(now.date())
+            self.mon.sched(self,self.pretty_schedule(now.date()))
+        # and arm the timer for the next event
+        sleep=TimeOfDay.max_sleep
+        next_event=self.next_event(now)
+        if next_event is not None:
+            sleep=min(sleep,self.seconds(next_event[TimeOfDay.WHEN]-now))
+        TimeOfDay.armed_for=now+timedelta(seconds=sleep)
+        TimeOfDay.timer=self.scheduler.after(int(math.ceil(sleep*1000)),self.poll)
+
+
+     # called by main program only
     def terminate(self):
-        if self.tick_timer is not None:
-            TimeOfDay.root.after_cancel(self.tick_timer)
+        self.scheduler.cancel(TimeOfDay.timer)
+        TimeOfDay.timer=None
+        TimeOfDay.done_until=None
+        TimeOfDay.armed_for=None
         self.clear_events_lists()
 
 
-        
-    # execute events at the appropriate time.
-    # called by main program only   
-    def do_scheduler(self):
-        # if its midnight then build the events lists for the new day
-        TimeOfDay.scheduler_time=TimeOfDay.now.time()
-        if  TimeOfDay.scheduler_time == time(hour=0,minute=0,second=0):
-            # if self.testing:
-                # print 'Its midnight,  today is now', TimeOfDay.now.ctime()
-            self.mon.sched(self,'Its midnight,  today is now ' + str(TimeOfDay.now.ctime()))
-            self.build_schedule_for_today(self.schedule)
-            self.mon.sched(self,self.pretty_todays_schedule())
-            # if self.testing:
-                # self.print_todays_schedule()
-            self.build_events_lists()
-            # self.mon.sched(self,self.pretty_events_lists())
-            # self.print_events_lists()
-
-        # print TimeOfDay.scheduler_time
-        for show_ref in TimeOfDay.events:      
-            # print 'scheduler time match', show_ref
-            times = TimeOfDay.events[show_ref]
-            # now send a command if time matches
-            for time_element in reversed(times):
-                # print time_element[1],TimeOfDay.scheduler_time
-                if time_element[1]  ==  TimeOfDay.scheduler_time:
-                    self.do_event(show_ref,time_element)
+    def now(self):
+        if TimeOfDay.sim_offset is not None:
+            return self.clock.now()+TimeOfDay.sim_offset
+        return self.clock.now()
 
 
     # execute an event
-    def do_event(self,show_ref,time_element):
-        self.mon.log (self,'Event : '  + time_element[0] +  ' ' +  show_ref + ' required at: ' + time_element[1].isoformat())
-        self.mon.sched (self,' ToD Scheduler : '  + time_element[0] +  ' ' +  show_ref + ' required at: ' + time_element[1].isoformat())
-        # if self.testing:
-            # print 'Event : ' +  time_element[0] + ' ' + show_ref + ' required at: '+ time_element[1].isoformat()
-        self.callback(time_element[0]  + ' ' + show_ref)
+    def do_event(self,event):
+        self.mon.log (self,'Event : '  + event[TimeOfDay.COMMAND] +  ' ' +  event[TimeOfDay.SHOW_REF] + ' required at: '
+                      + event[TimeOfDay.WHEN].time().isoformat())
+        self.mon.sched (self,' ToD Scheduler : '  + event[TimeOfDay.COMMAND] +  ' ' +  event[TimeOfDay.SHOW_REF]
+                        + ' required at: ' + event[TimeOfDay.WHEN].time().isoformat())
+        self.callback(event[TimeOfDay.COMMAND]  + ' ' + event[TimeOfDay.SHOW_REF])
 
 
 #
@@ -207,12 +194,57 @@ class TimeOfDay(object):
     # clear events list
     def clear_events_lists(self):
         self.mon.log(self,'clear time of day  events list ')
-        # empty event list
-        TimeOfDay.events={}
+        TimeOfDay.calendar={}
+
+
+# ***********************************
+# The calendar
+# ************************************
+
+    # compile the timelines of day and the days after it, forget the days before it
+    def precompile(self,day):
+        for old_day in TimeOfDay.calendar.keys():
+            if old_day < day:
+                del TimeOfDay.calendar[old_day]
+        for n in range(TimeOfDay.days_ahead+1):
+            self.timeline(day+timedelta(days=n))
+
+
+    def timeline(self,day):
+        if day not in TimeOfDay.calendar:
+            TimeOfDay.calendar[day]=self.compile_day(TimeOfDay.schedule,day)
+        return TimeOfDay.calendar[day]
+
+
+    # the events after start up to and including end, in time order
+    def events_between(self,start,end):
+        events=[]
+        day=start.date()
+        while day <= end.date():
+            timeline=self.timeline(day)
+            first=bisect_right(timeline,(start,sys.maxint))
+            last=bisect_right(timeline,(end,sys.maxint))
+            events.extend(timeline[first:last])
+            day+=timedelta(days=1)
+        return events
+
+
+    # the first event after when, None if there is none in the days compiled in advance
+    def next_event(self,when):
+        for n in range(TimeOfDay.days_ahead+1):
+            timeline=self.timeline(when.date()+timedelta(days=n))
+            index=bisect_right(timeline,(when,sys.maxint))
+            if index < len(timeline):
+                return timeline[index]
+        return None
+
+
+    def seconds(self,interval):
+        return interval.days*86400 + interval.seconds + interval.microseconds/1000000.0
 
 
 # ***********************************
-# Preparing schedule and todays event list
+# Compiling the schedule
 # ************************************
 
     def open_schedule(self):
@@ -225,79 +257,51 @@ class TimeOfDay(object):
         self.mon.log(self,"schedule.json read from "+ filename)
         return schedule
 
-    def build_schedule_for_today(self,schedule):
-        # print this_day.year, this_day.month, this_day.day, TimeOfDay.DAYS_OF_WEEK[ this_day.weekday()]
+
+    # the timeline of day (a date), all the events of the schedule on that day sorted by time
+    def compile_day(self,schedule,day):
+        timeline=[]
+        order=0
+        for show_ref,(kind,times) in self.schedule_for_day(schedule,day).items():
+            for time_element in times:
+                when=datetime.combine(day,self.parse_event_time(time_element[1]))
+                timeline.append((when,order,time_element[0],show_ref))
+                order+=1
+        timeline.sort()
+        return timeline
+
+
+    def schedule_for_day(self,schedule,day):
         """
-        self.todays_schedule is a dictionary the keys being show-refs.
-        Each dictionary entry is a list of time_elements
+        returns an ordered dictionary, the keys being show-refs.
+        Each entry is (kind,times), times is the show's list of time_elements for the day and kind is where they came from,
+        everyday times are replaced by weekday times if the day is one of the weekdays, then by monthday times
+        and then by specialday times.
         Each time element is a list with the fields:
         0 - command
         1 - time hour:min[:sec]
 
         """
-        self.todays_schedule={}
+        day_schedule=OrderedDict()
         for show in schedule['shows']:
             show_ref=show['show-ref']
-            if 'everyday' in show:
-                day=show['everyday']
-                # print day['day']
-                times=day['times']
-                for time in times:
-                    self.todays_schedule[show['show-ref']]=copy.deepcopy(day['times'])
-                # print '\nafter everyday'
-                # self.print_todays_schedule()
-      
-
-            if 'weekday' in show:
-                day=show['weekday']
-                # print day['day']
-                if  TimeOfDay.DAYS_OF_WEEK[ TimeOfDay.now.weekday()] in day['day'] :
-                    # print 'weekday matched', TimeOfDay.DAYS_OF_WEEK[ TimeOfDay.now.weekday()]
-                    times=day['times']
-                    for time in times:
-                        self.todays_schedule[show['show-ref']]=copy.deepcopy(day['times'])
-                # print '\nafter weekday'
-                # self.print_todays_schedule()
-
-
-            if 'monthday' in show:
-                day=show['monthday']
-                # print day['day']
-                if  TimeOfDay.now.day in map(int,day['day']):
-                    # print 'monthday matched', day['day']
-                    times=day['times']
-                    for time in times:
-                        self.todays_schedule[show['show-ref']]=copy.deepcopy(day['times'])
-                # print '\nafter monthday'
-                # self.print_todays_schedule()
-                     
+            # an empty list of times does not replace the times from before, except for a special day
+            if 'everyday' in show and len(show['everyday']['times']) > 0:
+                day_schedule[show_ref]=('everyday',show['everyday']['times'])
+
+            if 'weekday' in show and len(show['weekday']['times']) > 0:
+                if  TimeOfDay.DAYS_OF_WEEK[day.weekday()] in show['weekday']['day']:
+                    day_schedule[show_ref]=('weekday',show['weekday']['times'])
+
+            if 'monthday' in show and len(show['monthday']['times']) > 0:
+                if  day.day in map(int,show['monthday']['day']):
+                    day_schedule[show_ref]=('monthday',show['monthday']['times'])
+
             if 'specialday' in show:
-                days=show['specialday']
-               # print days['day']
-                for day in days['day']:
-                    sdate=datetime.strptime(day,'%Y-%m-%d')
-                    if sdate.year == TimeOfDay.now.year and sdate.month==TimeOfDay.now.month and sdate.day == TimeOfDay.now.day:
-                        # print 'special matched', day
-                        times=days['times']
-                        # for time in times:
-                        self.todays_schedule[show['show-ref']]=copy.deepcopy(days['times'])
-                # print '\nafter specialday'
-                # self.print_todays_schedule()                          
-                
-
-    def build_events_lists(self):
-        # builds events dictionary from todays_schedule by
-        # converting times in todays schedule from hour:min:sec to datetime
-        # and sorts them earliest last
-        TimeOfDay.events={}
-        for show_ref in self.todays_schedule:
-            # print show_ref
-            times = self.todays_schedule[show_ref]
-            for time_element in times:
-                time_element[1]=self.parse_event_time(time_element[1])
-            sorted_times=sorted(times,key = lambda time_element: time_element[1],reverse=True)
-            TimeOfDay.events[show_ref]=sorted_times
-            # print times
+                for special in show['specialday']['day']:
+                    if datetime.strptime(special,'%Y-%m-%d').date() == day:
+                        day_schedule[show_ref]=('specialday',show['specialday']['times'])
+        return day_schedule
 
 
     def parse_event_time(self,time_text):
@@ -315,39 +319,13 @@ class TimeOfDay(object):
 # print for debug
 # *********************
 
-    def pretty_todays_schedule(self):
-        op='Schedule For ' + TimeOfDay.now.ctime() + '\n'
-        for key in self.todays_schedule:
-            op += '  '+ key + '\n'
-            for show in self.todays_schedule[key]:
-                op += '    '+show[0]+ ':   '+ str(show[1])+ '\n'
-            op +='\n'
+    def pretty_schedule(self,day):
+        op='Schedule For ' + day.strftime('%a %b %d %Y') + '\n'
+        for event in self.timeline(day):
+            op += '    ' + event[TimeOfDay.WHEN].time().isoformat() + '  ' + event[TimeOfDay.COMMAND] + ' '\
+                  + event[TimeOfDay.SHOW_REF] + '\n'
         return op
 
-    def pretty_events_lists(self):
-        op = ' Events list for today'
-        for key in self.events:
-            op += '\n' + key
-            for show in self.events[key]:
-                op += '\n    ' + show[0] + ' ' + str(show[1].isoformat())
-        return op
-
-                    
-    def print_todays_schedule(self):
-        print '\nSchedule For '+ TimeOfDay.now.ctime()
-        for key in self.todays_schedule:
-            print '  '+key
-            for show in self.todays_schedule[key]:
-                print '    '+show[0]+ ':   '+show[1]
-            print
-
-    def print_events_lists(self):
-        print '\nevents list for today'
-        for key in self.events:
-            print '\n',key
-            for show in self.events[key]:
-                print show[0],show[1].isoformat()
-                
 
     def save_schedule(self,filename):
         """ save a schedule """
@@ -358,8 +336,6 @@ class TimeOfDay(object):
         else:
             filename = string.replace(filename,'\\','/')
         ofile  = open(filename, "wb")
-        json.dump(self.schedule,ofile,sort_keys= False,indent=1)
+        json.dump(TimeOfDay.schedule,ofile,sort_keys= False,indent=1)
         ofile.close()
         return
-            
-
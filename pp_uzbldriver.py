@@ -3,6 +3,9 @@ import os
 from glob import glob
 from os import stat as os_stat
 from pp_utils import Monitor
+from pp_scheduler import Scheduler
+from pp_lifecycle import LifecycleEvents
+from pp_childwatcher import ChildWatcher
 from stat import S_ISFIFO
 
 """
@@ -18,12 +21,23 @@ from stat import S_ISFIFO
     External commands
     ----------------------------
     __init__ just creates the instance and initialises variables (e.g. bplayer=uzblDriver())
-    play -  opens the browser and plays the first track
+    play -  opens the browser and plays the first track, loads the track into a warm browser
     control  - sends commands to uzbl while it is open 
     stop - closes the browser.
     terminate - Stops the browser. Used when aborting an application.
 
 
+    Warm browsers
+    ----------------------------
+    from_pool - returns a spare browser that was started before it was needed, or a new driver if UZBLDriver.pool_size is 0
+    fill_pool - starts spare browsers until pool_size are running, counting those lent to players
+    spare_available - there is a spare browser for a show to preload its next web track into
+    A warm browser loads the track off the screen, show_window moves it onto the screen and stop parks it
+    for the next track instead of exiting it, so with pool_size 1 every web track uses the same uzbl.
+    empty_pool exits the spares.
+    Each uzbl is started with --name so the driver knows which fifo in /tmp is its own.
+
+
     Signals
     ----------
     The following signals are produced while the browser is open
@@ -31,24 +45,123 @@ from stat import S_ISFIFO
 
     is_running() tests whether the sub-process running uzbl is alive.
 
+    Events
+    ----------
+    self.events.when('loaded',callback) - uzbl's fifo is available, same time as start_play_signal
+    self.events.when('closed',callback) - uzbl process has exited after stop
+
+
 """
 
 class UZBLDriver(object):
 
-    def __init__(self,widget):
+# CLASS VARIABLES (UZBLDriver.)
+    pool_size=1         # warm browsers kept running, set from the command line by PiPresents, 0 to start one for each track
+    spares=[]           # warm drivers not lent to a player, parked off the screen
+    on_loan=[]          # warm drivers lent to a player, they come back to spares when stopped
+    instances=0         # each uzbl is given a name so the driver knows its fifo
+
+    warm_appear_time=500    # ms for a page to be drawn by a warm browser
+    cold_appear_time=10000  # ms for a new browser to appear
+    exit_deadline=2000      # ms for uzbl to exit before it is killed
+
+
+    def __init__(self,widget,pp_dir='',warm=False):
 
         self.widget=widget
+        self.pp_dir=pp_dir
         
         self.mon=Monitor()
+        self.scheduler=Scheduler()
+        self.events=LifecycleEvents()
 
         self._process=None
-        self.fifo=''
+        UZBLDriver.instances+=1
+        self.name='pp_uzbl_' + str(os.getpid()) + '_' + str(UZBLDriver.instances)
+        self.fifo='/tmp/uzbl_fifo_' + self.name
+        self.exit_timer=None
+
+        # a warm browser is started before it is needed and is kept for the next track when stopped
+        self.warm=warm
+        self.lent=False
+        self.ready=False        # warm browser's fifo has appeared
+        self.pending=None       # track to go to when the warm browser's fifo appears
+        self.window=None        # x,y,width,height of the track's web window
+        if warm is True:
+            self.appear_time=UZBLDriver.warm_appear_time
+        else:
+            self.appear_time=UZBLDriver.cold_appear_time
+
+
+    # the driver for a player, a warm browser from the pool if there is one
+    def from_pool(self):
+        if UZBLDriver.pool_size == 0:
+            return self
+        # prefer one that is ready, a spare that is still starting is better than starting another
+        self.fill_pool()
+        if len(UZBLDriver.spares) == 0:
+            # all are lent to players, this track has a browser of its own
+            return self
+        ready=[driver for driver in UZBLDriver.spares if driver.ready is True]
+        if len(ready) > 0:
+            driver=ready[0]
+        else:
+            driver=UZBLDriver.spares[0]
+        UZBLDriver.spares.remove(driver)
+        driver.widget=self.widget
+        driver.events=LifecycleEvents()
+        driver.lent=True
+        UZBLDriver.on_loan.append(driver)
+        self.mon.log(self,'Using warm browser ' + driver.name)
+        return driver
+
+
+    # the browsers on loan count, they come back when their track is stopped
+    def fill_pool(self):
+        while len(UZBLDriver.spares) + len(UZBLDriver.on_loan) < UZBLDriver.pool_size:
+            driver=UZBLDriver(self.widget,self.pp_dir,warm=True)
+            try:
+                driver.warm_up()
+            except pexpect.ExceptionPexpect as e:
+                # no uzbl, a browser is started for each web track and fails as it would without the pool
+                self.mon.warn(self,'Cannot start a spare browser, not keeping any: ' + str(e))
+                UZBLDriver.pool_size=0
+                return
+            UZBLDriver.spares.append(driver)
+
+
+    def spare_available(self):
+        return UZBLDriver.pool_size > 0 and len(UZBLDriver.spares) > 0
+
+
+    # exit the spare browsers, called by PiPresents
+    def empty_pool(self):
+        for driver in UZBLDriver.spares:
+            driver.terminate('killed')
+        UZBLDriver.spares=[]
+
+
+    # start a warm browser off the screen with a blank page
+    def warm_up(self):
+        cmd='uzbl-browser --name=' + self.name + ' --geometry=1x1+' + str(self._screen_width()) + '+0 --uri=about:blank'
+        self.mon.log(self, "Start warm browser: "+ cmd)
+        self._process = pexpect.spawn(cmd)
+        ChildWatcher().watch(self._process,'uzbl',self._exited)
+        self.get_fifo()
+
 
     def pause(self):
         pass
 
     def stop(self):
+        if self.warm is True and self.lent is True:
+            if self._return_to_pool() is True:
+                # kept for the next track, there is no process to wait for
+                self.events.fire('closed','exit')
+                return
         self.control('exit')
+        if self.exit_timer is None:
+            self.exit_timer=self.scheduler.after(UZBLDriver.exit_deadline,self._exit_timed_out)
 
 
     # kill the subprocess (uzbl). Used for tidy up on exit.
@@ -58,13 +171,28 @@ class UZBLDriver(object):
             self.control('exit')
             # self._process.close(force=True)
     
-    def play(self, track, geometry):
+    # window is x,y,width,height or None for maximised
+    def play(self, track, window):
         self.start_play_signal = False
+        self.window=window
+        if self.warm is True:
+            # the page is loaded off the screen and moved on by show_window
+            if self.ready is True:
+                self._go_to(track)
+            else:
+                self.pending=track
+            return
+
+        if window is None:
+            geometry=' --geometry=maximized '
+        else:
+            geometry='--geometry=' + self._geometry(0) + ' '
         # track= "'"+ track.replace("'","'\\''") + "'"
 
-        cmd='uzbl-browser '  + geometry + '--uri='+track
+        cmd='uzbl-browser --name=' + self.name + ' ' + geometry + '--uri='+track
         self.mon.log(self, "Send command to uzbl: "+ cmd)
         self._process = pexpect.spawn(cmd)       
+        ChildWatcher().watch(self._process,'uzbl',self._exited)
         # uncomment to monitor output to and input from uzbl (read pexpect manual)
         # fout= file('/home/pi/pipresents/uzbllogfile.txt','w')  #uncomment and change sys.stdout to fout to log to a file
         # self._process.logfile_send = sys.stdout  # send just commands to stdout
@@ -73,23 +201,37 @@ class UZBLDriver(object):
         # and poll for fifo to be available
         self.get_fifo()
 
+
+    # move a warm browser onto the screen, a new browser is already there
+    def show_window(self):
+        if self.warm is True:
+            self.control('set geometry = ' + self._geometry(0))
+
+
     # poll for fifo to be available
     # when it is set start_play_signal
     # browser player calls is_running at intervals to test if uzbl is ended after an exit command
     def get_fifo(self):
         """
-        Look for UZBL's FIFO-file in /tmp.
+        Look for this UZBL's FIFO-file in /tmp.
         Don't give up until it has been found.
         """
-        candidates = glob('/tmp/uzbl_fifo_*')
-        for fifo_file in candidates:
-            if S_ISFIFO(os_stat(fifo_file).st_mode):
-                self.mon.log(self, 'Found UZBL fifo  in %s.' % fifo_file)
-                self.fifo=fifo_file
-                self.start_play_signal=True
+        if os.path.exists(self.fifo) and S_ISFIFO(os_stat(self.fifo).st_mode):
+            self.mon.log(self, 'Found UZBL fifo  in %s.' % self.fifo)
+            if self.warm is True:
+                self.ready=True
+                if self.pending is not None:
+                    self._go_to(self.pending)
+                    self.pending=None
                 return
+            self.start_play_signal=True
+            self.events.fire('loaded')
+            return
+        if self.warm is True and self.lent is False and self.is_running() is False:
+            # exited before it started, the child watcher has taken it out of the pool
+            return
         # print 'fifo not found trying again'
-        self.widget.after(500,self.get_fifo)
+        self.scheduler.after(500,self.get_fifo)
 
 
     def exists_fifo(self):
@@ -109,10 +251,69 @@ class UZBLDriver(object):
 
    # test of whether _process is running
     def is_running(self):
-        return self._process.isalive()     
+        return self._process.isalive()
 
-   
 
-    
+# ***********************************
+# INTERNAL FUNCTIONS
+# ************************************
+
+    # load the track into the warm browser off the screen, it is loaded when the fifo has taken the command
+    def _go_to(self,track):
+        self.control('set geometry = ' + self._geometry(self._screen_width()))
+        self.control('uri ' + track)
+        self.start_play_signal=True
+        self.events.fire('loaded')
+
+
+    # returns False if the browser is not wanted or cannot be used again, it is then exited as a cold one
+    def _return_to_pool(self):
+        self.lent=False
+        if self in UZBLDriver.on_loan:
+            UZBLDriver.on_loan.remove(self)
+        if len(UZBLDriver.spares) + len(UZBLDriver.on_loan) >= UZBLDriver.pool_size:
+            return False
+        if not self.exists_fifo() or self.is_running() is False:
+            return False
+        self.control('set geometry = ' + self._geometry(self._screen_width()))
+        self.control('uri about:blank')
+        UZBLDriver.spares.append(self)
+        self.mon.log(self,'Warm browser returned to the pool: ' + self.name)
+        return True
+
+
+    # uzbl geometry of the web window moved right by x_offset
+    def _geometry(self,x_offset):
+        if self.window is None:
+            x,y,width,height=0,0,self._screen_width(),self.widget.winfo_screenheight()
+        else:
+            x,y,width,height=self.window
+        return '%dx%d%+d%+d' % (width,height,x+x_offset,y)
+
+
+    def _screen_width(self):
+        return self.widget.winfo_screenwidth()
+
+
+    # uzbl has not gone after exit was sent
+    def _exit_timed_out(self):
+        self.exit_timer=None
+        ChildWatcher().kill(self._process,UZBLDriver.exit_deadline)
 
 
+    # the child watcher has reaped uzbl
+    def _exited(self,returncode):
+        self.scheduler.cancel(self.exit_timer)
+        self.exit_timer=None
+        if self in UZBLDriver.spares:
+            self.mon.warn(self,'Spare browser has exited: ' + self.name)
+            UZBLDriver.spares.remove(self)
+        if self in UZBLDriver.on_loan:
+            UZBLDriver.on_loan.remove(self)
+        # clean up the fifo and socket left by this uzbl
+        for leftover in glob('/tmp/uzbl_*_' + self.name):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        self.events.fire('closed','exit')
@@ -1,7 +1,9 @@
 import os
+import re
 import json
 import ConfigParser
 from pp_utils import parse_rectangle
+from pp_mediainfo import MediaInfo
 from Tkinter import Toplevel, Scrollbar,Text
 from Tkinter import VERTICAL,RIGHT,LEFT,BOTH,Y,NORMAL,END,DISABLED
 
@@ -57,6 +59,7 @@ class Validator(object):
 
         # CHECK ALL MEDIALISTS AND THEIR TRACKS
         v_media_lists = []
+        v_media_files = []
 
 
         for medialist_file in os.listdir(pp_profile):
@@ -114,6 +117,12 @@ class Validator(object):
                             track_file=pp_profile+track_file[1:]
                             if not os.path.exists(track_file): self.result.display('f',"location "+track['location']+ " Media File not Found")
 
+                    # checked they can be played when all the files have been found
+                    if track['type'] in ('video','audio'):
+                        media_file=MediaInfo().track_path(track,pp_home,pp_profile)
+                        if media_file is not None:
+                            v_media_files.append((media_file,medialist_file,track['title']))
+
                     if track['type'] in ('video','audio','message','image','web','menu'):
                         
                         # check common fields
@@ -299,6 +308,11 @@ class Validator(object):
                     
                     if not show['track-count-limit'].isdigit(): self.result.display('f',"'Track Count Limit' is not 0 or a positive integer")
 
+                    # preload fields are not in profiles made before they were added
+                    if not show.get('preload-depth','0').isdigit(): self.result.display('f',"'Preload Tracks' is not 0 or a positive integer")
+                    if not show.get('preload-memory','64').isdigit(): self.result.display('f',"'Preload Memory' is not 0 or a positive integer")
+                    if not show.get('preload-players','1').isdigit(): self.result.display('f',"'Preload Player Processes' is not 0 or a positive integer")
+
                     if show['trigger-start-type']in('input','input-persist'):
                         self.check_triggers('Trigger for Start',show['trigger-start-param'])
 
@@ -363,6 +377,8 @@ class Validator(object):
                     self.check_hh_mm_ss('Track Timeout',show['track-timeout'])
                     self.check_web_window('show','web-window',show['web-window'])
 
+        self.check_media_files(pp_profile,v_media_files)
+
         self.result.display('t', "\nValidation Complete")
         self.result.stats()
         if self.result.num_errors() == 0:
@@ -370,6 +386,23 @@ class Validator(object):
         else:
             return False
 
+    # probe the video and audio files, what is found is added to the media info index for Pi Presents
+    def check_media_files(self,pp_profile,media_files):
+        if len(media_files) == 0:
+            return
+        self.result.display('t',"\nChecking media files can be played")
+        messages=[]
+        files,probed,kept,failed=MediaInfo().build(pp_profile,[item[0] for item in media_files],log=messages.append,drop=False)
+        unknown=0
+        for media_file,medialist_file,title in media_files:
+            info=MediaInfo().lookup(media_file,files)
+            if info is None:
+                unknown+=1
+            elif info['playable'] is False:
+                self.result.display('f',"'"+title+"' in "+medialist_file+" cannot be played: "+info['error'])
+        if unknown > 0:
+            self.result.display('w',str(unknown)+" media files could not be checked, is ffprobe installed?")
+
     def check_hh_mm_ss(self,name,item):          
         fields=item.split(':')
         if len(fields) == 0:
@@ -666,7 +699,7 @@ class Validator(object):
             self.result.display('f',"incorrect number of fields in Control: " + line)
             return
         operation=fields[1]
-        if operation in ('up','down','play','stop','exit','pause','no-command','null') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('up','down','play','stop','exit','pause','no-command','null') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
         else:
             self.result.display('f',"unknown Command in Control: " + line)
@@ -691,7 +724,7 @@ class Validator(object):
             return
         symbol=fields[0]
         operation=fields[1]
-        if operation in ('home','null','stop','exit','repeat','pause','no-command') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('home','null','stop','exit','repeat','pause','no-command') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
 
         elif operation in ('call','goto','jump'):
@@ -737,7 +770,7 @@ class Validator(object):
             return
         symbol=fields[0]
         operation=fields[1]
-        if operation in ('return','stop','exit','pause','no-command') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('return','stop','exit','pause','no-command') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
         
         elif operation == 'play':
@@ -808,16 +841,18 @@ class Validator(object):
             return
 
         delay_text=fields[0]
-        if  not delay_text.isdigit(): self.result.display('f','Delay is not 0 or a positive integer in:' + field + ", " + line)
+        # seconds, up to 3 decimal places for millisecond timing
+        if re.match(r'^[0-9]+(\.[0-9]{1,3})?$',delay_text) is None: self.result.display('f','Delay is not 0 or a positive number of seconds in:' + field + ", " + line)
 
         name = fields[1]
         # name not checked - done at runtime
 
         out_type = fields[2]
-        if out_type != 'state': self.result.display('f','Unknownl type in: ' + field + ", " + line)
+        if out_type not in ('state','sound'): self.result.display('f','Unknownl type in: ' + field + ", " + line)
         
         to_state_text=fields[3]
-        if not (to_state_text  in ('on','off')): self.result.display('f','Unknown parameter in: ' + field + ", " + line)
+        if out_type == 'state' and not (to_state_text  in ('on','off')): self.result.display('f','Unknown parameter in: ' + field + ", " + line)
+        if out_type == 'sound' and to_state_text != 'play': self.result.display('f','Unknown parameter in: ' + field + ", " + line)
         
         return
     
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
-from pp_omxdriver import OMXDriver
+from pp_mediabackend import MediaBackend
 from pp_player import Player
 from pp_utils import parse_rectangle
 
@@ -91,7 +91,7 @@ class VideoPlayer(Player):
         # initialise video playing state and signals
         self.quit_signal=False
         self.unload_signal=False
-        self.play_state='initialised'
+        self.set_play_state('initialised')
         self.frozen_at_end=False
 
     # LOAD - creates and omxplayer instance, loads a track and then pause
@@ -110,7 +110,7 @@ class VideoPlayer(Player):
         status,message,command,has_window,x1,y1,x2,y2= self.parse_video_window(self.omx_window)
         if status  == 'error':
             self.mon.err(self,'omx window error: ' + message + ' in ' + self.omx_window)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error','omx window error: ' + message + ' in ' + self.omx_window)
                 return
@@ -125,7 +125,7 @@ class VideoPlayer(Player):
             status,message=self.load_plugin()
             if status == 'error':
                 self.mon.err(self,message)
-                self.play_state='load-failed'
+                self.set_play_state('load-failed')
                 if self.loaded_callback is not  None:
                     self.loaded_callback('error',message)
                     return
@@ -134,7 +134,7 @@ class VideoPlayer(Player):
         status,message=self.load_x_content(enable_menu)
         if status == 'error':
             self.mon.err(self,message)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error',message)
                 return
@@ -142,12 +142,12 @@ class VideoPlayer(Player):
 
         if not os.path.exists(track):
             self.mon.err(self,"Track file not found: "+ track)
-            self.play_state='load-failed'
+            self.set_play_state('load-failed')
             if self.loaded_callback is not  None:
                 self.loaded_callback('error','track file not found: '+ track)
                 return
 
-        self.omx=OMXDriver(self.canvas,self.pp_dir)
+        self.omx=MediaBackend().driver('video',self.canvas,self.pp_dir)
         self.start_state_machine_load(self.track)
 
 
@@ -214,7 +214,7 @@ class VideoPlayer(Player):
                 self.frozen_at_end=True
                 # pause the track
                 self.omx.pause('freeze at end from user stop')
-                self.quit_signal=True
+                self.quit_video()
                 # and return to show so it can end  the track and the video in track ready callback
 ##                if self.finished_callback is not None:
 ##                    # print 'finished from stop'
@@ -224,7 +224,7 @@ class VideoPlayer(Player):
         else:
             # freeze not required and its showing just stop the video
             if self.play_state=='showing':
-                self.quit_signal=True
+                self.quit_video()
             else:
                 self.mon.log(self,"!<stop rejected")                
 
@@ -339,45 +339,47 @@ class VideoPlayer(Player):
     <closed_callback with status= normal - omxplayer is dead, can close the track instance.
 
     >unload
-        Ongoing states - start_unload and unloading - omxplayer processes are dying due to quit sent.
+        Ongoing state - unloading - omxplayer processes are dying due to quit sent.
         when unloading is complete state=unloaded
-        I have not added a callback to unload. its easy to add one if you want.
+        There is no callback for unload, use when('closed',callback) to find out when it is complete.
 
-    closed is needed because wait_for end in pp_show polls for closed and does not use closed_callback
+    Progress through the states is driven by the lifecycle events from omxdriver (first-frame, finished, closed)
+    with deadlines for omxplayer not responding, nothing is polled.
+    The player's own events (loaded, first-frame, finished, closed) are fired by set_play_state, wait_for_end in pp_show uses closed.
     
     """
 
 
     def start_state_machine_load(self,track):
         self.track=track
-        # initialise all the state machine variables
-        self.loading_count=0     # initialise loading timeout counter
-        self.play_state='loading'
+        self.set_play_state('loading')
+
+        # wait for omxdriver's events rather than polling its signals
+        self.omx.events.when('first-frame',self.load_first_frame)
+        self.omx.events.when('finished',self.load_ended_early)
         
         # load the selected track
         options= ' --no-osd ' + self.omx_audio+ ' --vol -6000 ' + self.omx_window_processed + ' ' + self.seamless_loop + ' ' + self.omx_other_options +" "
         self.omx.load(track,self.freeze_at_start,options,self.mon.pretty_inst(self))
         # self.mon.log (self,'Send load command track '+ self.track + 'with options ' + options + 'from show Id: '+ str(self.show_id))
         # print 'omx.load started ',self.track
-        # and start polling for state changes
-        self.tick_timer=self.canvas.after(50, self.load_state_machine)
+        # deal with omxplayer crashing while loading and hence never sending first-frame
+        self.tick_timer=self.scheduler.after(40000, self.load_timed_out)
+
 
     def start_state_machine_unload(self):
         # print 'videoplayer - starting unload',self.play_state
         if self.play_state in('closed','initialised','unloaded'):
             # omxplayer already closed
-            self.play_state='unloaded'
+            self.set_play_state('unloaded')
             # print ' closed so no need to unload'
         else:
             if self.play_state  ==  'loaded':
-                # load already complete so set unload signal and kick off state machine
-                self.play_state='start_unload'
-                self.unloading_count=0
-                self.unload_signal=True
-                self.tick_timer=self.canvas.after(50, self.load_state_machine)
+                # load already complete so unload now
+                self.start_unload()
             elif self.play_state == 'loading':
                 # wait for load to complete before unloading - ???? must do this because does not respond to quit when loading
-                # state machine will go to start_unloading state and stop omxplayer
+                # load_first_frame will stop omxplayer
                 self.unload_signal=True
             else:
                 self.mon.err(self,'illegal state in unload method: ' + self.play_state)
@@ -386,219 +388,180 @@ class VideoPlayer(Player):
     def start_state_machine_show(self):
         if self.play_state == 'loaded':
             # print '\nstart show state machine ' + self.play_state
-            self.play_state='showing'
+            self.set_play_state('showing')
             self.freeze_signal=False     # signal that user has pressed stop
             self.must_quit_signal=False
             # show the track and content
+            self.omx.events.when('finished',self.show_finished)
             self.omx.show(self.freeze_at_end_required,self.omx_volume)
             self.mon.log (self,'>showing track from show Id: '+ str(self.show_id))
-
-            # and start polling for state changes
-            # print 'start show state machine show'
-            self.tick_timer=self.canvas.after(0, self.show_state_machine)
         else:
             self.mon.fatal(self,'illegal state in show method ' + self.play_state)
-            self.play_state='show-failed'
-            if self.finished_callback is not None:
-                self.finished_callback('error','illegal state in show method: ' + self.play_state)
+            self.set_play_state('show-failed')
+            self.track_finished('error','illegal state in show method: ' + self.play_state)
              
 
     def start_state_machine_close(self):
-        self.quit_signal=True
         # print 'start close state machine close'
-        self.tick_timer=self.canvas.after(0, self.show_state_machine)
-
-
-    def load_state_machine(self):
-        # print 'vidoeplayer state is'+self.play_state
-        if self.play_state == 'loading':
-            # if omxdriver says loaded then can finish normally
-            # self.mon.log(self,"      State machine: " + self.play_state)
-            if self.omx.end_play_signal is True:
-                # got nice day before the first timestamp
-                self.mon.warn(self,self.track)
-                self.mon.warn(self,"loading  - omxplayer ended before starting track with reason: " + self.omx.end_play_reason + ' at ' +str(self.omx.video_position))
-                self.omx.kill()
-                self.mon.err(self,'omxplayer ended before loading track')
-                self.play_state = 'load-failed'
-                self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                if self.loaded_callback is not  None:
-                    self.loaded_callback('error','omxplayer ended before loading track')      
-            else:
-                # end play signal false  - continue waiting for first timestamp
-                self.loading_count+=1
-                # video has loaded
-                if self.omx.start_play_signal is True:
-                    self.mon.log(self,"Loading complete from show Id: "+ str(self.show_id)+ ' ' +self.track)
-                    self.mon.log(self,'Got video duration from track, frezing at: '+ str(self.omx.duration)+ ' microsecs.')
-                    
-                    if self.unload_signal is True:
-                        # print'unload sig=true state= start_unload'
-                        # need to unload, kick off state machine in 'start_unload' state
-                        self.play_state='start_unload'
-                        self.unloading_count=0
-                        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                        self.tick_timer=self.canvas.after(200, self.load_state_machine)
-                    else:
-                        self.play_state = 'loaded'
-                        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                        if self.loaded_callback is not None:
-                            # print 'callback when loaded'
-                            self.loaded_callback('normal','video loaded')
-                else:
-                    # start play signal false - continue to wait
-                    if self.loading_count>400:  #40 seconds
-                        # deal with omxplayer crashing while  loading and hence not receive start_play_signal
-                        self.mon.warn(self,self.track)
-                        self.mon.warn(self,"loading - videoplayer counted out: " + self.omx.end_play_reason + ' at ' + str(self.omx.video_position))
-                        self.omx.kill()
-                        self.mon.warn(self,'videoplayer counted out when loading track ')
-                        self.play_state = 'load-failed'
-                        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                        if self.loaded_callback is not None:
-                            self.loaded_callback('error','omxplayer counted out when loading track')
-                    else:
-                        self.tick_timer=self.canvas.after(100, self.load_state_machine) #200
-
-
-        elif self.play_state == 'start_unload':
-            # omxplayer reports it is terminating
-            # self.mon.log(self,"      State machine: " + self.play_state)
-      
-            # deal with unload signal
-            if self.unload_signal is True:
-                self.unload_signal=False
-                self.omx.stop()
-                
-            if self.omx.end_play_signal is True:
-                self.omx.end_play_signal=False
-                self.mon.log(self,"            <end play signal received with reason: " + self.omx.end_play_reason + ' at: ' + str(self.omx.video_position))
-                
-                # omxplayer has been closed 
-                if self.omx.end_play_reason == 'nice_day':
-                    # no problem with omxplayer
-                    self.play_state='unloading'
-                    self.unloading_count=0
-                    self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                    self.tick_timer=self.canvas.after(50, self.load_state_machine)
-                else:
-                    # unexpected reason
-                    self.mon.err(self,'unexpected reason at unload: '+self.omx.end_play_reason)
-                    self.end('error','unexpected reason at unload: '+self.omx.end_play_reason)
-            else:
-                # end play signal false
-                self.tick_timer=self.canvas.after(50, self.load_state_machine)       
+        if self.play_state == 'showing':
+            self.quit_video()
+        elif self.play_state == 'closed':
+            if self.closed_callback is not  None:
+                self.closed_callback('normal','omxplayer already closed')
+        # if closing then closed_callback is called when omxplayer exits
 
-        elif self.play_state == 'unloading':
-            # wait for unloading to complete
-            self.mon.log(self,"      State machine: " + self.play_state)
-            
-            # if spawned process has closed can change to closed state
-            if self.omx.is_running()  is False:
-                self.mon.log(self,"            <omx process is dead")
-                self.play_state='unloaded'
-                self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-            else:
-                # process still running
-                self.unloading_count+=1
-                if self.unloading_count>10:
-                    # deal with omxplayer not terminating at the end of a track
-                    self.mon.warn(self,self.track)
-                    self.mon.warn(self,"            <unloading - omxplayer failed to close at: " + str(self.omx.video_position))
-                    self.mon.warn(self,'omxplayer should now  be killed ')
-                    self.omx.kill()
-                    self.play_state='unloaded'
-                    self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                else:
-                    self.tick_timer=self.canvas.after(200, self.load_state_machine)
-        else:
-            self.mon.err(self,'illegal state in load state machine: ' + self.play_state)
-            self.end('error','load state machine in illegal state: '+ self.play_state)
 
+# ***********************
+# loading and unloading
+# **********************
 
+    # omxplayer is paused on the first frame
+    def load_first_frame(self):
+        if self.play_state != 'loading':
+            return
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.mon.log(self,"Loading complete from show Id: "+ str(self.show_id)+ ' ' +self.track)
+        self.mon.log(self,'Got video duration from track, frezing at: '+ str(self.omx.duration)+ ' microsecs.')
+        if self.unload_signal is True:
+            # unload was received while loading
+            self.unload_signal=False
+            self.start_unload()
+        else:
+            self.set_play_state('loaded')
+            self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+            if self.loaded_callback is not None:
+                # print 'callback when loaded'
+                self.loaded_callback('normal','video loaded')
+
+
+    # got nice day before the first timestamp
+    def load_ended_early(self,reason):
+        if self.play_state != 'loading':
+            return
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.mon.warn(self,self.track)
+        self.mon.warn(self,"loading  - omxplayer ended before starting track with reason: " + reason + ' at ' +str(self.omx.video_position))
+        self.omx.kill()
+        self.mon.err(self,'omxplayer ended before loading track')
+        self.set_play_state('load-failed')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        if self.loaded_callback is not  None:
+            self.loaded_callback('error','omxplayer ended before loading track')      
+
+
+    def load_timed_out(self):
+        self.tick_timer=None
+        if self.play_state != 'loading':
+            return
+        self.mon.warn(self,self.track)
+        self.mon.warn(self,"loading - videoplayer timed out: " + self.omx.end_play_reason + ' at ' + str(self.omx.video_position))
+        self.omx.kill()
+        self.mon.warn(self,'videoplayer timed out when loading track ')
+        self.set_play_state('load-failed')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        if self.loaded_callback is not None:
+            self.loaded_callback('error','omxplayer timed out when loading track')
+
+
+    # quit omxplayer and wait for it to exit
+    def start_unload(self):
+        self.set_play_state('unloading')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        self.omx.events.when('closed',self.unload_closed)
+        self.omx.stop()
+        # deal with omxplayer not terminating
+        self.tick_timer=self.scheduler.after(2000, self.unload_timed_out)
+
+
+    def unload_closed(self,reason):
+        if self.play_state != 'unloading':
+            return
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.mon.log(self,"            <omx process is dead")
+        self.set_play_state('unloaded')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+
+
+    def unload_timed_out(self):
+        self.tick_timer=None
+        if self.play_state != 'unloading':
+            return
+        self.mon.warn(self,self.track)
+        self.mon.warn(self,"            <unloading - omxplayer failed to close at: " + str(self.omx.video_position))
+        self.mon.warn(self,'omxplayer should now  be killed ')
+        self.omx.kill()
+        self.set_play_state('unloaded')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
 
-    def show_state_machine(self):
-        # print self.play_state
-        # if self.play_state != 'showing': print 'show state is '+self.play_state
-        if self.play_state == 'showing':
-            # service any queued stop signals by sending quit to omxplayer
-            # self.mon.log(self,"      State machine: " + self.play_state)
-            if self.quit_signal is True:
-                self.quit_signal=False
-                self.mon.log(self,"      quit video - Send stop to omxdriver")
-                self.omx.stop()
-                self.tick_timer=self.canvas.after(50, self.show_state_machine)
-
-            # omxplayer reports it is terminating
-            elif self.omx.end_play_signal is True:
-                self.omx.end_play_signal=False
-                self.mon.log(self,"end play signal received with reason: " + self.omx.end_play_reason + ' at: ' + str(self.omx.video_position))
-                # paused at end of track so return so calling prog can release the pause
-                if self.omx.end_play_reason == 'pause_at_end':
-                    self.frozen_at_end=True
-                    if self.finished_callback is not None:
-                        self.finished_callback('pause_at_end','pause at end')
-
-                elif self.omx.end_play_reason == 'nice_day':
-                    # no problem with omxplayer
-                    self.play_state='closing'
-                    self.closing_count=0
-                    self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                    self.tick_timer=self.canvas.after(50, self.show_state_machine)
-                else:
-                    # unexpected reason
-                    self.mon.err(self,'unexpected reason at end of show '+self.omx.end_play_reason)
-                    self.play_state='show-failed'
-                    if self.finished_callback is not None:
-                        self.finished_callback('error','unexpected reason at end of show: '+ self.omx.end_play_reason)
 
-            else:
-                # nothing to do just try again
-                # print 'showing - try again'
-                self.tick_timer=self.canvas.after(50, self.show_state_machine)       
-
-
-        elif self.play_state == 'closing':
-            # wait for closing to complete
-            self.mon.log(self,"      State machine: " + self.play_state)
-            if self.omx.is_running()  is False:
-                # if spawned process has closed can change to closed state
-                self.mon.log(self,"            <omx process is dead")
-                self.play_state = 'closed'
-                # print 'process dead going to closed'
-                self.omx=None
-                self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                if self.closed_callback is not  None:
-                    self.closed_callback('normal','omxplayer closed')
-            else:
-                # process still running
-                self.closing_count+=1
-                # print 'closing - waiting for process to die',self.closing_count
-                if self.closing_count>10:
-                    # deal with omxplayer not terminating at the end of a track
-                    # self.mon.warn(self,self.track)
-                    # self.mon.warn(self,"omxplayer failed to close at: " + str(self.omx.video_position))
-                    self.mon.warn(self,'failed to close - omxplayer now being killed with SIGINT')
-                    self.omx.kill()
-                    # print 'closing - precess will not die so ita been killed with SIGINT'
-                    self.play_state = 'closed'
-                    self.omx=None
-                    self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
-                    if self.closed_callback is not None:
-                        self.closed_callback('normal','closed omxplayer after sigint')
-                else:
-                    self.tick_timer=self.canvas.after(200, self.show_state_machine)
-
-        elif self.play_state=='closed':
-            # needed because wait_for_end polls the state and does not use callback
-            self.mon.log(self,"      State machine: " + self.play_state)    
-            self.tick_timer=self.canvas.after(200, self.show_state_machine)            
+# ***********************
+# showing and closing
+# **********************
 
+    # omxplayer reports it is at the end of the track
+    def show_finished(self,reason):
+        if self.play_state != 'showing':
+            return
+        self.mon.log(self,"end play signal received with reason: " + reason + ' at: ' + str(self.omx.video_position))
+        # paused at end of track so return so calling prog can release the pause
+        if reason == 'pause_at_end':
+            self.frozen_at_end=True
+            self.track_finished('pause_at_end','pause at end')
+
+        elif reason == 'nice_day':
+            # no problem with omxplayer, it is terminating
+            self.start_closing()
         else:
-            self.mon.err(self,'unknown state in show/close state machine ' + self.play_state)
-            self.play_state='show-failed'
-            if self.finished_callback is not None:
-                self.finished_callback('error','show state machine in unknown state: '+ self.play_state)
+            # unexpected reason
+            self.mon.err(self,'unexpected reason at end of show '+reason)
+            self.set_play_state('show-failed')
+            self.track_finished('error','unexpected reason at end of show: '+ reason)
+
+
+    # send quit to omxplayer
+    def quit_video(self):
+        if self.play_state != 'showing':
+            return
+        self.mon.log(self,"      quit video - Send stop to omxdriver")
+        self.start_closing()
+        self.omx.stop()
+
+
+    def start_closing(self):
+        self.set_play_state('closing')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        self.omx.events.when('closed',self.show_closed)
+        # deal with omxplayer not terminating at the end of a track
+        self.tick_timer=self.scheduler.after(2000, self.close_timed_out)
+
+
+    def show_closed(self,reason):
+        if self.play_state != 'closing':
+            return
+        self.scheduler.cancel(self.tick_timer)
+        self.tick_timer=None
+        self.mon.log(self,"            <omx process is dead")
+        self.omx=None
+        self.set_play_state('closed')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        if self.closed_callback is not  None:
+            self.closed_callback('normal','omxplayer closed')
+
+
+    def close_timed_out(self):
+        self.tick_timer=None
+        if self.play_state != 'closing':
+            return
+        self.mon.warn(self,'failed to close - omxplayer now being killed with SIGINT')
+        self.omx.kill()
+        self.omx=None
+        self.set_play_state('closed')
+        self.mon.log(self,"      Entering state : " + self.play_state + ' from show Id: '+ str(self.show_id))
+        if self.closed_callback is not None:
+            self.closed_callback('normal','closed omxplayer after sigint')
 
 
     def parse_video_window(self,line):
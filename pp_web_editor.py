@@ -1009,6 +1009,8 @@ class PPWebEditor(App):
             self.edit_track_dialog.show_tab('track')
 
     def finished_edit_track(self):
+        # track-ref may have been edited
+        self.current_medialist.reindex()
         self.refresh_tracks_display()
         self.save_medialist()        
             
@@ -1,9 +1,11 @@
 import os
+import re
 import json
 import ConfigParser
 import remi.gui as gui
 from remi_plus import AdaptableDialog
 from pp_utils import parse_rectangle
+from pp_mediainfo import MediaInfo
 """
 1/12/2016 - warn if foreign files in profile rather than abort
 
@@ -93,6 +95,7 @@ class Validator(AdaptableDialog):
 
         # CHECK ALL MEDIALISTS AND THEIR TRACKS
         v_media_lists = []
+        v_media_files = []
         for medialist_file in os.listdir(pp_profile):
             if not medialist_file.endswith(".json") and medialist_file not in ('readme.txt') and not os.path.isdir(pp_profile+os.sep+medialist_file):
                 self.display('w',"Placing a media file in a profile is discouraged: "+ medialist_file + '\n         Place it in a directory')
@@ -147,6 +150,12 @@ class Validator(AdaptableDialog):
                             track_file=pp_profile+track_file[1:]
                             if not os.path.exists(track_file): self.display('f',"location "+track['location']+ " Media File not Found")
 
+                    # checked they can be played when all the files have been found
+                    if track['type'] in ('video','audio'):
+                        media_file=MediaInfo().track_path(track,pp_home,pp_profile)
+                        if media_file is not None:
+                            v_media_files.append((media_file,medialist_file,track['title']))
+
                     if track['type'] in ('video','audio','message','image','web','menu'):
                         
                         # check common fields
@@ -332,6 +341,11 @@ class Validator(AdaptableDialog):
                     
                     if not show['track-count-limit'].isdigit(): self.display('f',"'Track Count Limit' is not 0 or a positive integer")
 
+                    # preload fields are not in profiles made before they were added
+                    if not show.get('preload-depth','0').isdigit(): self.display('f',"'Preload Tracks' is not 0 or a positive integer")
+                    if not show.get('preload-memory','64').isdigit(): self.display('f',"'Preload Memory' is not 0 or a positive integer")
+                    if not show.get('preload-players','1').isdigit(): self.display('f',"'Preload Player Processes' is not 0 or a positive integer")
+
                     if show['trigger-start-type']in('input','input-persist'):
                         self.check_triggers('Start Trigger Parameters',show['trigger-start-param'])
 
@@ -413,6 +427,8 @@ class Validator(AdaptableDialog):
                     self.check_hh_mm_ss('Track Timeout',show['track-timeout'])
                     self.check_web_window('show','web-window',show['web-window'])
 
+        self.check_media_files(pp_profile,v_media_files)
+
         self.display('t', "\nValidation Complete")
         self.stats()
         if self.num_errors() == 0:
@@ -420,6 +436,23 @@ class Validator(AdaptableDialog):
         else:
             return False
 
+    # probe the video and audio files, what is found is added to the media info index for Pi Presents
+    def check_media_files(self,pp_profile,media_files):
+        if len(media_files) == 0:
+            return
+        self.display('t',"\nChecking media files can be played")
+        messages=[]
+        files,probed,kept,failed=MediaInfo().build(pp_profile,[item[0] for item in media_files],log=messages.append,drop=False)
+        unknown=0
+        for media_file,medialist_file,title in media_files:
+            info=MediaInfo().lookup(media_file,files)
+            if info is None:
+                unknown+=1
+            elif info['playable'] is False:
+                self.display('f',"'"+title+"' in "+medialist_file+" cannot be played: "+info['error'])
+        if unknown > 0:
+            self.display('w',str(unknown)+" media files could not be checked, is ffprobe installed?")
+
     def check_hh_mm_ss(self,name,item):          
         fields=item.split(':')
         if len(fields) == 0:
@@ -716,7 +749,7 @@ class Validator(AdaptableDialog):
             self.display('f',"incorrect number of fields in Control: " + line)
             return
         operation=fields[1]
-        if operation in ('up','down','play','stop','exit','pause','no-command','null','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('up','down','play','stop','exit','pause','no-command','null','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
         else:
             self.display('f',"unknown Command in Control: " + line)
@@ -741,7 +774,7 @@ class Validator(AdaptableDialog):
             return
         symbol=fields[0]
         operation=fields[1]
-        if operation in ('home','null','stop','exit','repeat','pause','no-command','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('home','null','stop','exit','repeat','pause','no-command','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
 
         elif operation in ('call','goto','jump'):
@@ -787,7 +820,7 @@ class Validator(AdaptableDialog):
             return
         symbol=fields[0]
         operation=fields[1]
-        if operation in ('return','stop','exit','pause','no-command','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-':
+        if operation in ('return','stop','exit','pause','no-command','pause-on','pause-off','mute','unmute','go') or operation[0:6] == 'mplay-' or operation[0:4] == 'omx-' or operation[0:5] == 'uzbl-' or operation[0:6] == 'sound-':
             return
         
         elif operation == 'play':
@@ -856,16 +889,18 @@ class Validator(AdaptableDialog):
             return
 
         delay_text=fields[0]
-        if  not delay_text.isdigit(): self.display('f','Delay is not 0 or a positive integer in:' + field + ", " + line)
+        # seconds, up to 3 decimal places for millisecond timing
+        if re.match(r'^[0-9]+(\.[0-9]{1,3})?$',delay_text) is None: self.display('f','Delay is not 0 or a positive number of seconds in:' + field + ", " + line)
 
         name = fields[1]
         # name not checked - done at runtime
 
         out_type = fields[2]
-        if out_type != 'state': self.display('f','Unknownl type in: ' + field + ", " + line)
+        if out_type not in ('state','sound'): self.display('f','Unknownl type in: ' + field + ", " + line)
         
         to_state_text=fields[3]
-        if not (to_state_text  in ('on','off')): self.display('f','Unknown parameter in: ' + field + ", " + line)
+        if out_type == 'state' and not (to_state_text  in ('on','off')): self.display('f','Unknown parameter in: ' + field + ", " + line)
+        if out_type == 'sound' and to_state_text != 'play': self.display('f','Unknown parameter in: ' + field + ", " + line)
         
         return
     